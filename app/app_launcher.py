@@ -150,4 +150,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # 冻结版中流水线的常驻进程池（pipeline/worker_pool.py）以本程序启动 worker，须先交给 multiprocessing 处理
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -1,13 +1,48 @@
 # -*- coding: utf-8 -*-
-"""高级查询：表列表、表详情、执行 SQL。"""
+"""高级查询：表列表、表详情、执行 SQL、流式导出 SELECT 结果。"""
 from __future__ import annotations
 
+import base64
+import csv
 import datetime
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
 from decimal import Decimal
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict
 
 MAX_SELECT_ROWS = 10000
 SAMPLE_ROWS = 50
+# 流式输出：每次从服务端游标取的行数、攒够多少字节写一次响应
+STREAM_FETCH_ROWS = 500
+STREAM_FLUSH_BYTES = 64 * 1024
+STREAM_FORMATS = ("json", "ndjson", "csv")
+
+
+def _env_num(name: str, default, cast=int):
+    try:
+        return cast(os.environ.get(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+# 分析型查询的护栏（环境变量可调）：单条超时、EXPLAIN 估算代价上限、重查询排队阈值、并发数、排队等待上限
+QUERY_TIMEOUT_MS = _env_num("ADVANCED_QUERY_TIMEOUT_MS", 30000)
+QUERY_MAX_COST = _env_num("ADVANCED_QUERY_MAX_COST", 5e7, float)
+QUERY_HEAVY_COST = _env_num("ADVANCED_QUERY_HEAVY_COST", 1e6, float)
+QUERY_CONCURRENCY = max(1, _env_num("ADVANCED_QUERY_CONCURRENCY", 2))
+QUERY_QUEUE_WAIT_S = _env_num("ADVANCED_QUERY_QUEUE_WAIT_S", 20, float)
+
+# 所有分析型查询共用的小信号量；估算代价超过 QUERY_HEAVY_COST 的再排一个单槽队列，重查询同一时刻只跑一条
+_QUERY_SEM = threading.BoundedSemaphore(QUERY_CONCURRENCY)
+_HEAVY_SEM = threading.BoundedSemaphore(1)
+
+
+class QueryRejected(Exception):
+    """查询被护栏拒绝（代价过高或排队超时），message 直接返回给前端。"""
 
 
 def _cell_to_json(v):
@@ -28,15 +63,21 @@ def _cell_to_json(v):
 
 
 def get_tables(conn) -> list:
-    """返回当前库所有表名（来自 information_schema）。"""
+    """返回当前库所有表名（MySQL 来自 information_schema，内嵌 SQLite 来自 sqlite_master）。"""
     if not conn:
         return []
     try:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT TABLE_NAME FROM information_schema.TABLES "
-                "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
-            )
+            if getattr(conn, "backend", None) == "sqlite":
+                cur.execute(
+                    "SELECT name AS TABLE_NAME FROM sqlite_master "
+                    "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+                )
+            else:
+                cur.execute(
+                    "SELECT TABLE_NAME FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+                )
             rows = cur.fetchall()
             return [r["TABLE_NAME"] for r in rows if r.get("TABLE_NAME")]
     except Exception:
@@ -52,9 +93,12 @@ def get_table_info(conn, table_name: str) -> Optional[Dict]:
         return None
     try:
         with conn.cursor() as cur:
-            cur.execute("DESCRIBE `%s`" % safe_name)
-            cols = cur.fetchall()
-            columns = [c.get("Field") or "" for c in cols]
+            if getattr(conn, "backend", None) == "sqlite":
+                cur.execute("PRAGMA table_info(`%s`)" % safe_name)
+                columns = [c.get("name") or "" for c in cur.fetchall()]
+            else:
+                cur.execute("DESCRIBE `%s`" % safe_name)
+                columns = [c.get("Field") or "" for c in cur.fetchall()]
             cur.execute("SELECT * FROM `%s` LIMIT %s" % (safe_name, SAMPLE_ROWS))
             rows = cur.fetchall()
             list_rows = []
@@ -88,3 +132,333 @@ def execute_sql(conn, sql: str, max_rows: int = MAX_SELECT_ROWS) -> dict:
             return {"affected": cur.rowcount}
     except Exception as e:
         return {"error": str(e)}
+
+
+def is_select(sql: str) -> bool:
+    """是否为返回结果集的只读查询（SELECT / WITH ... SELECT），用于决定走流式执行。"""
+    head = (sql or "").lstrip().split(None, 1)
+    return bool(head) and head[0].upper() in ("SELECT", "WITH")
+
+
+def encode_keyset_token(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_keyset_token(token: str):
+    """解析翻页 token，非法时抛 ValueError。"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("翻页 token 无效")
+
+
+def _server_side_cursor(conn):
+    """MySQL 用 SSDictCursor（逐批从服务端取，不在本进程缓存整个结果集）；内嵌 SQLite 游标本身即按需读取。"""
+    if getattr(conn, "backend", None) == "sqlite":
+        return conn.cursor()
+    import pymysql
+    return conn.cursor(pymysql.cursors.SSDictCursor)
+
+
+def _keyset_sql(sql: str, keys: list, has_after: bool, limit: int) -> str:
+    """
+    把用户 SELECT 包成按 keys 列（组合）排序、从上一页末尾继续的子查询。列名仅允许字母数字下划线。
+    多列时按行值比较 (a, b) > (%s, %s)，单列不唯一时可追加能区分行的列作为 tiebreaker。
+    """
+    # 外层带参数执行，用户 SQL 中的字面量 % 需转义
+    inner = sql.rstrip().rstrip(";").replace("%", "%%")
+    cols = ", ".join("_q.`%s`" % k for k in keys)
+    where = ""
+    if has_after:
+        where = " WHERE (%s) > (%s)" % (cols, ", ".join(["%s"] * len(keys))) if len(keys) > 1 else " WHERE %s > %%s" % cols
+    return "SELECT * FROM (%s) AS _q%s ORDER BY %s LIMIT %d" % (inner, where, cols, limit)
+
+
+class _Out:
+    """把小片段攒到 STREAM_FLUSH_BYTES 再交给 write，减少 socket 写次数。"""
+
+    def __init__(self, write: Callable[[bytes], None]):
+        self._write = write
+        self._buf = []
+        self._size = 0
+
+    def __call__(self, text: str):
+        b = text.encode("utf-8")
+        self._buf.append(b)
+        self._size += len(b)
+        if self._size >= STREAM_FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._write(b"".join(self._buf))
+            self._buf = []
+            self._size = 0
+
+
+def stream_select(conn, sql: str, write: Callable[[bytes], None], fmt: str = "json",
+                  limit: int = MAX_SELECT_ROWS, key: str = "", after: str = "",
+                  on_finish: Callable[[bool], dict] = None) -> dict:
+    """
+    用服务端游标执行 SELECT，边取边写：内存占用与结果集大小无关。
+    - fmt=json：{"ok": true, "headers": [...], "rows": [[...], ...], "next": token|null, "truncated": bool, "rowCount": n}，
+      与 execute_sql 的 SELECT 返回结构兼容；
+    - fmt=ndjson：首行 {"headers": [...]}，之后每行一个 JSON 数组，末行 {"done": true, "rowCount": n, "next": ..., "truncated": ...}；
+    - fmt=csv：表头 + 数据行（UTF-8 BOM，便于 Excel 打开），不带翻页信息。
+    limit<=0 表示不限行数（导出用）。指定 key（结果中的列名，逗号分隔可给多列）时按该列组合做 keyset 翻页：
+    每页多取一行判断是否还有下一页，next 为本页最后一行 key 值的 token，下次以 after=next 请求。
+    key 组合须唯一：页尾两行 key 相同（或含 NULL）时继续翻页会漏行，此时不给 next 并在末尾写入 error，
+    请追加能区分行的列（如 key="week_tag,id"）。
+    开始输出前出错返回 {"error": ...}（调用方可正常返回错误）；输出中途出错在流末尾写入 error 字段。
+    on_finish(结果是否读完) 返回的 dict 作为 stats 写入流末尾（json / ndjson）。
+    返回 {"rows": n, "truncated": bool, "next": token|None, "stats": ...}。
+    """
+    if fmt not in STREAM_FORMATS:
+        return {"error": "不支持的输出格式: %s" % fmt}
+    if not is_select(sql):
+        return {"error": "仅 SELECT 查询支持流式输出"}
+    keys = [k.strip() for k in (key or "").split(",") if k.strip()]
+    if any("".join(c for c in k if c.isalnum() or c == "_") != k for k in keys):
+        return {"error": "翻页列名仅允许字母数字下划线"}
+    params = None
+    limit = int(limit or 0)
+    exec_sql = sql
+    if keys:
+        if limit <= 0:
+            limit = MAX_SELECT_ROWS
+        if after:
+            try:
+                params = decode_keyset_token(after)
+            except ValueError as e:
+                return {"error": str(e)}
+            # 单列 token 为标量（兼容旧 token），多列为列表
+            params = tuple(params) if isinstance(params, list) else (params,)
+            if len(params) != len(keys):
+                return {"error": "翻页 token 与 key 列数不一致"}
+        exec_sql = _keyset_sql(sql, keys, bool(after), limit + 1)
+        if params is None:
+            exec_sql = exec_sql.replace("%%", "%")
+    cur = _server_side_cursor(conn)
+    try:
+        cur.execute(exec_sql, params)
+        desc = cur.description or ()
+    except Exception as e:
+        return {"error": str(e)}
+    headers = [d[0] for d in desc]
+    missing = [k for k in keys if k not in headers]
+    if missing:
+        return {"error": "翻页列 %s 不在结果列中" % ",".join(missing)}
+    key_idx = [headers.index(k) for k in keys]
+
+    out = _Out(write)
+    csv_buf = io.StringIO()
+    csv_writer = csv.writer(csv_buf)
+    if fmt == "json":
+        out('{"ok": true, "headers": ' + json.dumps(headers, ensure_ascii=False) + ', "rows": [')
+    elif fmt == "ndjson":
+        out(json.dumps({"headers": headers}, ensure_ascii=False) + "\n")
+    else:
+        out("\ufeff")
+        csv_writer.writerow(headers)
+        out(csv_buf.getvalue())
+
+    count = 0
+    truncated = False
+    last_key = None
+    error = None
+    try:
+        while True:
+            batch = cur.fetchmany(STREAM_FETCH_ROWS)
+            if not batch:
+                break
+            for r in batch:
+                if limit > 0 and count >= limit:
+                    truncated = True
+                    # 多取的一行与页尾 key 相同：按 > last_key 翻页会跳过它及其余同 key 行
+                    if keys and [_cell_to_json(r.get(k)) for k in keys] == last_key:
+                        error = "翻页列 %s 不唯一，请追加能区分行的列（如 key=\"%s,id\"）" % (",".join(keys), ",".join(keys))
+                    break
+                row = [_cell_to_json(r.get(h)) for h in headers]
+                if keys:
+                    last_key = [row[i] for i in key_idx]
+                if fmt == "csv":
+                    csv_buf.seek(0)
+                    csv_buf.truncate()
+                    csv_writer.writerow(["" if v is None else (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v) for v in row])
+                    out(csv_buf.getvalue())
+                else:
+                    text = json.dumps(row, ensure_ascii=False, default=str)
+                    out(("," if count and fmt == "json" else "") + text + ("\n" if fmt == "ndjson" else ""))
+                count += 1
+            if truncated:
+                break
+    except Exception as e:
+        error = str(e)
+    # 截断时不关闭服务端游标（SSCursor.close 会把剩余结果读完），由 guarded_query 直接关闭连接
+    consumed = not truncated and not error
+    if consumed:
+        try:
+            cur.close()
+        except Exception:
+            pass
+    next_token = None
+    if keys and truncated and not error:
+        if last_key is None or any(v is None for v in last_key):
+            error = "页尾行的翻页列为 NULL，无法继续翻页，请改用非空列作为 key"
+        else:
+            next_token = encode_keyset_token(last_key if len(keys) > 1 else last_key[0])
+    tail = {"next": next_token, "truncated": truncated, "rowCount": count}
+    if on_finish:
+        tail["stats"] = on_finish(consumed)
+    if error:
+        tail["error"] = error
+    if fmt == "json":
+        out("], " + json.dumps(tail, ensure_ascii=False)[1:])
+    elif fmt == "ndjson":
+        out(json.dumps(dict(tail, done=True), ensure_ascii=False) + "\n")
+    out.flush()
+    return {"rows": count, "truncated": truncated, "next": next_token, "stats": tail.get("stats")}
+
+
+def _is_sqlite(conn) -> bool:
+    return getattr(conn, "backend", None) == "sqlite"
+
+
+def _sum_plan_rows(node) -> int:
+    """EXPLAIN FORMAT=JSON 中各表 rows_examined_per_scan 之和，作为预计扫描行数。"""
+    total = 0
+    if isinstance(node, dict):
+        table = node.get("table")
+        if isinstance(table, dict):
+            try:
+                total += int(table.get("rows_examined_per_scan") or 0)
+            except (TypeError, ValueError):
+                pass
+        for k, v in node.items():
+            if k != "table":
+                total += _sum_plan_rows(v)
+        if isinstance(table, dict):
+            for v in table.values():
+                if isinstance(v, (dict, list)):
+                    total += _sum_plan_rows(v)
+    elif isinstance(node, list):
+        for v in node:
+            total += _sum_plan_rows(v)
+    return total
+
+
+def estimate_query_cost(conn, sql: str) -> Optional[Dict]:
+    """
+    预检：MySQL 用 EXPLAIN FORMAT=JSON 取优化器估算代价 query_cost 与预计扫描行数；
+    内嵌 SQLite 无代价模型，返回 None（不做代价拦截，仅受超时与并发限制）。EXPLAIN 失败时同样返回 None，交由执行阶段报错。
+    """
+    if _is_sqlite(conn):
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN FORMAT=JSON " + sql.rstrip().rstrip(";"))
+            row = cur.fetchone()
+    except Exception:
+        return None
+    if not row:
+        return None
+    raw = row.get("EXPLAIN") if isinstance(row, dict) else row[0]
+    try:
+        plan = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        block = plan.get("query_block") or {}
+        cost = float((block.get("cost_info") or {}).get("query_cost") or 0)
+    except Exception:
+        return None
+    return {"cost": cost, "rows": _sum_plan_rows(block)}
+
+
+def _rows_examined_counter(conn) -> Optional[int]:
+    """本会话 Handler_read_* 累计值（存储引擎读行数），执行前后相减即本条查询实际扫描行数。SQLite 返回 None。"""
+    if _is_sqlite(conn):
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+            rows = cur.fetchall() or []
+        return sum(int(r.get("Value") or 0) for r in rows)
+    except Exception:
+        return None
+
+
+def _set_timeout(conn, timeout_ms: int) -> None:
+    if _is_sqlite(conn):
+        # SQLite 无语句超时：用进度回调在超时后中断执行（报 interrupted）
+        if timeout_ms > 0:
+            deadline = time.monotonic() + timeout_ms / 1000.0
+            conn.raw.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        else:
+            conn.raw.set_progress_handler(None, 0)
+        return
+    with conn.cursor() as cur:
+        cur.execute("SET SESSION MAX_EXECUTION_TIME = %d" % max(0, int(timeout_ms)))
+
+
+@contextmanager
+def guarded_query(conn, sql: str, timeout_ms: int = None):
+    """
+    分析型 SELECT 的护栏，with 块内执行查询：
+    1. EXPLAIN 预检，估算代价超过 QUERY_MAX_COST 直接拒绝；超过 QUERY_HEAVY_COST 进入单槽重查询队列；
+    2. 占用 QUERY_CONCURRENCY 个名额之一，排队超过 QUERY_QUEUE_WAIT_S 拒绝；
+    3. 会话级 MAX_EXECUTION_TIME（SQLite 为进度回调中断）。
+    yield 的 stats 在 with 块中可随时调用 finish_stats 补全；拒绝时抛 QueryRejected。
+    退出时先清理连接再释放名额：结果已读完（finish_stats 以 consumed=True 调用过）才复位会话超时；
+    未读完（截断、出错、客户端断开）时直接关闭连接——服务端游标上还有未读的行，此时再执行 SET 会先把剩余结果全部读完。
+    """
+    timeout_ms = QUERY_TIMEOUT_MS if timeout_ms is None else int(timeout_ms)
+    est = estimate_query_cost(conn, sql)
+    stats = {"estimatedCost": est["cost"] if est else None, "estimatedRows": est["rows"] if est else None}
+    if est and QUERY_MAX_COST > 0 and est["cost"] > QUERY_MAX_COST:
+        raise QueryRejected(
+            "查询估算代价 %.0f 超过上限 %.0f（预计扫描 %d 行），请加 WHERE 条件或 LIMIT 缩小范围"
+            % (est["cost"], QUERY_MAX_COST, est["rows"])
+        )
+    heavy = bool(est and QUERY_HEAVY_COST > 0 and est["cost"] > QUERY_HEAVY_COST)
+    t_wait = time.perf_counter()
+    held = []
+    try:
+        for sem in ((_HEAVY_SEM, _QUERY_SEM) if heavy else (_QUERY_SEM,)):
+            if not sem.acquire(timeout=QUERY_QUEUE_WAIT_S):
+                raise QueryRejected("当前分析查询较多，排队超过 %d 秒，请稍后重试" % QUERY_QUEUE_WAIT_S)
+            held.append(sem)
+        stats["queuedMs"] = round((time.perf_counter() - t_wait) * 1000, 1)
+        stats["heavy"] = heavy
+        stats["timeoutMs"] = timeout_ms
+        _set_timeout(conn, timeout_ms)
+        stats["_examined0"] = _rows_examined_counter(conn)
+        stats["_t0"] = time.perf_counter()
+        stats["_consumed"] = False
+        yield stats
+    finally:
+        if held:
+            try:
+                if stats.get("_consumed"):
+                    _set_timeout(conn, 0)
+                else:
+                    conn.close()
+            except Exception:
+                pass
+        for sem in reversed(held):
+            sem.release()
+
+
+def finish_stats(conn, stats: dict, consumed: bool = True) -> dict:
+    """
+    返回对外的统计：elapsedMs（执行+取数耗时）、rowsExamined（实际扫描行数，结果未读完或 SQLite 时为 None）、
+    以及预检得到的 estimatedCost / estimatedRows、排队耗时 queuedMs。
+    """
+    stats["_consumed"] = consumed
+    out = {k: v for k, v in stats.items() if not k.startswith("_")}
+    t0 = stats.get("_t0")
+    out["elapsedMs"] = round((time.perf_counter() - t0) * 1000, 1) if t0 else None
+    out["rowsExamined"] = None
+    base = stats.get("_examined0")
+    if consumed and base is not None:
+        now = _rows_examined_counter(conn)
+        if now is not None:
+            out["rowsExamined"] = max(0, now - base)
+    return out
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+高级查询的列式分析引擎（可选）：DuckDB 直接查询按周导出的 Parquet 文件。
+- MySQL 中按周大表整周存为一个 JSON，临时分析只能 JSON_EXTRACT 逐行展开，无法建索引；
+  这里在周同步时把 formatted_data / metrics_total / product_strategy 展开为每行一条、列类型确定（数值列为 DOUBLE）的 Parquet，
+  另附 product_history（每产品每周一行，指标已解析为数值），跨周聚合走 DuckDB 向量化执行；
+- 文件布局：{ANALYTICS_DIR}/{表名}/{年}/{周}[_{old|new}].parquet，各表为 union_by_name 视图，带 year / week_tag（/ strategy_type）列；
+- 启用：ANALYTICS_ENGINE=duckdb 且已安装 duckdb（写 Parquet 时有 pyarrow 则用 pyarrow，否则由 DuckDB 自己写）；
+  未启用或未安装时本模块所有函数静默返回，不影响同步与原有高级查询；
+- 回填 / 命令行查询：python -m backend.db.analytics --export [--year 2026]；python -m backend.db.analytics --query "SELECT ..."。
+"""
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .product_history import HISTORY_COLUMNS, _norm, _to_num, extract_week_records
+
+TABLES = ("formatted_data", "metrics_total", "product_strategy", "product_history")
+MAX_SELECT_ROWS = 10000
+
+
+def _env_num(name: str, default, cast=int):
+    try:
+        return cast(os.environ.get(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+QUERY_TIMEOUT_MS = _env_num("ANALYTICS_TIMEOUT_MS", 30000)
+QUERY_THREADS = _env_num("ANALYTICS_THREADS", 0)
+_QUERY_SEM = threading.BoundedSemaphore(max(1, _env_num("ANALYTICS_CONCURRENCY", 2)))
+
+
+class QueryRejected(Exception):
+    """排队超时等，message 直接返回给前端。"""
+
+
+def enabled() -> bool:
+    """ANALYTICS_ENGINE=duckdb 且已安装 duckdb。"""
+    return duckdb is not None and os.environ.get("ANALYTICS_ENGINE", "").strip().lower() == "duckdb"
+
+
+def get_analytics_dir() -> Path:
+    """Parquet 根目录：ANALYTICS_DIR，未设置时为数据目录（SLG_MONITOR_DATA_DIR 或项目根）下 analytics/。"""
+    p = os.environ.get("ANALYTICS_DIR", "").strip()
+    if p:
+        return Path(p).expanduser().resolve()
+    from .config import BASE_DIR
+    data_dir = os.environ.get("SLG_MONITOR_DATA_DIR", "").strip()
+    root = Path(data_dir).expanduser().resolve() if data_dir else BASE_DIR
+    return root / "analytics"
+
+
+# ---------- 导出 ----------
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _typed_columns(headers, rows):
+    """
+    表头 + 行 -> [(列名, 类型, 值列表)]。某列非空值全部可解析为数值（去掉千分位 / $）时为 DOUBLE，否则为 VARCHAR。
+    重复 / 空表头加序号区分，保证列名唯一。
+    """
+    names, seen = [], {}
+    for i, h in enumerate(headers):
+        name = _norm(h) or "col_%d" % (i + 1)
+        if name in seen:
+            seen[name] += 1
+            name = "%s_%d" % (name, seen[name])
+        else:
+            seen[name] = 1
+        names.append(name)
+    out = []
+    for i, name in enumerate(names):
+        values = [r[i] if r and i < len(r) else None for r in rows]
+        numeric = True
+        nums = []
+        for v in values:
+            if v is None or v == "":
+                nums.append(None)
+                continue
+            n = float(v) if _is_number(v) else _to_num(v)
+            if n is None:
+                numeric = False
+                break
+            nums.append(n)
+        if numeric:
+            out.append((name, "DOUBLE", nums))
+        else:
+            out.append((name, "VARCHAR", [None if v is None or v == "" else str(v) for v in values]))
+    return out
+
+
+def _write_parquet(path: Path, columns) -> None:
+    """columns: [(列名, 'DOUBLE'|'VARCHAR'|'INTEGER', 值列表)]；先写临时文件再替换，查询中的读者不会读到半个文件。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    if pyarrow is not None:
+        types = {"DOUBLE": pyarrow.float64(), "VARCHAR": pyarrow.string(), "INTEGER": pyarrow.int32()}
+        table = pyarrow.table({name: pyarrow.array(vals, type=types[t]) for name, t, vals in columns})
+        pyarrow.parquet.write_table(table, str(tmp), compression="zstd")
+    else:
+        # 无 pyarrow：先写一个临时 CSV，再由 DuckDB 按指定列类型读入并 COPY 为 Parquet（空串即 NULL）
+        fd, csv_path = tempfile.mkstemp(suffix=".csv", dir=str(path.parent))
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                count = len(columns[0][2]) if columns else 0
+                for i in range(count):
+                    writer.writerow(["" if c[2][i] is None else c[2][i] for c in columns])
+            spec = "{" + ", ".join("'%s': '%s'" % (n.replace("'", "''"), t) for n, t, _ in columns) + "}"
+            con = duckdb.connect()
+            try:
+                con.execute(
+                    "COPY (SELECT * FROM read_csv('%s', header = false, columns = %s, nullstr = '')) TO '%s' (FORMAT PARQUET, COMPRESSION ZSTD)"
+                    % (csv_path.replace("'", "''"), spec, str(tmp).replace("'", "''"))
+                )
+            finally:
+                con.close()
+        finally:
+            os.unlink(csv_path)
+    os.replace(tmp, path)
+
+
+def _week_columns(year: int, week_tag: str, n: int, strategy_type: str = None):
+    cols = [("year", "INTEGER", [int(year)] * n), ("week_tag", "VARCHAR", [week_tag] * n)]
+    if strategy_type:
+        cols.append(("strategy_type", "VARCHAR", [strategy_type] * n))
+    return cols
+
+
+def _export_table_payload(root: Path, table: str, year: int, week_tag: str, payload, strategy_type: str = None) -> bool:
+    if not isinstance(payload, dict):
+        return False
+    headers = payload.get("headers") or []
+    rows = [r for r in payload.get("rows") or [] if r]
+    if not headers:
+        return False
+    reserved = {"year", "week_tag", "strategy_type"}
+    cols = [c for c in _typed_columns(headers, rows) if c[0] not in reserved]
+    name = week_tag + ("_" + strategy_type if strategy_type else "") + ".parquet"
+    _write_parquet(root / table / str(year) / name, _week_columns(year, week_tag, len(rows), strategy_type) + cols)
+    return True
+
+
+def _export_history(root: Path, year: int, week_tag: str, formatted, strategy_old, strategy_new) -> bool:
+    records = extract_week_records(formatted, strategy_old, strategy_new)
+    uids = list(records)
+    text_cols = ("product_name", "company", "strategy_type")
+    cols = [("unified_id", "VARCHAR", uids)]
+    for c in HISTORY_COLUMNS:
+        t = "VARCHAR" if c in text_cols else ("INTEGER" if c.startswith("flag_") else "DOUBLE")
+        cols.append((c, t, [records[u][c] for u in uids]))
+    _write_parquet(root / "product_history" / str(year) / (week_tag + ".parquet"), _week_columns(year, week_tag, len(uids)) + cols)
+    return True
+
+
+def export_week(year: int, week_tag: str, payloads: dict) -> list:
+    """
+    把某周 payload 导出为 Parquet（覆盖旧文件）。payloads: {(表名, strategy_type 或 None): dict}，
+    只导出给出的部分；监测表或爆量表在其中时同时重写该周 product_history。未启用时返回 []，否则返回写出的表名。
+    """
+    if not enabled():
+        return []
+    root = get_analytics_dir()
+    year = int(year)
+    written = []
+    for (table, stype), payload in payloads.items():
+        if table in ("formatted_data", "metrics_total", "product_strategy"):
+            if _export_table_payload(root, table, year, week_tag, payload, stype):
+                written.append(table)
+    history_keys = (("formatted_data", None), ("product_strategy", "old"), ("product_strategy", "new"))
+    if any(k in payloads for k in history_keys):
+        if _export_history(root, year, week_tag, *[payloads.get(k) for k in history_keys]):
+            written.append("product_history")
+    return written
+
+
+def export_week_from_files(data_dir: Path, year: int, week_tag: str) -> list:
+    """从 frontend/data/{年}/ 读取该周 JSON 并全部导出（回填用）。"""
+    def read(path):
+        if path.is_file():
+            try:
+                return json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+        return None
+    year_dir = Path(data_dir) / str(year)
+    week_dir = year_dir / week_tag
+    payloads = {
+        ("formatted_data", None): read(year_dir / (week_tag + "_formatted.json")),
+        ("metrics_total", None): read(week_dir / "metrics_total.json"),
+        ("product_strategy", "old"): read(week_dir / "product_strategy_old.json"),
+        ("product_strategy", "new"): read(week_dir / "product_strategy_new.json"),
+    }
+    return export_week(year, week_tag, {k: v for k, v in payloads.items() if v is not None})
+
+
+# ---------- 查询 ----------
+
+def _connect():
+    """
+    每次查询一个内存库：为已有 Parquet 的表建视图，之后禁止访问 ANALYTICS_DIR 以外的文件并锁定配置。
+    任一限制设置失败（DuckDB 版本不支持 allowed_directories 等）时关闭连接并抛 QueryRejected，不在无沙箱的连接上执行查询。
+    """
+    root = get_analytics_dir()
+    con = duckdb.connect(":memory:")
+    if QUERY_THREADS > 0:
+        con.execute("SET threads = %d" % QUERY_THREADS)
+    for table in TABLES:
+        if any((root / table).glob("*/*.parquet")):
+            glob = str(root / table / "*" / "*.parquet").replace("'", "''")
+            con.execute("CREATE VIEW %s AS SELECT * FROM read_parquet('%s', union_by_name = true)" % (table, glob))
+    try:
+        con.execute("SET allowed_directories = ['%s']" % str(root).replace("'", "''"))
+        con.execute("SET enable_external_access = false")
+        con.execute("SET lock_configuration = true")
+    except Exception as e:
+        con.close()
+        raise QueryRejected("无法限制分析引擎的文件访问（需较新版本 DuckDB）: %s" % e)
+    return con
+
+
+def _single_select(con, sql: str):
+    """SQL 须恰好一条 SELECT（含 WITH ... SELECT）；否则返回错误信息。按 DuckDB 自身解析判断，不靠首个关键字。"""
+    try:
+        statements = con.extract_statements(sql)
+    except AttributeError:
+        return "当前 DuckDB 版本无法解析语句类型，拒绝执行（请升级 duckdb）"
+    except Exception as e:
+        return str(e)
+    if len(statements) != 1:
+        return "列式分析引擎一次只能执行一条 SELECT 查询"
+    if statements[0].type != duckdb.StatementType.SELECT:
+        return "列式分析引擎仅支持 SELECT 查询"
+    return None
+
+
+def get_tables() -> list:
+    """已有 Parquet 数据的表名。"""
+    if not enabled():
+        return []
+    root = get_analytics_dir()
+    return [t for t in TABLES if any((root / t).glob("*/*.parquet"))]
+
+
+def get_table_info(table_name: str, sample_rows: int = 50):
+    """表结构（列名与类型）及前 sample_rows 行，结构同 advanced_query.get_table_info（另带 types）。"""
+    if not enabled() or table_name not in get_tables():
+        return None
+    try:
+        con = _connect()
+    except QueryRejected:
+        return None
+    try:
+        cols = con.execute("DESCRIBE " + table_name).fetchall()
+        cur = con.execute("SELECT * FROM %s LIMIT %d" % (table_name, int(sample_rows)))
+        return {
+            "headers": [c[0] for c in cols],
+            "types": [c[1] for c in cols],
+            "rows": [[_cell_to_json(v) for v in r] for r in cur.fetchall()],
+        }
+    finally:
+        con.close()
+
+
+def _cell_to_json(v):
+    if v is None or isinstance(v, (str, int, bool)):
+        return v
+    if isinstance(v, float):
+        return v if v == v else None
+    return str(v)
+
+
+def run_select(sql: str, max_rows: int = MAX_SELECT_ROWS, timeout_ms: int = None) -> dict:
+    """
+    执行只读 SELECT / WITH，最多返回 max_rows 行：
+    {"headers", "rows", "truncated", "stats": {"engine", "elapsedMs", "timeoutMs"}}；出错返回 {"error": ...}。
+    超时由定时器调用 interrupt 中断；并发受 ANALYTICS_CONCURRENCY 限制，排队超过 20 秒拒绝。
+    """
+    if not enabled():
+        return {"error": "列式分析引擎未启用（需 ANALYTICS_ENGINE=duckdb 并安装 duckdb）"}
+    head = (sql or "").lstrip().split(None, 1)
+    if not head or head[0].upper() not in ("SELECT", "WITH"):
+        return {"error": "列式分析引擎仅支持 SELECT 查询"}
+    timeout_ms = QUERY_TIMEOUT_MS if timeout_ms is None else int(timeout_ms)
+    max_rows = max(1, int(max_rows or MAX_SELECT_ROWS))
+    if not _QUERY_SEM.acquire(timeout=20):
+        raise QueryRejected("当前分析查询较多，排队超过 20 秒，请稍后重试")
+    con = None
+    timer = None
+    try:
+        con = _connect()
+        bad = _single_select(con, sql)
+        if bad:
+            return {"error": bad}
+        if timeout_ms > 0:
+            timer = threading.Timer(timeout_ms / 1000.0, con.interrupt)
+            timer.daemon = True
+            timer.start()
+        t0 = time.perf_counter()
+        cur = con.execute(sql.strip().rstrip(";"))
+        headers = [d[0] for d in cur.description or ()]
+        rows = cur.fetchmany(max_rows + 1)
+        elapsed = round((time.perf_counter() - t0) * 1000, 1)
+        return {
+            "headers": headers,
+            "rows": [[_cell_to_json(v) for v in r] for r in rows[:max_rows]],
+            "truncated": len(rows) > max_rows,
+            "stats": {"engine": "duckdb", "elapsedMs": elapsed, "timeoutMs": timeout_ms},
+        }
+    except Exception as e:
+        if timer is not None and not timer.is_alive():
+            return {"error": "查询超过 %d 毫秒被中断" % timeout_ms}
+        return {"error": str(e)}
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if con is not None:
+            con.close()
+        _QUERY_SEM.release()
+
+
+def main():
+    import argparse
+    import sys
+    root = Path(__file__).resolve().parent.parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    parser = argparse.ArgumentParser(description="列式分析引擎：导出周数据为 Parquet / 命令行查询")
+    parser.add_argument("--export", action="store_true", help="按 frontend/data/weeks_index.json 把各周 JSON 导出为 Parquet")
+    parser.add_argument("--year", type=int, default=None, help="只导出该年")
+    parser.add_argument("--query", type=str, default="", help="执行一条 SELECT 并打印结果与耗时")
+    args = parser.parse_args()
+    if duckdb is None:
+        print("未安装 duckdb：pip install duckdb（可选 pyarrow）")
+        sys.exit(1)
+    os.environ.setdefault("ANALYTICS_ENGINE", "duckdb")
+    if args.export:
+        try:
+            from app.app_paths import get_data_root
+            data_root = get_data_root()
+        except Exception:
+            data_root = root
+        data_dir = data_root / "frontend" / "data"
+        try:
+            index = json.loads((data_dir / "weeks_index.json").read_text(encoding="utf-8"))
+        except Exception:
+            index = {}
+        n = 0
+        for y, weeks in sorted(index.items()):
+            if args.year and str(args.year) != str(y):
+                continue
+            for w in weeks or []:
+                if export_week_from_files(data_dir, int(y), w):
+                    n += 1
+        print(f"已导出 {n} 周到 {get_analytics_dir()}")
+    if args.query:
+        out = run_select(args.query)
+        if "error" in out:
+            print(out["error"])
+            sys.exit(1)
+        print("\t".join(out["headers"]))
+        for r in out["rows"]:
+            print("\t".join("" if v is None else str(v) for v in r))
+        print(f"-- {len(out['rows'])} 行{'（已截断）' if out['truncated'] else ''}，{out['stats']['elapsedMs']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,85 @@
 # -*- coding: utf-8 -*-
 """从 MySQL 读取数据，返回与前端当前 JSON 一致的结构，供 start_server 的 /api/data/* 使用。"""
 import json
+import logging
 import threading
 import time
 
-# 内存缓存，减少重复查库与解析大 JSON，缓解取数慢
+from . import shared_cache
+from .basetable_rows import load_table
+from .connection import DB_ERRORS
+from .country_facts import country_breakdown
+from .payload_codec import fetch_payloads
+from .product_history import HISTORY_COLUMNS, records_to_series
+from .substring_index import SubstringIndex
+from .week_aggregates import company_totals, load_week_aggregate
+
+# 内存缓存（L1），减少重复查库与解析大 JSON，缓解取数慢；配置 SHARED_CACHE_URL 时其后还有多实例共享的 L2（见 shared_cache）
 _DATA_CACHE = {}
 _CACHE_LOCK = threading.Lock()
 _TTL_SHORT = 120   # 按周数据 2 分钟
 _TTL_LONG = 300    # 周索引等 5 分钟
 
+# 缓存键首元素 -> 版本组：同组共用一个数据版本号，invalidate_* 递增版本使所有实例的该组缓存失效；
+# 不在表中的键（查找索引等含非 JSON 对象）只存 L1
+_CACHE_GROUPS = {
+    "weeks_index": "weeks_index",
+    "formatted": "week_data",
+    "product_strategy": "week_data",
+    "creative_products": "week_data",
+    "metrics_total_payload": "week_data",
+    "metrics_total_product_names_all": "week_data",
+    "product_history": "week_data",
+    "country_breakdown": "week_data",
+    "week_aggregate": "week_data",
+    "new_products": "new_products",
+    "product_theme_style_mapping": "mapping",
+    "basetable": "basetable",
+}
+
 def _cache_get(key, ttl):
+    group = _CACHE_GROUPS.get(key[0])
+    ver = shared_cache.version(group) if group else 0
     with _CACHE_LOCK:
         ent = _DATA_CACHE.get(key)
-        if ent is None:
-            return None
-        val, expire = ent
-        if time.time() > expire:
-            del _DATA_CACHE[key]
-            return None
-        return val
+        if ent is not None:
+            val, expire, ent_ver = ent
+            if time.time() > expire or (ver is not None and ent_ver != ver):
+                del _DATA_CACHE[key]
+            else:
+                shared_cache.count("l1_hits")
+                return val
+    if group and ver is not None:
+        val = shared_cache.get(group, ver, key)
+        if val is not None:
+            shared_cache.count("l2_hits")
+            with _CACHE_LOCK:
+                _DATA_CACHE[key] = (val, time.time() + ttl, ver)
+            return val
+    shared_cache.count("misses")
+    return None
 
 def _cache_set(key, value, ttl):
+    group = _CACHE_GROUPS.get(key[0])
+    ver = shared_cache.version(group) if group else 0
     with _CACHE_LOCK:
-        _DATA_CACHE[key] = (value, time.time() + ttl)
+        _DATA_CACHE[key] = (value, time.time() + ttl, ver)
+    if group and ver is not None:
+        shared_cache.put(group, ver, key, value, ttl)
+
+def _bump(group):
+    """递增该组数据版本（多实例共享 L2 时其它实例最多 SHARED_CACHE_VERSION_TTL 秒后看到）。"""
+    try:
+        shared_cache.bump(group)
+    except Exception:
+        pass
+
+def cache_stats():
+    """L1 / L2 命中统计（/api/data/cache_stats），另附当前 L1 条目数。"""
+    out = shared_cache.stats()
+    with _CACHE_LOCK:
+        out["l1_entries"] = len(_DATA_CACHE)
+    return out
 
 def _get_conn():
     from .config import use_mysql
@@ -36,6 +92,7 @@ def invalidate_weeks_index():
     """第一步或刷新周索引后调用，使下次 get_weeks_index 从 MySQL 重新读取，侧边栏能立即显示新周。"""
     with _CACHE_LOCK:
         _DATA_CACHE.pop(("weeks_index",), None)
+    _bump("weeks_index")
 
 
 def get_weeks_index():
@@ -70,10 +127,9 @@ def get_formatted(year, week_tag):
         return None
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT payload FROM formatted_data WHERE year = %s AND week_tag = %s", (int(year), week_tag))
-            row = cur.fetchone()
-            if row:
-                out = json.loads(row["payload"])
+            rows = fetch_payloads(cur, "formatted_data", "year = %s AND week_tag = %s", (int(year), week_tag))
+            if rows:
+                out = rows[0][0]
                 _cache_set(key, out, _TTL_SHORT)
                 return out
     except Exception:
@@ -92,13 +148,12 @@ def get_product_strategy(year, week_tag, strategy_type):
         return None
     try:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT payload FROM product_strategy WHERE year = %s AND week_tag = %s AND strategy_type = %s",
+            rows = fetch_payloads(
+                cur, "product_strategy", "year = %s AND week_tag = %s AND strategy_type = %s",
                 (int(year), week_tag, strategy_type),
             )
-            row = cur.fetchone()
-            if row:
-                out = json.loads(row["payload"])
+            if rows:
+                out = rows[0][0]
                 _cache_set(key, out, _TTL_SHORT)
                 return out
     except Exception:
@@ -140,11 +195,10 @@ def _get_metrics_total_payload(year, week_tag):
         return None
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT payload FROM metrics_total WHERE year = %s AND week_tag = %s", (int(year), week_tag))
-            row = cur.fetchone()
-            if not row:
+            rows = fetch_payloads(cur, "metrics_total", "year = %s AND week_tag = %s", (int(year), week_tag))
+            if not rows:
                 return {"headers": [], "rows": []}
-            out = json.loads(row["payload"])
+            out = rows[0][0]
             _cache_set(key, out, _TTL_SHORT)
             return out
     except Exception:
@@ -240,6 +294,14 @@ def get_new_products():
         conn.close()
     return None
 
+def invalidate_product_theme_style_mapping():
+    """产品归属/题材画风映射更新后调用，下次取数时重新加载映射并重建产品名子串索引。"""
+    with _CACHE_LOCK:
+        _DATA_CACHE.pop(("product_theme_style_mapping",), None)
+        _DATA_CACHE.pop(("product_theme_style_name_index",), None)
+    _bump("mapping")
+
+
 def get_product_theme_style_mapping():
     key = ("product_theme_style_mapping",)
     v = _cache_get(key, _TTL_LONG)
@@ -276,6 +338,49 @@ def _product_name_match(name, cell):
     return name == c or name in c or c in name
 
 
+def _get_metrics_total_lookup(year, week_tag, data, idx_uid, idx_product):
+    """
+    按周构建 metrics_total 查找索引（随 payload 缓存，payload 重新加载后自动重建）：
+    uid_first: Unified ID -> 首次出现的行号；names/name_rows: 非空产品归属按首次出现顺序及其行号；
+    name_index: names 上的子串索引，等价于逐行 _product_name_match 的首个命中。
+    """
+    key = ("metrics_total_lookup", str(year), str(week_tag), idx_uid, idx_product)
+    ent = _cache_get(key, _TTL_SHORT)
+    if ent is not None and ent[0] is data:
+        return ent[1]
+    uid_first = {}
+    name_first = {}
+    for i, r in enumerate(data.get("rows") or []):
+        if not r:
+            continue
+        uid_val = _norm(r[idx_uid]) if idx_uid >= 0 and idx_uid < len(r) else ""
+        name_val = _norm(r[idx_product]) if idx_product >= 0 and idx_product < len(r) else ""
+        if uid_val and uid_val not in uid_first:
+            uid_first[uid_val] = i
+        if name_val and name_val not in name_first:
+            name_first[name_val] = i
+    names = list(name_first.keys())
+    lookup = {
+        "uid_first": uid_first,
+        "name_rows": [name_first[n] for n in names],
+        "name_index": SubstringIndex(names),
+    }
+    _cache_set(key, (data, lookup), _TTL_SHORT)
+    return lookup
+
+
+def _get_theme_style_name_index(mapping, by_name):
+    """byProductName 键上的子串索引（随映射对象缓存，映射重新加载或 invalidate 后重建），返回 (keys, index)。"""
+    key = ("product_theme_style_name_index",)
+    ent = _cache_get(key, _TTL_LONG)
+    if ent is not None and ent[0] is mapping:
+        return ent[1], ent[2]
+    keys = list(by_name.keys())
+    index = SubstringIndex(keys)
+    _cache_set(key, (mapping, keys, index), _TTL_LONG)
+    return keys, index
+
+
 def get_product_detail_panels(year, week_tag, unified_id=None, product_name=None):
     """
     产品详情页「两数据面板」单请求取数：仅读 metrics_total（第一步产出）为主，辅以 product_strategy 判新/旧、mapping 取题材/画风。
@@ -303,20 +408,16 @@ def get_product_detail_panels(year, week_tag, unified_id=None, product_name=None
         return None
     target_uid = _norm(unified_id) if unified_id else None
     target_name = _norm(product_name) if product_name else None
-    found_row = None
-    for r in rows:
-        if not r:
-            continue
-        uid_val = _norm(r[idx_uid]) if idx_uid >= 0 and idx_uid < len(r) else ""
-        name_val = _norm(r[idx_product]) if idx_product >= 0 and idx_product < len(r) else ""
-        if not uid_val and not name_val:
-            continue
-        if target_uid and uid_val == target_uid:
-            found_row = r
-            break
-        if target_name and (name_val == target_name or _product_name_match(target_name, name_val)):
-            found_row = r
-            break
+    # 与逐行「uid 相等或产品名互为包含」取首个命中等价，改为查索引
+    lookup = _get_metrics_total_lookup(year, week_tag, data, idx_uid, idx_product)
+    hits = []
+    if target_uid and target_uid in lookup["uid_first"]:
+        hits.append(lookup["uid_first"][target_uid])
+    if target_name:
+        k = lookup["name_index"].first_match(target_name)
+        if k is not None:
+            hits.append(lookup["name_rows"][k])
+    found_row = rows[min(hits)] if hits else None
     if not found_row:
         return None
     unified_id_out = _norm(found_row[idx_uid]) if idx_uid >= 0 and idx_uid < len(found_row) else ""
@@ -385,10 +486,10 @@ def get_product_detail_panels(year, week_tag, unified_id=None, product_name=None
         if not entry and product_name_out and by_name:
             entry = by_name.get(product_name_out)
         if not entry and by_name and product_name_out:
-            for k, v in by_name.items():
-                if k and (k == product_name_out or product_name_out in k or k in product_name_out):
-                    entry = v
-                    break
+            name_keys, name_index = _get_theme_style_name_index(mapping, by_name)
+            k = name_index.first_match(product_name_out)
+            if k is not None:
+                entry = by_name.get(name_keys[k])
         if entry and isinstance(entry, dict):
             theme = entry.get("题材") or entry.get("theme") or (entry.get("题材标签") if isinstance(entry.get("题材标签"), str) else None)
             style = entry.get("画风") or entry.get("style") or (entry.get("画风标签") if isinstance(entry.get("画风标签"), str) else None)
@@ -413,68 +514,36 @@ def get_product_detail_panels(year, week_tag, unified_id=None, product_name=None
 
 def get_company_detail_panels(year, week_tag, company_name):
     """
-    公司详情页 4 卡片轻量取数：按周从 metrics_total 按公司归属汇总累计安装/流水并计算赛道排名。
+    公司详情页 4 卡片轻量取数：优先取该周物化汇总（week_aggregates），未物化时从 metrics_total 按公司归属汇总累计安装/流水并计算赛道排名。
     返回 None 表示无数据；否则返回 { sumInstall, sumRevenue, rankInstall, rankRevenue }（数值，前端做千分位）。
     """
     if not company_name or not (str(company_name or "").strip()):
         return None
     year, week_tag = str(year), str(week_tag)
     target_company = _norm(company_name)
+    agg = get_week_aggregate(year, week_tag, "company")
+    if agg is not None:
+        # 已物化：直接取该公司一行（与下面现场计算结果一致）
+        hit = next((it for it in agg.get("items") or [] if it.get("company") == target_company), None)
+        if not hit:
+            return None
+        return {
+            "sumInstall": hit["install"],
+            "sumRevenue": hit["revenue"],
+            "rankInstall": hit["rankInstall"],
+            "rankRevenue": hit["rankRevenue"],
+        }
     data = _get_metrics_total_payload(year, week_tag)
     if not data:
         return None
-    headers = data.get("headers") or []
-    rows = data.get("rows") or []
-    if not headers or not rows:
-        return None
-    idx_company = next((i for i, h in enumerate(headers) if _norm(h) == "公司归属"), -1)
-    idx_product = next((i for i, h in enumerate(headers) if _norm(h) == "产品归属"), -1)
-    idx_uid = next((i for i, h in enumerate(headers) if _norm(h) == "Unified ID"), -1)
-    idx_downloads = next((i for i, h in enumerate(headers) if _norm(h) == "All Time Downloads (WW)"), -1)
-    idx_revenue = next((i for i, h in enumerate(headers) if _norm(h) == "All Time Revenue (WW)"), -1)
-    if idx_company < 0 or (idx_downloads < 0 and idx_revenue < 0):
-        return None
-
-    def to_float(v):
-        if v is None or v == "":
-            return 0.0
-        if isinstance(v, (int, float)):
-            return float(v) if v == v else 0.0
-        s = str(v).replace(",", "").replace("$", "").strip()
-        try:
-            return float(s) if s else 0.0
-        except ValueError:
-            return 0.0
-
-    company_totals = {}
-    seen_per_company = {}
-    for r in rows:
-        if not r:
-            continue
-        company = _norm(r[idx_company]) if idx_company >= 0 and idx_company < len(r) else ""
-        if not company or "汇总" in company:
-            continue
-        uid = _norm(r[idx_uid]) if idx_uid >= 0 and idx_uid < len(r) else ""
-        product = _norm(r[idx_product]) if idx_product >= 0 and idx_product < len(r) else ""
-        key = uid or product
-        if not key:
-            continue
-        if company not in seen_per_company:
-            seen_per_company[company] = set()
-            company_totals[company] = {"install": 0.0, "revenue": 0.0}
-        if key in seen_per_company[company]:
-            continue
-        seen_per_company[company].add(key)
-        company_totals[company]["install"] += to_float(r[idx_downloads] if idx_downloads >= 0 and idx_downloads < len(r) else None)
-        company_totals[company]["revenue"] += to_float(r[idx_revenue] if idx_revenue >= 0 and idx_revenue < len(r) else None)
-
-    if target_company not in company_totals:
+    totals = company_totals(data)
+    if target_company not in totals:
         return None
-    tot = company_totals[target_company]
+    tot = totals[target_company]
     sum_install = tot["install"]
     sum_revenue = tot["revenue"]
-    by_install = sorted(company_totals.keys(), key=lambda c: company_totals[c]["install"], reverse=True)
-    by_revenue = sorted(company_totals.keys(), key=lambda c: company_totals[c]["revenue"], reverse=True)
+    by_install = sorted(totals.keys(), key=lambda c: totals[c]["install"], reverse=True)
+    by_revenue = sorted(totals.keys(), key=lambda c: totals[c]["revenue"], reverse=True)
     rank_install = next((i + 1 for i, c in enumerate(by_install) if _norm(c) == target_company), 0)
     rank_revenue = next((i + 1 for i, c in enumerate(by_revenue) if _norm(c) == target_company), 0)
     return {
@@ -485,7 +554,112 @@ def get_company_detail_panels(year, week_tag, company_name):
     }
 
 
+def get_week_aggregate(year, week_tag, kind):
+    """按周物化汇总（kind: company / theme / top_products / rule_hits，见 week_aggregates），数 KB；该周未物化时返回 None。"""
+    key = ("week_aggregate", int(year), str(week_tag), kind)
+    v = _cache_get(key, _TTL_SHORT)
+    if v is not None:
+        return v
+    conn = _get_conn()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            out = load_week_aggregate(cur, int(year), str(week_tag), kind)
+        if out is not None:
+            _cache_set(key, out, _TTL_SHORT)
+        return out
+    except DB_ERRORS + (ValueError,) as e:
+        # 旧库未建 week_aggregates 表或该行 JSON 损坏：按未物化处理，调用方现场计算
+        logging.warning("读取 week_aggregates %s %s/%s 失败: %s", kind, year, week_tag, e)
+    finally:
+        conn.close()
+    return None
+
+
+def invalidate_week_data():
+    """sync_week_from_files 写入新周 / 重写某周后调用：清空按周取数结果与各产品时间序列缓存（含其它实例的共享缓存）。"""
+    with _CACHE_LOCK:
+        for k in [k for k in _DATA_CACHE if k and _CACHE_GROUPS.get(k[0]) == "week_data"]:
+            del _DATA_CACHE[k]
+    _bump("week_data")
+
+
+def invalidate_product_history():
+    """兼容旧调用：产品时间序列随周数据一起失效。"""
+    invalidate_week_data()
+
+
+def get_product_history(unified_id, limit=52):
+    """
+    产品跨周时间序列：从 product_history 表按主键范围读取该产品最近 limit 周，返回列式结构
+    （weeks 与 install/revenue/变动/T 度获量/规则标记等等长数组）。无记录时 weeks 为空数组。
+    """
+    uid = _norm(unified_id)
+    if not uid:
+        return None
+    limit = max(1, min(int(limit or 52), 520))
+    key = ("product_history", uid, limit)
+    v = _cache_get(key, _TTL_SHORT)
+    if v is not None:
+        return v
+    conn = _get_conn()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT year, week_tag, " + ", ".join(HISTORY_COLUMNS) + " FROM product_history"
+                " WHERE unified_id = %s ORDER BY year DESC, week_tag DESC LIMIT %s",
+                (uid, limit),
+            )
+            rows = cur.fetchall() or []
+        points = [(r["year"], r["week_tag"], r) for r in reversed(rows)]
+        out = records_to_series(uid, points)
+        _cache_set(key, out, _TTL_SHORT)
+        return out
+    except Exception:
+        pass
+    finally:
+        conn.close()
+    return None
+
+
+def get_country_breakdown(unified_id, year, week_tag):
+    """单品某周分国家下载 / 收入（country_facts），附四个市场小计；该周无数据时 countries 为空数组。"""
+    uid = _norm(unified_id)
+    if not uid:
+        return None
+    key = ("country_breakdown", uid, int(year), week_tag)
+    v = _cache_get(key, _TTL_LONG)
+    if v is not None:
+        return v
+    conn = _get_conn()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            out = country_breakdown(cur, uid, int(year), week_tag)
+        _cache_set(key, out, _TTL_LONG)
+        return out
+    except Exception:
+        pass
+    finally:
+        conn.close()
+    return None
+
+
+def invalidate_basetable(name=None):
+    """底表单行编辑 / 整表替换后调用，清掉该表（name 为空时全部底表）的缓存。"""
+    with _CACHE_LOCK:
+        for k in list(_DATA_CACHE.keys()):
+            if k[0] == "basetable" and (name is None or k[1] == str(name)):
+                _DATA_CACHE.pop(k, None)
+    _bump("basetable")
+
+
 def get_basetable(name):
+    """{headers, rows}；行级存储时另带 keys / versions（与 rows 一一对应，单行编辑时带回）。"""
     key = ("basetable", str(name))
     v = _cache_get(key, _TTL_SHORT)
     if v is not None:
@@ -495,10 +669,10 @@ def get_basetable(name):
         return None
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT headers, `rows` FROM basetable WHERE name = %s", (name,))
-            row = cur.fetchone()
-            if row:
-                out = {"headers": json.loads(row["headers"]), "rows": json.loads(row["rows"])}
+            out = load_table(cur, name)
+            if out:
+                if out.get("keys") is None:
+                    out = {"headers": out["headers"], "rows": out["rows"]}
                 _cache_set(key, out, _TTL_SHORT)
                 return out
     except Exception:
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+数据底表行级存储（basetable_rows）：每张底表一行一条记录，主键 (name, row_key)，带乐观锁版本号。
+- row_key 取各表的业务主键列（产品归属表为「产品归属」、公司归属表为「发行商」……），该列为空时退化为行号；
+- 表头仍存 basetable.headers；整表替换（上传 Excel、同步、迁移）同时写 basetable.`rows` 与行级表，两边一致；
+- 单行增 / 改 / 删只动行级表对应的一行（O(1)），首次行级编辑时先把旧库的整表 JSON 拆成行，再将 basetable.`rows` 置空，
+  读取端以行级表为准（行级表无该表记录时才读 basetable.`rows`）；
+- 改 / 删带 version 条件：版本不符时不写入并返回当前版本，前端据此提示「已被他人修改」，不会静默覆盖；
+- 单行编辑以库为准，提交后只标记该表「待写回」，由服务端延迟合并写回 mapping/、labels/ 下的 xlsx，流水线 / 整表同步
+  读 xlsx 之前也会先写回（sync_maintenance.flush_dirty_basetables）；之后的整表同步按主键比对，内容未变的行保留版本号，
+  不会冲掉行级编辑的并发保护。
+"""
+import json
+
+from .connection import DB_ERRORS
+
+# 各底表的行主键列；表头中无该列时按行号
+ROW_KEY_COLUMNS = {
+    "product_mapping": "产品归属",
+    "company_mapping": "发行商",
+    "region_t_mapping": "地区",
+    "theme_label": "标签名",
+    "gameplay_label": "标签名",
+    "art_style_label": "标签名",
+}
+
+# 行级表存的是去掉「序号」后的单元格；读取时按当前顺序重新编号，删行后序号仍连续
+SEQ_HEADER = "序号"
+
+
+def _val(row, name, idx):
+    if row is None:
+        return None
+    return row.get(name) if isinstance(row, dict) else row[idx]
+
+
+def _key_index(name: str, headers: list) -> int:
+    col = ROW_KEY_COLUMNS.get(name)
+    return headers.index(col) if col and col in headers else -1
+
+
+def _cells_of(headers: list, row) -> list:
+    """整行（含序号列）-> 存储用单元格（去掉序号列）。row 可为数组或 {列名: 值}。"""
+    if isinstance(row, dict):
+        row = [row.get(h, "") for h in headers]
+    row = list(row or [])
+    row += [""] * (len(headers) - len(row))
+    if headers and headers[0] == SEQ_HEADER:
+        row = row[1:]
+    return row[: len(headers) - (1 if headers and headers[0] == SEQ_HEADER else 0)]
+
+
+def _is_duplicate(exc) -> bool:
+    """主键冲突：MySQL 1062 / SQLite UNIQUE constraint failed。"""
+    args = getattr(exc, "args", ())
+    return (bool(args) and args[0] == 1062) or "UNIQUE constraint failed" in str(exc)
+
+
+def _row_key(name: str, headers: list, row, fallback) -> str:
+    idx = _key_index(name, headers)
+    if isinstance(row, dict):
+        v = row.get(headers[idx]) if idx >= 0 else None
+    else:
+        v = row[idx] if 0 <= idx < len(row or []) else None
+    v = str(v).strip() if v is not None else ""
+    return v or "#%s" % fallback
+
+
+def _load_headers(cur, name: str, lock: bool = False):
+    """lock=True 时锁住该表在 basetable 中的记录（SQLite 为整库写锁），同一张表的行级编辑依次执行。"""
+    cur.execute("SELECT headers, `rows` FROM basetable WHERE name = %s" + (" FOR UPDATE" if lock else ""), (name,))
+    row = cur.fetchone()
+    if not row:
+        return None, None
+    headers = json.loads(_val(row, "headers", 0) or "[]")
+    raw_rows = _val(row, "rows", 1)
+    return headers, raw_rows
+
+
+def replace_table_rows(cur, name: str, headers: list, rows: list) -> None:
+    """
+    整表替换行级记录（调用方负责 commit），重复主键保留首行、其余加 #行号 后缀。
+    按主键与库中现有行比对：内容未变的行沿用原版本号，内容变化的行版本号 +1，持旧版本的单行编辑仍会得到冲突提示。
+    """
+    cur.execute("SELECT row_key, cells, version FROM basetable_rows WHERE name = %s", (name,))
+    old = {_val(it, "row_key", 0): (_val(it, "cells", 1), int(_val(it, "version", 2) or 1)) for it in cur.fetchall() or []}
+    cur.execute("DELETE FROM basetable_rows WHERE name = %s", (name,))
+    seen = set()
+    params = []
+    for pos, r in enumerate(rows or [], 1):
+        key = _row_key(name, headers, r, pos)
+        if key in seen:
+            key = "%s#%d" % (key, pos)
+        seen.add(key)
+        cells = json.dumps(_cells_of(headers, r), ensure_ascii=False)
+        prev = old.get(key)
+        version = 1 if prev is None else (prev[1] if prev[0] == cells else prev[1] + 1)
+        params.append((name, key, pos, cells, version))
+    if params:
+        cur.executemany(
+            "INSERT INTO basetable_rows (name, row_key, position, cells, version) VALUES (%s, %s, %s, %s, %s)",
+            params,
+        )
+
+
+def write_table(cur, name: str, headers: list, rows: list) -> None:
+    """整表写入：basetable（表头 + 整表 JSON）与行级表同时替换。旧库无 basetable_rows 表时只写前者。"""
+    cur.execute(
+        """INSERT INTO basetable (name, headers, `rows`) VALUES (%s, %s, %s)
+           ON DUPLICATE KEY UPDATE headers = VALUES(headers), `rows` = VALUES(`rows`)""",
+        (name, json.dumps(headers, ensure_ascii=False), json.dumps(rows, ensure_ascii=False)),
+    )
+    try:
+        replace_table_rows(cur, name, headers, rows)
+    except Exception:
+        pass
+
+
+def load_table(cur, name: str):
+    """
+    读取一张底表，返回 {headers, rows, keys, versions}；rows 含序号列（若表头有），keys/versions 与 rows 一一对应，
+    供单行编辑带回。行级表无记录时读 basetable.`rows`（keys 为 None）。不存在返回 None。
+    """
+    headers, raw_rows = _load_headers(cur, name)
+    if headers is None:
+        return None
+    seq = bool(headers) and headers[0] == SEQ_HEADER
+    try:
+        cur.execute(
+            "SELECT row_key, cells, version FROM basetable_rows WHERE name = %s ORDER BY position, row_key",
+            (name,),
+        )
+        items = cur.fetchall() or []
+    except Exception:
+        items = []
+    if not items:
+        rows = json.loads(raw_rows or "[]")
+        return {"headers": headers, "rows": rows, "keys": None, "versions": None}
+    rows, keys, versions = [], [], []
+    for i, it in enumerate(items, 1):
+        cells = json.loads(_val(it, "cells", 1) or "[]")
+        rows.append([i] + cells if seq else cells)
+        keys.append(_val(it, "row_key", 0))
+        versions.append(int(_val(it, "version", 2) or 1))
+    return {"headers": headers, "rows": rows, "keys": keys, "versions": versions}
+
+
+def _ensure_row_level(cur, name: str):
+    """
+    首次行级编辑：行级表无该表记录时，把 basetable.`rows` 拆入行级表，并将整表 JSON 置空（以行级表为准）。返回表头。
+    先锁住 basetable 中该表的记录，并发的首次编辑不会各自拆一遍、互相删掉对方刚写入的行；锁持续到调用方 commit / rollback。
+    """
+    headers, raw_rows = _load_headers(cur, name, lock=True)
+    if headers is None:
+        return None
+    cur.execute("SELECT COUNT(*) AS n FROM basetable_rows WHERE name = %s", (name,))
+    if int(_val(cur.fetchone(), "n", 0) or 0) == 0:
+        rows = json.loads(raw_rows or "[]")
+        replace_table_rows(cur, name, headers, rows)
+    if raw_rows not in (None, "[]"):
+        cur.execute("UPDATE basetable SET `rows` = %s WHERE name = %s", ("[]", name))
+    return headers
+
+
+def _current_version(cur, name: str, key: str):
+    cur.execute("SELECT version FROM basetable_rows WHERE name = %s AND row_key = %s", (name, key))
+    row = cur.fetchone()
+    return int(_val(row, "version", 0)) if row else None
+
+
+def insert_row(conn, name: str, row) -> dict:
+    """新增一行（row 为含序号列的数组或 {列名: 值}），主键已存在时不覆盖。返回 {ok, key, version} 或 {ok: False, message}。"""
+    try:
+        with conn.cursor() as cur:
+            headers = _ensure_row_level(cur, name)
+            if headers is None:
+                return {"ok": False, "message": "底表不存在: %s" % name}
+            key = _row_key(name, headers, row, "new")
+            if key.startswith("#"):
+                conn.rollback()
+                return {"ok": False, "message": "主键列「%s」不能为空" % ROW_KEY_COLUMNS.get(name, "")}
+            cur.execute("SELECT COALESCE(MAX(position), 0) + 1 AS p FROM basetable_rows WHERE name = %s", (name,))
+            pos = int(_val(cur.fetchone(), "p", 0) or 1)
+            cur.execute(
+                "INSERT IGNORE INTO basetable_rows (name, row_key, position, cells, version) VALUES (%s, %s, %s, %s, 1)",
+                (name, key, pos, json.dumps(_cells_of(headers, row), ensure_ascii=False)),
+            )
+            if cur.rowcount == 0:
+                conn.rollback()
+                return {"ok": False, "message": "「%s」已存在" % key, "key": key}
+        conn.commit()
+        return {"ok": True, "key": key, "version": 1}
+    except Exception as e:
+        conn.rollback()
+        return {"ok": False, "message": str(e)}
+
+
+def update_row(conn, name: str, key: str, row, version: int) -> dict:
+    """
+    按主键改一行（row 为数组时整行替换，为 {列名: 值} 时只改给出的列），仅当库中版本等于 version 时生效；
+    冲突返回 {ok: False, conflict: True, version: 当前版本}。
+    改了主键列时在同一事务内把该行改挂到新主键：新主键为空拒绝，已被其它行占用返回 {ok: False, conflict: True, duplicate: True}；
+    成功时返回的 key 为新主键。
+    """
+    try:
+        with conn.cursor() as cur:
+            headers = _ensure_row_level(cur, name)
+            if headers is None:
+                return {"ok": False, "message": "底表不存在: %s" % name}
+            if isinstance(row, dict):
+                # 按列名传入时只改给出的列，其余沿用库中当前值
+                cur.execute("SELECT cells FROM basetable_rows WHERE name = %s AND row_key = %s", (name, key))
+                cur_row = cur.fetchone()
+                cells = json.loads(_val(cur_row, "cells", 0) or "[]") if cur_row else []
+                data_headers = headers[1:] if headers and headers[0] == SEQ_HEADER else headers
+                merged = dict(zip(data_headers, cells))
+                merged.update(row)
+                row = merged
+            new_key = key
+            if _key_index(name, headers) >= 0:
+                new_key = _row_key(name, headers, row, "")
+                if new_key.startswith("#"):
+                    conn.rollback()
+                    return {"ok": False, "message": "主键列「%s」不能为空" % ROW_KEY_COLUMNS.get(name, ""), "key": key}
+            if new_key != key:
+                cur.execute("SELECT 1 FROM basetable_rows WHERE name = %s AND row_key = %s", (name, new_key))
+                if cur.fetchone():
+                    conn.rollback()
+                    return {"ok": False, "conflict": True, "duplicate": True, "message": "「%s」已存在" % new_key, "key": key}
+            try:
+                cur.execute(
+                    "UPDATE basetable_rows SET row_key = %s, cells = %s, version = version + 1"
+                    " WHERE name = %s AND row_key = %s AND version = %s",
+                    (new_key, json.dumps(_cells_of(headers, row), ensure_ascii=False), name, key, int(version)),
+                )
+            except DB_ERRORS as e:
+                # 检查之后被并发插入同主键的行（主键冲突）
+                conn.rollback()
+                if new_key != key and _is_duplicate(e):
+                    return {"ok": False, "conflict": True, "duplicate": True, "message": "「%s」已存在" % new_key, "key": key}
+                raise
+            if cur.rowcount == 0:
+                current = _current_version(cur, name, key)
+                conn.rollback()
+                if current is None:
+                    return {"ok": False, "message": "该行不存在或已被删除", "key": key}
+                return {"ok": False, "conflict": True, "message": "该行已被他人修改，请刷新后重试", "key": key, "version": current}
+        conn.commit()
+        return {"ok": True, "key": new_key, "version": int(version) + 1}
+    except Exception as e:
+        conn.rollback()
+        return {"ok": False, "message": str(e)}
+
+
+def delete_row(conn, name: str, key: str, version: int) -> dict:
+    """按主键删一行，带版本条件，返回结构同 update_row。"""
+    try:
+        with conn.cursor() as cur:
+            if _ensure_row_level(cur, name) is None:
+                return {"ok": False, "message": "底表不存在: %s" % name}
+            cur.execute(
+                "DELETE FROM basetable_rows WHERE name = %s AND row_key = %s AND version = %s",
+                (name, key, int(version)),
+            )
+            if cur.rowcount == 0:
+                current = _current_version(cur, name, key)
+                conn.rollback()
+                if current is None:
+                    return {"ok": False, "message": "该行不存在或已被删除", "key": key}
+                return {"ok": False, "conflict": True, "message": "该行已被他人修改，请刷新后重试", "key": key, "version": current}
+        conn.commit()
+        return {"ok": True, "key": key}
+    except Exception as e:
+        conn.rollback()
+        return {"ok": False, "message": str(e)}
+
+
+def upsert_rows(cur, name: str, rows: list, only_new: bool = True):
+    """
+    批量按主键写入（调用方负责 commit）：only_new 时已存在的主键跳过（INSERT IGNORE），否则覆盖并递增版本。
+    整批只做一次 _ensure_row_level。返回实际新增 / 变更的行（rows 中的元素）；底表不存在时返回 None。
+    """
+    headers = _ensure_row_level(cur, name)
+    if headers is None:
+        return None
+    cur.execute("SELECT COALESCE(MAX(position), 0) AS p FROM basetable_rows WHERE name = %s", (name,))
+    pos = int(_val(cur.fetchone(), "p", 0) or 0)
+    written = []
+    for r in rows:
+        key = _row_key(name, headers, r, "")
+        if key.startswith("#"):
+            continue
+        pos += 1
+        cells = json.dumps(_cells_of(headers, r), ensure_ascii=False)
+        if only_new:
+            cur.execute(
+                "INSERT IGNORE INTO basetable_rows (name, row_key, position, cells, version) VALUES (%s, %s, %s, %s, 1)",
+                (name, key, pos, cells),
+            )
+            if cur.rowcount > 0:
+                written.append(r)
+        else:
+            cur.execute(
+                """INSERT INTO basetable_rows (name, row_key, position, cells, version) VALUES (%s, %s, %s, %s, 1)
+                   ON DUPLICATE KEY UPDATE cells = VALUES(cells), version = version + 1""",
+                (name, key, pos, cells),
+            )
+            written.append(r)
+    return written
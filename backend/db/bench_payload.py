@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+按周 payload 压缩存储基准：对比 JSON 列与 zlib / zstd 压缩 blob 的存储大小、解码耗时，以及（可选）MySQL 取数+解码延迟。
+在项目根目录执行：
+  python -m backend.db.bench_payload --year 2026 --week 0119-0125
+  python -m backend.db.bench_payload --year 2026 --week 0119-0125 --mysql   # 另测库内往返（使用临时表，不改动业务表）
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from backend.db import payload_codec  # noqa: E402
+from backend.db.config import BASE_DIR  # noqa: E402
+
+
+def _codecs():
+    out = ["json", "zlib"]
+    if payload_codec.zstandard is not None:
+        out.append("zstd")
+    return out
+
+
+def _week_files(year: int, week_tag: str):
+    data_dir = BASE_DIR / "frontend" / "data" / str(year)
+    week_dir = data_dir / week_tag
+    files = [
+        ("formatted_data", data_dir / (week_tag + "_formatted.json")),
+        ("metrics_total", week_dir / "metrics_total.json"),
+        ("product_strategy(old)", week_dir / "product_strategy_old.json"),
+        ("product_strategy(new)", week_dir / "product_strategy_new.json"),
+    ]
+    return [(name, p) for name, p in files if p.is_file()]
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def bench_local(files, repeat: int):
+    print(f"{'payload':<24}{'codec':<7}{'size KB':>10}{'ratio':>8}{'encode ms':>11}{'decode ms':>11}")
+    for name, path in files:
+        text = json.dumps(json.loads(path.read_text(encoding="utf-8")), ensure_ascii=False)
+        base = len(text.encode("utf-8"))
+        for codec in _codecs():
+            blob = payload_codec.encode(text, codec)
+            enc = _median_ms(lambda: payload_codec.encode(text, codec), repeat)
+            if codec == "json":
+                dec = _median_ms(lambda: json.loads(text), repeat)
+            else:
+                dec = _median_ms(lambda: payload_codec.decode(blob), repeat)
+            print(f"{name:<24}{codec:<7}{len(blob) / 1024:>10.1f}{base / max(len(blob), 1):>8.2f}{enc:>11.2f}{dec:>11.2f}")
+
+
+def bench_mysql(files, repeat: int):
+    from backend.db.connection import get_connection
+    conn = get_connection()
+    if not conn:
+        print("无法连接 MySQL，跳过库内测试")
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "CREATE TEMPORARY TABLE bench_payload (id INT PRIMARY KEY, payload JSON NULL, payload_blob LONGBLOB NULL)"
+            )
+            print()
+            print(f"{'payload':<24}{'codec':<7}{'stored KB':>11}{'fetch+decode ms':>17}")
+            for name, path in files:
+                text = json.dumps(json.loads(path.read_text(encoding="utf-8")), ensure_ascii=False)
+                for i, codec in enumerate(_codecs()):
+                    cur.execute("DELETE FROM bench_payload")
+                    if codec == "json":
+                        cur.execute("INSERT INTO bench_payload (id, payload) VALUES (1, %s)", (text,))
+                        cur.execute("SELECT JSON_STORAGE_SIZE(payload) AS n FROM bench_payload WHERE id = 1")
+                    else:
+                        cur.execute(
+                            "INSERT INTO bench_payload (id, payload_blob) VALUES (1, %s)",
+                            (payload_codec.encode(text, codec),),
+                        )
+                        cur.execute("SELECT LENGTH(payload_blob) AS n FROM bench_payload WHERE id = 1")
+                    stored = int(cur.fetchone()["n"] or 0)
+
+                    def fetch():
+                        cur.execute("SELECT payload, payload_blob FROM bench_payload WHERE id = 1")
+                        row = cur.fetchone()
+                        if row["payload"] is not None:
+                            return json.loads(row["payload"])
+                        return payload_codec.decode(row["payload_blob"])
+
+                    ms = _median_ms(fetch, repeat)
+                    print(f"{name:<24}{codec:<7}{stored / 1024:>11.1f}{ms:>17.2f}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按周 payload：JSON 列 vs 压缩 blob 基准")
+    parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
+    parser.add_argument("--week", type=str, required=True, help="周标签，如 0119-0125")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取中位数，默认 5")
+    parser.add_argument("--mysql", action="store_true", help="另测 MySQL 临时表中的存储大小与取数+解码延迟")
+    args = parser.parse_args()
+    files = _week_files(args.year, args.week)
+    if not files:
+        print(f"frontend/data/{args.year}/{args.week} 下未找到 payload 文件")
+        raise SystemExit(1)
+    if payload_codec.zstandard is None:
+        print("未安装 zstandard，仅对比 json / zlib")
+    bench_local(files, max(1, args.repeat))
+    if args.mysql:
+        bench_mysql(files, max(1, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+内嵌 SQLite 与文件模式读数对比：同一周的 formatted / metrics_total / product_strategy 分别从 frontend/data 读 JSON、
+从 SQLite 库读 payload（不经过 api_data 缓存），另测 product_history 按产品取时间序列（文件模式需逐周扫描）。
+在项目根目录执行（库需先用 python -m backend.db.sqlite_backend --import-files 导入）：
+  python -m backend.db.bench_sqlite --year 2026 --week 0119-0125 [--unified-id xxx]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from backend.db.config import BASE_DIR  # noqa: E402
+from backend.db.payload_codec import fetch_payloads  # noqa: E402
+from backend.db.product_history import history_from_files  # noqa: E402
+from backend.db.sqlite_backend import connect  # noqa: E402
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件模式 vs 内嵌 SQLite 读数延迟")
+    parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
+    parser.add_argument("--week", type=str, required=True, help="周标签，如 0119-0125")
+    parser.add_argument("--unified-id", type=str, default="", help="另测该产品的跨周时间序列")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取中位数，默认 5")
+    args = parser.parse_args()
+    repeat = max(1, args.repeat)
+    conn = connect()
+    if not conn:
+        print("无法打开 SQLite 库")
+        raise SystemExit(1)
+    data_dir = BASE_DIR / "frontend" / "data"
+    year, week = args.year, args.week
+    cases = [
+        ("formatted", data_dir / str(year) / (week + "_formatted.json"),
+         "formatted_data", "year = %s AND week_tag = %s", (year, week)),
+        ("metrics_total", data_dir / str(year) / week / "metrics_total.json",
+         "metrics_total", "year = %s AND week_tag = %s", (year, week)),
+        ("product_strategy(old)", data_dir / str(year) / week / "product_strategy_old.json",
+         "product_strategy", "year = %s AND week_tag = %s AND strategy_type = %s", (year, week, "old")),
+    ]
+    try:
+        print(f"{'payload':<24}{'file ms':>10}{'sqlite ms':>11}")
+        with conn.cursor() as cur:
+            for name, path, table, where, params in cases:
+                if not path.is_file():
+                    continue
+                file_ms = _median_ms(lambda: json.loads(path.read_text(encoding="utf-8")), repeat)
+                db_ms = _median_ms(lambda: fetch_payloads(cur, table, where, params), repeat)
+                print(f"{name:<24}{file_ms:>10.2f}{db_ms:>11.2f}")
+            if args.unified_id:
+                weeks_path = data_dir / "weeks_index.json"
+                weeks_index = json.loads(weeks_path.read_text(encoding="utf-8")) if weeks_path.is_file() else {}
+                file_ms = _median_ms(lambda: history_from_files(data_dir, weeks_index, args.unified_id), repeat)
+
+                def db_history():
+                    cur.execute(
+                        "SELECT * FROM product_history WHERE unified_id = %s ORDER BY year DESC, week_tag DESC LIMIT 52",
+                        (args.unified_id,),
+                    )
+                    return cur.fetchall()
+
+                db_ms = _median_ms(db_history, repeat)
+                print(f"{'product_history':<24}{file_ms:>10.2f}{db_ms:>11.2f}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
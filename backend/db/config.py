@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-"""MySQL 连接配置，从环境变量读取。"""
+"""数据库连接配置，从环境变量读取（MySQL 或内嵌 SQLite）。"""
 import os
 from pathlib import Path
 
@@ -16,6 +16,22 @@ def get_mysql_config():
         "charset": "utf8mb4",
     }
 
+def get_db_backend():
+    """数据库后端：mysql（默认）或 sqlite（内嵌单文件库，单机/桌面版免装数据库服务）。环境变量 DB_BACKEND。"""
+    v = os.environ.get("DB_BACKEND", "").strip().lower()
+    return "sqlite" if v == "sqlite" else "mysql"
+
+def get_sqlite_path():
+    """SQLite 库文件：SQLITE_PATH，未设置时放在数据目录（SLG_MONITOR_DATA_DIR 或项目根）下 slg_monitor.db。"""
+    p = os.environ.get("SQLITE_PATH", "").strip()
+    if p:
+        return Path(p).expanduser().resolve()
+    data_dir = os.environ.get("SLG_MONITOR_DATA_DIR", "").strip()
+    root = Path(data_dir).expanduser().resolve() if data_dir else BASE_DIR
+    return root / "slg_monitor.db"
+
 def use_mysql():
-    """是否启用从 MySQL 读数据（环境变量 USE_MYSQL=1 时启用）。"""
+    """是否启用从数据库读数据（USE_MYSQL=1 时启用；DB_BACKEND=sqlite 时内嵌库始终启用）。"""
+    if get_db_backend() == "sqlite":
+        return True
     return os.environ.get("USE_MYSQL", "").strip() in ("1", "true", "yes")
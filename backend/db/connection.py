@@ -1,9 +1,25 @@
 # -*- coding: utf-8 -*-
-"""MySQL 连接封装，供迁移脚本和 API 使用。"""
+"""数据库连接封装（MySQL 或内嵌 SQLite），供迁移脚本和 API 使用。"""
 import json
+import sqlite3
+
+try:
+    import pymysql as _pymysql
+except ImportError:
+    _pymysql = None
+
+# 两种后端的数据库错误，用于「旧库缺表/缺列时降级」一类的捕获
+DB_ERRORS = (sqlite3.Error,) + ((_pymysql.MySQLError,) if _pymysql else ())
+
+def is_sqlite(conn) -> bool:
+    return getattr(conn, "backend", None) == "sqlite"
 
 def get_connection():
-    """获取 pymysql 连接，失败返回 None。"""
+    """获取数据库连接（DB_BACKEND=sqlite 时为内嵌库连接，否则为 pymysql 连接），失败返回 None。"""
+    from .config import get_db_backend
+    if get_db_backend() == "sqlite":
+        from .sqlite_backend import connect
+        return connect()
     try:
         import pymysql
     except ImportError:
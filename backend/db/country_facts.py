@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+国家维度事实表 country_facts：(app_id, year, week_tag, product_type, country) -> 下载 / 收入，由地区数据拉取
+（request/fetch_country_data）写入，T 度汇总与单品分国家明细直接用 SQL GROUP BY，不再逐个解析 countiesdata 下的 JSON。
+- 下载 / 收入按原始记录逐条 int() 取整后再累加，缺国家代码的记录记在空国家 "" 下（归 T3），与 build_final_join.aggregate_by_tier 一致；
+- product_type 对应 countiesdata/{年}/{周}/strategy_old|strategy_new，同一 app 在两类下的数据互不覆盖；
+- country_tier：国家 -> T 度（来自 mapping/市场T度.csv，亚洲 T1 不含 CN），未在表中的国家按 T3；
+- 旧周回填：python -m backend.db.country_facts --year 2026 [--week 0119-0125]
+"""
+import csv
+import json
+from pathlib import Path
+
+REGIONS = ["亚洲T1", "欧美T1", "T2", "T3"]
+PRODUCT_TYPES = ("strategy_old", "strategy_new")
+
+# INSERT 分批，避免单条语句超过 max_allowed_packet
+_INSERT_BATCH = 2000
+
+
+def _val(row, name, idx):
+    return row.get(name) if isinstance(row, dict) else row[idx]
+
+
+def load_tier_mapping(csv_path: Path) -> dict:
+    """mapping/市场T度.csv -> {国家代码: T度}；亚洲 T1 排除 CN（与 build_final_join 一致）。"""
+    tier = {}
+    if csv_path and Path(csv_path).is_file():
+        with open(csv_path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                c = (row.get("country") or "").strip().upper()
+                t = (row.get("T度") or "").strip()
+                if c and t:
+                    tier[c] = t
+    if tier.get("CN") == "亚洲T1":
+        del tier["CN"]
+    return tier
+
+
+def _num(v) -> float:
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return f if f == f else 0.0
+
+
+def country_rows(raw) -> dict:
+    """
+    单个 app 的 sales_report_estimates 返回（list 或 {"data": list}）-> {国家: (下载, 收入)}，
+    同一国家多个日期的记录先逐条取整再累加（与 aggregate_by_tier 的 int(row[...]) 一致）；
+    缺国家代码的记录不丢弃，记在 "" 下，汇总时归 T3。
+    """
+    if isinstance(raw, dict):
+        raw = raw.get("data") or []
+    out = {}
+    for row in raw or []:
+        if not isinstance(row, dict):
+            continue
+        c = row.get("country")
+        c = str(c).strip().upper() if c is not None else ""
+        if c == "NAN":
+            c = ""
+        u, r = out.get(c, (0, 0))
+        out[c] = (u + int(_num(row.get("unified_units"))), r + int(_num(row.get("unified_revenue"))))
+    return out
+
+
+def sync_country_tiers(cur, country_to_tier: dict) -> None:
+    """整表替换 country_tier（行数只有几百，调用方负责 commit）。"""
+    cur.execute("DELETE FROM country_tier")
+    if country_to_tier:
+        cur.executemany(
+            "INSERT INTO country_tier (country, tier) VALUES (%s, %s)",
+            sorted(country_to_tier.items()),
+        )
+
+
+def store_app_facts(cur, year: int, week_tag: str, product_type: str, by_app: dict) -> int:
+    """
+    写入若干 app 当周某产品类型的国家数据：by_app = {app_id: {国家: (下载, 收入)}}。
+    先删该 app 该周该类型的旧记录再插入（重拉覆盖），调用方负责 commit。返回写入行数。
+    """
+    year = int(year)
+    apps = [a for a in by_app if a]
+    for i in range(0, len(apps), 500):
+        chunk = apps[i : i + 500]
+        cur.execute(
+            "DELETE FROM country_facts WHERE year = %s AND week_tag = %s AND product_type = %s AND app_id IN ("
+            + ", ".join(["%s"] * len(chunk)) + ")",
+            (year, week_tag, product_type, *chunk),
+        )
+    params = [
+        (app_id, year, week_tag, product_type, country, u, r)
+        for app_id in apps
+        for country, (u, r) in by_app[app_id].items()
+    ]
+    for i in range(0, len(params), _INSERT_BATCH):
+        cur.executemany(
+            "INSERT INTO country_facts (app_id, year, week_tag, product_type, country, downloads, revenue)"
+            " VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            params[i : i + _INSERT_BATCH],
+        )
+    return len(params)
+
+
+def load_week_files(base_dir: Path, year: int, week_tag: str, app_ids=None) -> dict:
+    """
+    读取 countiesdata/{年}/{周}/strategy_old|strategy_new/json/*.json（仅回填旧周或补缺时用），
+    返回 {product_type: {app_id: {国家: (下载, 收入)}}}。
+    """
+    wanted = set(app_ids) if app_ids is not None else None
+    out = {}
+    for ptype in PRODUCT_TYPES:
+        json_dir = base_dir / "countiesdata" / str(year) / week_tag / ptype / "json"
+        if not json_dir.is_dir():
+            continue
+        facts = {}
+        for p in json_dir.glob("*.json"):
+            app_id = p.stem
+            if wanted is not None and app_id not in wanted:
+                continue
+            try:
+                facts[app_id] = country_rows(json.loads(p.read_text(encoding="utf-8")))
+            except Exception:
+                continue
+        if facts:
+            out[ptype] = facts
+    return out
+
+
+def apps_with_facts(cur, year: int, week_tag: str, product_type: str, app_ids: list) -> set:
+    """该周该产品类型已有国家数据的 app_id 集合。"""
+    found = set()
+    for i in range(0, len(app_ids), 500):
+        chunk = app_ids[i : i + 500]
+        cur.execute(
+            "SELECT DISTINCT app_id FROM country_facts WHERE year = %s AND week_tag = %s AND product_type = %s AND app_id IN ("
+            + ", ".join(["%s"] * len(chunk)) + ")",
+            (int(year), week_tag, product_type, *chunk),
+        )
+        for row in cur.fetchall() or []:
+            found.add(_val(row, "app_id", 0))
+    return found
+
+
+def _tier_expr() -> str:
+    # 不在映射表或 T 度不在四个市场之内的国家一律归 T3
+    return "CASE WHEN t.tier IN (" + ", ".join("'%s'" % r for r in REGIONS) + ") THEN t.tier ELSE 'T3' END"
+
+
+def tier_aggregates(cur, year: int, week_tag: str, product_type: str, app_ids: list) -> dict:
+    """
+    SQL 按 T 度汇总：返回 {app_id: {亚洲T1_安装, 欧美T1_安装, T2_安装, T3_安装, 亚洲T1_流水, ...}}，
+    只包含该周该产品类型有数据的 app。入库时已逐条记录取整，SUM 结果与 build_final_join.aggregate_by_tier 一致。
+    """
+    out = {}
+    tier = _tier_expr()
+    for i in range(0, len(app_ids), 500):
+        chunk = app_ids[i : i + 500]
+        cur.execute(
+            "SELECT f.app_id AS app_id, " + tier + " AS tier, SUM(f.downloads) AS downloads, SUM(f.revenue) AS revenue"
+            " FROM country_facts f LEFT JOIN country_tier t ON t.country = f.country"
+            " WHERE f.year = %s AND f.week_tag = %s AND f.product_type = %s AND f.app_id IN ("
+            + ", ".join(["%s"] * len(chunk)) + ")"
+            " GROUP BY f.app_id, " + tier,
+            (int(year), week_tag, product_type, *chunk),
+        )
+        for row in cur.fetchall() or []:
+            app_id, t = _val(row, "app_id", 0), _val(row, "tier", 1)
+            agg = out.setdefault(app_id, {**{f"{r}_安装": 0 for r in REGIONS}, **{f"{r}_流水": 0 for r in REGIONS}})
+            agg[f"{t}_安装"] += int(_num(_val(row, "downloads", 2)))
+            agg[f"{t}_流水"] += int(_num(_val(row, "revenue", 3)))
+    return out
+
+
+def _breakdown(app_id: str, year: int, week_tag: str, items) -> dict:
+    """[(国家, T度, 下载, 收入), ...] -> 接口返回结构（按下载降序，另附四个市场小计；缺国家代码的只计入 T3 小计）。"""
+    countries = []
+    tiers = {r: {"downloads": 0, "revenue": 0} for r in REGIONS}
+    for country, tier, u, r in items:
+        tier = tier if tier in REGIONS else "T3"
+        if country:
+            countries.append({"country": country, "tier": tier, "downloads": u, "revenue": r})
+        tiers[tier]["downloads"] += u
+        tiers[tier]["revenue"] += r
+    countries.sort(key=lambda x: (-x["downloads"], x["country"]))
+    return {"unifiedId": app_id, "year": int(year), "week": week_tag, "countries": countries, "tiers": tiers}
+
+
+def country_breakdown(cur, app_id: str, year: int, week_tag: str) -> dict:
+    """
+    单品某周分国家明细（走 (app_id, year, week_tag) 主键前缀）；
+    同一 app 两类产品下都有数据时按 PRODUCT_TYPES 顺序取第一类，与 breakdown_from_files 一致。
+    """
+    cur.execute(
+        "SELECT f.product_type AS product_type, f.country AS country, t.tier AS tier, f.downloads AS downloads, f.revenue AS revenue"
+        " FROM country_facts f LEFT JOIN country_tier t ON t.country = f.country"
+        " WHERE f.app_id = %s AND f.year = %s AND f.week_tag = %s",
+        (app_id, int(year), week_tag),
+    )
+    by_type = {}
+    for r in cur.fetchall() or []:
+        by_type.setdefault(_val(r, "product_type", 0), []).append(
+            (_val(r, "country", 1), _val(r, "tier", 2), int(_num(_val(r, "downloads", 3))), int(_num(_val(r, "revenue", 4))))
+        )
+    ptype = next((p for p in PRODUCT_TYPES if p in by_type), next(iter(by_type), None))
+    return _breakdown(app_id, year, week_tag, by_type.get(ptype, []))
+
+
+def breakdown_from_files(base_dir: Path, app_id: str, year: int, week_tag: str, country_to_tier: dict) -> dict:
+    """未启用数据库时的兜底：直接读该 app 当周的地区 JSON。"""
+    by_type = load_week_files(base_dir, year, week_tag, [app_id])
+    facts = next((by_type[p][app_id] for p in PRODUCT_TYPES if p in by_type), {})
+    items = [(c, country_to_tier.get(c, "T3"), u, r) for c, (u, r) in facts.items()]
+    return _breakdown(app_id, year, week_tag, items)
+
+
+def store_fetched(year: int, week_tag: str, product_type: str, by_app: dict, base_dir: Path = None) -> int:
+    """
+    地区数据拉取完成后调用：启用数据库时把本次拉到的 app 写入 country_facts，并刷新 country_tier。
+    未启用数据库或写入失败返回 -1（JSON 仍已落盘，不影响 build_final_join 文件兜底）。
+    """
+    from .config import BASE_DIR, use_mysql
+    from .connection import get_connection
+    if not by_app or not use_mysql():
+        return -1
+    conn = get_connection()
+    if not conn:
+        return -1
+    try:
+        with conn.cursor() as cur:
+            sync_country_tiers(cur, load_tier_mapping((base_dir or BASE_DIR) / "mapping" / "市场T度.csv"))
+            n = store_app_facts(cur, year, week_tag, product_type, by_app)
+        conn.commit()
+        return n
+    except Exception:
+        conn.rollback()
+        return -1
+    finally:
+        conn.close()
+
+
+def main():
+    """按 countiesdata 回填 country_facts：python -m backend.db.country_facts --year 2026 [--week 0119-0125]"""
+    import argparse
+    import sys
+    root = Path(__file__).resolve().parent.parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    from backend.db.config import BASE_DIR
+    from backend.db.connection import get_connection
+    parser = argparse.ArgumentParser(description="countiesdata 地区 JSON 回填 country_facts")
+    parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
+    parser.add_argument("--week", type=str, default=None, help="周标签，不填则该年全部周")
+    args = parser.parse_args()
+    year_dir = BASE_DIR / "countiesdata" / str(args.year)
+    weeks = [args.week] if args.week else sorted(p.name for p in year_dir.iterdir() if p.is_dir()) if year_dir.is_dir() else []
+    conn = get_connection()
+    if not conn:
+        print("无法连接数据库")
+        sys.exit(1)
+    try:
+        with conn.cursor() as cur:
+            sync_country_tiers(cur, load_tier_mapping(BASE_DIR / "mapping" / "市场T度.csv"))
+        conn.commit()
+        for week_tag in weeks:
+            by_type = load_week_files(BASE_DIR, args.year, week_tag)
+            for ptype, facts in by_type.items():
+                with conn.cursor() as cur:
+                    n = store_app_facts(cur, args.year, week_tag, ptype, facts)
+                conn.commit()
+                print(f"  {args.year} {week_tag} {ptype}: {len(facts)} 个 app，{n} 行")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
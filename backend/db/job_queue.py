@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+流水线任务队列（pipeline_jobs）：第一步、2.1 / 2.2 拉取、重建监测表、映射表更新等耗时任务不再在 Web 进程内执行，
+由服务端入队、独立 worker（python -m pipeline.job_worker）领取执行，任务状态落库，服务重启不丢失，可多机多进程横向扩展。
+- 领取：SELECT ... FOR UPDATE SKIP LOCKED，多个 worker 并发领取互不阻塞、不会领到同一任务；
+- 租约 + 心跳：领取时写 lease_until，worker 执行期间定期续期；进程崩溃 / 失联后租约过期，任务可被其他 worker 重新领取（最多 max_attempts 次）；
+- 按周互斥：pipeline_week_locks 以 (year, week_tag) 为主键，同一周同一时间只有一个任务在执行（全局任务用 year = 0, week_tag = '*'）；
+- 围栏：续租须同时续上任务与周锁，任一已被接管（或数据库不可用）即视为失去所有权，worker 停止执行；
+  handler 写库前用 owns 确认仍持有任务，finish 只更新本 worker 仍在执行的任务；
+- 时间统一由调用方按本机时钟传入（MySQL / SQLite 通用），多台 worker 需保持时钟同步。
+"""
+import json
+import os
+import time
+
+LEASE_SECONDS = int(os.environ.get("PIPELINE_JOB_LEASE_S", "120"))
+GLOBAL_WEEK = "*"
+KINDS = ("phase1", "phase2_1", "phase2_2", "rebuild_monitor_table", "sync_week", "mapping_update")
+# 单次领取时最多查看的候选任务数（前面的周被占用时顺延到后面的任务）
+_CLAIM_SCAN = 20
+
+
+def queue_enabled() -> bool:
+    """是否启用任务队列：PIPELINE_JOB_QUEUE=1 且启用了数据库；未启用时维护接口仍在 Web 进程内同步执行。"""
+    if os.environ.get("PIPELINE_JOB_QUEUE", "").strip() not in ("1", "true", "yes"):
+        return False
+    from .config import use_mysql
+    return use_mysql()
+
+
+def _ts(offset: float = 0) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + offset))
+
+
+def _lock_key(job: dict):
+    year = int(job.get("year") or 0)
+    week_tag = (job.get("week_tag") or "").strip()
+    return (year, week_tag) if year and week_tag else (0, GLOBAL_WEEK)
+
+
+def _row_to_job(row) -> dict:
+    if not row:
+        return None
+    job = dict(row)
+    raw = job.get("params")
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    try:
+        job["params"] = json.loads(raw) if isinstance(raw, str) and raw else (raw or {})
+    except ValueError:
+        job["params"] = {}
+    for k in ("created_at", "started_at", "finished_at", "lease_until"):
+        if job.get(k) is not None and not isinstance(job[k], str):
+            job[k] = job[k].strftime("%Y-%m-%d %H:%M:%S")
+    return job
+
+
+def enqueue(conn, kind: str, year: int = 0, week_tag: str = "", params: dict = None,
+            batch: str = None, max_attempts: int = 3, dedupe: bool = True) -> int:
+    """
+    入队一个任务并 commit，返回任务 id。dedupe 时同类型、同周、参数相同且仍在排队的任务直接返回已有 id（重复点击不重复执行）。
+    """
+    if kind not in KINDS:
+        raise ValueError("unknown job kind: %s" % kind)
+    year = int(year or 0)
+    week_tag = (week_tag or "").strip()
+    params_json = json.dumps(params or {}, ensure_ascii=False, sort_keys=True)
+    try:
+        with conn.cursor() as cur:
+            if dedupe:
+                cur.execute(
+                    "SELECT id, params FROM pipeline_jobs WHERE kind = %s AND year = %s AND week_tag = %s AND status = 'queued'"
+                    " ORDER BY id",
+                    (kind, year, week_tag),
+                )
+                for row in cur.fetchall() or []:
+                    if _row_to_job(row)["params"] == json.loads(params_json):
+                        conn.rollback()
+                        return int(row["id"])
+            cur.execute(
+                "INSERT INTO pipeline_jobs (kind, year, week_tag, params, batch, status, attempts, max_attempts, created_at)"
+                " VALUES (%s, %s, %s, %s, %s, 'queued', 0, %s, %s)",
+                (kind, year, week_tag, params_json, batch, int(max_attempts), _ts()),
+            )
+            job_id = int(cur.lastrowid)
+        conn.commit()
+        return job_id
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _acquire_week_lock(cur, job: dict, worker: str, lease_until: str, now: str) -> bool:
+    """在领取事务内取该任务所在周的锁；锁被其他未过期任务持有时返回 False。"""
+    year, week_tag = _lock_key(job)
+    # 先做一次不加锁的读，明显被占用的周直接跳过，减少行锁等待
+    cur.execute("SELECT job_id, lease_until FROM pipeline_week_locks WHERE year = %s AND week_tag = %s", (year, week_tag))
+    row = cur.fetchone()
+    if row and int(row["job_id"]) != int(job["id"]) and str(row["lease_until"]) >= now:
+        return False
+    cur.execute(
+        "INSERT IGNORE INTO pipeline_week_locks (year, week_tag, job_id, worker, lease_until) VALUES (%s, %s, %s, %s, %s)",
+        (year, week_tag, job["id"], worker, lease_until),
+    )
+    if cur.rowcount:
+        return True
+    cur.execute(
+        "UPDATE pipeline_week_locks SET job_id = %s, worker = %s, lease_until = %s"
+        " WHERE year = %s AND week_tag = %s AND (lease_until < %s OR job_id = %s)",
+        (job["id"], worker, lease_until, year, week_tag, now, job["id"]),
+    )
+    return cur.rowcount > 0
+
+
+def claim(conn, worker: str, kinds=None, lease: int = None) -> dict:
+    """
+    领取一个可执行的任务（排队中，或执行中但租约已过期），同时取得该周的锁，返回任务 dict；无可领取任务返回 None。
+    租约过期且已达最大次数的任务直接标为 failed。
+    """
+    lease = int(lease or LEASE_SECONDS)
+    now = _ts()
+    lease_until = _ts(lease)
+    where = "(status = 'queued' OR (status = 'running' AND lease_until < %s))"
+    params = [now]
+    if kinds:
+        where += " AND kind IN (" + ", ".join(["%s"] * len(kinds)) + ")"
+        params += list(kinds)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, kind, year, week_tag, params, status, attempts, max_attempts FROM pipeline_jobs"
+                " WHERE " + where + " ORDER BY id LIMIT " + str(_CLAIM_SCAN) + " FOR UPDATE SKIP LOCKED",
+                tuple(params),
+            )
+            candidates = [_row_to_job(r) for r in cur.fetchall() or []]
+            for job in candidates:
+                if job["status"] == "running" and int(job["attempts"]) >= int(job["max_attempts"]):
+                    cur.execute(
+                        "UPDATE pipeline_jobs SET status = 'failed', message = %s, finished_at = %s, lease_until = NULL WHERE id = %s",
+                        ("worker 失联且已达最大重试次数", now, job["id"]),
+                    )
+                    cur.execute("DELETE FROM pipeline_week_locks WHERE job_id = %s", (job["id"],))
+                    continue
+                if not _acquire_week_lock(cur, job, worker, lease_until, now):
+                    continue
+                cur.execute(
+                    "UPDATE pipeline_jobs SET status = 'running', worker = %s, attempts = attempts + 1, lease_until = %s,"
+                    " started_at = %s, message = NULL WHERE id = %s",
+                    (worker, lease_until, now, job["id"]),
+                )
+                conn.commit()
+                job.update(status="running", worker=worker, attempts=int(job["attempts"]) + 1, lease_until=lease_until)
+                return job
+        conn.commit()
+    except Exception:
+        # 并发领取偶发死锁 / 锁等待超时：回滚后由 worker 下一轮重试
+        conn.rollback()
+    return None
+
+
+def heartbeat(conn, job_id: int, worker: str, lease: int = None) -> bool:
+    """
+    续租任务与周锁，两者都续上才返回 True。任务已不属于该 worker（租约过期被他人领走）、周锁已被其他任务接管，
+    或续租时数据库出错（无法确认租约仍有效）均返回 False，调用方应停止执行。
+    """
+    lease_until = _ts(int(lease or LEASE_SECONDS))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE pipeline_jobs SET lease_until = %s WHERE id = %s AND worker = %s AND status = 'running'",
+                (lease_until, job_id, worker),
+            )
+            owned = cur.rowcount > 0
+            if owned:
+                cur.execute(
+                    "UPDATE pipeline_week_locks SET lease_until = %s WHERE job_id = %s AND worker = %s",
+                    (lease_until, job_id, worker),
+                )
+                owned = cur.rowcount > 0
+        if owned:
+            conn.commit()
+        else:
+            conn.rollback()
+        return owned
+    except Exception:
+        conn.rollback()
+        return False
+
+
+def owns(conn, job_id: int, worker: str) -> bool:
+    """该 worker 是否仍持有任务（执行中、租约未过期且周锁仍属于该任务）；出错时按未持有处理。"""
+    now = _ts()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM pipeline_jobs j JOIN pipeline_week_locks l ON l.job_id = j.id AND l.worker = j.worker"
+                " WHERE j.id = %s AND j.worker = %s AND j.status = 'running' AND j.lease_until >= %s AND l.lease_until >= %s",
+                (job_id, worker, now, now),
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return row is not None
+    except Exception:
+        conn.rollback()
+        return False
+
+
+def finish(conn, job: dict, worker: str, ok: bool, message: str = "", retry: bool = False) -> str:
+    """
+    结束任务并释放周锁，返回最终状态：成功 done；失败且 retry 且未达最大次数时重新排队（queued），否则 failed。
+    只更新该 worker 仍在执行的任务：租约已失效、任务被他人接管或已被判为失败时不改状态，返回 lost。
+    """
+    if ok:
+        status = "done"
+    elif retry and int(job.get("attempts") or 0) < int(job.get("max_attempts") or 1):
+        status = "queued"
+    else:
+        status = "failed"
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE pipeline_jobs SET status = %s, message = %s, finished_at = %s, lease_until = NULL"
+                " WHERE id = %s AND worker = %s AND status = 'running'",
+                (status, (message or "")[:4000], _ts() if status != "queued" else None, job["id"], worker),
+            )
+            if cur.rowcount == 0:
+                status = "lost"
+            cur.execute("DELETE FROM pipeline_week_locks WHERE job_id = %s AND worker = %s", (job["id"], worker))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    return status
+
+
+def get_job(conn, job_id: int) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("SELECT * FROM pipeline_jobs WHERE id = %s", (int(job_id),))
+        return _row_to_job(cur.fetchone())
+
+
+def list_jobs(conn, status: str = None, batch: str = None, limit: int = 50) -> list:
+    """最近的任务（id 倒序），可按状态 / 批次过滤。"""
+    where, params = [], []
+    if status:
+        where.append("status = %s")
+        params.append(status)
+    if batch:
+        where.append("batch = %s")
+        params.append(batch)
+    sql = "SELECT * FROM pipeline_jobs" + (" WHERE " + " AND ".join(where) if where else "")
+    sql += " ORDER BY id DESC LIMIT " + str(max(1, min(int(limit or 50), 500)))
+    with conn.cursor() as cur:
+        cur.execute(sql, tuple(params) if params else None)
+        return [_row_to_job(r) for r in cur.fetchall() or []]
+
+
+def batch_status(conn, batch: str = None) -> dict:
+    """
+    批量第一步进度（与服务端 PHASE1_BATCH_STATE 同结构）；batch 为空时取最近一个批次。无批次返回 None。
+    """
+    with conn.cursor() as cur:
+        if not batch:
+            cur.execute("SELECT batch FROM pipeline_jobs WHERE batch IS NOT NULL ORDER BY id DESC LIMIT 1")
+            row = cur.fetchone()
+            if not row:
+                return None
+            batch = row["batch"]
+    jobs = list_jobs(conn, batch=batch, limit=500)
+    if not jobs:
+        return None
+    jobs.reverse()
+    active = [j for j in jobs if j["status"] in ("queued", "running")]
+    finished = [j["finished_at"] for j in jobs if j.get("finished_at")]
+    return {
+        "running": bool(active),
+        "batch": batch,
+        "root_dir": (jobs[0]["params"] or {}).get("source_root", ""),
+        "current": ", ".join("%s-%s" % (j["year"], j["week_tag"]) for j in jobs if j["status"] == "running"),
+        "total": len(jobs),
+        "done": len(jobs) - len(active),
+        "errors": [
+            {"year": j["year"], "week_tag": j["week_tag"], "message": j.get("message") or ""}
+            for j in jobs if j["status"] == "failed"
+        ],
+        "started_at": jobs[0].get("created_at") or "",
+        "finished_at": "" if active else (max(finished) if finished else ""),
+    }
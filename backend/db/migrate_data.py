@@ -6,6 +6,7 @@
 或：cd backend/db && python migrate_data.py
 可设置环境变量 MYSQL_HOST, MYSQL_PORT, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE；
 或用 root：MYSQL_USER=root MYSQL_PASSWORD=你的root密码 python -m backend.db.migrate_data
+大量历史周数据可用并行、可续传模式：python -m backend.db.migrate_data --parallel --workers 8
 """
 import argparse
 import json
@@ -78,8 +79,8 @@ def _excel_to_headers_rows(path):
     return headers, rows
 
 
-def run_migration(mysql_config):
-    conn = pymysql.connect(
+def _connect(mysql_config):
+    return pymysql.connect(
         host=mysql_config["host"],
         port=mysql_config["port"],
         user=mysql_config["user"],
@@ -87,38 +88,116 @@ def run_migration(mysql_config):
         database=mysql_config["database"],
         charset=mysql_config.get("charset", "utf8mb4"),
     )
-    try:
-        with conn.cursor() as cur:
-            # 1. weeks_index + data_range -> app_config
-            weeks_path = FRONTEND_DATA / "weeks_index.json"
-            if weeks_path.is_file():
-                data = json.loads(weeks_path.read_text(encoding="utf-8"))
-                val = json.dumps(data, ensure_ascii=False)
-                cur.execute(
-                    "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
-                    ("weeks_index", val),
-                )
-                if "data_range" in data:
+
+
+def _migrate_weeks_index(conn, cur):
+    """1. weeks_index + data_range -> app_config，并写入 year_weeks。"""
+    weeks_path = FRONTEND_DATA / "weeks_index.json"
+    if weeks_path.is_file():
+        data = json.loads(weeks_path.read_text(encoding="utf-8"))
+        val = json.dumps(data, ensure_ascii=False)
+        cur.execute(
+            "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
+            ("weeks_index", val),
+        )
+        if "data_range" in data:
+            cur.execute(
+                "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
+                ("data_range", json.dumps(data["data_range"], ensure_ascii=False)),
+            )
+        # year_weeks
+        for year_s, weeks in data.items():
+            if year_s == "data_range" or not isinstance(weeks, list):
+                continue
+            try:
+                year = int(year_s)
+            except ValueError:
+                continue
+            for week_tag in weeks:
+                if isinstance(week_tag, str):
                     cur.execute(
-                        "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
-                        ("data_range", json.dumps(data["data_range"], ensure_ascii=False)),
+                        "INSERT IGNORE INTO year_weeks (year, week_tag) VALUES (%s, %s)",
+                        (year, week_tag),
                     )
-                # year_weeks
-                for year_s, weeks in data.items():
-                    if year_s == "data_range" or not isinstance(weeks, list):
-                        continue
-                    try:
-                        year = int(year_s)
-                    except ValueError:
-                        continue
-                    for week_tag in weeks:
-                        if isinstance(week_tag, str):
-                            cur.execute(
-                                "INSERT IGNORE INTO year_weeks (year, week_tag) VALUES (%s, %s)",
-                                (year, week_tag),
-                            )
-                print("  [OK] app_config weeks_index, year_weeks")
-            conn.commit()
+        print("  [OK] app_config weeks_index, year_weeks")
+    conn.commit()
+
+
+def _migrate_global_tables(conn, cur):
+    """6~10. 全局一份的表：metrics_rank、new_products、题材画风映射、basetable、users（串行/并行模式共用）。"""
+    # 6. metrics_rank（全局一份，先删后插避免重复）
+    global_rank = FRONTEND_DATA / "metrics_rank.json"
+    if global_rank.is_file():
+        payload = json.loads(global_rank.read_text(encoding="utf-8"))
+        val = json.dumps(payload, ensure_ascii=False)
+        cur.execute("DELETE FROM metrics_rank WHERE scope = 'global'")
+        cur.execute(
+            "INSERT INTO metrics_rank (payload, scope) VALUES (%s, 'global')",
+            (val,),
+        )
+        conn.commit()
+    print("  [OK] metrics_rank")
+
+    # 7. new_products
+    np_path = FRONTEND_DATA / "new_products.json"
+    if np_path.is_file():
+        payload = json.loads(np_path.read_text(encoding="utf-8"))
+        val = json.dumps(payload, ensure_ascii=False)
+        cur.execute(
+            "INSERT INTO new_products (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
+            (val,),
+        )
+        conn.commit()
+    print("  [OK] new_products")
+
+    # 8. product_theme_style_mapping
+    mapping_path = FRONTEND_DATA / "product_theme_style_mapping.json"
+    if mapping_path.is_file():
+        payload = json.loads(mapping_path.read_text(encoding="utf-8"))
+        val = json.dumps(payload, ensure_ascii=False)
+        cur.execute(
+            "INSERT INTO product_theme_style_mapping (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
+            (val,),
+        )
+        conn.commit()
+    print("  [OK] product_theme_style_mapping")
+
+    # 9. basetable（整表 JSON + 行级 basetable_rows）
+    from backend.db.basetable_rows import write_table
+    for name, xlsx_path in BASETABLE_SOURCES.items():
+        headers, rows = _excel_to_headers_rows(xlsx_path)
+        if headers or rows:
+            write_table(cur, name, headers, rows)
+    conn.commit()
+    print("  [OK] basetable")
+
+    # 10. users（从 auth_users.json）
+    if AUTH_USERS_PATH.is_file():
+        data = json.loads(AUTH_USERS_PATH.read_text(encoding="utf-8"))
+        users = data.get("users") or []
+        for u in users:
+            username = (u.get("username") or "").strip()
+            if not username:
+                continue
+            salt = (u.get("salt") or "").strip()
+            h = (u.get("hash") or "").strip()
+            role = (u.get("role") or "user").strip() or "user"
+            status = (u.get("status") or "pending").strip() or "pending"
+            cur.execute(
+                """INSERT INTO users (username, salt, password_hash, role, status)
+                   VALUES (%s, %s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE salt = VALUES(salt), password_hash = VALUES(password_hash), role = VALUES(role), status = VALUES(status)""",
+                (username, salt, h, role, status),
+            )
+        conn.commit()
+    print("  [OK] users")
+
+
+def run_migration(mysql_config):
+    conn = _connect(mysql_config)
+    try:
+        with conn.cursor() as cur:
+            _migrate_weeks_index(conn, cur)
 
             # 2. formatted_data
             for year_dir in FRONTEND_DATA.iterdir():
@@ -203,78 +282,245 @@ def run_migration(mysql_config):
             conn.commit()
             print("  [OK] metrics_total")
 
-            # 6. metrics_rank（全局一份，先删后插避免重复）
-            global_rank = FRONTEND_DATA / "metrics_rank.json"
-            if global_rank.is_file():
-                payload = json.loads(global_rank.read_text(encoding="utf-8"))
-                val = json.dumps(payload, ensure_ascii=False)
-                cur.execute("DELETE FROM metrics_rank WHERE scope = 'global'")
-                cur.execute(
-                    "INSERT INTO metrics_rank (payload, scope) VALUES (%s, 'global')",
-                    (val,),
-                )
-                conn.commit()
-            print("  [OK] metrics_rank")
-
-            # 7. new_products
-            np_path = FRONTEND_DATA / "new_products.json"
-            if np_path.is_file():
-                payload = json.loads(np_path.read_text(encoding="utf-8"))
-                val = json.dumps(payload, ensure_ascii=False)
-                cur.execute(
-                    "INSERT INTO new_products (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
-                    (val,),
-                )
-                conn.commit()
-            print("  [OK] new_products")
-
-            # 8. product_theme_style_mapping
-            mapping_path = FRONTEND_DATA / "product_theme_style_mapping.json"
-            if mapping_path.is_file():
-                payload = json.loads(mapping_path.read_text(encoding="utf-8"))
-                val = json.dumps(payload, ensure_ascii=False)
-                cur.execute(
-                    "INSERT INTO product_theme_style_mapping (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
-                    (val,),
-                )
-                conn.commit()
-            print("  [OK] product_theme_style_mapping")
-
-            # 9. basetable
-            for name, xlsx_path in BASETABLE_SOURCES.items():
-                headers, rows = _excel_to_headers_rows(xlsx_path)
-                if headers or rows:
-                    h_val = json.dumps(headers, ensure_ascii=False)
-                    r_val = json.dumps(rows, ensure_ascii=False)
-                    cur.execute(
-                        """INSERT INTO basetable (name, headers, `rows`) VALUES (%s, %s, %s)
-                           ON DUPLICATE KEY UPDATE headers = VALUES(headers), `rows` = VALUES(`rows`)""",
-                        (name, h_val, r_val),
-                    )
+            _migrate_global_tables(conn, cur)
+
+            # 11. product_history（由已导入的 formatted_data / product_strategy 回填产品跨周时间序列）
+            try:
+                from backend.db.product_history import rebuild_product_history
+                n = rebuild_product_history(conn)
+                print(f"  [OK] product_history（{n} 行）")
+            except Exception as e:
+                conn.rollback()
+                print(f"  [SKIP] product_history: {e}")
+    finally:
+        conn.close()
+    print("迁移完成。")
+
+
+# ---------- 并行、可续传的按周数据迁移（--parallel） ----------
+
+# 按周 payload 表 -> 主键列（与 sync_week._DIGEST_TABLES 一致）
+WEEK_TABLE_KEYS = {
+    "formatted_data": ("year", "week_tag"),
+    "product_strategy": ("year", "week_tag", "strategy_type"),
+    "creative_products": ("year", "week_tag"),
+    "metrics_total": ("year", "week_tag"),
+}
+
+
+def _collect_week_tasks():
+    """扫描 frontend/data，列出按周 payload 文件：[(表名, 主键值元组, 源文件相对路径), ...]。"""
+    tasks = []
+    if not FRONTEND_DATA.is_dir():
+        return tasks
+    for year_dir in sorted(FRONTEND_DATA.iterdir()):
+        if not year_dir.is_dir() or not year_dir.name.isdigit():
+            continue
+        year = int(year_dir.name)
+        for f in sorted(year_dir.iterdir()):
+            if f.is_file() and f.name.endswith("_formatted.json"):
+                tasks.append(("formatted_data", (year, f.name.replace("_formatted.json", "")), f))
+                continue
+            if not f.is_dir():
+                continue
+            week_tag = f.name
+            for name, table, key in (
+                ("product_strategy_old.json", "product_strategy", (year, week_tag, "old")),
+                ("product_strategy_new.json", "product_strategy", (year, week_tag, "new")),
+                ("creative_products.json", "creative_products", (year, week_tag)),
+                ("metrics_total.json", "metrics_total", (year, week_tag)),
+            ):
+                if (f / name).is_file():
+                    tasks.append((table, key, f / name))
+    return [(t, k, str(p.relative_to(FRONTEND_DATA))) for t, k, p in tasks]
+
+
+def _load_week_file(task, done_digest):
+    """
+    工作进程内执行：读文件、算 sha256，与检查点一致时直接跳过；否则解析并压缩为紧凑 JSON。
+    返回 (task, digest, 紧凑 JSON 文本或 None, 源文件字节数)。
+    """
+    import hashlib
+    table, key, rel = task
+    raw = (FRONTEND_DATA / rel).read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if done_digest == digest:
+        return task, digest, None, len(raw)
+    val = json.dumps(json.loads(raw.decode("utf-8")), ensure_ascii=False)
+    return task, digest, val, len(raw)
+
+
+def _ensure_checkpoint_table(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS migrate_checkpoint (
+             source      VARCHAR(255) PRIMARY KEY COMMENT 'frontend/data 下的相对路径',
+             digest      CHAR(64) NOT NULL,
+             bytes       BIGINT UNSIGNED NOT NULL DEFAULT 0,
+             done_at     DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"""
+    )
+
+
+def _has_digest_column(cur) -> bool:
+    try:
+        cur.execute("SELECT payload_digest FROM formatted_data LIMIT 0")
+        cur.fetchall()
+        return True
+    except pymysql.MySQLError:
+        return False
+
+
+class _Throughput:
+    """累计写入行数/字节数并按间隔打印 rows/s、MB/s。"""
+
+    def __init__(self, interval=5.0):
+        import time
+        self._time = time.time
+        self.t0 = self._time()
+        self.last = self.t0
+        self.interval = interval
+        self.rows = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def add(self, rows, nbytes):
+        self.rows += rows
+        self.bytes += nbytes
+        now = self._time()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report("  ...")
+
+    def report(self, prefix):
+        secs = max(self._time() - self.t0, 1e-6)
+        print(
+            f"{prefix} 写入 {self.rows} 行 / {self.bytes / 1048576:.1f} MB，跳过 {self.skipped} 个未变化文件，"
+            f"耗时 {secs:.1f}s，{self.rows / secs:.1f} rows/s，{self.bytes / 1048576 / secs:.2f} MB/s"
+        )
+
+
+def _write_batch(conn, table, batch, with_digest, max_stmt):
+    """
+    写线程内执行：同一事务内 executemany 批量写 payload 并登记检查点，提交后该批文件视为已完成。
+    batch: [(task, digest, val, nbytes), ...]；返回 (行数, 写入字节数)。
+    """
+    cols = WEEK_TABLE_KEYS[table]
+    names = list(cols) + ["payload"] + (["payload_digest"] if with_digest else [])
+    update = "payload = VALUES(payload)" + (", payload_digest = VALUES(payload_digest)" if with_digest else "")
+    sql = (
+        "INSERT INTO " + table + " (" + ", ".join(names) + ") VALUES (" + ", ".join(["%s"] * len(names)) + ")"
+        " ON DUPLICATE KEY UPDATE " + update
+    )
+    params = [tuple(key) + (val,) + ((digest,) if with_digest else ()) for (_, key, _), digest, val, _ in batch]
+    try:
+        with conn.cursor() as cur:
+            # pymysql 按 max_stmt_length 拼多行 INSERT，放宽到单批上限，使一批只发一条语句
+            cur.max_stmt_length = max(cur.max_stmt_length, max_stmt)
+            cur.executemany(sql, params)
+            cur.executemany(
+                "INSERT INTO migrate_checkpoint (source, digest, bytes) VALUES (%s, %s, %s)"
+                " ON DUPLICATE KEY UPDATE digest = VALUES(digest), bytes = VALUES(bytes)",
+                [(rel, digest, nbytes) for (_, _, rel), digest, _, nbytes in batch],
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(batch), sum(len(val.encode("utf-8")) for _, _, val, _ in batch)
+
+
+def run_parallel_migration(mysql_config, workers=4, batch_mb=16, resume=True):
+    """
+    并行、可续传迁移：按周 payload 由进程池读取解析，按字节数攒批后由 workers 个写连接 executemany 写入；
+    每批与 migrate_checkpoint 登记同一事务提交，中断后重跑时摘要未变的文件直接跳过。
+    全局表与 product_history 回填仍走串行逻辑。
+    """
+    import threading
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    conn = _connect(mysql_config)
+    try:
+        with conn.cursor() as cur:
+            _ensure_checkpoint_table(cur)
+            if not resume:
+                cur.execute("DELETE FROM migrate_checkpoint")
             conn.commit()
-            print("  [OK] basetable")
-
-            # 10. users（从 auth_users.json）
-            if AUTH_USERS_PATH.is_file():
-                data = json.loads(AUTH_USERS_PATH.read_text(encoding="utf-8"))
-                users = data.get("users") or []
-                for u in users:
-                    username = (u.get("username") or "").strip()
-                    if not username:
+            cur.execute("SELECT source, digest FROM migrate_checkpoint")
+            done = {r[0]: r[1] for r in cur.fetchall()}
+            with_digest = _has_digest_column(cur)
+            cur.execute("SELECT @@max_allowed_packet")
+            max_packet = int(cur.fetchone()[0])
+            _migrate_weeks_index(conn, cur)
+    except Exception:
+        conn.close()
+        raise
+
+    # 单批上限取 batch_mb 与 max_allowed_packet 的 80% 中较小者，避免语句超包
+    batch_limit = max(1, min(int(batch_mb * 1048576), int(max_packet * 0.8)))
+    tasks = _collect_week_tasks()
+    stats = _Throughput()
+    print(f"  并行迁移：{len(tasks)} 个按周文件，{workers} 个工作进程/写连接，单批上限 {batch_limit / 1048576:.1f} MB")
+    local = threading.local()
+    local_conns = []
+    lock = threading.Lock()
+
+    def write(table, batch):
+        if getattr(local, "conn", None) is None:
+            local.conn = _connect(mysql_config)
+            with lock:
+                local_conns.append(local.conn)
+        n, nbytes = _write_batch(local.conn, table, batch, with_digest, batch_limit)
+        with lock:
+            stats.add(n, nbytes)
+
+    pending = {t: [] for t in WEEK_TABLE_KEYS}
+    pending_bytes = {t: 0 for t in WEEK_TABLE_KEYS}
+    futures = []
+
+    def submit(writers, table):
+        # 背压：在途批次过多时先等最早的一批写完，避免解析结果在内存中堆积
+        while len(futures) >= workers * 2:
+            futures.pop(0).result()
+        futures.append(writers.submit(write, table, pending[table]))
+        pending[table], pending_bytes[table] = [], 0
+
+    window = max(workers * 4, 1)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as loaders, ThreadPoolExecutor(max_workers=workers) as writers:
+            for start in range(0, len(tasks), window):
+                chunk = tasks[start:start + window]
+                expected = [done.get(t[2]) if resume else None for t in chunk]
+                for task, digest, val, nbytes in loaders.map(_load_week_file, chunk, expected):
+                    if val is None:
+                        stats.skipped += 1
                         continue
-                    salt = (u.get("salt") or "").strip()
-                    h = (u.get("hash") or "").strip()
-                    role = (u.get("role") or "user").strip() or "user"
-                    status = (u.get("status") or "pending").strip() or "pending"
-                    cur.execute(
-                        """INSERT INTO users (username, salt, password_hash, role, status)
-                           VALUES (%s, %s, %s, %s, %s)
-                           ON DUPLICATE KEY UPDATE salt = VALUES(salt), password_hash = VALUES(password_hash), role = VALUES(role), status = VALUES(status)""",
-                        (username, salt, h, role, status),
-                    )
-                conn.commit()
-            print("  [OK] users")
+                    table = task[0]
+                    size = len(val.encode("utf-8"))
+                    if pending[table] and pending_bytes[table] + size > batch_limit:
+                        submit(writers, table)
+                    pending[table].append((task, digest, val, nbytes))
+                    pending_bytes[table] += size
+            for table in WEEK_TABLE_KEYS:
+                if pending[table]:
+                    submit(writers, table)
+            while futures:
+                futures.pop(0).result()
+        stats.report("  [OK] 按周数据")
+        with conn.cursor() as cur:
+            _migrate_global_tables(conn, cur)
+        try:
+            from backend.db.product_history import rebuild_product_history
+            n = rebuild_product_history(conn)
+            print(f"  [OK] product_history（{n} 行）")
+        except Exception as e:
+            conn.rollback()
+            print(f"  [SKIP] product_history: {e}")
     finally:
+        for c in local_conns:
+            try:
+                c.close()
+            except Exception:
+                pass
         conn.close()
     print("迁移完成。")
 
@@ -286,6 +532,10 @@ def main():
     parser.add_argument("--mysql-host", default=None)
     parser.add_argument("--mysql-port", type=int, default=None)
     parser.add_argument("--mysql-database", default=None)
+    parser.add_argument("--parallel", action="store_true", help="并行、可续传模式：多进程读取 + 多连接批量写入，记录检查点")
+    parser.add_argument("--workers", type=int, default=4, help="并行模式的工作进程/写连接数，默认 4")
+    parser.add_argument("--batch-mb", type=float, default=16, help="并行模式单批 executemany 的 payload 上限（MB），默认 16")
+    parser.add_argument("--restart", action="store_true", help="并行模式下清空检查点，从头迁移")
     args = parser.parse_args()
     cfg = get_mysql_config()
     if args.mysql_user is not None:
@@ -299,7 +549,10 @@ def main():
     if args.mysql_database is not None:
         cfg["database"] = args.mysql_database
     # 允许空密码（本地 Homebrew MySQL 等 root 常无密码）
-    run_migration(cfg)
+    if args.parallel:
+        run_parallel_migration(cfg, workers=max(1, args.workers), batch_mb=args.batch_mb, resume=not args.restart)
+    else:
+        run_migration(cfg)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+按周大 payload 的可选压缩存储（formatted_data / metrics_total / product_strategy）。
+- 压缩后写入 payload_blob（LONGBLOB），payload（JSON 列）置 NULL；未启用压缩时仍写 payload，payload_blob 置 NULL；
+  读取时 payload 非空优先，其次解码 payload_blob。
+- blob 头部 5 字节为编码标记：b"SLGP" + 编码号（0=未压缩 JSON，1=zlib，2=zstd），读取端据此解码，与写入时的配置无关。
+- 编码由环境变量 MYSQL_PAYLOAD_CODEC 选择：none（默认）/ zlib / zstd；zstd 需安装 zstandard，未安装时退回 zlib。
+"""
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_TABLES = ("formatted_data", "metrics_total", "product_strategy")
+
+_MAGIC = b"SLGP"
+_CODEC_IDS = {"json": 0, "zlib": 1, "zstd": 2}
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 6
+
+# 表名 -> 读取时能否带 payload_blob 列（旧库未升级时为 False，只读 payload）；("cols", 表名) -> 写入用的列信息
+_BLOB_SUPPORT = {}
+
+
+def get_codec() -> str:
+    """当前写入编码：json（不压缩）/ zlib / zstd。"""
+    name = os.environ.get("MYSQL_PAYLOAD_CODEC", "").strip().lower()
+    if name in ("", "none", "json", "off", "0"):
+        return "json"
+    if name == "zstd":
+        return "zstd" if zstandard is not None else "zlib"
+    if name == "zlib":
+        return "zlib"
+    return "json"
+
+
+def encode(text: str, codec: str) -> bytes:
+    """把 JSON 文本编码为带标记的 blob。"""
+    data = text.encode("utf-8")
+    if codec == "zstd" and zstandard is not None:
+        body = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    elif codec in ("zlib", "zstd"):
+        codec = "zlib"
+        body = zlib.compress(data, _ZLIB_LEVEL)
+    else:
+        codec = "json"
+        body = data
+    return _MAGIC + bytes([_CODEC_IDS[codec]]) + body
+
+
+def decode(blob):
+    """解码带标记的 blob 为 Python 对象；无标记时按未压缩 JSON 处理。"""
+    blob = bytes(blob)
+    if not blob.startswith(_MAGIC) or len(blob) < 5:
+        return json.loads(blob.decode("utf-8"))
+    codec_id = blob[4]
+    body = blob[5:]
+    if codec_id == 1:
+        body = zlib.decompress(body)
+    elif codec_id == 2:
+        if zstandard is None:
+            raise RuntimeError("payload 为 zstd 压缩，但未安装 zstandard")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return json.loads(body.decode("utf-8") if isinstance(body, (bytes, bytearray)) else body)
+
+
+def _row_values(row, names):
+    if isinstance(row, dict):
+        return [row.get(n) for n in names]
+    return list(row)
+
+
+def _is_unknown_column(exc) -> bool:
+    """是否为「列不存在」错误（MySQL 1054 / SQLite no such column），即旧库未加 payload_blob 列。"""
+    args = getattr(exc, "args", ())
+    if args and args[0] == 1054:
+        return True
+    return "no such column" in str(exc).lower()
+
+
+def fetch_payloads(cur, table: str, where: str, params: tuple, extra=()) -> list:
+    """
+    读取 payload（自动识别压缩 blob / JSON 列），返回 [(*extra 列值, payload 对象), ...]。
+    COMPRESSED_TABLES 以外的表或旧库无 payload_blob 列时只读 payload。兼容 DictCursor 与普通游标。
+    只有「列不存在」才记为旧库、此后只读 payload；连接中断等其他错误照常抛出，不影响之后读取压缩行。
+    """
+    extra = tuple(extra)
+    use_blob = table in COMPRESSED_TABLES and _BLOB_SUPPORT.get(table, True)
+    cols = list(extra) + ["payload"] + (["payload_blob"] if use_blob else [])
+    sql = "SELECT " + ", ".join(cols) + " FROM " + table + " WHERE " + where
+    try:
+        cur.execute(sql, params)
+    except Exception as e:
+        if not use_blob or not _is_unknown_column(e):
+            raise
+        _BLOB_SUPPORT[table] = False
+        return fetch_payloads(cur, table, where, params, extra)
+    if use_blob:
+        _BLOB_SUPPORT[table] = True
+    out = []
+    for row in cur.fetchall() or []:
+        vals = _row_values(row, cols)
+        blob = vals[-1] if use_blob else None
+        raw = vals[len(extra)]
+        # payload 非空优先：迁移脚本等只写 JSON 列的路径不会被残留的旧 blob 覆盖
+        if raw is not None:
+            obj = json.loads(raw) if isinstance(raw, (str, bytes, bytearray)) else raw
+        elif blob:
+            obj = decode(blob)
+        else:
+            continue
+        out.append(tuple(vals[: len(extra)]) + (obj,))
+    return out
+
+
+def _payload_columns_info(cur, table: str) -> dict:
+    """{列名: IS_NULLABLE}，仅 payload / payload_blob 两列，按进程缓存（内嵌 SQLite 用 PRAGMA table_info）。"""
+    key = ("cols", table)
+    if key in _BLOB_SUPPORT:
+        return _BLOB_SUPPORT[key]
+    cols = {}
+    try:
+        if getattr(cur, "backend", None) == "sqlite":
+            cur.execute("PRAGMA table_info(" + table + ")")
+            for row in cur.fetchall() or []:
+                if row["name"] in ("payload", "payload_blob"):
+                    cols[row["name"]] = "NO" if row["notnull"] else "YES"
+        else:
+            cur.execute(
+                "SELECT COLUMN_NAME, IS_NULLABLE FROM information_schema.COLUMNS"
+                " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME IN ('payload', 'payload_blob')",
+                (table,),
+            )
+            for row in cur.fetchall() or []:
+                name, nullable = _row_values(row, ("COLUMN_NAME", "IS_NULLABLE"))
+                cols[name] = nullable
+    except Exception:
+        # 查询失败（如连接中断）不缓存，下次重新查
+        return {}
+    _BLOB_SUPPORT[key] = cols
+    return cols
+
+
+def payload_columns(cur, table: str, text: str):
+    """
+    按当前编码配置返回写入用的 (payload 列值, payload_blob 列值, 是否写 blob 列)：
+    启用压缩且表有 payload_blob 列、payload 允许 NULL（见 schema.sql 升级语句）时 payload 为 NULL；
+    否则 payload 为 JSON 文本，有 blob 列时一并把旧 blob 清为 NULL，避免读到过期的压缩数据。
+    """
+    if table not in COMPRESSED_TABLES:
+        return text, None, False
+    cols = _payload_columns_info(cur, table)
+    has_blob = "payload_blob" in cols
+    codec = get_codec()
+    if codec != "json" and has_blob and cols.get("payload") == "YES":
+        return None, encode(text, codec), True
+    return text, None, has_blob
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+产品跨周时间序列（product_history 表）。
+- 按 (unified_id, year, week_tag) 聚簇存储，每个产品的历史在 InnoDB 中连续存放，单产品 52 周只需一次范围读；
+- sync_week_from_files 写入某周 formatted / product_strategy 时调用 sync_week_product_history 按周增量维护（先删该周再插入）；
+- 读取时组装为列式结构（每个指标一条按周排列的数组），供 /api/data/product_history 直接返回。
+"""
+import json
+import re
+
+from .payload_codec import fetch_payloads
+
+# product_history 的列顺序（与 schema.sql 一致）
+HISTORY_COLUMNS = (
+    "product_name",
+    "company",
+    "install_this",
+    "install_last",
+    "install_change",
+    "revenue_this",
+    "revenue_last",
+    "revenue_change",
+    "tier_asia_t1",
+    "tier_west_t1",
+    "tier_t2",
+    "tier_t3",
+    "strategy_type",
+    "flag_yellow",
+    "flag_strike",
+)
+
+# product_strategy 中 4 个地区获量列 -> product_history 列
+_TIER_COLUMNS = {
+    "亚洲 T1 市场获量": "tier_asia_t1",
+    "欧美 T1 市场获量": "tier_west_t1",
+    "T2 市场获量": "tier_t2",
+    "T3 市场获量": "tier_t3",
+}
+
+_YELLOW_BG = "FFF2CC"   # step5 标黄行底色
+_STRIKE_FONT = "FF0000"  # step5 划删除线时产品列字体色
+
+_CHANGE_RE = re.compile(r"([+-]?\d+\.?\d*)\s*%")
+
+
+def _norm(s):
+    return str(s).strip() if s is not None else ""
+
+
+def _to_num(v):
+    """单元格转数值：空/无法解析返回 None（区别于 0，前端可画断点）。"""
+    if v is None or v == "":
+        return None
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return float(v) if v == v else None
+    s = str(v).replace(",", "").replace("$", "").strip()
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _to_change(v):
+    """「周安装变动」等（如 31.81%▲、-16.51%▼）解析为百分数数值。"""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v) if v == v else None
+    m = _CHANGE_RE.search(str(v))
+    if not m:
+        return None
+    try:
+        return float(m.group(1))
+    except ValueError:
+        return None
+
+
+def _col(headers, *names):
+    for i, h in enumerate(headers or []):
+        if _norm(h) in names:
+            return i
+    return -1
+
+
+def _cell(row, idx):
+    return row[idx] if idx >= 0 and idx < len(row) else None
+
+
+def _empty_record():
+    rec = dict.fromkeys(HISTORY_COLUMNS)
+    rec["flag_yellow"] = 0
+    rec["flag_strike"] = 0
+    return rec
+
+
+def extract_week_records(formatted=None, strategy_old=None, strategy_new=None) -> dict:
+    """
+    从单周 formatted（监测表，含样式）与 product_strategy old/new 抽取每个产品的一行时间序列记录。
+    返回 { unified_id: {HISTORY_COLUMNS...} }；无 Unified ID 的行与公司汇总行跳过。
+    """
+    out = {}
+    if isinstance(formatted, dict):
+        headers = formatted.get("headers") or []
+        rows = formatted.get("rows") or []
+        styles = formatted.get("styles") or []
+        i_company = _col(headers, "公司归属")
+        i_product = _col(headers, "产品归属")
+        i_uid = _col(headers, "Unified ID")
+        i_inst = _col(headers, "当周周安装")
+        i_inst_last = _col(headers, "上周周安装")
+        i_inst_chg = _col(headers, "周安装变动")
+        i_rev = _col(headers, "当周周流水")
+        i_rev_last = _col(headers, "上周周流水")
+        i_rev_chg = _col(headers, "周流水变动")
+        if i_uid >= 0:
+            for ri, row in enumerate(rows):
+                if not row:
+                    continue
+                company = _norm(_cell(row, i_company))
+                uid = _norm(_cell(row, i_uid))
+                if not uid or company.endswith("汇总") or uid in out:
+                    continue
+                rec = _empty_record()
+                rec["product_name"] = _norm(_cell(row, i_product)) or None
+                rec["company"] = company or None
+                rec["install_this"] = _to_num(_cell(row, i_inst))
+                rec["install_last"] = _to_num(_cell(row, i_inst_last))
+                rec["install_change"] = _to_change(_cell(row, i_inst_chg))
+                rec["revenue_this"] = _to_num(_cell(row, i_rev))
+                rec["revenue_last"] = _to_num(_cell(row, i_rev_last))
+                rec["revenue_change"] = _to_change(_cell(row, i_rev_chg))
+                # styles[0] 为表头样式
+                style_row = styles[ri + 1] if ri + 1 < len(styles) and isinstance(styles[ri + 1], list) else []
+                for s in style_row:
+                    if isinstance(s, dict) and str(s.get("bg_color") or "").upper().endswith(_YELLOW_BG):
+                        rec["flag_yellow"] = 1
+                        break
+                ps = style_row[i_product] if 0 <= i_product < len(style_row) else None
+                if isinstance(ps, dict) and str(ps.get("font_color") or "").upper().endswith(_STRIKE_FONT):
+                    rec["flag_strike"] = 1
+                out[uid] = rec
+    for stype, payload in (("old", strategy_old), ("new", strategy_new)):
+        if not isinstance(payload, dict):
+            continue
+        headers = payload.get("headers") or []
+        i_uid = _col(headers, "Unified ID")
+        if i_uid < 0:
+            continue
+        i_product = _col(headers, "产品归属")
+        i_company = _col(headers, "公司归属")
+        i_inst = _col(headers, "当周周安装")
+        i_inst_last = _col(headers, "上周周安装")
+        i_inst_chg = _col(headers, "周安装变动")
+        tier_idx = [(_col(headers, h), c) for h, c in _TIER_COLUMNS.items()]
+        for row in payload.get("rows") or []:
+            if not row:
+                continue
+            uid = _norm(_cell(row, i_uid))
+            if not uid:
+                continue
+            rec = out.get(uid)
+            if rec is None:
+                # 爆量表中有、监测表中无（已被删除规则过滤）：仍记录产品维度可得的指标
+                rec = _empty_record()
+                rec["product_name"] = _norm(_cell(row, i_product)) or None
+                rec["company"] = _norm(_cell(row, i_company)) or None
+                rec["install_this"] = _to_num(_cell(row, i_inst))
+                rec["install_last"] = _to_num(_cell(row, i_inst_last))
+                rec["install_change"] = _to_change(_cell(row, i_inst_chg))
+                out[uid] = rec
+            if rec["strategy_type"] is None:
+                rec["strategy_type"] = stype
+            for idx, c in tier_idx:
+                if idx >= 0 and rec[c] is None:
+                    rec[c] = _to_num(_cell(row, idx))
+    return out
+
+
+def sync_week_product_history(cur, year: int, week_tag: str, formatted=None, strategy_old=None, strategy_new=None) -> int:
+    """
+    在调用方事务内按周重写 product_history：先删该周旧记录，再批量插入本周抽取结果。
+    三个 payload 全为 None 时不做任何改动（该周无可用数据，保留已有历史）。返回写入行数。
+    """
+    if formatted is None and strategy_old is None and strategy_new is None:
+        return 0
+    records = extract_week_records(formatted, strategy_old, strategy_new)
+    cur.execute("DELETE FROM product_history WHERE year = %s AND week_tag = %s", (int(year), week_tag))
+    if not records:
+        return 0
+    cols = ", ".join(HISTORY_COLUMNS)
+    marks = ", ".join(["%s"] * (len(HISTORY_COLUMNS) + 3))
+    sql = "INSERT INTO product_history (unified_id, year, week_tag, " + cols + ") VALUES (" + marks + ")"
+    params = [
+        (uid[:64], int(year), week_tag) + tuple(rec[c] for c in HISTORY_COLUMNS)
+        for uid, rec in records.items()
+    ]
+    cur.executemany(sql, params)
+    return len(params)
+
+
+def rebuild_product_history(conn) -> int:
+    """
+    全量重建：按 year_weeks 逐周从 formatted_data / product_strategy 读取并写入 product_history。
+    用于首次上线本表或历史数据迁移后回填；之后由 sync_week_from_files 增量维护。返回写入总行数。
+    """
+    total = 0
+    with conn.cursor() as cur:
+        cur.execute("SELECT year, week_tag FROM year_weeks ORDER BY year, week_tag")
+        weeks = [(r["year"], r["week_tag"]) if isinstance(r, dict) else (r[0], r[1]) for r in cur.fetchall()]
+    for year, week_tag in weeks:
+        with conn.cursor() as cur:
+            found = fetch_payloads(cur, "formatted_data", "year = %s AND week_tag = %s", (year, week_tag))
+            formatted = found[0][0] if found else None
+            strategies = dict(fetch_payloads(
+                cur, "product_strategy", "year = %s AND week_tag = %s", (year, week_tag), extra=("strategy_type",)
+            ))
+            total += sync_week_product_history(
+                cur, year, week_tag, formatted, strategies.get("old"), strategies.get("new")
+            )
+        conn.commit()
+    return total
+
+
+def records_to_series(unified_id: str, points: list) -> dict:
+    """
+    points: 按时间升序的 [(year, week_tag, {HISTORY_COLUMNS...}), ...]，组装为列式响应：
+    每个指标一条与 weeks 等长的数组，前端可直接画趋势线。
+    """
+    def col(name):
+        return [p[2].get(name) for p in points]
+
+    latest = points[-1][2] if points else {}
+    return {
+        "unifiedId": unified_id,
+        "productName": latest.get("product_name"),
+        "company": latest.get("company"),
+        "weeks": [{"year": int(p[0]), "week": p[1]} for p in points],
+        "install": col("install_this"),
+        "installLast": col("install_last"),
+        "installChange": col("install_change"),
+        "revenue": col("revenue_this"),
+        "revenueLast": col("revenue_last"),
+        "revenueChange": col("revenue_change"),
+        "tiers": {
+            "asiaT1": col("tier_asia_t1"),
+            "westT1": col("tier_west_t1"),
+            "t2": col("tier_t2"),
+            "t3": col("tier_t3"),
+        },
+        "flags": {
+            "strategy": col("strategy_type"),
+            "yellow": [bool(v) for v in col("flag_yellow")],
+            "strike": [bool(v) for v in col("flag_strike")],
+        },
+    }
+
+
+def history_from_files(data_dir, weeks_index: dict, unified_id: str, limit: int = 52) -> dict:
+    """
+    未启用 MySQL 时的兜底：按周索引倒序读取最近 limit 周的 formatted / product_strategy JSON 抽取该产品。
+    仅用于本地单机模式，线上走 product_history 表。
+    """
+    weeks = []
+    for year_s, week_list in (weeks_index or {}).items():
+        if year_s == "data_range" or not isinstance(week_list, list):
+            continue
+        try:
+            year = int(year_s)
+        except ValueError:
+            continue
+        weeks.extend((year, w) for w in week_list if isinstance(w, str))
+    weeks.sort()
+    uid = _norm(unified_id)
+
+    def read(path):
+        if path.is_file():
+            try:
+                return json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+        return None
+
+    points = []
+    for year, week_tag in reversed(weeks):
+        if len(points) >= limit:
+            break
+        year_dir = data_dir / str(year)
+        records = extract_week_records(
+            read(year_dir / (week_tag + "_formatted.json")),
+            read(year_dir / week_tag / "product_strategy_old.json"),
+            read(year_dir / week_tag / "product_strategy_new.json"),
+        )
+        if uid in records:
+            points.append((year, week_tag, records[uid]))
+    points.reverse()
+    return records_to_series(uid, points)
+
+
+def main():
+    """python -m backend.db.product_history：按库中已有周数据全量回填 product_history。"""
+    import sys
+    from pathlib import Path
+    root = Path(__file__).resolve().parent.parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    from backend.db.connection import get_connection
+    conn = get_connection()
+    if not conn:
+        print("无法连接 MySQL，请检查 MYSQL_* 环境变量")
+        sys.exit(1)
+    try:
+        n = rebuild_product_history(conn)
+    finally:
+        conn.close()
+    print(f"product_history 回填完成：{n} 行")
+
+
+if __name__ == "__main__":
+    main()
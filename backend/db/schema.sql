@@ -29,7 +29,9 @@ CREATE TABLE IF NOT EXISTS year_weeks (
 CREATE TABLE IF NOT EXISTS formatted_data (
   year       SMALLINT UNSIGNED NOT NULL,
   week_tag   VARCHAR(16) NOT NULL,
-  payload    JSON NOT NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload    JSON NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload_blob LONGBLOB NULL COMMENT '压缩 payload（MYSQL_PAYLOAD_CODEC=zlib|zstd 时写入，payload 置 NULL）',
+  payload_digest CHAR(64) NULL COMMENT '源 JSON 文件 sha256，未变化时同步跳过',
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (year, week_tag)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -39,7 +41,9 @@ CREATE TABLE IF NOT EXISTS product_strategy (
   year          SMALLINT UNSIGNED NOT NULL,
   week_tag      VARCHAR(16) NOT NULL,
   strategy_type ENUM('old','new') NOT NULL COMMENT 'old=爆量旧产品, new=爆量新产品',
-  payload       JSON NOT NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload       JSON NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload_blob LONGBLOB NULL COMMENT '压缩 payload（MYSQL_PAYLOAD_CODEC=zlib|zstd 时写入，payload 置 NULL）',
+  payload_digest CHAR(64) NULL COMMENT '源 JSON 文件 sha256，未变化时同步跳过',
   updated_at    DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (year, week_tag, strategy_type)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -49,6 +53,7 @@ CREATE TABLE IF NOT EXISTS creative_products (
   year       SMALLINT UNSIGNED NOT NULL,
   week_tag   VARCHAR(16) NOT NULL,
   payload    JSON NOT NULL COMMENT '{"week_tag","strategy_old",[...],"strategy_new",[...]}',
+  payload_digest CHAR(64) NULL COMMENT '源 JSON 文件 sha256，未变化时同步跳过',
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (year, week_tag)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -57,7 +62,9 @@ CREATE TABLE IF NOT EXISTS creative_products (
 CREATE TABLE IF NOT EXISTS metrics_total (
   year       SMALLINT UNSIGNED NOT NULL,
   week_tag   VARCHAR(16) NOT NULL,
-  payload    JSON NOT NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload    JSON NULL COMMENT '{"headers":[...],"rows":[...]}',
+  payload_blob LONGBLOB NULL COMMENT '压缩 payload（MYSQL_PAYLOAD_CODEC=zlib|zstd 时写入，payload 置 NULL）',
+  payload_digest CHAR(64) NULL COMMENT '源 JSON 文件 sha256，未变化时同步跳过',
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (year, week_tag)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -117,3 +124,121 @@ CREATE TABLE IF NOT EXISTS sessions (
   created_at   DATETIME DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 13. 产品跨周时间序列（按产品聚簇，sync_week_from_files 按周增量维护；回填：python -m backend.db.product_history）
+CREATE TABLE IF NOT EXISTS product_history (
+  unified_id     VARCHAR(64) NOT NULL,
+  year           SMALLINT UNSIGNED NOT NULL,
+  week_tag       VARCHAR(16) NOT NULL,
+  product_name   VARCHAR(255) NULL,
+  company        VARCHAR(255) NULL,
+  install_this   DOUBLE NULL COMMENT '当周周安装',
+  install_last   DOUBLE NULL COMMENT '上周周安装',
+  install_change DOUBLE NULL COMMENT '周安装变动（%）',
+  revenue_this   DOUBLE NULL COMMENT '当周周流水',
+  revenue_last   DOUBLE NULL COMMENT '上周周流水',
+  revenue_change DOUBLE NULL COMMENT '周流水变动（%）',
+  tier_asia_t1   DOUBLE NULL COMMENT '亚洲 T1 市场获量',
+  tier_west_t1   DOUBLE NULL COMMENT '欧美 T1 市场获量',
+  tier_t2        DOUBLE NULL COMMENT 'T2 市场获量',
+  tier_t3        DOUBLE NULL COMMENT 'T3 市场获量',
+  strategy_type  ENUM('old','new') NULL COMMENT '当周是否进入爆量旧/新产品表',
+  flag_yellow    TINYINT(1) NOT NULL DEFAULT 0 COMMENT '监测表标黄',
+  flag_strike    TINYINT(1) NOT NULL DEFAULT 0 COMMENT '监测表划删除线',
+  updated_at     DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (unified_id, year, week_tag),
+  KEY idx_week (year, week_tag)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 14. 并行迁移检查点（python -m backend.db.migrate_data --parallel 自动创建；每批写入与登记同一事务提交，中断后续传）
+CREATE TABLE IF NOT EXISTS migrate_checkpoint (
+  source     VARCHAR(255) PRIMARY KEY COMMENT 'frontend/data 下的相对路径',
+  digest     CHAR(64) NOT NULL,
+  bytes      BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  done_at    DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 15. 数据底表行级存储（单行增改删 O(1)，带乐观锁版本号；basetable 仍存表头，整表替换时两边同时写入，见 backend/db/basetable_rows.py）
+CREATE TABLE IF NOT EXISTS basetable_rows (
+  name       VARCHAR(32) NOT NULL COMMENT '同 basetable.name',
+  row_key    VARCHAR(191) NOT NULL COMMENT '业务主键：产品归属表为「产品归属」，公司归属表为「发行商」，标签表为「标签名」',
+  position   INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '展示顺序',
+  cells      JSON NOT NULL COMMENT '该行单元格（不含序号列），与 basetable.headers 对应',
+  version    INT UNSIGNED NOT NULL DEFAULT 1 COMMENT '乐观锁版本号，每次修改 +1',
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (name, row_key),
+  KEY idx_position (name, position)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 16. 国家维度事实表（地区数据拉取后写入，T 度汇总与分国家明细走 SQL；回填：python -m backend.db.country_facts --year 2026）
+CREATE TABLE IF NOT EXISTS country_facts (
+  app_id     VARCHAR(64) NOT NULL COMMENT 'Unified ID',
+  year       SMALLINT UNSIGNED NOT NULL,
+  week_tag   VARCHAR(16) NOT NULL,
+  product_type VARCHAR(16) NOT NULL COMMENT 'strategy_old|strategy_new',
+  country    VARCHAR(8) NOT NULL COMMENT '国家代码，大写；空串为缺国家代码的记录（归 T3）',
+  downloads  BIGINT NOT NULL DEFAULT 0 COMMENT 'unified_units，逐条记录取整后累加',
+  revenue    BIGINT NOT NULL DEFAULT 0 COMMENT 'unified_revenue，逐条记录取整后累加',
+  PRIMARY KEY (app_id, year, week_tag, product_type, country),
+  KEY idx_week_country (year, week_tag, country)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 17. 国家 -> 市场 T 度（来自 mapping/市场T度.csv，亚洲 T1 不含 CN；未在表中的国家按 T3）
+CREATE TABLE IF NOT EXISTS country_tier (
+  country    VARCHAR(8) PRIMARY KEY,
+  tier       VARCHAR(16) NOT NULL COMMENT '亚洲T1|欧美T1|T2|T3'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 18. 流水线任务队列（第一步 / 2.1 / 2.2 / 重建监测表等；独立 worker 用 FOR UPDATE SKIP LOCKED 领取，租约 + 心跳，见 backend/db/job_queue.py）
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+  id           BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+  kind         VARCHAR(32) NOT NULL COMMENT 'phase1|phase2_1|phase2_2|rebuild_monitor_table|sync_week|mapping_update',
+  year         SMALLINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '0 表示不按周（如映射表更新）',
+  week_tag     VARCHAR(16) NOT NULL DEFAULT '' COMMENT '空表示不按周',
+  params       JSON NULL,
+  batch        VARCHAR(32) NULL COMMENT '批量第一步的批次号',
+  status       VARCHAR(16) NOT NULL DEFAULT 'queued' COMMENT 'queued|running|done|failed',
+  attempts     INT UNSIGNED NOT NULL DEFAULT 0,
+  max_attempts INT UNSIGNED NOT NULL DEFAULT 3,
+  worker       VARCHAR(128) NULL COMMENT '当前 / 最后领取的 worker',
+  lease_until  DATETIME NULL COMMENT '租约到期时间，worker 心跳续期；过期未续视为 worker 已失联，任务可被重新领取',
+  message      TEXT NULL COMMENT '结果说明或错误信息',
+  created_at   DATETIME DEFAULT CURRENT_TIMESTAMP,
+  started_at   DATETIME NULL,
+  finished_at  DATETIME NULL,
+  KEY idx_status (status, id),
+  KEY idx_week (year, week_tag),
+  KEY idx_batch (batch, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 19. 按周互斥锁：同一周同一时间只有一个任务在执行（year = 0, week_tag = '*' 为全局任务锁）
+CREATE TABLE IF NOT EXISTS pipeline_week_locks (
+  year        SMALLINT UNSIGNED NOT NULL,
+  week_tag    VARCHAR(16) NOT NULL,
+  job_id      BIGINT UNSIGNED NOT NULL,
+  worker      VARCHAR(128) NOT NULL,
+  lease_until DATETIME NOT NULL,
+  PRIMARY KEY (year, week_tag)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 20. 按周物化汇总（公司排名、题材 / 画风合计、Top 产品、规则命中数；周同步时重算，回填：python -m backend.db.week_aggregates）
+CREATE TABLE IF NOT EXISTS week_aggregates (
+  year       SMALLINT UNSIGNED NOT NULL,
+  week_tag   VARCHAR(16) NOT NULL,
+  kind       VARCHAR(32) NOT NULL COMMENT 'company|theme|top_products|rule_hits',
+  payload    JSON NOT NULL,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag, kind)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 旧库升级（已按旧版 schema 建表时执行一次；未执行时同步退化为每次全量写入）：
+-- ALTER TABLE formatted_data    ADD COLUMN payload_digest CHAR(64) NULL AFTER payload;
+-- ALTER TABLE metrics_total     ADD COLUMN payload_digest CHAR(64) NULL AFTER payload;
+-- ALTER TABLE product_strategy  ADD COLUMN payload_digest CHAR(64) NULL AFTER payload;
+-- ALTER TABLE creative_products ADD COLUMN payload_digest CHAR(64) NULL AFTER payload;
+-- 压缩存储（MYSQL_PAYLOAD_CODEC=zlib|zstd）需要 payload_blob 列且 payload 允许 NULL：
+-- ALTER TABLE formatted_data   MODIFY payload JSON NULL, ADD COLUMN payload_blob LONGBLOB NULL AFTER payload;
+-- ALTER TABLE metrics_total    MODIFY payload JSON NULL, ADD COLUMN payload_blob LONGBLOB NULL AFTER payload;
+-- ALTER TABLE product_strategy MODIFY payload JSON NULL, ADD COLUMN payload_blob LONGBLOB NULL AFTER payload;
+-- country_facts 按旧版（无 product_type、DOUBLE 列）建表时：表中数据可由地区 JSON 重建，删表后重新执行本文件再回填
+-- DROP TABLE country_facts;   -- 然后：python -m backend.db.country_facts --year 2026
@@ -0,0 +1,197 @@
+-- SLG Monitor 3.0 内嵌 SQLite 表结构（DB_BACKEND=sqlite）
+-- 与 schema.sql 表名、列名、主键一致，JSON 列存 TEXT；首次连接时由 sqlite_backend 自动执行，无需手动导入。
+-- 库文件默认位于数据目录下 slg_monitor.db，WAL 模式：多读者并发、单写者。
+
+CREATE TABLE IF NOT EXISTS app_config (
+  config_key   TEXT PRIMARY KEY,
+  config_value TEXT NOT NULL,
+  updated_at   TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS year_weeks (
+  year      INTEGER NOT NULL,
+  week_tag  TEXT NOT NULL,
+  PRIMARY KEY (year, week_tag)
+);
+
+CREATE TABLE IF NOT EXISTS formatted_data (
+  year           INTEGER NOT NULL,
+  week_tag       TEXT NOT NULL,
+  payload        TEXT NULL,
+  payload_blob   BLOB NULL,
+  payload_digest TEXT NULL,
+  updated_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag)
+);
+
+CREATE TABLE IF NOT EXISTS product_strategy (
+  year           INTEGER NOT NULL,
+  week_tag       TEXT NOT NULL,
+  strategy_type  TEXT NOT NULL CHECK (strategy_type IN ('old', 'new')),
+  payload        TEXT NULL,
+  payload_blob   BLOB NULL,
+  payload_digest TEXT NULL,
+  updated_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag, strategy_type)
+);
+
+CREATE TABLE IF NOT EXISTS creative_products (
+  year           INTEGER NOT NULL,
+  week_tag       TEXT NOT NULL,
+  payload        TEXT NOT NULL,
+  payload_digest TEXT NULL,
+  updated_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag)
+);
+
+CREATE TABLE IF NOT EXISTS metrics_total (
+  year           INTEGER NOT NULL,
+  week_tag       TEXT NOT NULL,
+  payload        TEXT NULL,
+  payload_blob   BLOB NULL,
+  payload_digest TEXT NULL,
+  updated_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag)
+);
+
+CREATE TABLE IF NOT EXISTS metrics_rank (
+  id         INTEGER PRIMARY KEY AUTOINCREMENT,
+  payload    TEXT NOT NULL,
+  scope      TEXT DEFAULT 'global',
+  year       INTEGER NULL,
+  week_tag   TEXT NULL,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS new_products (
+  id         INTEGER PRIMARY KEY DEFAULT 1,
+  payload    TEXT NOT NULL,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS product_theme_style_mapping (
+  id         INTEGER PRIMARY KEY DEFAULT 1,
+  payload    TEXT NOT NULL,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS basetable (
+  name       TEXT PRIMARY KEY,
+  headers    TEXT NOT NULL,
+  `rows`     TEXT NOT NULL,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 行级底表：一行一条记录，主键为各表业务主键列（见 basetable_rows.ROW_KEY_COLUMNS），version 为乐观锁版本号
+CREATE TABLE IF NOT EXISTS basetable_rows (
+  name       TEXT NOT NULL,
+  row_key    TEXT NOT NULL,
+  position   INTEGER NOT NULL DEFAULT 0,
+  cells      TEXT NOT NULL,
+  version    INTEGER NOT NULL DEFAULT 1,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (name, row_key)
+);
+CREATE INDEX IF NOT EXISTS idx_basetable_rows_pos ON basetable_rows (name, position);
+
+CREATE TABLE IF NOT EXISTS users (
+  id            INTEGER PRIMARY KEY AUTOINCREMENT,
+  username      TEXT NOT NULL UNIQUE,
+  salt          TEXT NOT NULL,
+  password_hash TEXT NOT NULL,
+  role          TEXT NOT NULL DEFAULT 'user',
+  status        TEXT NOT NULL DEFAULT 'pending',
+  created_at    TEXT DEFAULT CURRENT_TIMESTAMP,
+  updated_at    TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+  session_id   TEXT PRIMARY KEY,
+  user_id      INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  expires_at   TEXT NOT NULL,
+  created_at   TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 行级表：产品跨周时间序列，主键即按产品聚簇的索引
+CREATE TABLE IF NOT EXISTS product_history (
+  unified_id     TEXT NOT NULL,
+  year           INTEGER NOT NULL,
+  week_tag       TEXT NOT NULL,
+  product_name   TEXT NULL,
+  company        TEXT NULL,
+  install_this   REAL NULL,
+  install_last   REAL NULL,
+  install_change REAL NULL,
+  revenue_this   REAL NULL,
+  revenue_last   REAL NULL,
+  revenue_change REAL NULL,
+  tier_asia_t1   REAL NULL,
+  tier_west_t1   REAL NULL,
+  tier_t2        REAL NULL,
+  tier_t3        REAL NULL,
+  strategy_type  TEXT NULL CHECK (strategy_type IS NULL OR strategy_type IN ('old', 'new')),
+  flag_yellow    INTEGER NOT NULL DEFAULT 0,
+  flag_strike    INTEGER NOT NULL DEFAULT 0,
+  updated_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (unified_id, year, week_tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_product_history_week ON product_history (year, week_tag);
+CREATE INDEX IF NOT EXISTS idx_product_history_name ON product_history (product_name);
+
+-- 国家维度事实表与国家 -> T 度映射（见 backend/db/country_facts.py）
+CREATE TABLE IF NOT EXISTS country_facts (
+  app_id     TEXT NOT NULL,
+  year       INTEGER NOT NULL,
+  week_tag   TEXT NOT NULL,
+  product_type TEXT NOT NULL,
+  country    TEXT NOT NULL,
+  downloads  INTEGER NOT NULL DEFAULT 0,
+  revenue    INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (app_id, year, week_tag, product_type, country)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_country_facts_week ON country_facts (year, week_tag, country);
+
+CREATE TABLE IF NOT EXISTS country_tier (
+  country    TEXT PRIMARY KEY,
+  tier       TEXT NOT NULL
+);
+
+-- 流水线任务队列与按周互斥锁（见 backend/db/job_queue.py；SQLite 无行锁，领取时整库写锁串行）
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+  id           INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind         TEXT NOT NULL,
+  year         INTEGER NOT NULL DEFAULT 0,
+  week_tag     TEXT NOT NULL DEFAULT '',
+  params       TEXT NULL,
+  batch        TEXT NULL,
+  status       TEXT NOT NULL DEFAULT 'queued',
+  attempts     INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  worker       TEXT NULL,
+  lease_until  TEXT NULL,
+  message      TEXT NULL,
+  created_at   TEXT DEFAULT CURRENT_TIMESTAMP,
+  started_at   TEXT NULL,
+  finished_at  TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_status ON pipeline_jobs (status, id);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_week ON pipeline_jobs (year, week_tag);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_batch ON pipeline_jobs (batch, id);
+
+CREATE TABLE IF NOT EXISTS pipeline_week_locks (
+  year        INTEGER NOT NULL,
+  week_tag    TEXT NOT NULL,
+  job_id      INTEGER NOT NULL,
+  worker      TEXT NOT NULL,
+  lease_until TEXT NOT NULL,
+  PRIMARY KEY (year, week_tag)
+);
+
+CREATE TABLE IF NOT EXISTS week_aggregates (
+  year       INTEGER NOT NULL,
+  week_tag   TEXT NOT NULL,
+  kind       TEXT NOT NULL,
+  payload    TEXT NOT NULL,
+  updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (year, week_tag, kind)
+);
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+多实例共享的二级缓存（L2）：api_data 的进程内缓存（L1）之后再查一层本机 memcached / Redis，
+多个服务进程（Nginx 后挂多实例）共享已解码并序列化好的取数结果，冷启动时不必每个进程各自查库、解压、解析大 JSON。
+- 环境变量 SHARED_CACHE_URL：memcached://127.0.0.1:11211 或 redis://127.0.0.1:6379/0，未设置时只用 L1（与之前一致）；
+- 缓存键带数据版本：每组数据（周数据、周索引、映射、底表……）在 L2 里有一个版本计数器，失效时递增版本，
+  各实例的旧键自然不再命中（无需逐键删除），L1 也按版本判断是否过期；
+- L2 不可用（未启动、超时）时自动降级为只用 L1，隔一段时间再重试，不影响取数；
+- 命中率：stats() 返回 L1 / L2 命中、未命中次数与命中率（/api/data/cache_stats）；
+- 测试 / 无 memcached 环境：python -m backend.db.shared_cache --serve 11311 启动纯 Python 的 memcached 文本协议替身。
+"""
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+import zlib
+
+# 超过该字节数的值不写 L2（memcached 默认单项上限 1MB）
+_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", "1000000"))
+# 版本号在本进程内缓存的秒数（其它实例失效后，本实例最多延迟这么久看到新版本）
+_VERSION_TTL = float(os.environ.get("SHARED_CACHE_VERSION_TTL", "5"))
+# L2 出错后暂停使用的秒数
+_RETRY_AFTER = 10.0
+# 序列化后超过该字节数时 zlib 压缩
+_COMPRESS_MIN = 4096
+_KEY_PREFIX = "slg:"
+
+_STATS = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "l2_sets": 0, "l2_errors": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def count(name: str, n: int = 1) -> None:
+    with _STATS_LOCK:
+        _STATS[name] = _STATS.get(name, 0) + n
+
+
+def stats() -> dict:
+    """命中统计：各计数及 hitRatio（L1+L2 命中 / 总查询）、l2HitRatio（L2 命中 / L1 未命中）。"""
+    with _STATS_LOCK:
+        out = dict(_STATS)
+    lookups = out["l1_hits"] + out["l2_hits"] + out["misses"]
+    l1_misses = out["l2_hits"] + out["misses"]
+    out["lookups"] = lookups
+    out["hitRatio"] = round((out["l1_hits"] + out["l2_hits"]) / lookups, 4) if lookups else None
+    out["l2HitRatio"] = round(out["l2_hits"] / l1_misses, 4) if l1_misses else None
+    client = get_client()
+    out["backend"] = client.name if client else None
+    out["available"] = bool(client and client.available())
+    return out
+
+
+def reset_stats() -> None:
+    with _STATS_LOCK:
+        for k in _STATS:
+            _STATS[k] = 0
+
+
+def dumps(value) -> bytes:
+    """取数结果 -> L2 存储字节：JSON（UTF-8），较大时 zlib 压缩，首字节标记编码。"""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= _COMPRESS_MIN:
+        return b"Z" + zlib.compress(raw, 1)
+    return b"J" + raw
+
+
+def loads(data: bytes):
+    if data[:1] == b"Z":
+        return json.loads(zlib.decompress(data[1:]).decode("utf-8"))
+    return json.loads(data[1:].decode("utf-8"))
+
+
+def make_key(group: str, version: int, key) -> str:
+    """L2 键：前缀 + 组 + 版本 + 原键摘要（memcached 键不能含空格、长度 ≤ 250）。"""
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    return "%s%s:%d:%s" % (_KEY_PREFIX, group, int(version), digest)
+
+
+class _Client:
+    """L2 客户端公共部分：每线程一条长连接，出错时关闭连接并暂停使用 _RETRY_AFTER 秒。"""
+
+    name = ""
+
+    def __init__(self, host: str, port: int, timeout: float = 0.2):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def available(self) -> bool:
+        return time.time() >= self._down_until
+
+    def _sock(self):
+        s = getattr(self._local, "sock", None)
+        if s is None:
+            s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.sock = s
+            self._local.buf = b""
+            self._on_connect()
+        return s
+
+    def _on_connect(self):
+        pass
+
+    def _reset(self):
+        s = getattr(self._local, "sock", None)
+        self._local.sock = None
+        self._local.buf = b""
+        if s is not None:
+            try:
+                s.close()
+            except OSError:
+                pass
+
+    def _readline(self) -> bytes:
+        while b"\r\n" not in self._local.buf:
+            chunk = self._local.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("connection closed")
+            self._local.buf += chunk
+        line, self._local.buf = self._local.buf.split(b"\r\n", 1)
+        return line
+
+    def _readexact(self, n: int) -> bytes:
+        while len(self._local.buf) < n:
+            chunk = self._local.sock.recv(max(65536, n - len(self._local.buf)))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            self._local.buf += chunk
+        data, self._local.buf = self._local.buf[:n], self._local.buf[n:]
+        return data
+
+    def _call(self, fn, *args):
+        if not self.available():
+            return None
+        try:
+            return fn(*args)
+        except (OSError, ValueError, ConnectionError):
+            self._reset()
+            self._down_until = time.time() + _RETRY_AFTER
+            count("l2_errors")
+            return None
+
+    def get(self, key: str):
+        return self._call(self._get, key)
+
+    def set(self, key: str, data: bytes, ttl: int) -> bool:
+        return bool(self._call(self._set, key, data, int(ttl)))
+
+    def incr(self, key: str):
+        return self._call(self._incr, key)
+
+    def read_int(self, key: str) -> int:
+        """读取计数器（版本号），不存在为 0；L2 不可用时返回 None。"""
+        data = self.get(key)
+        if data is None:
+            return 0 if self.available() else None
+        try:
+            return int(data)
+        except ValueError:
+            return 0
+
+
+class MemcacheClient(_Client):
+    """memcached 文本协议（get / set / add / incr）。"""
+
+    name = "memcached"
+
+    def _get(self, key):
+        s = self._sock()
+        s.sendall(b"get " + key.encode("ascii") + b"\r\n")
+        value = None
+        while True:
+            line = self._readline()
+            if line == b"END":
+                return value
+            if not line.startswith(b"VALUE "):
+                raise ValueError(line.decode("latin-1"))
+            nbytes = int(line.split()[3])
+            value = self._readexact(nbytes + 2)[:-2]
+
+    def _store(self, cmd, key, data, ttl):
+        s = self._sock()
+        s.sendall(b"%s %s 0 %d %d\r\n" % (cmd, key.encode("ascii"), ttl, len(data)) + data + b"\r\n")
+        line = self._readline()
+        if line in (b"STORED", b"NOT_STORED"):
+            return line == b"STORED"
+        # SERVER_ERROR object too large 等：连接仍可用，视为未写入
+        if line.startswith(b"SERVER_ERROR"):
+            return False
+        raise ValueError(line.decode("latin-1"))
+
+    def _set(self, key, data, ttl):
+        return self._store(b"set", key, data, ttl)
+
+    def _incr(self, key):
+        s = self._sock()
+        for _ in range(2):
+            s.sendall(b"incr " + key.encode("ascii") + b" 1\r\n")
+            line = self._readline()
+            if line != b"NOT_FOUND":
+                return int(line)
+            # 计数器不存在时从 1 起；并发下 add 失败说明别的实例已建好，再 incr 一次
+            if self._store(b"add", key, b"1", 0):
+                return 1
+        return None
+
+
+class RedisClient(_Client):
+    """Redis RESP 协议（GET / SET EX / INCR），兼容 Redis、KeyDB、Dragonfly 等。"""
+
+    name = "redis"
+
+    def __init__(self, host, port, db=0, timeout=0.2):
+        super().__init__(host, port, timeout)
+        self.db = int(db or 0)
+
+    def _on_connect(self):
+        if self.db:
+            self._command(b"SELECT", str(self.db).encode())
+
+    def _command(self, *parts):
+        s = self._local.sock
+        msg = b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(p), p) for p in parts)
+        s.sendall(msg)
+        line = self._readline()
+        kind, rest = line[:1], line[1:]
+        if kind == b"$":
+            n = int(rest)
+            return None if n < 0 else self._readexact(n + 2)[:-2]
+        if kind == b":":
+            return int(rest)
+        if kind == b"+":
+            return rest
+        raise ValueError(line.decode("latin-1"))
+
+    def _get(self, key):
+        self._sock()
+        return self._command(b"GET", key.encode("ascii"))
+
+    def _set(self, key, data, ttl):
+        self._sock()
+        if ttl > 0:
+            return self._command(b"SET", key.encode("ascii"), data, b"EX", str(ttl).encode()) == b"OK"
+        return self._command(b"SET", key.encode("ascii"), data) == b"OK"
+
+    def _incr(self, key):
+        self._sock()
+        return self._command(b"INCR", key.encode("ascii"))
+
+
+_CLIENT = None
+_CLIENT_URL = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """按 SHARED_CACHE_URL 返回 L2 客户端（进程内单例）；未配置或协议不识别时返回 None。"""
+    global _CLIENT, _CLIENT_URL
+    url = os.environ.get("SHARED_CACHE_URL", "").strip()
+    if url == _CLIENT_URL:
+        return _CLIENT
+    with _CLIENT_LOCK:
+        if url != _CLIENT_URL:
+            _CLIENT = _make_client(url) if url else None
+            _CLIENT_URL = url
+            _VERSIONS.clear()
+    return _CLIENT
+
+
+def _make_client(url: str):
+    u = urllib.parse.urlparse(url)
+    timeout = float(os.environ.get("SHARED_CACHE_TIMEOUT_MS", "200")) / 1000.0
+    if u.scheme == "memcached":
+        return MemcacheClient(u.hostname or "127.0.0.1", u.port or 11211, timeout)
+    if u.scheme == "redis":
+        return RedisClient(u.hostname or "127.0.0.1", u.port or 6379, (u.path or "/0").strip("/") or 0, timeout)
+    return None
+
+
+# 组版本号的本地缓存：{group: (version, 取到的时间)}
+_VERSIONS = {}
+_VERSIONS_LOCK = threading.Lock()
+
+
+def version(group: str):
+    """当前组版本号（本地缓存 _VERSION_TTL 秒）；未配置 L2 为 0，L2 不可用时返回 None（调用方只用 L1）。"""
+    client = get_client()
+    if client is None:
+        return 0
+    now = time.time()
+    with _VERSIONS_LOCK:
+        ent = _VERSIONS.get(group)
+    if ent is not None and now - ent[1] < _VERSION_TTL:
+        return ent[0]
+    v = client.read_int(_KEY_PREFIX + "ver:" + group)
+    if v is None:
+        return ent[0] if ent is not None else None
+    with _VERSIONS_LOCK:
+        _VERSIONS[group] = (v, now)
+    return v
+
+
+def bump(group: str) -> None:
+    """使该组所有实例的缓存失效：递增 L2 中的版本号，并立即更新本进程的版本缓存。"""
+    client = get_client()
+    if client is None:
+        return
+    v = client.incr(_KEY_PREFIX + "ver:" + group)
+    with _VERSIONS_LOCK:
+        if v is None:
+            _VERSIONS.pop(group, None)
+        else:
+            _VERSIONS[group] = (v, time.time())
+
+
+def get(group: str, ver: int, key):
+    """按 (组, 版本, 原键) 读 L2 并解码；未命中或不可用返回 None。"""
+    client = get_client()
+    if client is None or ver is None:
+        return None
+    data = client.get(make_key(group, ver, key))
+    if data is None:
+        return None
+    try:
+        return loads(data)
+    except (ValueError, zlib.error):
+        return None
+
+
+def put(group: str, ver: int, key, value, ttl: int) -> bool:
+    """序列化后写 L2；值不可 JSON 序列化或超过 _MAX_BYTES 时不写。"""
+    client = get_client()
+    if client is None or ver is None or not client.available():
+        return False
+    try:
+        data = dumps(value)
+    except (TypeError, ValueError):
+        return False
+    if len(data) > _MAX_BYTES:
+        return False
+    ok = client.set(make_key(group, ver, key), data, ttl)
+    if ok:
+        count("l2_sets")
+    return ok
+
+
+# ---------- 测试用替身：纯 Python memcached 文本协议服务 ----------
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store, lock = self.server.store, self.server.lock
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.strip().split()
+            if not parts:
+                continue
+            cmd = parts[0].lower()
+            now = time.time()
+            if cmd == b"get" or cmd == b"gets":
+                out = []
+                with lock:
+                    for k in parts[1:]:
+                        ent = store.get(k)
+                        if ent and (ent[1] == 0 or ent[1] > now):
+                            out.append(b"VALUE %s 0 %d\r\n%s\r\n" % (k, len(ent[0]), ent[0]))
+                        elif ent:
+                            del store[k]
+                self.wfile.write(b"".join(out) + b"END\r\n")
+            elif cmd in (b"set", b"add"):
+                k, ttl, n = parts[1], int(parts[3]), int(parts[4])
+                data = self.rfile.read(n + 2)[:-2]
+                if n > self.server.max_bytes:
+                    self.wfile.write(b"SERVER_ERROR object too large for cache\r\n")
+                    continue
+                with lock:
+                    ent = store.get(k)
+                    exists = ent is not None and (ent[1] == 0 or ent[1] > now)
+                    if cmd == b"add" and exists:
+                        self.wfile.write(b"NOT_STORED\r\n")
+                        continue
+                    store[k] = (data, now + ttl if ttl > 0 else 0)
+                self.wfile.write(b"STORED\r\n")
+            elif cmd == b"incr":
+                k, delta = parts[1], int(parts[2])
+                with lock:
+                    ent = store.get(k)
+                    if ent is None or (ent[1] and ent[1] <= now):
+                        self.wfile.write(b"NOT_FOUND\r\n")
+                        continue
+                    v = int(ent[0]) + delta
+                    store[k] = (str(v).encode(), ent[1])
+                self.wfile.write(b"%d\r\n" % v)
+            elif cmd == b"delete":
+                with lock:
+                    found = store.pop(parts[1], None) is not None
+                self.wfile.write(b"DELETED\r\n" if found else b"NOT_FOUND\r\n")
+            elif cmd == b"flush_all":
+                with lock:
+                    store.clear()
+                self.wfile.write(b"OK\r\n")
+            elif cmd == b"stats":
+                with lock:
+                    n = len(store)
+                self.wfile.write(b"STAT curr_items %d\r\nEND\r\n" % n)
+            elif cmd == b"version":
+                self.wfile.write(b"VERSION 0-standin\r\n")
+            elif cmd == b"quit":
+                return
+            else:
+                self.wfile.write(b"ERROR\r\n")
+
+
+class _StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_stand_in(host: str = "127.0.0.1", port: int = 0, max_bytes: int = 1024 * 1024):
+    """后台线程启动 memcached 替身，返回 (server, 实际端口)；测试结束调用 server.shutdown()。"""
+    server = _StandInServer((host, port), _StandInHandler)
+    server.store, server.lock, server.max_bytes = {}, threading.Lock(), max_bytes
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="纯 Python memcached 文本协议替身（测试 / 无 memcached 环境用）")
+    parser.add_argument("--serve", type=int, default=11311, help="监听端口，默认 11311")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    server, port = start_stand_in(args.host, args.serve)
+    print("memcached 替身已启动: memcached://%s:%d（Ctrl+C 结束）" % (args.host, port), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+内嵌 SQLite 后端（DB_BACKEND=sqlite）：单机 / 桌面版无需 MySQL 服务即可使用 api_data、sync_week 等数据库模式。
+- 连接对象模拟 pymysql 的 DictCursor 用法（cursor() 上下文、%s 占位符、fetchone/fetchall 返回 dict、commit/rollback）；
+- 现有 MySQL 方言语句在执行前改写：INSERT IGNORE、ON DUPLICATE KEY UPDATE ... VALUES(col)、SELECT ... FOR UPDATE [SKIP LOCKED]；
+- 库文件使用 WAL 模式，读者互不阻塞、与单个写者并发；首次连接时按 schema_sqlite.sql 建表。
+初始化并从 frontend/data 等文件导入：python -m backend.db.sqlite_backend --import-files
+"""
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+_SCHEMA_PATH = Path(__file__).resolve().parent / "schema_sqlite.sql"
+_INIT_LOCK = threading.Lock()
+_INITIALIZED = set()
+
+# ON DUPLICATE KEY UPDATE 改写为 ON CONFLICT(主键) DO UPDATE 时使用的冲突目标
+_CONFLICT_KEYS = {
+    "app_config": ("config_key",),
+    "year_weeks": ("year", "week_tag"),
+    "formatted_data": ("year", "week_tag"),
+    "product_strategy": ("year", "week_tag", "strategy_type"),
+    "creative_products": ("year", "week_tag"),
+    "metrics_total": ("year", "week_tag"),
+    "new_products": ("id",),
+    "product_theme_style_mapping": ("id",),
+    "basetable": ("name",),
+    "basetable_rows": ("name", "row_key"),
+    "users": ("username",),
+    "sessions": ("session_id",),
+    "product_history": ("unified_id", "year", "week_tag"),
+    "week_aggregates": ("year", "week_tag", "kind"),
+}
+
+_RE_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?", re.I)
+_RE_ON_DUP = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b(.*)$", re.I | re.S)
+_RE_VALUES_FN = re.compile(r"\bVALUES\s*\(\s*(`?\w+`?)\s*\)", re.I)
+_RE_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE(?:\s+(?:SKIP\s+LOCKED|NOWAIT))?\s*$", re.I)
+_RE_PARAM = re.compile(r"%(s|%)")
+
+
+@lru_cache(maxsize=512)
+def translate(sql: str, with_params: bool = True):
+    """MySQL 方言 -> SQLite，返回 (改写后的 SQL, 是否需要立即加写锁)。无参数执行时不改写 %s（与 pymysql 一致）。"""
+    lock = False
+    out = sql
+    if _RE_FOR_UPDATE.search(out):
+        # SQLite 没有行锁：去掉 FOR UPDATE，改为在事务开始时用 BEGIN IMMEDIATE 取得写锁，读-改-写期间不会被其他写者插入
+        out = _RE_FOR_UPDATE.sub("", out)
+        lock = True
+    out = re.sub(r"^\s*INSERT\s+IGNORE\s+INTO", "INSERT OR IGNORE INTO", out, flags=re.I)
+    m = _RE_ON_DUP.search(out)
+    if m:
+        tm = _RE_INSERT_TABLE.match(out)
+        table = tm.group(1) if tm else ""
+        keys = _CONFLICT_KEYS.get(table)
+        sets = _RE_VALUES_FN.sub(r"excluded.\1", m.group(1))
+        target = "(" + ", ".join(keys) + ")" if keys else ""
+        out = out[: m.start()] + "ON CONFLICT" + target + " DO UPDATE SET" + sets
+    if with_params:
+        # 与 pymysql 的 % 格式化一致：%s 为占位符，%% 为字面量 %
+        out = _RE_PARAM.sub(lambda m: "?" if m.group(1) == "s" else "%", out)
+    return out, lock
+
+
+class SQLiteCursor:
+    """与 pymysql DictCursor 用法一致的最小游标封装。"""
+
+    backend = "sqlite"
+    max_stmt_length = 1024000
+
+    def __init__(self, owner):
+        self._owner = owner
+        self._cur = owner.raw.cursor()
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self._cur.close()
+        except Exception:
+            pass
+
+    def _prepare(self, sql, with_params=True):
+        sql2, lock = translate(sql, with_params)
+        if lock and not self._owner.raw.in_transaction:
+            self._cur.execute("BEGIN IMMEDIATE")
+        return sql2
+
+    def execute(self, sql, params=None):
+        sql2 = self._prepare(sql, params is not None)
+        self._cur.execute(sql2, tuple(params) if params is not None else ())
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        sql2 = self._prepare(sql)
+        self._cur.executemany(sql2, [tuple(p) for p in seq_of_params])
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def _to_dict(self, row):
+        if row is None:
+            return None
+        names = [d[0] for d in self._cur.description or ()]
+        return dict(zip(names, row))
+
+    def fetchone(self):
+        return self._to_dict(self._cur.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cur.fetchmany(size) if size else self._cur.fetchmany()
+        return [self._to_dict(r) for r in rows]
+
+    def fetchall(self):
+        return [self._to_dict(r) for r in self._cur.fetchall()]
+
+
+class SQLiteConnection:
+    """get_connection() 在 DB_BACKEND=sqlite 时返回的连接对象。"""
+
+    backend = "sqlite"
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+def _init_schema(path: Path, raw) -> None:
+    key = str(path)
+    if key in _INITIALIZED:
+        return
+    with _INIT_LOCK:
+        if key in _INITIALIZED:
+            return
+        raw.executescript(_SCHEMA_PATH.read_text(encoding="utf-8"))
+        raw.commit()
+        _INITIALIZED.add(key)
+
+
+def connect(path: Path = None):
+    """打开（必要时创建）SQLite 库，开启 WAL，返回 SQLiteConnection；失败返回 None。"""
+    from .config import get_sqlite_path
+    path = Path(path) if path else get_sqlite_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        raw = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        raw.execute("PRAGMA busy_timeout=30000")
+        _init_schema(path, raw)
+        return SQLiteConnection(raw)
+    except Exception:
+        return None
+
+
+def import_from_files(conn, base_dir: Path = None, workers: int = 4) -> dict:
+    """
+    从文件树导入内嵌库：按周数据走 sync_week_from_files（带摘要跳过），
+    底表 / 上线新游 / 题材画风映射走 sync_maintenance 与同样的 upsert。返回各部分结果。
+    """
+    import json
+    from .config import BASE_DIR
+    from .sync_maintenance import sync_basetable_from_files, sync_new_products_from_file
+    from .sync_week import sync_week_from_files
+
+    base_dir = base_dir or BASE_DIR
+    data_dir = base_dir / "frontend" / "data"
+    result = {"weeks": 0, "weeks_failed": 0}
+    weeks = []
+    if data_dir.is_dir():
+        for year_dir in sorted(data_dir.iterdir()):
+            if not year_dir.is_dir() or not year_dir.name.isdigit():
+                continue
+            tags = set()
+            for p in year_dir.iterdir():
+                if p.is_dir():
+                    tags.add(p.name)
+                elif p.name.endswith("_formatted.json"):
+                    tags.add(p.name[: -len("_formatted.json")])
+            weeks.extend((int(year_dir.name), t) for t in sorted(tags))
+    # SQLite 单写者：按周串行写入即可，解析开销远大于写入
+    for year, week_tag in weeks:
+        if sync_week_from_files(conn, year, week_tag, base_dir):
+            result["weeks"] += 1
+        else:
+            result["weeks_failed"] += 1
+    result["basetable"] = sync_basetable_from_files(conn, base_dir)
+    result["new_products"] = sync_new_products_from_file(conn, base_dir)
+    mapping_path = data_dir / "product_theme_style_mapping.json"
+    if mapping_path.is_file():
+        payload = json.loads(mapping_path.read_text(encoding="utf-8"))
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO product_theme_style_mapping (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
+                (json.dumps(payload, ensure_ascii=False),),
+            )
+        conn.commit()
+        result["product_theme_style_mapping"] = True
+    return result
+
+
+def main():
+    import argparse
+    import sys
+    import time
+    root = Path(__file__).resolve().parent.parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    parser = argparse.ArgumentParser(description="内嵌 SQLite 库：建表并可从 frontend/data 等文件导入")
+    parser.add_argument("--path", default=None, help="库文件路径，默认 SQLITE_PATH 或数据目录下 slg_monitor.db")
+    parser.add_argument("--import-files", action="store_true", help="从 frontend/data、mapping、labels 导入数据")
+    args = parser.parse_args()
+    conn = connect(Path(args.path) if args.path else None)
+    if not conn:
+        print("无法打开 SQLite 库")
+        sys.exit(1)
+    try:
+        if args.import_files:
+            t0 = time.time()
+            res = import_from_files(conn)
+            print(f"导入完成（{time.time() - t0:.1f}s）: {res}")
+        else:
+            print("SQLite 库已就绪")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+子串匹配索引：替代「逐条 for + in 判断」的模糊包含查找，供 api_data 产品名兜底匹配使用。
+匹配语义与原逻辑一致：关键字非空，且 关键字 == 查询串、查询串包含关键字、关键字包含查询串 三者之一；
+多个命中时返回插入顺序最靠前的关键字编号。
+"""
+from bisect import bisect_left
+
+_INF = float("inf")
+_MAX_CHAR = "\U0010ffff"
+
+
+def _prefix_upper(q: str):
+    """返回大于所有以 q 为前缀的字符串的最小串；q 全由最大码位组成时返回 None。"""
+    i = len(q) - 1
+    while i >= 0 and q[i] == _MAX_CHAR:
+        i -= 1
+    if i < 0:
+        return None
+    return q[:i] + chr(ord(q[i]) + 1)
+
+
+class SubstringIndex:
+    """
+    keys 按列表顺序编号（空串/None 保留编号但永不命中）。
+    - 关键字是查询串的子串：Aho-Corasick 自动机，扫描查询串一遍，耗时 O(len(query))；
+    - 查询串是关键字的子串：广义后缀数组二分定位前缀区间 + 线段树区间最小编号，耗时 O(len(query) * log N)。
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._build_automaton()
+        self._build_suffix_array()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _build_automaton(self):
+        goto = [{}]
+        best = [_INF]
+        for kid, key in enumerate(self.keys):
+            if not key:
+                continue
+            node = 0
+            for ch in key:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    best.append(_INF)
+                node = nxt
+            if kid < best[node]:
+                best[node] = kid
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            u = queue[head]
+            head += 1
+            for ch, v in goto[u].items():
+                f = fail[u]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[v] = goto[f].get(ch, 0)
+                # 输出链合并：best[v] 为以该状态结尾的所有关键字中的最小编号
+                if best[fail[v]] < best[v]:
+                    best[v] = best[fail[v]]
+                queue.append(v)
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def _build_suffix_array(self):
+        entries = []
+        for kid, key in enumerate(self.keys):
+            if not key:
+                continue
+            for j in range(len(key)):
+                entries.append((key[j:], kid))
+        entries.sort()
+        self._suffixes = [s for s, _ in entries]
+        n = len(entries)
+        tree = [_INF] * (2 * n)
+        for i, (_, kid) in enumerate(entries):
+            tree[n + i] = kid
+        for i in range(n - 1, 0, -1):
+            tree[i] = min(tree[2 * i], tree[2 * i + 1])
+        self._n = n
+        self._tree = tree
+
+    def _range_min(self, lo: int, hi: int):
+        res = _INF
+        lo += self._n
+        hi += self._n
+        tree = self._tree
+        while lo < hi:
+            if lo & 1:
+                if tree[lo] < res:
+                    res = tree[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                if tree[hi] < res:
+                    res = tree[hi]
+            lo >>= 1
+            hi >>= 1
+        return res
+
+    def _first_key_in_query(self, query: str):
+        """所有「是 query 子串」的关键字中的最小编号。"""
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        res = _INF
+        for ch in query:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best[state] < res:
+                res = best[state]
+        return res
+
+    def _first_key_containing(self, query: str):
+        """所有「包含 query」的关键字中的最小编号。"""
+        lo = bisect_left(self._suffixes, query)
+        upper = _prefix_upper(query)
+        hi = bisect_left(self._suffixes, upper, lo) if upper is not None else self._n
+        if lo >= hi:
+            return _INF
+        return self._range_min(lo, hi)
+
+    def first_match(self, query):
+        """返回第一个与 query 相等或互为包含的关键字编号，无命中返回 None。"""
+        if not query or not self.keys:
+            return None
+        res = min(self._first_key_in_query(query), self._first_key_containing(query))
+        return None if res == _INF else res
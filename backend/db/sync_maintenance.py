@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 """
-上传维护类接口成功后，将对应文件同步到 MySQL（USE_MYSQL 时生效）。
+上传维护类接口成功后，将对应文件同步到数据库（USE_MYSQL 或 DB_BACKEND=sqlite 时生效）。
 - sync_basetable_from_files: 归属表/标签表 Excel → basetable
 - sync_new_products_from_file: frontend/data/new_products.json → new_products
+- append_product_mapping_rows: 按行追加产品归属（basetable_rows，见 basetable_rows.py），不再整表读写
+- export_basetable_to_file: 把库中底表写回 Excel，流水线（step2、generate_target 等读 mapping/*.xlsx）与文件模式读取看到同一份数据
+- mark_basetables_dirty / flush_dirty_basetables: 行级编辑只写库并留下「待写回」标记（{数据根}/cache/basetable_dirty/{表名}），
+  由服务端延迟合并写回，或在流水线 / 整表同步读 xlsx 之前写回；库中数据为准，编辑请求不再整表读写 xlsx
 """
 import json
+import os
+import time
 from pathlib import Path
 
 try:
@@ -12,16 +18,32 @@ try:
 except ImportError:
     pymysql = None
 
+from .basetable_rows import load_table, upsert_rows, write_table
+from .connection import DB_ERRORS, is_sqlite
+
 def _get_base_dir():
     from .config import BASE_DIR
     return BASE_DIR
 
+def _invalidate_basetable():
+    """同进程内（服务端维护接口触发）清掉底表缓存，编辑后立即可见。"""
+    try:
+        from . import api_data
+        api_data.invalidate_basetable()
+    except Exception:
+        pass
+
 def _excel_to_headers_rows(path):
     if not path or not path.is_file():
         return [], []
     try:
         import pandas as pd
-        df = pd.read_excel(path)
+        try:
+            # 与流水线 / 维护页共用映射表缓存，表未改动时不重复解析
+            from pipeline.steps.mapping_cache import read_mapping_table
+        except ImportError:
+            read_mapping_table = pd.read_excel
+        df = read_mapping_table(path)
     except Exception:
         return [], []
     if df.empty:
@@ -42,14 +64,41 @@ def _excel_to_headers_rows(path):
     return headers, rows
 
 
-def sync_basetable_from_files(conn, base_dir: Path = None) -> bool:
-    """将 mapping/、labels/ 下 Excel 同步到 basetable（产品/公司归属、市场T度映射、题材/玩法/画风标签）。"""
-    if not conn or not pymysql:
+def export_basetable_to_file(conn, name: str, path: Path) -> bool:
+    """
+    将库中底表 name（行级表优先）整表写回 xlsx：先写临时文件再替换，读取端不会读到半个文件。
+    调用方需串行化同一张表的导出（导出读的是已提交的最新数据，最后一次导出即为最新）。失败返回 False。
+    """
+    if not conn or (not pymysql and not is_sqlite(conn)):
         return False
-    base_dir = base_dir or _get_base_dir()
+    try:
+        import pandas as pd
+        with conn.cursor() as cur:
+            table = load_table(cur, name)
+        conn.commit()
+        if table is None:
+            return False
+        headers = table["headers"]
+        rows = [list(r) + [""] * (len(headers) - len(r)) for r in table["rows"]]
+        df = pd.DataFrame([r[: len(headers)] for r in rows], columns=headers)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name("%s.tmp%d%s" % (path.stem, os.getpid(), path.suffix))
+        df.to_excel(tmp, index=False)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        if conn:
+            conn.rollback()
+        return False
+
+
+def basetable_sources(base_dir: Path = None) -> dict:
+    """底表名 → mapping/、labels/ 下对应的 xlsx 路径。"""
+    base_dir = Path(base_dir or _get_base_dir())
     mapping_dir = base_dir / "mapping"
     labels_dir = base_dir / "labels"
-    sources = {
+    return {
         "product_mapping": mapping_dir / "产品归属.xlsx",
         "company_mapping": mapping_dir / "公司归属.xlsx",
         "region_t_mapping": mapping_dir / "各地区市场T度映射表.xlsx",
@@ -57,6 +106,109 @@ def sync_basetable_from_files(conn, base_dir: Path = None) -> bool:
         "gameplay_label": labels_dir / "玩法标签表.xlsx",
         "art_style_label": labels_dir / "画风标签表.xlsx",
     }
+
+
+def _dirty_dir(base_dir: Path = None) -> Path:
+    return Path(base_dir or _get_base_dir()) / "cache" / "basetable_dirty"
+
+
+def mark_basetables_dirty(names, base_dir: Path = None) -> None:
+    """库中这些底表已改动、xlsx 待写回（在提交之后调用）。标记落盘，服务重启或其它进程也能写回。"""
+    d = _dirty_dir(base_dir)
+    try:
+        d.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            (d / name).write_text(str(time.time_ns()), encoding="utf-8")
+    except OSError:
+        pass
+
+
+def dirty_basetables(base_dir: Path = None) -> list:
+    d = _dirty_dir(base_dir)
+    if not d.is_dir():
+        return []
+    return sorted(p.name for p in d.iterdir() if p.is_file() and "." not in p.name)
+
+
+_FLUSH_LOCK_STALE_S = 300
+
+
+def _acquire_flush_lock(lock: Path, timeout: float = 120) -> bool:
+    """跨进程串行化写回（服务端与 worker 同时写同一张 xlsx 时，先读库的一方可能后落盘）；超时返回 False。"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            os.close(os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > _FLUSH_LOCK_STALE_S:
+                    lock.unlink()
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                return False
+            time.sleep(0.2)
+
+
+def flush_dirty_basetables(conn, base_dir: Path = None) -> list:
+    """
+    把带「待写回」标记的底表写回 xlsx，返回已写回的表名；写回失败的表保留标记，下次再试。
+    标记先改名为 .flushing 再导出：导出期间又有编辑时会生成新标记，不会被本次清掉。
+    """
+    d = _dirty_dir(base_dir)
+    if not conn or not d.is_dir() or not any(d.iterdir()):
+        return []
+    sources = basetable_sources(base_dir)
+    lock = d / ".flush.lock"
+    if not _acquire_flush_lock(lock):
+        print("⚠️ 等待底表写回锁超时，本次不写回")
+        return []
+    out = []
+    try:
+        # 上次写回中途退出留下的 .flushing 还原为标记
+        for p in d.glob("*.flushing"):
+            marker = d / p.name[: -len(".flushing")]
+            if marker.exists():
+                p.unlink()
+            else:
+                os.replace(p, marker)
+        for name in dirty_basetables(base_dir):
+            marker = d / name
+            if name not in sources:
+                marker.unlink(missing_ok=True)
+                continue
+            flushing = d / (name + ".flushing")
+            try:
+                os.replace(marker, flushing)
+            except OSError:
+                continue
+            if export_basetable_to_file(conn, name, sources[name]):
+                flushing.unlink()
+                out.append(name)
+            elif not marker.exists():
+                os.replace(flushing, marker)
+            else:
+                flushing.unlink()
+    finally:
+        try:
+            lock.unlink()
+        except OSError:
+            pass
+    return out
+
+
+def sync_basetable_from_files(conn, base_dir: Path = None) -> bool:
+    """
+    将 mapping/、labels/ 下 Excel 同步到 basetable（产品/公司归属、市场T度映射、题材/玩法/画风标签）。
+    先写回仍待写回的底表，避免用旧 xlsx 覆盖库中尚未写回的行级编辑。
+    """
+    if not conn or (not pymysql and not is_sqlite(conn)):
+        return False
+    base_dir = base_dir or _get_base_dir()
+    flush_dirty_basetables(conn, base_dir)
+    sources = basetable_sources(base_dir)
     # 标签表缺省表头（文件缺失时仍写入一条空底表记录，保证数据底表 5 张在库中均存在）
     default_label_headers = ["序号", "标签名", "备注"]
     default_region_headers = ["地区", "地区代码", "市场T度"]
@@ -69,14 +221,9 @@ def sync_basetable_from_files(conn, base_dir: Path = None) -> bool:
                 if not headers and not rows and name == "region_t_mapping":
                     headers, rows = default_region_headers, []
                 if headers or rows:
-                    h_val = json.dumps(headers, ensure_ascii=False)
-                    r_val = json.dumps(rows, ensure_ascii=False)
-                    cur.execute(
-                        """INSERT INTO basetable (name, headers, `rows`) VALUES (%s, %s, %s)
-                           ON DUPLICATE KEY UPDATE headers = VALUES(headers), `rows` = VALUES(`rows`)""",
-                        (name, h_val, r_val),
-                    )
+                    write_table(cur, name, headers, rows)
         conn.commit()
+        _invalidate_basetable()
         return True
     except Exception:
         if conn:
@@ -84,12 +231,12 @@ def sync_basetable_from_files(conn, base_dir: Path = None) -> bool:
         return False
 
 
-def _merge_company_mapping_from_rows(conn, rows: list) -> None:
+def _merge_company_mapping_blob(conn, rows: list) -> None:
     """
     将 product 行中的 (发行商, 公司归属) 合并进 basetable 的 company_mapping（仅当两者均非空时）。
     rows: list of [产品名, Unified ID, 产品归属, 题材, 画风, 发行商, 公司归属]，索引 5=发行商，6=公司归属。
     """
-    if not conn or not pymysql or not rows:
+    if not conn or (not pymysql and not is_sqlite(conn)) or not rows:
         return
     comp_headers = ["序号", "发行商", "公司归属"]
     idx_pub, idx_comp = 5, 6
@@ -140,14 +287,14 @@ def _merge_company_mapping_from_rows(conn, rows: list) -> None:
             conn.rollback()
 
 
-def append_product_mapping_rows(conn, new_rows: list) -> int:
+def _append_product_mapping_blob(conn, new_rows: list) -> int:
     """
-    将新行追加到 basetable 的 product_mapping（仅追加 产品归属 不在表中的行）。
+    旧库（无 basetable_rows 表）的整表 JSON 写法：将新行追加到 basetable 的 product_mapping（仅追加 产品归属 不在表中的行）。
     若不空的 发行商/公司归属 存在，会一并合并进 basetable 的 company_mapping。
     new_rows: list of [产品名, Unified ID, 产品归属, 题材, 画风, 发行商, 公司归属]（与 OUT_COLS 顺序一致）。
     返回实际追加条数。
     """
-    if not conn or not pymysql or not new_rows:
+    if not conn or (not pymysql and not is_sqlite(conn)) or not new_rows:
         return 0
     headers = ["产品名（实时更新中）", "Unified ID", "产品归属", "题材", "画风", "发行商", "公司归属"]
     try:
@@ -186,7 +333,7 @@ def append_product_mapping_rows(conn, new_rows: list) -> int:
             )
         conn.commit()
         if to_append:
-            _merge_company_mapping_from_rows(conn, to_append)
+            _merge_company_mapping_blob(conn, to_append)
         return len(to_append)
     except Exception:
         if conn:
@@ -194,9 +341,72 @@ def append_product_mapping_rows(conn, new_rows: list) -> int:
         return 0
 
 
+def _company_pairs(rows: list) -> list:
+    """product 行（索引 5=发行商，6=公司归属）中两者均非空的 (发行商, 公司归属)，同一发行商以后者为准。"""
+    by_pub = {}
+    for r in rows:
+        if not isinstance(r, (list, tuple)) or len(r) <= 6:
+            continue
+        pub = str(r[5]).strip() if r[5] is not None else ""
+        comp = str(r[6]).strip() if r[6] is not None else ""
+        if pub and comp:
+            by_pub[pub] = comp
+    return list(by_pub.items())
+
+
+def append_product_mapping_rows(conn, new_rows: list) -> int:
+    """
+    将新行追加到产品归属表（仅追加 产品归属 不在表中的行），按主键逐行 INSERT IGNORE，不再整表读写；
+    不空的 发行商/公司归属 按发行商逐行 upsert 进公司归属表。两表在同一事务内提交。
+    new_rows: list of [产品名, Unified ID, 产品归属, 题材, 画风, 发行商, 公司归属]（与 OUT_COLS 顺序一致）。
+    旧库未建 basetable_rows 表时退回整表 JSON 读写。返回实际追加条数。
+    """
+    if not conn or (not pymysql and not is_sqlite(conn)) or not new_rows:
+        return 0
+    headers = ["产品名（实时更新中）", "Unified ID", "产品归属", "题材", "画风", "发行商", "公司归属"]
+    rows = []
+    for r in new_rows:
+        if not isinstance(r, (list, tuple)) or len(r) < 7:
+            continue
+        rows.append([str(x).strip() if x is not None else "" for x in r[:7]])
+    if not rows:
+        return 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM basetable WHERE name = %s", ("product_mapping",))
+            if not cur.fetchone():
+                cur.execute(
+                    "INSERT INTO basetable (name, headers, `rows`) VALUES (%s, %s, %s)",
+                    ("product_mapping", json.dumps(headers, ensure_ascii=False), "[]"),
+                )
+            cur.execute("SELECT 1 FROM basetable WHERE name = %s", ("company_mapping",))
+            if not cur.fetchone():
+                cur.execute(
+                    "INSERT INTO basetable (name, headers, `rows`) VALUES (%s, %s, %s)",
+                    ("company_mapping", json.dumps(["序号", "发行商", "公司归属"], ensure_ascii=False), "[]"),
+                )
+            written = upsert_rows(cur, "product_mapping", [dict(zip(headers, r)) for r in rows], only_new=True) or []
+            appended = [[d[h] for h in headers] for d in written]
+            added = len(appended)
+            pairs = _company_pairs(appended)
+            if pairs:
+                upsert_rows(cur, "company_mapping", [{"发行商": p, "公司归属": c} for p, c in pairs], only_new=False)
+        conn.commit()
+        if added:
+            _invalidate_basetable()
+        return added
+    except DB_ERRORS:
+        conn.rollback()
+        return _append_product_mapping_blob(conn, rows)
+    except Exception:
+        if conn:
+            conn.rollback()
+        return 0
+
+
 def sync_new_products_from_file(conn, base_dir: Path = None) -> bool:
     """将 frontend/data/new_products.json 同步到 new_products 表。"""
-    if not conn or not pymysql:
+    if not conn or (not pymysql and not is_sqlite(conn)):
         return False
     base_dir = base_dir or _get_base_dir()
     json_path = base_dir / "frontend" / "data" / "new_products.json"
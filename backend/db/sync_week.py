@@ -3,8 +3,13 @@
 单周数据同步与周索引刷新。
 - refresh_weeks_index: 仅将 (year, week_tag) 加入周索引（数据已写入 MySQL 时用）。
 - sync_week_from_files: 从 frontend/data/{年}/{周}/ 读取 JSON，写入 MySQL 并更新周索引（仅制表后同步用）。
+  按源文件 sha256 与库中 payload_digest 比对，未变化的 payload 不解析、不重写；变化部分与周索引在同一事务内提交。
+  周数据有变化时同时重算该周的物化汇总（week_aggregates），启用列式分析引擎时提交后再导出该周 Parquet。
+- sync_weeks_from_files: 多周并行同步（每个线程独立连接），迁移后整年回灌用。
 """
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
@@ -12,16 +17,75 @@ try:
 except ImportError:
     pymysql = None
 
+from .connection import DB_ERRORS, is_sqlite
+from .payload_codec import payload_columns
+from .product_history import sync_week_product_history
+from .week_aggregates import sync_week_aggregates
+
+# 带 payload_digest 列的按周表：(表名, 主键列)
+_DIGEST_TABLES = {
+    "formatted_data": ("year", "week_tag"),
+    "metrics_total": ("year", "week_tag"),
+    "product_strategy": ("year", "week_tag", "strategy_type"),
+    "creative_products": ("year", "week_tag"),
+}
+
 def _get_base_dir():
     from .config import BASE_DIR
     return BASE_DIR
 
+def _invalidate_week_data():
+    """清掉按周取数与产品时间序列缓存（本进程立即生效；配置共享缓存时递增版本，其它实例随之失效），使新周立即可见。"""
+    try:
+        from . import api_data
+        api_data.invalidate_week_data()
+    except Exception:
+        pass
+
+def _export_analytics(year: int, week_tag: str, payloads: dict) -> None:
+    """启用列式分析引擎（ANALYTICS_ENGINE=duckdb）时把本次变化的 payload 导出为 Parquet；导出失败不影响同步结果。"""
+    try:
+        from . import analytics
+        if analytics.enabled():
+            analytics.export_week(year, week_tag, payloads)
+    except Exception:
+        pass
+
+def _add_week_to_index(cur, year: int, week_tag: str) -> None:
+    """
+    在调用方事务内把 (year, week_tag) 写入 year_weeks 与 app_config.weeks_index。
+    weeks_index 是整段 JSON 的读-改-写，用 SELECT ... FOR UPDATE 锁住该行，多个周并行同步时不会互相覆盖；
+    该周已在索引中时不再重写。
+    """
+    cur.execute("INSERT IGNORE INTO year_weeks (year, week_tag) VALUES (%s, %s)", (year, week_tag))
+    cur.execute("SELECT config_value FROM app_config WHERE config_key = 'weeks_index' FOR UPDATE")
+    row = cur.fetchone()
+    data = {}
+    raw = (row.get("config_value") if isinstance(row, dict) else row[0]) if row else None
+    if raw:
+        try:
+            data = json.loads(raw)
+        except Exception:
+            data = {}
+    year_s = str(year)
+    if year_s not in data or not isinstance(data[year_s], list):
+        data[year_s] = []
+    if week_tag in data[year_s]:
+        return
+    data[year_s].append(week_tag)
+    data[year_s].sort()
+    val = json.dumps(data, ensure_ascii=False)
+    cur.execute(
+        "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
+        ("weeks_index", val),
+    )
+
 def refresh_weeks_index(conn, year: int, week_tag: str) -> bool:
     """
     将 (year, week_tag) 加入 year_weeks 与 app_config.weeks_index，不读文件。
     数据已直接写入 formatted_data/metrics_total 时，调用此接口即可让前端选到该周。
     """
-    if not conn or not pymysql:
+    if not conn or (not pymysql and not is_sqlite(conn)):
         return False
     year = int(year)
     week_tag = (week_tag or "").strip()
@@ -29,26 +93,7 @@ def refresh_weeks_index(conn, year: int, week_tag: str) -> bool:
         return False
     try:
         with conn.cursor() as cur:
-            cur.execute("INSERT IGNORE INTO year_weeks (year, week_tag) VALUES (%s, %s)", (year, week_tag))
-            cur.execute("SELECT config_value FROM app_config WHERE config_key = 'weeks_index'")
-            row = cur.fetchone()
-            data = {}
-            if row and row.get("config_value"):
-                try:
-                    data = json.loads(row["config_value"])
-                except Exception:
-                    data = {}
-            year_s = str(year)
-            if year_s not in data or not isinstance(data[year_s], list):
-                data[year_s] = []
-            if week_tag not in data[year_s]:
-                data[year_s].append(week_tag)
-                data[year_s].sort()
-            val = json.dumps(data, ensure_ascii=False)
-            cur.execute(
-                "INSERT INTO app_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)",
-                ("weeks_index", val),
-            )
+            _add_week_to_index(cur, year, week_tag)
         conn.commit()
         return True
     except Exception:
@@ -57,13 +102,60 @@ def refresh_weeks_index(conn, year: int, week_tag: str) -> bool:
         return False
 
 
+def _load_digests(cur, year: int, week_tag: str):
+    """
+    读取该周各表已存的 payload_digest，返回 {(表名, strategy_type 或 None): digest}。
+    旧库未加 payload_digest 列时返回 None，调用方退化为全量写入（不带摘要列）。
+    """
+    out = {}
+    try:
+        for table in ("formatted_data", "metrics_total", "creative_products"):
+            cur.execute(
+                "SELECT payload_digest FROM " + table + " WHERE year = %s AND week_tag = %s",
+                (year, week_tag),
+            )
+            row = cur.fetchone()
+            if row:
+                out[(table, None)] = row["payload_digest"] if isinstance(row, dict) else row[0]
+        cur.execute(
+            "SELECT strategy_type, payload_digest FROM product_strategy WHERE year = %s AND week_tag = %s",
+            (year, week_tag),
+        )
+        for row in cur.fetchall() or []:
+            stype, digest = (row["strategy_type"], row["payload_digest"]) if isinstance(row, dict) else (row[0], row[1])
+            out[("product_strategy", stype)] = digest
+    except DB_ERRORS:
+        return None
+    return out
+
+
+def _upsert_payload(cur, table: str, key_values: tuple, val: str, digest) -> None:
+    """写入一条按周 payload；按 MYSQL_PAYLOAD_CODEC 决定写 JSON 列还是压缩 blob（见 payload_codec）。"""
+    payload, blob, with_blob = payload_columns(cur, table, val)
+    names = list(_DIGEST_TABLES[table]) + ["payload"]
+    params = key_values + (payload,)
+    if with_blob:
+        names.append("payload_blob")
+        params += (blob,)
+    if digest is not None:
+        names.append("payload_digest")
+        params += (digest,)
+    update = ", ".join(n + " = VALUES(" + n + ")" for n in names[len(key_values):])
+    cur.execute(
+        "INSERT INTO " + table + " (" + ", ".join(names) + ") VALUES (" + ", ".join(["%s"] * len(names)) + ")"
+        " ON DUPLICATE KEY UPDATE " + update,
+        params,
+    )
+
+
 def sync_week_from_files(conn, year: int, week_tag: str, base_dir: Path = None) -> bool:
     """
     从 frontend/data/{year}/{week_tag}/ 及同目录下 {week_tag}_formatted.json 读取，
     写入 formatted_data、metrics_total、product_strategy（old/new）、creative_products，
-    并刷新周索引。2.1/2.2 步拉取完成后调用即可将新数据写入 MySQL。
+    按周增量更新 product_history（产品跨周时间序列）与 week_aggregates（按周物化汇总），并刷新周索引。2.1/2.2 步拉取完成后调用即可将新数据写入 MySQL。
+    源文件内容摘要与库中一致的 payload 直接跳过；全部未变时只确认周索引，近似空操作。
     """
-    if not conn or not pymysql:
+    if not conn or (not pymysql and not is_sqlite(conn)):
         return False
     base_dir = base_dir or _get_base_dir()
     year = int(year)
@@ -71,54 +163,133 @@ def sync_week_from_files(conn, year: int, week_tag: str, base_dir: Path = None)
     data_dir = base_dir / "frontend" / "data" / str(year)
     if not data_dir.is_dir():
         return False
+    week_dir = data_dir / week_tag
+    # (表名, strategy_type, 源文件)
+    sources = [("formatted_data", None, data_dir / (week_tag + "_formatted.json"))]
+    if week_dir.is_dir():
+        sources += [
+            ("metrics_total", None, week_dir / "metrics_total.json"),
+            # 产品维度 product_strategy（2.1 步拉取后产出）
+            ("product_strategy", "old", week_dir / "product_strategy_old.json"),
+            ("product_strategy", "new", week_dir / "product_strategy_new.json"),
+            # 素材维度 creative_products（2.2 步拉取后产出）
+            ("creative_products", None, week_dir / "creative_products.json"),
+        ]
     try:
         with conn.cursor() as cur:
-            # formatted: 可能在 year 目录下 {week_tag}_formatted.json
-            formatted_file = data_dir / (week_tag + "_formatted.json")
-            if formatted_file.is_file():
-                payload = json.loads(formatted_file.read_text(encoding="utf-8"))
-                val = json.dumps(payload, ensure_ascii=False)
-                cur.execute(
-                    """INSERT INTO formatted_data (year, week_tag, payload) VALUES (%s, %s, %s)
-                       ON DUPLICATE KEY UPDATE payload = VALUES(payload)""",
-                    (year, week_tag, val),
-                )
-            week_dir = data_dir / week_tag
-            if week_dir.is_dir():
-                metrics_file = week_dir / "metrics_total.json"
-                if metrics_file.is_file():
-                    payload = json.loads(metrics_file.read_text(encoding="utf-8"))
-                    val = json.dumps(payload, ensure_ascii=False)
-                    cur.execute(
-                        """INSERT INTO metrics_total (year, week_tag, payload) VALUES (%s, %s, %s)
-                           ON DUPLICATE KEY UPDATE payload = VALUES(payload)""",
-                        (year, week_tag, val),
-                    )
-                # 产品维度 product_strategy（2.1 步拉取后产出）
-                for key, stype in (("product_strategy_old", "old"), ("product_strategy_new", "new")):
-                    f = week_dir / (key + ".json")
-                    if f.is_file():
-                        payload = json.loads(f.read_text(encoding="utf-8"))
-                        val = json.dumps(payload, ensure_ascii=False)
-                        cur.execute(
-                            """INSERT INTO product_strategy (year, week_tag, strategy_type, payload) VALUES (%s, %s, %s, %s)
-                               ON DUPLICATE KEY UPDATE payload = VALUES(payload)""",
-                            (year, week_tag, stype, val),
-                        )
-                # 素材维度 creative_products（2.2 步拉取后产出）
-                cp_file = week_dir / "creative_products.json"
-                if cp_file.is_file():
-                    payload = json.loads(cp_file.read_text(encoding="utf-8"))
-                    val = json.dumps(payload, ensure_ascii=False)
-                    cur.execute(
-                        """INSERT INTO creative_products (year, week_tag, payload) VALUES (%s, %s, %s)
-                           ON DUPLICATE KEY UPDATE payload = VALUES(payload)""",
-                        (year, week_tag, val),
+            stored = _load_digests(cur, year, week_tag)
+            use_digest = stored is not None
+            payloads = {}
+            changed = set()
+            for table, stype, path in sources:
+                if not path.is_file():
+                    continue
+                raw = path.read_bytes()
+                digest = hashlib.sha256(raw).hexdigest()
+                if use_digest and stored.get((table, stype)) == digest:
+                    payloads[(table, stype)] = raw
+                    continue
+                payload = json.loads(raw.decode("utf-8"))
+                payloads[(table, stype)] = payload
+                changed.add((table, stype))
+                key_values = (year, week_tag, stype) if stype else (year, week_tag)
+                _upsert_payload(cur, table, key_values, json.dumps(payload, ensure_ascii=False), digest if use_digest else None)
+            # 产品跨周时间序列：监测表或爆量表有变化时，与上面的 payload 同一事务内按周重写；
+            # 旧库未建 product_history 表时跳过，不影响整周同步
+            def parsed(k):
+                # 未变化的 payload 只在下游需要时才解析，且只解析一次
+                v = payloads.get(k)
+                if isinstance(v, bytes):
+                    v = payloads[k] = json.loads(v.decode("utf-8"))
+                return v
+
+            history_keys = (("formatted_data", None), ("product_strategy", "old"), ("product_strategy", "new"))
+            if any(k in changed for k in history_keys):
+                try:
+                    sync_week_product_history(cur, year, week_tag, *[parsed(k) for k in history_keys])
+                except DB_ERRORS:
+                    pass
+            # 按周物化汇总（公司排名、题材 / 画风合计、Top 产品、规则命中数）：监测表、metrics_total 或爆量表有变化时重算；
+            # 旧库未建 week_aggregates 表时跳过
+            aggregate_keys = history_keys + (("metrics_total", None),)
+            if any(k in changed for k in aggregate_keys):
+                try:
+                    sync_week_aggregates(
+                        cur, year, week_tag, parsed(("formatted_data", None)), parsed(("metrics_total", None)),
+                        parsed(("product_strategy", "old")), parsed(("product_strategy", "new")),
                     )
+                except DB_ERRORS:
+                    pass
+            _add_week_to_index(cur, year, week_tag)
         conn.commit()
-        refresh_weeks_index(conn, year, week_tag)
+        if changed:
+            _invalidate_week_data()
+            exported = {k: payloads[k] for k in changed}
+            if any(k in changed for k in history_keys):
+                # 该周 product_history 由三者共同生成，只变了其一时另外两个也要带上
+                exported.update((k, parsed(k)) for k in history_keys if k in payloads)
+            _export_analytics(year, week_tag, exported)
         return True
     except Exception:
         if conn:
             conn.rollback()
         return False
+
+
+def sync_weeks_from_files(weeks, base_dir: Path = None, max_workers: int = 4) -> dict:
+    """
+    多周并行同步：weeks 为 [(year, week_tag), ...]，每个线程各取一个连接执行 sync_week_from_files。
+    不同周写入的主键互不重叠，周索引行由 _add_week_to_index 加锁串行更新。返回 {(year, week_tag): bool}。
+    """
+    from .connection import get_connection
+
+    def one(item):
+        year, week_tag = item
+        conn = get_connection()
+        if not conn:
+            return item, False
+        try:
+            return item, sync_week_from_files(conn, year, week_tag, base_dir)
+        finally:
+            conn.close()
+
+    weeks = [(int(y), str(w)) for y, w in weeks]
+    if not weeks:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(weeks)))) as ex:
+        return dict(ex.map(one, weeks))
+
+
+def main():
+    """python -m backend.db.sync_week --year 2026 [--week 0119-0125] [--workers 4]：按文件回灌指定年/周。"""
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="将 frontend/data 下指定年/周的 JSON 同步到 MySQL（未变化的 payload 自动跳过）")
+    parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
+    parser.add_argument("--week", type=str, default=None, help="周标签，如 0119-0125；不填则同步该年全部周")
+    parser.add_argument("--workers", type=int, default=4, help="并行连接数，默认 4")
+    args = parser.parse_args()
+    base_dir = _get_base_dir()
+    if args.week:
+        weeks = [(args.year, args.week)]
+    else:
+        year_dir = base_dir / "frontend" / "data" / str(args.year)
+        tags = set()
+        if year_dir.is_dir():
+            for p in year_dir.iterdir():
+                if p.is_dir():
+                    tags.add(p.name)
+                elif p.name.endswith("_formatted.json"):
+                    tags.add(p.name[: -len("_formatted.json")])
+        weeks = [(args.year, t) for t in sorted(tags)]
+    t0 = time.time()
+    result = sync_weeks_from_files(weeks, base_dir, args.workers)
+    ok = sum(1 for v in result.values() if v)
+    print(f"同步完成：{ok}/{len(result)} 周成功，耗时 {time.time() - t0:.1f}s")
+    for (y, w), v in sorted(result.items()):
+        if not v:
+            print(f"  失败: {y} {w}")
+
+
+if __name__ == "__main__":
+    main()
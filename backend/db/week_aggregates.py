@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+按周物化汇总（week_aggregates 表）：公司排名、题材 / 画风合计、安装 / 流水 Top 产品、规则命中数。
+- 这些汇总原先每次请求都要读整周 formatted / metrics_total（数 MB）再现场计算；
+  现由 sync_week_from_files 在周数据变化时于同一事务内重算一次，每周每类一行 JSON（数 KB）；
+- /api/data/aggregates/<kind> 直接返回该行，看板无需再拉整周大表；
+- 题材 / 画风合计依赖映射表：映射 JSON 重新生成后由 sync_mapping 写入 product_theme_style_mapping 表并重算各周；
+- 首次上线回填：python -m backend.db.week_aggregates [--year 2026]。
+"""
+import json
+from pathlib import Path
+
+from .payload_codec import fetch_payloads
+from .product_history import _col, _norm, _to_num, extract_week_records
+
+KINDS = ("company", "theme", "top_products", "rule_hits")
+# Top 产品榜单长度
+TOP_N = 50
+
+
+def _to_float(v):
+    """与公司详情面板一致：空 / 无法解析按 0 计。"""
+    n = _to_num(v)
+    return n if n is not None else 0.0
+
+
+def company_totals(metrics_total) -> dict:
+    """
+    按公司归属汇总 metrics_total 的累计安装 / 流水（同一公司内按 Unified ID 或产品名去重，跳过汇总行），
+    返回 { 公司: {"install", "revenue", "products"} }，键顺序为表中首次出现顺序（排名并列时按此顺序）。
+    """
+    out = {}
+    if not isinstance(metrics_total, dict):
+        return out
+    headers = metrics_total.get("headers") or []
+    i_company = _col(headers, "公司归属")
+    i_product = _col(headers, "产品归属")
+    i_uid = _col(headers, "Unified ID")
+    i_inst = _col(headers, "All Time Downloads (WW)")
+    i_rev = _col(headers, "All Time Revenue (WW)")
+    if i_company < 0 or (i_inst < 0 and i_rev < 0):
+        return out
+    seen = {}
+    for r in metrics_total.get("rows") or []:
+        if not r:
+            continue
+        company = _norm(r[i_company]) if i_company < len(r) else ""
+        if not company or "汇总" in company:
+            continue
+        uid = _norm(r[i_uid]) if 0 <= i_uid < len(r) else ""
+        product = _norm(r[i_product]) if 0 <= i_product < len(r) else ""
+        key = uid or product
+        if not key:
+            continue
+        if company not in out:
+            out[company] = {"install": 0.0, "revenue": 0.0, "products": 0}
+            seen[company] = set()
+        if key in seen[company]:
+            continue
+        seen[company].add(key)
+        tot = out[company]
+        tot["products"] += 1
+        tot["install"] += _to_float(r[i_inst] if 0 <= i_inst < len(r) else None)
+        tot["revenue"] += _to_float(r[i_rev] if 0 <= i_rev < len(r) else None)
+    return out
+
+
+def _company_aggregate(metrics_total, records) -> dict:
+    totals = company_totals(metrics_total)
+    by_install = sorted(totals, key=lambda c: totals[c]["install"], reverse=True)
+    rank_revenue = {c: i + 1 for i, c in enumerate(sorted(totals, key=lambda c: totals[c]["revenue"], reverse=True))}
+    week = {}
+    for rec in records.values():
+        company = rec.get("company")
+        if company:
+            w = week.setdefault(company, [0.0, 0.0])
+            w[0] += rec.get("install_this") or 0.0
+            w[1] += rec.get("revenue_this") or 0.0
+    items = []
+    for i, c in enumerate(by_install):
+        w = week.get(c) or (0.0, 0.0)
+        items.append({
+            "company": c,
+            "install": totals[c]["install"],
+            "revenue": totals[c]["revenue"],
+            "products": totals[c]["products"],
+            "rankInstall": i + 1,
+            "rankRevenue": rank_revenue[c],
+            "weekInstall": w[0],
+            "weekRevenue": w[1],
+        })
+    return {"items": items}
+
+
+def _theme_of(mapping, uid, name, metrics_tags):
+    """题材 / 画风：映射表优先按 Unified ID、再按产品名；都没有时用 metrics_total 的题材标签 / 画风标签列。"""
+    m = None
+    if isinstance(mapping, dict):
+        m = (mapping.get("byUnifiedId") or {}).get(uid) or (mapping.get("byProductName") or {}).get(name or "")
+    if isinstance(m, dict) and (m.get("题材") or m.get("画风")):
+        return _norm(m.get("题材")), _norm(m.get("画风"))
+    return metrics_tags.get(uid, ("", ""))
+
+
+def _theme_aggregate(metrics_total, records, mapping) -> dict:
+    tags = {}
+    if isinstance(metrics_total, dict):
+        headers = metrics_total.get("headers") or []
+        i_uid = _col(headers, "Unified ID")
+        i_theme = _col(headers, "题材标签", "题材")
+        i_style = _col(headers, "画风标签", "画风")
+        if i_uid >= 0 and (i_theme >= 0 or i_style >= 0):
+            for r in metrics_total.get("rows") or []:
+                uid = _norm(r[i_uid]) if r and i_uid < len(r) else ""
+                if uid and uid not in tags:
+                    tags[uid] = (
+                        _norm(r[i_theme]) if 0 <= i_theme < len(r) else "",
+                        _norm(r[i_style]) if 0 <= i_style < len(r) else "",
+                    )
+    groups = {"theme": {}, "style": {}}
+    for uid, rec in records.items():
+        theme, style = _theme_of(mapping, uid, rec.get("product_name"), tags)
+        for dim, label in (("theme", theme), ("style", style)):
+            g = groups[dim].setdefault(label or "未分类", {"products": 0, "install": 0.0, "revenue": 0.0})
+            g["products"] += 1
+            g["install"] += rec.get("install_this") or 0.0
+            g["revenue"] += rec.get("revenue_this") or 0.0
+    return {
+        dim: [dict(name=k, **v) for k, v in sorted(g.items(), key=lambda kv: kv[1]["install"], reverse=True)]
+        for dim, g in groups.items()
+    }
+
+
+def _top_aggregate(records) -> dict:
+    def item(uid, rec):
+        return {
+            "unifiedId": uid,
+            "productName": rec.get("product_name"),
+            "company": rec.get("company"),
+            "install": rec.get("install_this"),
+            "installChange": rec.get("install_change"),
+            "revenue": rec.get("revenue_this"),
+            "revenueChange": rec.get("revenue_change"),
+            "strategyType": rec.get("strategy_type"),
+        }
+    out = {}
+    for name, col in (("install", "install_this"), ("revenue", "revenue_this")):
+        ranked = sorted((kv for kv in records.items() if kv[1].get(col) is not None), key=lambda kv: kv[1][col], reverse=True)
+        out[name] = [item(uid, rec) for uid, rec in ranked[:TOP_N]]
+    return out
+
+
+def _rule_hits_aggregate(formatted, records) -> dict:
+    return {
+        "rows": len(formatted.get("rows") or []) if isinstance(formatted, dict) else 0,
+        "products": len(records),
+        "yellow": sum(1 for r in records.values() if r.get("flag_yellow")),
+        "strike": sum(1 for r in records.values() if r.get("flag_strike")),
+        "strategyOld": sum(1 for r in records.values() if r.get("strategy_type") == "old"),
+        "strategyNew": sum(1 for r in records.values() if r.get("strategy_type") == "new"),
+    }
+
+
+def compute_week_aggregates(formatted=None, metrics_total=None, strategy_old=None, strategy_new=None, mapping=None) -> dict:
+    """由单周 payload 计算全部汇总，返回 {kind: dict}（kind 见 KINDS）。"""
+    records = extract_week_records(formatted, strategy_old, strategy_new)
+    return {
+        "company": _company_aggregate(metrics_total, records),
+        "theme": _theme_aggregate(metrics_total, records, mapping),
+        "top_products": _top_aggregate(records),
+        "rule_hits": _rule_hits_aggregate(formatted, records),
+    }
+
+
+def _load_mapping(cur):
+    cur.execute("SELECT payload FROM product_theme_style_mapping WHERE id = 1")
+    row = cur.fetchone()
+    raw = (row["payload"] if isinstance(row, dict) else row[0]) if row else None
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def sync_week_aggregates(cur, year: int, week_tag: str, formatted=None, metrics_total=None,
+                         strategy_old=None, strategy_new=None, mapping=None) -> int:
+    """
+    在调用方事务内重算并写入该周全部汇总（覆盖旧值）。mapping 为 None 时从 product_theme_style_mapping 表读取。
+    四个 payload 全为 None 时不做改动。返回写入行数。
+    """
+    if formatted is None and metrics_total is None and strategy_old is None and strategy_new is None:
+        return 0
+    if mapping is None:
+        mapping = _load_mapping(cur)
+    aggs = compute_week_aggregates(formatted, metrics_total, strategy_old, strategy_new, mapping)
+    cur.executemany(
+        "INSERT INTO week_aggregates (year, week_tag, kind, payload) VALUES (%s, %s, %s, %s)"
+        " ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
+        [(int(year), week_tag, kind, json.dumps(aggs[kind], ensure_ascii=False)) for kind in KINDS],
+    )
+    return len(KINDS)
+
+
+def load_week_aggregate(cur, year: int, week_tag: str, kind: str):
+    """读取某周某类汇总；该周尚未物化时返回 None。"""
+    cur.execute(
+        "SELECT payload FROM week_aggregates WHERE year = %s AND week_tag = %s AND kind = %s",
+        (int(year), week_tag, kind),
+    )
+    row = cur.fetchone()
+    raw = (row["payload"] if isinstance(row, dict) else row[0]) if row else None
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    return json.loads(raw) if raw else None
+
+
+def aggregates_from_files(data_dir, year, week_tag: str, mapping=None) -> dict:
+    """单机文件模式兜底：直接读该周 JSON 现场计算（较慢，与入库结果一致）。"""
+    def read(path):
+        if path.is_file():
+            try:
+                return json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+        return None
+    year_dir = data_dir / str(year)
+    week_dir = year_dir / week_tag
+    return compute_week_aggregates(
+        read(year_dir / (week_tag + "_formatted.json")),
+        read(week_dir / "metrics_total.json"),
+        read(week_dir / "product_strategy_old.json"),
+        read(week_dir / "product_strategy_new.json"),
+        mapping,
+    )
+
+
+def rebuild_week_aggregates(conn, year: int = None) -> int:
+    """全量重建：按 year_weeks 逐周从库中 payload 重算（可只限某年），每周单独提交。返回写入总行数。"""
+    total = 0
+    with conn.cursor() as cur:
+        if year:
+            cur.execute("SELECT year, week_tag FROM year_weeks WHERE year = %s ORDER BY week_tag", (int(year),))
+        else:
+            cur.execute("SELECT year, week_tag FROM year_weeks ORDER BY year, week_tag")
+        weeks = [(r["year"], r["week_tag"]) if isinstance(r, dict) else (r[0], r[1]) for r in cur.fetchall()]
+        mapping = _load_mapping(cur)
+    for y, week_tag in weeks:
+        where, params = "year = %s AND week_tag = %s", (y, week_tag)
+        with conn.cursor() as cur:
+            found = fetch_payloads(cur, "formatted_data", where, params)
+            metrics = fetch_payloads(cur, "metrics_total", where, params)
+            strategies = dict(fetch_payloads(cur, "product_strategy", where, params, extra=("strategy_type",)))
+            total += sync_week_aggregates(
+                cur, y, week_tag,
+                found[0][0] if found else None,
+                metrics[0][0] if metrics else None,
+                strategies.get("old"), strategies.get("new"), mapping,
+            )
+        conn.commit()
+    return total
+
+
+def sync_mapping(conn, base_dir) -> int:
+    """
+    题材 / 画风映射（frontend/data/product_theme_style_mapping.json）重新生成后调用：写入 product_theme_style_mapping 表，
+    与库中不同时按新映射重算各周汇总（库中已无 payload 的归档周保持原值）。返回重算写入行数，映射未变或文件不存在返回 0。
+    """
+    path = Path(base_dir) / "frontend" / "data" / "product_theme_style_mapping.json"
+    if not path.is_file():
+        return 0
+    mapping = json.loads(path.read_text(encoding="utf-8"))
+    with conn.cursor() as cur:
+        if _load_mapping(cur) == mapping:
+            return 0
+        cur.execute(
+            "INSERT INTO product_theme_style_mapping (id, payload) VALUES (1, %s) ON DUPLICATE KEY UPDATE payload = VALUES(payload)",
+            (json.dumps(mapping, ensure_ascii=False),),
+        )
+    conn.commit()
+    return rebuild_week_aggregates(conn)
+
+
+def main():
+    """python -m backend.db.week_aggregates [--year 2026]：按库中已有周数据回填 week_aggregates。"""
+    import argparse
+    import sys
+    from pathlib import Path
+    root = Path(__file__).resolve().parent.parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    parser = argparse.ArgumentParser(description="回填按周物化汇总 week_aggregates")
+    parser.add_argument("--year", type=int, default=None, help="只重建该年")
+    args = parser.parse_args()
+    from backend.db.connection import get_connection
+    conn = get_connection()
+    if not conn:
+        print("无法连接 MySQL，请检查 MYSQL_* 环境变量")
+        sys.exit(1)
+    try:
+        n = rebuild_week_aggregates(conn, args.year)
+    finally:
+        conn.close()
+    print(f"week_aggregates 回填完成：{n} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+旧周归档与按需恢复（保留策略）。
+- 超过保留周数的周：把该周散落在 frontend/data、intermediate、raw_csv、target、final_join、advertisements、countiesdata 下的
+  目录 / 文件打成一个压缩包 archive/{年}/{周}.tar.gz，随后删除原文件，并删除库中该周的大 payload 行
+  （formatted_data / metrics_total / product_strategy / creative_products / country_facts）；
+- 保留：周索引（year_weeks / weeks_index，侧栏仍可选到）、product_history 与 week_aggregates（每周只有几 KB，跨周曲线与看板不受影响）；
+- 归档清单 archive/weeks.json 记录已归档的周，build_weeks_index 据此把它们并入周索引，不再逐个扫描其目录；
+- 首次访问（/api/data/* 带 year+week、前端静态 data / advertisements 下该周文件、第一步 / 第二步流水线）时自动解包恢复，启用数据库时再按文件重新同步该周，之后该周恢复为普通周，
+  下次执行保留策略时若仍超期会再次归档；
+- 同一周的归档与恢复共用 {周}.tar.gz.lock（进程内再加 _LOCK），清单 weeks.json 的读-改-写另有 weeks.json.lock，
+  保留策略与首次访问恢复同时发生时不会删掉刚恢复的文件或丢失清单条目。
+用法：python -m backend.db.week_archive --keep 26 [--dry-run]；恢复单周：--restore 2025 0106-0112；列出：--list。
+"""
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 每周散落的目录 / 文件（相对数据根目录），{year} / {week} 为占位
+WEEK_PATHS = (
+    "frontend/data/{year}/{week}_formatted.json",
+    "frontend/data/{year}/{week}",
+    "intermediate/{year}/{week}",
+    "raw_csv/{year}/{week}",
+    "target/{year}/{week}",
+    "final_join/{year}/{week}",
+    "advertisements/{year}/{week}",
+    "countiesdata/{year}/{week}",
+)
+# 归档时删除该周行的库表（均以 year, week_tag 定位）
+DB_TABLES = ("formatted_data", "metrics_total", "product_strategy", "creative_products", "country_facts")
+ARCHIVE_DIR = "archive"
+MANIFEST = "weeks.json"
+# 未指定 --keep 时的保留周数（WEEK_RETENTION_KEEP，0 表示不归档）
+KEEP_WEEKS = int(os.environ.get("WEEK_RETENTION_KEEP", "0") or 0)
+# 其它进程的恢复锁超过该秒数视为残留
+_STALE_LOCK_S = 600
+
+_LOCK = threading.Lock()
+
+
+def archive_path(root: Path, year, week_tag: str) -> Path:
+    return Path(root) / ARCHIVE_DIR / str(year) / (week_tag + ".tar.gz")
+
+
+def is_archived(root: Path, year, week_tag: str) -> bool:
+    """该周是否处于归档状态（仅一次 stat，可在每个请求上调用）。"""
+    return archive_path(root, year, week_tag).is_file()
+
+
+def load_manifest(root: Path) -> dict:
+    """已归档的周 {年: [周, ...]}；无清单时返回 {}。"""
+    try:
+        data = json.loads((Path(root) / ARCHIVE_DIR / MANIFEST).read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _update_manifest(root: Path, year, week_tag: str, archived: bool) -> None:
+    """清单读-改-写，持 weeks.json.lock：不同周的归档 / 恢复同时更新清单时互不丢失条目。"""
+    path = Path(root) / ARCHIVE_DIR / MANIFEST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _file_lock(path.with_name(MANIFEST + ".lock")):
+        data = load_manifest(root)
+        weeks = set(data.get(str(year)) or [])
+        if archived:
+            weeks.add(week_tag)
+        else:
+            weeks.discard(week_tag)
+        if weeks:
+            data[str(year)] = sorted(weeks)
+        else:
+            data.pop(str(year), None)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _week_paths(root: Path, year, week_tag: str) -> list:
+    out = []
+    for tpl in WEEK_PATHS:
+        p = Path(root) / tpl.format(year=year, week=week_tag)
+        if p.exists():
+            out.append(p)
+    return out
+
+
+def live_weeks(root: Path) -> list:
+    """frontend/data 下仍有散落文件的周 [(年, 周), ...]，按时间升序。"""
+    data_dir = Path(root) / "frontend" / "data"
+    weeks = set()
+    if not data_dir.is_dir():
+        return []
+    for year_dir in data_dir.iterdir():
+        if not (year_dir.is_dir() and year_dir.name.isdigit() and len(year_dir.name) == 4):
+            continue
+        for item in year_dir.iterdir():
+            name = item.name
+            if name.startswith("._"):
+                continue
+            if item.is_file() and name.endswith("_formatted.json"):
+                weeks.add((int(year_dir.name), name[: -len("_formatted.json")]))
+            elif item.is_dir():
+                weeks.add((int(year_dir.name), name))
+    return sorted(weeks)
+
+
+def archive_week(root: Path, year: int, week_tag: str, conn=None) -> dict:
+    """
+    归档单周：写压缩包（先写临时文件，校验成员数后替换）→ 记入清单 → 删除库中该周 payload 行 → 删除散落文件。
+    返回 {"files", "bytes", "archiveBytes"}；该周无散落文件时返回 None。
+    """
+    root = Path(root)
+    target = archive_path(root, year, week_tag)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # 与 restore_week 共用同一把锁：恢复进行中时等待其完成，不会删掉刚解包的文件
+    with _LOCK, _file_lock(target.with_name(target.name + ".lock")):
+        return _archive_locked(root, target, year, week_tag, conn)
+
+
+def _archive_locked(root: Path, target: Path, year: int, week_tag: str, conn=None) -> dict:
+    paths = _week_paths(root, year, week_tag)
+    if not paths:
+        return None
+    tmp = target.with_name(target.name + ".tmp")
+    files = size = 0
+    with tarfile.open(tmp, "w:gz") as tar:
+        for p in paths:
+            tar.add(p, arcname=p.relative_to(root).as_posix())
+        for m in tar.getmembers():
+            if m.isfile():
+                files += 1
+                size += m.size
+    with tarfile.open(tmp, "r:gz") as tar:
+        if sum(1 for m in tar.getmembers() if m.isfile()) != files:
+            tmp.unlink()
+            raise RuntimeError("归档校验失败: %s %s" % (year, week_tag))
+    os.replace(tmp, target)
+    _update_manifest(root, year, week_tag, True)
+    if conn is not None:
+        with conn.cursor() as cur:
+            for table in DB_TABLES:
+                try:
+                    cur.execute("DELETE FROM " + table + " WHERE year = %s AND week_tag = %s", (int(year), week_tag))
+                except Exception:
+                    # 旧库未建 country_facts 等表：跳过
+                    pass
+        conn.commit()
+    for p in paths:
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            p.unlink()
+    return {"files": files, "bytes": size, "archiveBytes": target.stat().st_size}
+
+
+def _acquire_file_lock(lock: Path, timeout: float = 300) -> bool:
+    """跨进程互斥（多个服务实例 / worker 同时首次访问同一归档周）：O_EXCL 建锁文件，超时或锁残留过久时抢占。"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode("ascii"))
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > _STALE_LOCK_S:
+                    lock.unlink()
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                return False
+            time.sleep(0.2)
+
+
+@contextmanager
+def _file_lock(lock: Path):
+    """持有锁文件执行 with 块；超时取不到时抛 TimeoutError。"""
+    if not _acquire_file_lock(lock):
+        raise TimeoutError("等待锁超时: %s" % lock)
+    try:
+        yield
+    finally:
+        try:
+            lock.unlink()
+        except OSError:
+            pass
+
+
+def restore_week(root: Path, year: int, week_tag: str, conn=None) -> bool:
+    """
+    解包恢复单周：文件放回原位（已存在的不覆盖），启用数据库时按文件重新同步该周 payload 与 country_facts，
+    最后删除压缩包并移出清单。该周未归档时返回 False。
+    """
+    root = Path(root)
+    target = archive_path(root, year, week_tag)
+    if not target.is_file():
+        return False
+    lock = target.with_name(target.name + ".lock")
+    with _LOCK:
+        try:
+            with _file_lock(lock):
+                if not target.is_file():
+                    # 等锁期间已被其它进程恢复
+                    return True
+                with tarfile.open(target, "r:gz") as tar:
+                    members = []
+                    for m in tar.getmembers():
+                        dest = (root / m.name).resolve()
+                        if root.resolve() not in dest.parents or (m.isfile() and dest.exists()):
+                            continue
+                        members.append(m)
+                    try:
+                        tar.extractall(root, members=members, filter="data")
+                    except TypeError:
+                        tar.extractall(root, members=members)
+                if conn is not None:
+                    _resync_week(conn, root, year, week_tag)
+                target.unlink()
+                _update_manifest(root, year, week_tag, False)
+                return True
+        except TimeoutError:
+            return False
+
+
+def _resync_week(conn, root: Path, year: int, week_tag: str) -> None:
+    from .country_facts import load_week_files, store_app_facts
+    from .sync_week import sync_week_from_files
+    sync_week_from_files(conn, year, week_tag, root)
+    by_type = load_week_files(root, year, week_tag)
+    if by_type:
+        try:
+            with conn.cursor() as cur:
+                for ptype, facts in by_type.items():
+                    store_app_facts(cur, year, week_tag, ptype, facts)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+
+
+def ensure_week(root: Path, year, week_tag: str) -> bool:
+    """
+    访问某周前调用：未归档时只做一次 stat 即返回 False；已归档时解包恢复（启用数据库时同时回写库）并返回 True，
+    调用方据此清掉取数缓存。
+    """
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return False
+    week_tag = (week_tag or "").strip()
+    if not week_tag or "/" in week_tag or "\\" in week_tag or not is_archived(root, year, week_tag):
+        return False
+    conn = None
+    try:
+        from .config import use_mysql
+        if use_mysql():
+            from .connection import get_connection
+            conn = get_connection()
+        return restore_week(root, year, week_tag, conn)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def apply_retention(root: Path, keep: int, conn=None, dry_run: bool = False) -> list:
+    """保留最近 keep 周的散落文件，更早的逐周归档；返回 [(年, 周, 统计 dict 或 None), ...]。keep<=0 时不做任何事。"""
+    if keep <= 0:
+        return []
+    weeks = live_weeks(root)
+    out = []
+    for year, week_tag in weeks[:-keep] if len(weeks) > keep else []:
+        try:
+            out.append((year, week_tag, None if dry_run else archive_week(root, year, week_tag, conn)))
+        except TimeoutError as e:
+            # 该周正被长时间恢复 / 归档，本轮跳过，下次保留策略再处理
+            print(f"⚠️ 跳过 {year}/{week_tag}: {e}")
+    return out
+
+
+def main():
+    import argparse
+    import sys
+    pkg_root = Path(__file__).resolve().parent.parent.parent
+    if str(pkg_root) not in sys.path:
+        sys.path.insert(0, str(pkg_root))
+    parser = argparse.ArgumentParser(description="旧周归档 / 恢复")
+    parser.add_argument("--keep", type=int, default=KEEP_WEEKS, help="保留最近多少周的散落文件，默认 WEEK_RETENTION_KEEP")
+    parser.add_argument("--dry-run", action="store_true", help="只列出将被归档的周")
+    parser.add_argument("--restore", nargs=2, metavar=("YEAR", "WEEK"), help="恢复单周")
+    parser.add_argument("--list", action="store_true", help="列出已归档的周")
+    parser.add_argument("--root", type=str, default="", help="数据根目录，默认 SLG_MONITOR_DATA_DIR 或项目根")
+    args = parser.parse_args()
+    if args.root:
+        root = Path(args.root).expanduser().resolve()
+    else:
+        from backend.db.config import BASE_DIR
+        env = os.environ.get("SLG_MONITOR_DATA_DIR", "").strip()
+        root = Path(env).expanduser().resolve() if env else BASE_DIR
+    if args.list:
+        for y, weeks in sorted(load_manifest(root).items()):
+            print(f"{y}: {len(weeks)} 周 {', '.join(weeks)}")
+        return
+    conn = None
+    from backend.db.config import use_mysql
+    if use_mysql():
+        from backend.db.connection import get_connection
+        conn = get_connection()
+    try:
+        if args.restore:
+            ok = restore_week(root, int(args.restore[0]), args.restore[1], conn)
+            print("已恢复" if ok else "该周未归档")
+            return
+        if args.keep <= 0:
+            print("未指定保留周数（--keep 或 WEEK_RETENTION_KEEP），不归档")
+            return
+        for year, week_tag, stats in apply_retention(root, args.keep, conn, dry_run=args.dry_run):
+            if stats is None:
+                print(f"  {year} {week_tag}" + ("（将归档）" if args.dry_run else "（无文件）"))
+            else:
+                print(f"  {year} {week_tag}: {stats['files']} 个文件 {stats['bytes'] / 1e6:.1f} MB -> {stats['archiveBytes'] / 1e6:.1f} MB")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
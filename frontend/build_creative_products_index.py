@@ -80,6 +80,18 @@ def build_index_for_week(year: str, week_tag: str) -> dict:
     return result
 
 
+def run(year, week_tag) -> bool:
+    """生成并写入某周的 creative_products.json（供流水线直接调用）。"""
+    index = build_index_for_week(str(year), week_tag)
+    out_dir = DATA_DIR / str(year) / week_tag
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / "creative_products.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"已写: {out_path}")
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(description="生成素材维度产品索引 creative_products.json")
     parser.add_argument("--year", type=str, help="年份，如 2026")
@@ -98,26 +110,13 @@ def main():
             for week_dir in sorted(year_dir.iterdir()):
                 if not week_dir.is_dir():
                     continue
-                week_tag = week_dir.name
-                index = build_index_for_week(year, week_tag)
-                out_dir = DATA_DIR / year / week_tag
-                out_dir.mkdir(parents=True, exist_ok=True)
-                out_path = out_dir / "creative_products.json"
-                with open(out_path, "w", encoding="utf-8") as f:
-                    json.dump(index, f, ensure_ascii=False, indent=2)
-                print(f"已写: {out_path}")
+                run(year, week_dir.name)
         return
 
     if not args.year or not args.week:
         parser.error("请指定 --year 与 --week，或使用 --all 扫描全部")
         return
-    index = build_index_for_week(args.year, args.week)
-    out_dir = DATA_DIR / args.year / args.week
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / "creative_products.json"
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
-    print(f"已写: {out_path}")
+    run(args.year, args.week)
 
 
 if __name__ == "__main__":
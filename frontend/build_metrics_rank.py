@@ -121,15 +121,20 @@ def build_metrics_rank(year: int, week_tag: str) -> bool:
     return True
 
 
+def run(year: int, week_tag: str) -> bool:
+    """供流水线直接调用：无 metrics_total.json 时跳过，不算失败。"""
+    if not build_metrics_rank(year, week_tag):
+        print(f"  ⏭ 未找到或无法解析 data/{year}/{week_tag}/metrics_total.json，跳过")
+    return True
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="根据 metrics_total.json 计算赛道排名，生成 metrics_rank.json")
     parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
     parser.add_argument("--week", type=str, required=True, help="周标签，如 0112-0118")
     args = parser.parse_args()
-    if not build_metrics_rank(args.year, args.week):
-        print(f"  ⏭ 未找到或无法解析 data/{args.year}/{args.week}/metrics_total.json，跳过")
-        raise SystemExit(0)
+    run(args.year, args.week)
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 """
 扫描 frontend/data/{年}/ 下的 {周}_formatted.json 与 {周}/ 目录，
 生成 frontend/data/weeks_index.json，供前端左侧边栏「年/周」选择使用。
+已归档的旧周（见 backend/db/week_archive.py）不再有散落文件，按归档清单 archive/weeks.json 并入索引，首次访问时自动恢复。
 同时计算并写入 data_range（数据起止日期），供前端「数据时间」等展示在跑完脚本后自动更新。
 """
 import json
@@ -98,6 +99,26 @@ def build_weeks_index():
     return index
 
 
+def load_archived_weeks() -> dict:
+    """归档清单 {年: [周, ...]}（数据根目录下 archive/weeks.json）；无归档时返回 {}。"""
+    path = DATA_DIR.parent.parent / "archive" / "weeks.json"
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def merge_archived_weeks(index: dict, archived: dict) -> dict:
+    """把已归档的周并入扫描得到的索引（不修改入参）。"""
+    out = {y: list(w) for y, w in index.items()}
+    for year, weeks in archived.items():
+        if not (str(year).isdigit() and isinstance(weeks, list)):
+            continue
+        out[str(year)] = sorted(set(out.get(str(year), [])) | set(weeks))
+    return dict(sorted(out.items()))
+
+
 def ensure_creative_products_for_all_weeks(index: dict) -> None:
     """为侧栏中每一周确保 data/{年}/{周}/creative_products.json 存在，无则写空，使素材维度与公司/产品维度周期一致。"""
     for year, weeks in index.items():
@@ -115,8 +136,9 @@ def ensure_creative_products_for_all_weeks(index: dict) -> None:
             print(f"  补全空索引: {out_file.relative_to(DATA_DIR)}")
 
 
-def main():
-    index = build_weeks_index()
+def run() -> bool:
+    live = build_weeks_index()
+    index = merge_archived_weeks(live, load_archived_weeks())
     data_range = compute_data_range(index)
     out = dict(index)
     if data_range:
@@ -125,9 +147,15 @@ def main():
     with open(WEEKS_INDEX_FILE, "w", encoding="utf-8") as f:
         json.dump(out, f, ensure_ascii=False, indent=2)
     print(f"✅ 已更新: {WEEKS_INDEX_FILE}" + (f" 数据时间: {data_range['start']} ~ {data_range['end']}" if data_range else ""))
-    ensure_creative_products_for_all_weeks(index)
+    # 只为有散落文件的周补空索引，不把已归档的周重新建出目录
+    ensure_creative_products_for_all_weeks(live)
     for y, wl in sorted(index.items()):
         print(f"   {y}: {len(wl)} 周 {wl[:3]}{'...' if len(wl) > 3 else ''}")
+    return True
+
+
+def main():
+    run()
 
 
 if __name__ == "__main__":
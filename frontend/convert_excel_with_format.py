@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-将Excel文件转换为JSON，保留格式信息（颜色、字体等）
+将数据监测表转为前端 {周}_formatted.json（headers / rows / styles）。
+- 第一步流程中 step5 已直接写出该文件（见 pipeline/steps/formatted_json.py），本脚本用于单独重建；
+- 默认由 step5 同时写出的 monitor_table（表数据）与 monitor_marks（删除线 / 标黄掩码）生成，
+  与 step5 使用同一个 formatted_from_frame，不再打开 xlsx 逐格读回样式；
+- 旧周没有这两张中间表时，回退为读取 output 下的 xlsx 样式并按当前规则补标黄。
 """
 
-import json
 import os
 import re
+import sys
 from pathlib import Path
 
 import pandas as pd
@@ -14,6 +18,11 @@ from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill
 
 BASE_DIR = Path(__file__).parent.parent
+if str(BASE_DIR.resolve()) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR.resolve()))
+
+from pipeline.steps.formatted_json import SUMMARY_ROW_BG, TARGET_ROW_BG, formatted_from_frame, save_formatted
+from pipeline.steps.monitor_rules import build_product_rule_sets, combine_rule_list, load_monitor_rules, normalize_rules, norm_str
 
 
 def _get_data_dir() -> Path:
@@ -31,158 +40,6 @@ def _get_data_dir() -> Path:
 
 
 DATA_DIR = _get_data_dir()
-TARGET_ROW_BG = "#FFF2CC"  # 标黄行黄底（由规则决定）
-SUMMARY_ROW_BG = "#D9E1F2"  # 汇总行浅蓝
-
-
-def _default_monitor_rules() -> dict:
-    return {
-        "version": 1,
-        "delete_rules": [
-            {
-                "conditions": [
-                    {"metric": "当周周安装", "op": "<", "value": 400},
-                    {"metric": "上周周安装", "op": "<", "value": 400},
-                    {"metric": "当周周流水", "op": "<", "value": 20000},
-                    {"metric": "上周周流水", "op": "<", "value": 20000},
-                ]
-            }
-        ],
-        "strike_rules": [
-            {
-                "conditions": [
-                    {"metric": "当周周安装", "op": "<", "value": 400},
-                    {"metric": "上周周安装", "op": "<", "value": 400},
-                    {"metric": "当周周流水", "op": ">=", "value": 20000},
-                ]
-            },
-            {
-                "conditions": [
-                    {"metric": "当周周安装", "op": "<", "value": 400},
-                    {"metric": "上周周安装", "op": "<", "value": 400},
-                    {"metric": "上周周流水", "op": ">=", "value": 20000},
-                ]
-            },
-        ],
-        "yellow_rules": [
-            {
-                "conditions": [
-                    {"metric": "周安装变动", "op": ">=", "value": 20},
-                    {"metric": "当周周安装", "op": ">", "value": 1000},
-                ]
-            }
-        ],
-        "product_rules": {
-            "delete": [],
-            "strike": [],
-            "yellow": [],
-        },
-    }
-
-
-def _load_monitor_rules() -> dict:
-    try:
-        from app.app_paths import get_data_root
-        path = get_data_root() / "config" / "monitor_rules.json"
-        if path.is_file():
-            data = json.loads(path.read_text(encoding="utf-8"))
-            if isinstance(data, dict):
-                return data
-    except Exception:
-        pass
-    return _default_monitor_rules()
-
-
-def _normalize_rules(rules: dict) -> dict:
-    base = _default_monitor_rules()
-    if not isinstance(rules, dict):
-        return base
-    out = {**base, **rules}
-    for key in ("delete_rules", "strike_rules", "yellow_rules"):
-        if not isinstance(out.get(key), list):
-            out[key] = []
-        for idx, rule in enumerate(out[key]):
-            if not isinstance(rule, dict):
-                continue
-            if idx > 0 and rule.get("join") not in ("and", "or"):
-                rule["join"] = "or"
-    pr = out.get("product_rules") if isinstance(out.get("product_rules"), dict) else {}
-    out["product_rules"] = {
-        "delete": pr.get("delete") if isinstance(pr.get("delete"), list) else [],
-        "strike": pr.get("strike") if isinstance(pr.get("strike"), list) else [],
-        "yellow": pr.get("yellow") if isinstance(pr.get("yellow"), list) else [],
-    }
-    return out
-
-
-def _norm_str(val) -> str:
-    return str(val).strip().lower() if val is not None else ""
-
-
-def _eval_condition(val, op, target) -> bool:
-    try:
-        v = float(val)
-        t = float(target)
-    except Exception:
-        return False
-    if op == ">":
-        return v > t
-    if op == ">=":
-        return v >= t
-    if op == "<":
-        return v < t
-    if op == "<=":
-        return v <= t
-    if op == "=":
-        return v == t
-    if op == "!=":
-        return v != t
-    return False
-
-
-def _rule_match(rule: dict, metrics: dict) -> bool:
-    conds = rule.get("conditions") if isinstance(rule, dict) else None
-    if not conds or not isinstance(conds, list):
-        return False
-    any_cond = False
-    for cond in conds:
-        if not isinstance(cond, dict):
-            return False
-        metric = cond.get("metric")
-        op = cond.get("op")
-        target = cond.get("value")
-        if metric not in metrics:
-            return False
-        if op not in (">", ">=", "<", "<=", "=", "!="):
-            return False
-        if target is None or target == "":
-            return False
-        any_cond = True
-        if not _eval_condition(metrics.get(metric), op, target):
-            return False
-    return any_cond
-
-
-def _build_product_rule_sets(product_rules: dict):
-    def _collect(key, by_value):
-        out = set()
-        for item in product_rules.get(key, []):
-            if not isinstance(item, dict):
-                continue
-            if item.get("by") != by_value:
-                continue
-            val = item.get("value")
-            if val is None:
-                continue
-            v = _norm_str(val)
-            if v:
-                out.add(v)
-        return out
-
-    return {
-        "yellow_name": _collect("yellow", "product_name"),
-        "yellow_id": _collect("yellow", "unified_id"),
-    }
 
 
 def _parse_install_change(val):
@@ -265,14 +122,54 @@ def get_cell_style(cell):
     return style
 
 
+def _load_marked_table(year, week_tag, excel_file):
+    """
+    读取 step5 写出的 monitor_table 与 monitor_marks；任一缺失、比数据监测表 / pivot_table 旧（同 generate_target 的判断）
+    或行数不一致时返回 None（回退读 xlsx）。
+    """
+    try:
+        from pipeline.steps.intermediate_io import current_monitor_frame, read_frame
+    except ImportError:
+        return None
+    week_dir = BASE_DIR / "intermediate" / str(year) / week_tag
+    table = current_monitor_frame(week_dir, excel_file, "monitor_table")
+    marks = current_monitor_frame(week_dir, excel_file, "monitor_marks")
+    if table is None or marks is None:
+        return None
+    try:
+        df = read_frame(table)
+        m = read_frame(marks)
+    except Exception as e:
+        print(f"  ⚠️ 无法读取 monitor_table / monitor_marks（{e}），改读数据监测表 xlsx")
+        return None
+    if len(m) != len(df) or "删除线" not in m.columns or "标黄" not in m.columns:
+        return None
+    return df, m["删除线"].to_numpy(dtype=bool), m["标黄"].to_numpy(dtype=bool)
+
+
 def convert_excel_to_json_with_format(year, week_tag):
-    """将Excel文件转换为JSON，保留格式信息"""
+    """生成 {周}_formatted.json：优先由 monitor_table + monitor_marks 生成，旧周回退读取 xlsx 样式。"""
     excel_file = BASE_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx"
     json_file = DATA_DIR / str(year) / f"{week_tag}_formatted.json"
-    
-    if not excel_file.exists():
-        raise FileNotFoundError(f"Excel文件不存在: {excel_file}")
-    
+
+    marked = _load_marked_table(year, week_tag, excel_file)
+    if marked is not None:
+        data = formatted_from_frame(*marked)
+    else:
+        if not excel_file.exists():
+            raise FileNotFoundError(f"Excel文件不存在: {excel_file}")
+        data = _formatted_from_workbook(excel_file)
+
+    save_formatted(data, json_file)
+
+    print(f"✅ 转换完成: {json_file}")
+    print(f"   数据行数: {len(data['rows'])}")
+    print(f"   列数: {len(data['headers'])}")
+    return json_file
+
+
+def _formatted_from_workbook(excel_file) -> dict:
+    """旧周：逐格读回 xlsx 样式，并按当前规则补标黄。"""
     # 使用openpyxl读取格式
     wb = load_workbook(excel_file, data_only=False)
     ws = wb.active
@@ -304,8 +201,8 @@ def convert_excel_to_json_with_format(year, week_tag):
         data["styles"].append(row_styles)
     
     # 标黄规则：按用户配置；汇总行保持浅蓝
-    rules = _normalize_rules(_load_monitor_rules())
-    product_rule_sets = _build_product_rule_sets(rules.get("product_rules", {}))
+    rules = normalize_rules(load_monitor_rules())
+    product_rule_sets = build_product_rule_sets(rules.get("product_rules", {}))
     headers = data["headers"]
     col_company = headers.index("公司归属") if "公司归属" in headers else -1
     col_product = headers.index("产品归属") if "产品归属" in headers else -1
@@ -317,23 +214,10 @@ def convert_excel_to_json_with_format(year, week_tag):
     col_inst_chg = headers.index("周安装变动") if "周安装变动" in headers else -1
     col_rev_chg = headers.index("周流水变动") if "周流水变动" in headers else -1
 
-    def _combine_rule_list(rule_list, metrics):
-        if not rule_list:
-            return False
-        result = _rule_match(rule_list[0], metrics)
-        for rule in rule_list[1:]:
-            join = str((rule or {}).get("join") or "or").strip().lower()
-            match = _rule_match(rule, metrics)
-            if join == "and":
-                result = result and match
-            else:
-                result = result or match
-        return result
-
     def _match_product_rule(product_name, unified_id):
-        if product_name and _norm_str(product_name) in product_rule_sets.get("yellow_name", set()):
+        if product_name and norm_str(product_name) in product_rule_sets.get("yellow_name", set()):
             return True
-        if unified_id and _norm_str(unified_id) in product_rule_sets.get("yellow_id", set()):
+        if unified_id and norm_str(unified_id) in product_rule_sets.get("yellow_id", set()):
             return True
         return False
 
@@ -361,15 +245,12 @@ def convert_excel_to_json_with_format(year, week_tag):
             "周安装变动": inst_chg,
             "周流水变动": rev_chg,
         }
-        yellow_hit = _match_product_rule(product_val, uid_val) or _combine_rule_list(rules.get("yellow_rules", []), metrics)
+        yellow_hit = _match_product_rule(product_val, uid_val) or combine_rule_list(rules.get("yellow_rules", []), metrics)
         if yellow_hit:
             for s in style_row:
                 if not s.get("bg_color"):
                     s["bg_color"] = TARGET_ROW_BG
     
-    # 保存JSON
-    json_file.parent.mkdir(parents=True, exist_ok=True)
-    
     # 将RGB颜色转换为可序列化的格式
     def serialize_style(style):
         result = {}
@@ -409,14 +290,13 @@ def convert_excel_to_json_with_format(year, week_tag):
     for row_styles in data["styles"]:
         serialized_styles.append([serialize_style(s) for s in row_styles])
     data["styles"] = serialized_styles
-    
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    print(f"✅ 转换完成: {json_file}")
-    print(f"   数据行数: {len(data['rows'])}")
-    print(f"   列数: {len(data['headers'])}")
-    return json_file
+    return data
+
+
+def run(year, week_tag) -> bool:
+    """供流水线直接调用；监测表不存在时抛 FileNotFoundError（与命令行一致，视为失败）。"""
+    convert_excel_to_json_with_format(year, week_tag)
+    return True
 
 
 if __name__ == "__main__":
@@ -135,7 +135,7 @@ def convert_target_to_json(target_path: Path, json_path: Path) -> bool:
     return True
 
 
-def run(year: int, week_tag: str) -> None:
+def run(year: int, week_tag: str) -> bool:
     final_dir = BASE_DIR / "final_join" / str(year) / week_tag
     target_dir = BASE_DIR / "target" / str(year) / week_tag / "strategy_target"
     out_dir = DATA_DIR / str(year) / week_tag
@@ -160,6 +160,7 @@ def run(year: int, week_tag: str) -> None:
         # 无 target 或 target 为空时，只写表头
         write_empty_product_strategy_json(json_path)
         print(f"已生成（空表）: {json_path}")
+    return True
 
 
 def main():
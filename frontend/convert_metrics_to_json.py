@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-将 intermediate/{年}/{周}/metrics_total.xlsx 转为 frontend/data/{年}/{周}/metrics_total.json，
+将 intermediate/{年}/{周}/metrics_total（.parquet 或 .xlsx，取较新者）转为 frontend/data/{年}/{周}/metrics_total.json，
 供产品详情页读取「All Time Downloads (WW)」「All Time Revenue (WW)」等关键数据。
 与 _formatted.json 同结构：{ "headers": [...], "rows": [[...], ...] }。
-使用 openpyxl 读取，与 convert_excel_with_format 一致。
+xlsx 使用 openpyxl 读取，与 convert_excel_with_format 一致；流水线第三步写出的 Parquet 用 pandas 读取。
 
 运行示例（使用 Anaconda 虚拟环境 deeppython）:
   conda activate deeppython
@@ -12,12 +12,15 @@
 """
 import json
 import os
+import sys
 from pathlib import Path
 
 from openpyxl import load_workbook
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 INTERMEDIATE_DIR = BASE_DIR / "intermediate"
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
 
 
 def _get_data_dir() -> Path:
@@ -45,14 +48,50 @@ def _cell_value(v):
     return str(v).strip() if v else ""
 
 
+def _read_parquet_rows(path: Path):
+    """读流水线写出的 metrics_total.parquet，单元格取值规则与 openpyxl 读 xlsx 时一致（空→""、整数值浮点→int）。"""
+    from pipeline.steps.intermediate_io import read_frame
+    df = read_frame(path)
+    headers = [_cell_value(c) for c in df.columns]
+    rows = []
+    for row in df.astype(object).values.tolist():
+        row_list = []
+        for v in row:
+            if v is None or (isinstance(v, float) and v != v):
+                row_list.append("")
+            elif isinstance(v, bool):
+                row_list.append(v)
+            elif isinstance(v, float):
+                row_list.append(int(v) if v.is_integer() else v)
+            elif isinstance(v, int):
+                row_list.append(v)
+            else:
+                row_list.append(str(v).strip() if v else "")
+        rows.append(row_list)
+    return headers, rows
+
+
 def convert_metrics_to_json(year: int, week_tag: str) -> bool:
     xlsx_path = INTERMEDIATE_DIR / str(year) / week_tag / "metrics_total.xlsx"
-    if not xlsx_path.exists() or xlsx_path.stat().st_size == 0:
+    try:
+        from pipeline.steps.intermediate_io import frame_path
+        src = frame_path(xlsx_path)
+    except ImportError:
+        src = xlsx_path if xlsx_path.exists() and xlsx_path.stat().st_size > 0 else None
+    if src is None:
         return False
     out_dir = DATA_DIR / str(year) / week_tag
     out_dir.mkdir(parents=True, exist_ok=True)
     json_path = out_dir / "metrics_total.json"
 
+    if src.suffix == ".parquet":
+        try:
+            headers, rows = _read_parquet_rows(src)
+        except Exception as e:
+            print(f"  ⚠️ 无法读取 {src.name}（{e}），跳过")
+            return False
+        return _write_json(json_path, headers, rows)
+
     try:
         # read_only + iter_rows 流式读取，7 万多行时比逐格 cell() 快很多
         wb = load_workbook(xlsx_path, read_only=True, data_only=True)
@@ -79,7 +118,10 @@ def convert_metrics_to_json(year: int, week_tag: str) -> bool:
             rows.append(row_list)
     finally:
         wb.close()
+    return _write_json(json_path, headers, rows)
 
+
+def _write_json(json_path: Path, headers: list, rows: list) -> bool:
     data = {"headers": headers, "rows": rows}
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -91,15 +133,20 @@ def convert_metrics_to_json(year: int, week_tag: str) -> bool:
     return True
 
 
+def run(year: int, week_tag: str) -> bool:
+    """供流水线直接调用：无 metrics_total 时跳过，不算失败。"""
+    if not convert_metrics_to_json(year, week_tag):
+        print(f"  ⏭ 未找到 intermediate/{year}/{week_tag}/metrics_total，跳过")
+    return True
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="将 metrics_total.xlsx 转为 metrics_total.json")
     parser.add_argument("--year", type=int, required=True, help="年份，如 2026")
     parser.add_argument("--week", type=str, required=True, help="周标签，如 0119-0125")
     args = parser.parse_args()
-    if not convert_metrics_to_json(args.year, args.week):
-        print(f"  ⏭ 未找到 intermediate/{args.year}/{args.week}/metrics_total.xlsx，跳过")
-        raise SystemExit(0)
+    run(args.year, args.week)
 
 
 if __name__ == "__main__":
@@ -5485,7 +5485,9 @@
               return;
             }
             if (res.headers != null && res.rows != null) {
-              if (advancedQueryStatus) advancedQueryStatus.textContent = '返回 ' + (res.rows.length || 0) + ' 行';
+              if (advancedQueryStatus) advancedQueryStatus.textContent = '返回 ' + (res.rows.length || 0) + ' 行' + (res.truncated ? '（已达行数上限，完整结果请用 format=csv 导出或按 key 翻页）' : '') +
+                (res.stats && res.stats.elapsedMs != null ? '，耗时 ' + res.stats.elapsedMs + ' ms' : '') +
+                (res.stats && res.stats.rowsExamined != null ? '，扫描 ' + res.stats.rowsExamined + ' 行' : '');
               renderAdvancedQueryResult(res.headers, res.rows);
             } else {
               if (advancedQueryStatus) advancedQueryStatus.textContent = '影响行数: ' + (res.affected != null ? res.affected : 0);
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线任务 worker：从数据库任务队列（pipeline_jobs，见 backend/db/job_queue.py）领取任务并执行，
+与 Web 服务分开部署，可在多台机器 / 多个进程上同时运行（同一周的任务不会被两个 worker 同时执行）。
+
+用法（项目根目录，数据库环境变量与服务端一致）:
+  python -m pipeline.job_worker                 # 常驻，轮询领取
+  python -m pipeline.job_worker --once          # 领取并执行至多一个任务后退出（适合 cron）
+  python -m pipeline.job_worker --kinds phase2_1,phase2_2   # 只处理指定类型（如单独的拉数机器）
+
+任务类型与参数（params）:
+  phase1                 {source_dir?, write_normalized?}  source_dir 非空时先把其中的 {周}-*.csv 复制到 raw_csv/{年}/{周}/
+  phase2_1 / phase2_2    {target, product_type, limit, unified_id?}
+  rebuild_monitor_table  {}        按当前监测规则重建该周数据监测表
+  sync_week              {}        仅把该周文件同步到数据库
+  mapping_update         {path}    合并上传的产品 / 公司归属表（全局任务）
+
+续租失败（任务或周锁已被接管、数据库不可用）即视为失去所有权：置位 task_graph.CANCEL，流水线不再启动新的步骤 / 脚本，
+handler 写库前经 _fence 确认仍持有任务，结束时 finish 只更新本 worker 仍持有的任务。
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import traceback
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+ROOT_DIR = PIPELINE_DIR.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+try:
+    from app.app_paths import get_data_root
+    DATA_ROOT = get_data_root()
+except Exception:
+    DATA_ROOT = ROOT_DIR
+
+_STOP = threading.Event()
+# 正在执行的任务 (job_id, worker)；handler 写库前据此确认所有权
+_CURRENT = {}
+
+
+class LeaseLost(Exception):
+    """任务租约已失效（可能已被其他 worker 接管）：停止执行，不再写库。"""
+
+
+def _fence() -> None:
+    """handler 写库前调用：已失去租约（或无法确认）时置位取消标志并抛出 LeaseLost；不在任务中执行时不检查。"""
+    if not _CURRENT:
+        return
+    from backend.db import job_queue
+    from backend.db.connection import get_connection
+    from pipeline.task_graph import CANCEL
+    owned = False
+    if not CANCEL.is_set():
+        conn = get_connection()
+        if conn:
+            try:
+                owned = job_queue.owns(conn, _CURRENT["job_id"], _CURRENT["worker"])
+            finally:
+                conn.close()
+    if not owned:
+        CANCEL.set()
+        raise LeaseLost("任务 %s 租约已失效，停止写入" % _CURRENT["job_id"])
+
+
+def _invalidate(week: bool = True, weeks_index: bool = False, mapping: bool = False) -> None:
+    """worker 与服务端不在同一进程：配置了共享缓存（SHARED_CACHE_URL）时递增版本，服务端随之失效；否则等缓存 TTL 过期。"""
+    try:
+        from backend.db import api_data
+        if week:
+            api_data.invalidate_week_data()
+        if weeks_index:
+            api_data.invalidate_weeks_index()
+        if mapping:
+            api_data.invalidate_product_theme_style_mapping()
+            api_data.invalidate_basetable()
+    except Exception:
+        pass
+
+
+def _sync_week(year: int, week_tag: str, refresh_index: bool = False) -> bool:
+    from backend.db.connection import get_connection
+    from backend.db.sync_week import refresh_weeks_index, sync_week_from_files
+    _fence()
+    conn = get_connection()
+    if not conn:
+        return False
+    try:
+        ok = sync_week_from_files(conn, year, week_tag, DATA_ROOT)
+        if refresh_index:
+            ok = refresh_weeks_index(conn, year, week_tag) and ok
+    finally:
+        conn.close()
+    _invalidate(week=True, weeks_index=refresh_index)
+    return ok
+
+
+def _run_phase1(year: int, week_tag: str, params: dict):
+    from pipeline.run_full_pipeline import run_frontend_script, run_week
+    source_dir = (params.get("source_dir") or "").strip()
+    if source_dir:
+        csv_files = sorted(Path(source_dir).glob(f"{week_tag}-*.csv"))
+        if len(csv_files) < 13:
+            return False, f"CSV 数量不足 13，仅 {len(csv_files)} 个"
+        dest_dir = DATA_ROOT / "raw_csv" / str(year) / week_tag
+        if dest_dir.exists():
+            shutil.rmtree(dest_dir, ignore_errors=True)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        for f in csv_files:
+            shutil.copy2(f, dest_dir / f.name)
+    report = {}
+    if not run_week(week_tag, year, write_normalized=bool(params.get("write_normalized", False)), report=report):
+        status = report.get("status") or {}
+        if status.get("step1") == "ok" and status.get("generate_target") == "ok":
+            return False, "前端更新执行失败"
+        return False, "第一步流水线执行失败"
+    synced = _sync_week(year, week_tag, refresh_index=True)
+    from pipeline.steps.intermediate_io import has_frame
+    if has_frame(DATA_ROOT / "intermediate" / str(year) / week_tag / "metrics_total.xlsx"):
+        run_frontend_script("convert_metrics_to_json.py", year=year, week_tag=week_tag)
+    return True, "第一步执行完成" + ("，已同步到数据库" if synced else "")
+
+
+def _run_phase2(year: int, week_tag: str, params: dict, fetch_country: bool):
+    from pipeline.run_full_pipeline import classify_single_product_to_target, run_phase2, run_phase3
+    unified_id = (params.get("unified_id") or "").strip() or None
+    label = "2.1 步拉取地区数据" if fetch_country else "2.2 步拉取创意数据"
+    if not run_phase2(
+        week_tag, year,
+        fetch_country=fetch_country,
+        fetch_creatives=not fetch_country,
+        limit=str(params.get("limit") or "all"),
+        target_source=params.get("target") or "strategy",
+        product_type=params.get("product_type") or "both",
+        unified_id=unified_id,
+    ):
+        return False, label + "执行失败"
+    if unified_id:
+        classify_single_product_to_target(year, week_tag, unified_id)
+    if not run_phase3(week_tag, year):
+        return False, "前端更新执行失败"
+    synced = _sync_week(year, week_tag)
+    return True, label + "完成" + ("，已同步到数据库" if synced else "")
+
+
+def _run_rebuild(year: int, week_tag: str, params: dict):
+    from pipeline.run_full_pipeline import run_frontend_script
+    from pipeline.steps.step4_pivot import run_step4
+    from pipeline.steps.step5_final_report import run_step5
+    from pipeline.steps.step5_5_fix_arrow_color import run_step5_5
+    from pipeline.steps.intermediate_io import has_frame
+    from pipeline.steps.pipeline_context import PipelineContext
+    if not has_frame(DATA_ROOT / "intermediate" / str(year) / week_tag / "metrics_total.xlsx"):
+        return True, "该周无 metrics_total，跳过"
+    ctx = PipelineContext(week_tag, year)
+    run_step4(week_tag, year, ctx=ctx)
+    run_step5(week_tag, year, ctx=ctx)
+    run_step5_5(week_tag, year, ctx=ctx)
+    # formatted.json 已由 step5 直接写出
+    run_frontend_script("build_weeks_index.py")
+    _sync_week(year, week_tag)
+    return True, "已重建"
+
+
+def _run_sync_week(year: int, week_tag: str, params: dict):
+    ok = _sync_week(year, week_tag, refresh_index=True)
+    return ok, "已同步到数据库" if ok else "同步失败"
+
+
+def _run_mapping_update(year: int, week_tag: str, params: dict):
+    path = Path(params.get("path") or "")
+    if not path.is_file():
+        return False, "上传文件不存在: %s" % path
+    from scripts.update_mapping_from_upload import run as run_mapping_update
+    from pipeline.run_full_pipeline import run_frontend_script
+    from backend.db.connection import get_connection
+    from pipeline.run_full_pipeline import flush_basetables, sync_theme_style_mapping
+    from backend.db.sync_maintenance import sync_basetable_from_files
+    # 先写回维护页尚未写回的行级编辑，上传内容合并在其基础上
+    flush_basetables()
+    ok, msg = run_mapping_update(path)
+    if ok:
+        run_frontend_script("convert_product_mapping_to_json.py")
+        _fence()
+        conn = get_connection()
+        if conn:
+            try:
+                sync_basetable_from_files(conn, DATA_ROOT)
+            finally:
+                conn.close()
+        # 题材 / 画风合计依赖映射：写入映射表并重算各周汇总
+        _invalidate(week=sync_theme_style_mapping() > 0, mapping=True)
+    return ok, msg
+
+
+HANDLERS = {
+    "phase1": _run_phase1,
+    "phase2_1": lambda y, w, p: _run_phase2(y, w, p, fetch_country=True),
+    "phase2_2": lambda y, w, p: _run_phase2(y, w, p, fetch_country=False),
+    "rebuild_monitor_table": _run_rebuild,
+    "sync_week": _run_sync_week,
+    "mapping_update": _run_mapping_update,
+}
+
+
+def _heartbeat_loop(job: dict, worker: str, done: threading.Event, lease: int) -> None:
+    """
+    执行期间每 1/3 租约续期一次。续期失败（任务或周锁已被接管、数据库出错）即视为失去所有权：
+    置位取消标志，流水线不再启动新的步骤 / 脚本，handler 尽快结束，避免与接管的 worker 同时处理同一周。
+    """
+    from backend.db import job_queue
+    from backend.db.connection import get_connection
+    from pipeline.task_graph import CANCEL
+    while not done.wait(max(5, lease // 3)):
+        conn = get_connection()
+        owned = False
+        if conn:
+            try:
+                owned = job_queue.heartbeat(conn, job["id"], worker, lease)
+            finally:
+                conn.close()
+        if not owned and not done.is_set():
+            print(f"  ⚠️ 任务 {job['id']} 续租失败（可能已被其他 worker 接管），停止执行", flush=True)
+            CANCEL.set()
+            return
+
+
+def run_one(worker: str, kinds=None, lease: int = None) -> bool:
+    """领取并执行一个任务，返回是否领到了任务。"""
+    from backend.db import job_queue
+    from backend.db.connection import get_connection
+    from pipeline.task_graph import CANCEL
+    lease = int(lease or job_queue.LEASE_SECONDS)
+    conn = get_connection()
+    if not conn:
+        return False
+    try:
+        job = job_queue.claim(conn, worker, kinds=kinds, lease=lease)
+    finally:
+        conn.close()
+    if not job:
+        return False
+    year, week_tag = int(job["year"] or 0), job["week_tag"] or ""
+    print(f"▶ 任务 {job['id']} {job['kind']} {year or ''} {week_tag}（第 {job['attempts']} 次）", flush=True)
+    CANCEL.clear()
+    _CURRENT.update(job_id=job["id"], worker=worker)
+    done = threading.Event()
+    hb = threading.Thread(target=_heartbeat_loop, args=(job, worker, done, lease), daemon=True)
+    hb.start()
+    retry = False
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            ok, message = False, "未知任务类型: %s" % job["kind"]
+        else:
+            ok, message = handler(year, week_tag, job["params"] or {})
+    except LeaseLost as e:
+        ok, message, retry = False, str(e), True
+    except Exception as e:
+        # 异常（如网络、数据库临时故障）可重试；处理函数明确返回失败（如 CSV 不足）不重试
+        ok, message, retry = False, "%s\n%s" % (e, traceback.format_exc(limit=5)), True
+    finally:
+        done.set()
+        hb.join(timeout=5)
+        _CURRENT.clear()
+    if CANCEL.is_set():
+        # 中途失去租约：本次结果不可信，按可重试的失败结束（已被他人接管时 finish 不改状态）
+        ok, retry = False, True
+        message = "租约失效，已停止执行" + ("\n" + message if message else "")
+        CANCEL.clear()
+    conn = get_connection()
+    if conn:
+        try:
+            status = job_queue.finish(conn, job, worker, ok, message, retry=retry)
+        finally:
+            conn.close()
+    else:
+        status = "?"
+    print(f"{'✅' if ok else '❌'} 任务 {job['id']} -> {status}: {(message or '').splitlines()[0] if message else ''}", flush=True)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线任务 worker（数据库任务队列）")
+    parser.add_argument("--once", action="store_true", help="至多执行一个任务后退出")
+    parser.add_argument("--kinds", type=str, default="", help="只处理这些类型，逗号分隔")
+    parser.add_argument("--poll", type=float, default=5.0, help="无任务时的轮询间隔（秒），默认 5")
+    parser.add_argument("--lease", type=int, default=None, help="租约秒数，默认 PIPELINE_JOB_LEASE_S 或 120")
+    parser.add_argument("--name", type=str, default="", help="worker 名称，默认 主机名:进程号")
+    args = parser.parse_args()
+
+    from backend.db.config import use_mysql
+    if not use_mysql():
+        print("未启用数据库（USE_MYSQL=1 或 DB_BACKEND=sqlite），任务队列不可用")
+        sys.exit(1)
+    worker = args.name or "%s:%d" % (socket.gethostname(), os.getpid())
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()] or None
+
+    def _on_signal(signum, frame):
+        print("收到退出信号，当前任务完成后退出…", flush=True)
+        _STOP.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+    print(f"worker {worker} 已启动" + (f"，类型: {', '.join(kinds)}" if kinds else ""), flush=True)
+    while not _STOP.is_set():
+        got = run_one(worker, kinds=kinds, lease=args.lease)
+        if args.once:
+            break
+        if not got:
+            _STOP.wait(args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,13 +27,17 @@ import subprocess
 import sys
 import tempfile
 import runpy
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 
 PIPELINE_DIR = Path(__file__).resolve().parent
 ROOT_DIR = PIPELINE_DIR.parent
 STEPS_DIR = PIPELINE_DIR / "steps"
+# 各步骤脚本通过 pipeline.steps.intermediate_io 读写中间表
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+from pipeline import worker_pool
+from pipeline.task_graph import CANCEL, Task, default_workers, run_tasks
 try:
     from app.app_paths import get_data_root
     ADS_ROOT = get_data_root() / "advertisements"
@@ -55,8 +59,20 @@ def _load_script_module(name: str):
     return mod
 
 
-def run_step1_in_process(week_tag: str, year: int, write_normalized: bool = True) -> bool:
-    """第一步制表：在同一进程内顺序执行 step1→step5_5，避免 6 次子进程启动与重复加载，加快整体耗时。"""
+def run_step1_in_process(week_tag: str, year: int, write_normalized: bool = True, force: bool = False) -> bool:
+    """
+    第一步制表：在同一进程内顺序执行 step1→step5_5，避免 6 次子进程启动与重复加载，加快整体耗时。
+    各步之间经 PipelineContext 在内存中交接 DataFrame，中间表只在 PIPELINE_CHECKPOINTS 指定的检查点落盘。
+    输入指纹（见 pipeline/steps/step_memo.py）未变化的开头若干步直接复用上次产出；force=True 或 PIPELINE_MEMO=0 时全部重跑。
+    """
+    import time
+    from pipeline.steps.pipeline_context import PipelineContext
+    from pipeline.steps import step_memo
+    flush_basetables()
+    ctx = PipelineContext(week_tag, year)
+    memo = step_memo.StepMemo(ROOT_DIR, year, week_tag) if step_memo.ENABLED and year else None
+    parent_fp = ""
+    reusing = not force
     steps = [
         ("step1_merge_clean.py", "run_step1"),
         ("step2_mapping.py", "run_step2"),
@@ -66,6 +82,8 @@ def run_step1_in_process(week_tag: str, year: int, write_normalized: bool = True
         ("step5_5_fix_arrow_color.py", "run_step5_5"),
     ]
     for script_name, func_name in steps:
+        if _cancelled(script_name):
+            return False
         mod = _load_script_module(script_name)
         if mod is None:
             print(f"  ❌ 未找到或无法加载: pipeline/steps/{script_name}")
@@ -74,17 +92,30 @@ def run_step1_in_process(week_tag: str, year: int, write_normalized: bool = True
         if fn is None:
             print(f"  ❌ {script_name} 中无函数: {func_name}")
             return False
+        fp = None
+        if memo is not None:
+            try:
+                fp = parent_fp = memo.fingerprint(func_name, parent_fp, mod)
+            except Exception as e:
+                print(f"  ⚠️ {script_name} 计算输入指纹失败（{e}），本次不复用")
+                memo = None
+        # 需要输出 normalized 目录时，只有标准化 CSV 均已是最新才复用 step1
+        if (reusing and fp and memo.is_fresh(func_name, fp, mod)
+                and not (func_name == "run_step1" and write_normalized and not mod.normalized_is_current(week_tag, year))):
+            print(f"  ⏭ {script_name}: 输入未变化，复用上次产出")
+            continue
+        reusing = False
+        kwargs = {"ctx": ctx}
+        if func_name == "run_step1":
+            kwargs["write_normalized"] = write_normalized
+        started_ns = time.time_ns()
         try:
-            if func_name == "run_step1":
-                try:
-                    fn(week_tag, year, write_normalized=write_normalized)
-                except TypeError:
-                    fn(week_tag, year)
-            else:
-                fn(week_tag, year)
+            fn(week_tag, year, **kwargs)
         except Exception as e:
             print(f"  ❌ {script_name} 执行失败: {e}")
             return False
+        if memo is not None and fp:
+            memo.record(func_name, fp, mod, started_ns)
     return True
 
 # 处理数量选项（API 请求阶段）
@@ -152,12 +183,26 @@ def ensure_raw_csv_for_step1(year: int, week_tag: str) -> None:
         print(f"  ⚠️ 无法创建 {year}_raw_csv 链接（{e}）")
 
 
+def _cancelled(name: str) -> bool:
+    """已被取消（task_graph.CANCEL，如任务队列 worker 失去租约）时不再启动新的脚本 / 步骤。"""
+    if CANCEL.is_set():
+        print(f"  ⏹ 已取消，不再执行 {name}")
+        return True
+    return False
+
+
 def run_script(script_name: str, week_tag: str, year: int, extra_args=None) -> bool:
-    """执行 pipeline/steps 下某脚本，传入 --week 与 --year。"""
+    """执行 pipeline/steps 下某脚本，传入 --week 与 --year。提供 run(year, week_tag) 的脚本在常驻进程池中执行。"""
+    if _cancelled(script_name):
+        return False
     script = STEPS_DIR / script_name
     if not script.exists():
         print(f"  ❌ 未找到: {script}")
         return False
+    if not extra_args:
+        ok = worker_pool.call_script(script, "run", (year, week_tag))
+        if ok is not None:
+            return ok
     cmd = [sys.executable, str(script), "--week", week_tag, "--year", str(year)]
     if extra_args:
         cmd.extend(extra_args)
@@ -172,11 +217,17 @@ def run_script(script_name: str, week_tag: str, year: int, extra_args=None) -> b
 
 
 def run_frontend_script(script_name: str, year: int = None, week_tag: str = None, extra_args=None) -> bool:
-    """执行 frontend 下某脚本，可选传入 --year / --week。"""
+    """执行 frontend 下某脚本，可选传入 --year / --week。默认在常驻进程池中调用脚本的 run(year, week_tag) / run()。"""
+    if _cancelled(script_name):
+        return False
     script = ROOT_DIR / "frontend" / script_name
     if not script.exists():
         print(f"  ❌ 未找到: {script}")
         return False
+    if not extra_args:
+        ok = worker_pool.call_script(script, "run", (year, week_tag) if year is not None and week_tag is not None else ())
+        if ok is not None:
+            return ok
     cmd = [sys.executable, str(script)]
     if year is not None:
         cmd.extend(["--year", str(year)])
@@ -195,11 +246,16 @@ def run_frontend_script(script_name: str, year: int = None, week_tag: str = None
 
 
 def run_request_script(script_name: str, extra_args=None) -> bool:
-    """执行 request 下某脚本（ST API 串行、子进程输出不缓冲，日志即时可见）。"""
+    """执行 request 下某脚本（ST API 串行、输出逐行可见）。默认在常驻进程池中调用脚本的 main(argv)。"""
+    if _cancelled(script_name):
+        return False
     script = ROOT_DIR / "request" / script_name
     if not script.exists():
         print(f"  ❌ 未找到: {script}")
         return False
+    ok = worker_pool.call_script(script, "main", (list(extra_args or []),))
+    if ok is not None:
+        return ok
     cmd = [sys.executable, str(script)]
     if extra_args:
         cmd.extend(extra_args)
@@ -275,6 +331,7 @@ def get_target_products_with_limit(
     """
     try:
         import pandas as pd
+        from pipeline.steps.intermediate_io import frame_path, read_frame
     except ImportError:
         print("  ❌ 需要 pandas，请安装: pip install pandas openpyxl")
         return [], []
@@ -297,14 +354,18 @@ def get_target_products_with_limit(
         sub_dir = target_base / sub
         if not sub_dir.exists():
             continue
-        for f in sub_dir.glob("*.xlsx"):
+        # 同名 .parquet / .xlsx 视为同一张表，读取较新者
+        stems = sorted({p.stem for p in sub_dir.iterdir() if p.suffix in (".xlsx", ".parquet")})
+        for f in (sub_dir / (stem + ".xlsx") for stem in stems):
             if sub == "strategy_target" and product_scope in ("old", "new"):
                 if product_scope == "old" and f.name != "target_strategy_old.xlsx":
                     continue
                 if product_scope == "new" and f.name != "target_strategy_new.xlsx":
                     continue
+            if frame_path(f) is None:
+                continue
             try:
-                df = pd.read_excel(f)
+                df = read_frame(f)
                 if col_product not in df.columns:
                     continue
                 has_uid = col_uid in df.columns
@@ -339,15 +400,21 @@ def get_app_ids_from_strategy_file(year: int, week_tag: str, filename: str, limi
     """
     try:
         import pandas as pd
+        from pipeline.steps.intermediate_io import frame_path, read_frame
     except ImportError:
         return []
     target_path = ROOT_DIR / "target" / str(year) / week_tag / "strategy_target" / filename
-    if not target_path.exists():
+    src = frame_path(target_path)
+    if src is None:
         return []
-    head_df = pd.read_excel(target_path, nrows=0)
-    col_uid = "Unified ID" if "Unified ID" in head_df.columns else "产品归属"
-    converters = {col_uid: str} if col_uid in head_df.columns else None
-    df = pd.read_excel(target_path, converters=converters)
+    if src.suffix == ".parquet":
+        df = read_frame(src)
+        col_uid = "Unified ID" if "Unified ID" in df.columns else "产品归属"
+    else:
+        head_df = pd.read_excel(src, nrows=0)
+        col_uid = "Unified ID" if "Unified ID" in head_df.columns else "产品归属"
+        converters = {col_uid: str} if col_uid in head_df.columns else None
+        df = pd.read_excel(src, converters=converters)
     if col_uid not in df.columns:
         return []
     ids = df[col_uid].dropna().astype(str).str.strip().replace("", pd.NA).dropna().unique().tolist()
@@ -384,6 +451,9 @@ def run_step(num: int, week_tag: str, year: int, limit: str = "all", **kwargs) -
         print(f"  ❌ 未知步骤: {num}，可选: 1,2,3,4,5")
         return False
     step_def = STEP_DEFS[num]
+    if num in (2, 5):
+        # 生成目标产品读产品归属表，前端更新读题材/画风映射（步骤 1 在 run_step1_in_process 中写回）
+        flush_basetables()
     # 步骤 3：拉取地区数据（仅支持策略目标；非策略时跳过）。支持 unified_id 单产品拉取。
     if num == 3:
         unified_id = (kwargs.get("unified_id") or "").strip()
@@ -493,79 +563,10 @@ def run_step(num: int, week_tag: str, year: int, limit: str = "all", **kwargs) -
         finally:
             Path(tmp_path).unlink(missing_ok=True)
     # 步骤 5：前端数据更新（公司维度 JSON、产品维度 JSON、素材索引、weeks_index、题材/画风映射）
-    # 并行化：无依赖任务先并行执行，有依赖的再按批执行，减少总耗时
+    # 按依赖图调度（见 frontend_tasks），互不依赖的脚本并行执行
     if num == 5:
         print("\n🔹 步骤 5: 前端数据更新（公司/产品/素材 JSON + 周索引 + 题材/画风映射）[并行]")
-        out_excel = ROOT_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx"
-        metrics_xlsx = ROOT_DIR / "intermediate" / str(year) / week_tag / "metrics_total.xlsx"
-        target_strategy_dir = ROOT_DIR / "target" / str(year) / week_tag / "strategy_target"
-        final_dir = ROOT_DIR / "final_join" / str(year) / week_tag
-        ads_dir = ADS_ROOT / str(year) / week_tag
-
-        def _run_batch(tasks):
-            """执行一批 (label, callable)，全部成功返回 True。冻结版改为串行避免 argv 冲突。"""
-            if not tasks:
-                return True
-            results = {}
-            if hasattr(sys, "_MEIPASS"):
-                for label, fn in tasks:
-                    try:
-                        results[label] = fn()
-                    except Exception as e:
-                        print(f"  ❌ {label} 异常: {e}")
-                        results[label] = False
-            else:
-                with ThreadPoolExecutor(max_workers=min(len(tasks), 6)) as ex:
-                    f2l = {ex.submit(fn): label for label, fn in tasks}
-                    for fut in as_completed(f2l):
-                        label = f2l[fut]
-                        try:
-                            results[label] = fut.result()
-                        except Exception as e:
-                            print(f"  ❌ {label} 异常: {e}")
-                            results[label] = False
-            ok = all(results.values())
-            for label, v in results.items():
-                if not v:
-                    print(f"  ❌ {label} 失败")
-            return ok
-
-        # 批次1：仅依赖 step1/2 产出，彼此无依赖，并行执行
-        batch1 = [
-            ("convert_product_mapping_to_json", lambda: run_frontend_script("convert_product_mapping_to_json.py")),
-        ]
-        if out_excel.exists():
-            batch1.append(("convert_excel_with_format", lambda: run_frontend_script("convert_excel_with_format.py", year=year, week_tag=week_tag)))
-        else:
-            print(f"  ⏭ 跳过 convert_excel_with_format（未找到 {out_excel.name}）")
-        if metrics_xlsx.exists():
-            batch1.append(("convert_metrics_to_json", lambda: run_frontend_script("convert_metrics_to_json.py", year=year, week_tag=week_tag)))
-        else:
-            print(f"  ⏭ 跳过 convert_metrics_to_json（未找到 {metrics_xlsx.relative_to(ROOT_DIR)}）")
-        if target_strategy_dir.exists():
-            batch1.append(("build_final_join", lambda: run_script("build_final_join.py", week_tag, year)))
-        else:
-            print(f"  ⏭ 跳过 build_final_join（未找到 target/{year}/{week_tag}/strategy_target）")
-        if ads_dir.exists():
-            batch1.append(("build_creative_products_index", lambda: run_frontend_script("build_creative_products_index.py", year=year, week_tag=week_tag)))
-        else:
-            print(f"  ⏭ 跳过 build_creative_products_index（未找到 advertisements/{year}/{week_tag}）")
-        if not _run_batch(batch1):
-            return False
-
-        # 批次2：依赖批次1 产出（build_final_join 可能在本轮才生成 final_dir，故重新检查）
-        batch2 = []
-        if metrics_xlsx.exists():
-            batch2.append(("build_metrics_rank", lambda: run_frontend_script("build_metrics_rank.py", year=year, week_tag=week_tag)))
-        # 始终执行：有 final_join 时转表；无时脚本会写空表头 JSON，避免产品维度页整页空白
-        batch2.append(("convert_final_join_to_json", lambda: run_frontend_script("convert_final_join_to_json.py", year=year, week_tag=week_tag)))
-        if not _run_batch(batch2):
-            return False
-
-        # 批次3：周索引（最后执行，汇总所有周）
-        if not run_frontend_script("build_weeks_index.py"):
-            return False
-        return True
+        return run_tasks(frontend_tasks(week_tag, year), workers=_graph_workers())
     # 步骤 1：默认单进程执行；若环境变量 STEP1_USE_SUBPROCESS=1 则改用 6 个子进程（便于对比耗时）
     if num == 1:
         scripts, label = step_def
@@ -589,8 +590,172 @@ def run_step(num: int, week_tag: str, year: int, limit: str = "all", **kwargs) -
     return True
 
 
+def _graph_workers() -> int:
+    """依赖图线程数：冻结版关闭进程池时脚本在本进程内执行（改 sys.argv），只能串行。"""
+    return 1 if hasattr(sys, "_MEIPASS") and not worker_pool.ENABLED else default_workers()
+
+
+def frontend_tasks(week_tag: str, year: int, step1: str = None, target: str = None) -> list:
+    """
+    前端数据更新的任务图。step1 / target 为同一图中制表、生成目标产品任务的名字（整周执行时传入），
+    各脚本只依赖它真正读取的产出：监测表 / metrics_total 就绪即可转 JSON，final_join 等目标产品表。
+    文件是否存在在依赖完成后才检查，本轮新生成的产出也能被后续任务用上。
+    """
+    from pipeline.steps.formatted_json import formatted_is_current
+    from pipeline.steps.intermediate_io import has_frame
+    out_excel = ROOT_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx"
+    metrics_xlsx = ROOT_DIR / "intermediate" / str(year) / week_tag / "metrics_total.xlsx"
+    marks_xlsx = ROOT_DIR / "intermediate" / str(year) / week_tag / "monitor_marks.xlsx"
+    target_strategy_dir = ROOT_DIR / "target" / str(year) / week_tag / "strategy_target"
+    ads_dir = ADS_ROOT / str(year) / week_tag
+    after_step1 = (step1,) if step1 else ()
+    after_target = (target,) if target else after_step1
+
+    def frontend(script, **kw):
+        return lambda: run_frontend_script(script, **kw)
+
+    def convert_mapping():
+        ok = run_frontend_script("convert_product_mapping_to_json.py")
+        if ok:
+            sync_theme_style_mapping()
+        return ok
+
+    tasks = [
+        Task("convert_product_mapping_to_json", convert_mapping),
+        # step5 已直接写出 formatted.json（不旧于掩码 / 监测表 / 规则文件）时不再转换
+        Task(
+            "convert_excel_with_format", frontend("convert_excel_with_format.py", year=year, week_tag=week_tag),
+            deps=after_step1,
+            when=lambda: not formatted_is_current(year, week_tag) and (out_excel.exists() or has_frame(marks_xlsx)),
+            skip_note=f"{week_tag}_formatted.json 已是最新或未找到 {out_excel.name}",
+        ),
+        Task(
+            "convert_metrics_to_json", frontend("convert_metrics_to_json.py", year=year, week_tag=week_tag),
+            deps=after_step1, when=lambda: has_frame(metrics_xlsx),
+            skip_note=f"未找到 intermediate/{year}/{week_tag}/metrics_total",
+        ),
+        Task(
+            "build_metrics_rank", frontend("build_metrics_rank.py", year=year, week_tag=week_tag),
+            deps=("convert_metrics_to_json",), when=lambda: has_frame(metrics_xlsx),
+        ),
+        Task(
+            "build_final_join", lambda: run_script("build_final_join.py", week_tag, year),
+            deps=after_target, when=target_strategy_dir.exists,
+            skip_note=f"未找到 target/{year}/{week_tag}/strategy_target",
+        ),
+        # 始终执行：有 final_join 时转表；无时脚本会写空表头 JSON，避免产品维度页整页空白
+        Task(
+            "convert_final_join_to_json", frontend("convert_final_join_to_json.py", year=year, week_tag=week_tag),
+            deps=("build_final_join",),
+        ),
+        Task(
+            "build_creative_products_index", frontend("build_creative_products_index.py", year=year, week_tag=week_tag),
+            when=ads_dir.exists, skip_note=f"未找到 advertisements/{year}/{week_tag}",
+        ),
+    ]
+    # 周索引汇总所有周的前端数据，最后执行
+    tasks.append(Task("build_weeks_index", frontend("build_weeks_index.py"), deps=[t.name for t in tasks]))
+    return tasks
+
+
+def run_week(week_tag: str, year: int, write_normalized: bool = True, report: dict = None) -> bool:
+    """
+    第一步 + 前端更新作为一张任务图执行：制表 → 生成目标产品 → 依赖目标产品的前端任务，
+    其余前端任务在各自输入就绪后即开始，整周耗时等于关键路径。report 见 task_graph.run_tasks。
+    """
+    ensure_week_restored(year, week_tag)
+    ensure_raw_csv_for_step1(year, week_tag)
+    if write_normalized:
+        step1 = lambda: run_step(1, week_tag, year)
+    else:
+        step1 = lambda: run_step1_in_process(week_tag, year, write_normalized=False)
+    tasks = [
+        Task("step1", step1),
+        Task("generate_target", lambda: run_step(2, week_tag, year), deps=("step1",)),
+    ]
+    tasks += frontend_tasks(week_tag, year, step1="step1", target="generate_target")
+    return run_tasks(tasks, workers=_graph_workers(), report=report)
+
+
+def ensure_week_restored(year: int, week_tag: str) -> None:
+    """该周已被归档（见 backend/db/week_archive.py）时先解包恢复，避免新产出与归档包中的旧文件混在一起。"""
+    try:
+        from app.app_paths import get_data_root
+        root = get_data_root()
+    except Exception:
+        root = ROOT_DIR
+    try:
+        from backend.db.week_archive import ensure_week
+        if ensure_week(root, year, week_tag):
+            print(f"  📦 已从归档恢复 {year} {week_tag}")
+    except Exception as e:
+        print(f"  ⚠️ 归档恢复失败（{e}）")
+
+
+def flush_basetables() -> None:
+    """维护页行级编辑只写库（见 backend/db/sync_maintenance.py）：读 mapping/、labels/ 下 xlsx 之前先把待写回的底表写回。"""
+    try:
+        from app.app_paths import get_data_root
+        root = get_data_root()
+    except Exception:
+        root = ROOT_DIR
+    try:
+        from backend.db.config import use_mysql
+        from backend.db.sync_maintenance import dirty_basetables, flush_dirty_basetables
+        if not use_mysql() or not dirty_basetables(root):
+            return
+        from backend.db.connection import get_connection
+        conn = get_connection()
+    except Exception as e:
+        print(f"  ⚠️ 底表写回失败（{e}），本次读取现有 xlsx")
+        return
+    if not conn:
+        return
+    try:
+        names = flush_dirty_basetables(conn, root)
+        if names:
+            print(f"  📝 已写回底表: {', '.join(names)}")
+    finally:
+        conn.close()
+
+
+def sync_theme_style_mapping() -> int:
+    """
+    题材/画风 JSON 重新生成后调用：启用数据库时写入映射表，映射有变化则按新映射重算各周汇总（见 week_aggregates.sync_mapping）。
+    返回重算写入的行数，未启用数据库或映射未变返回 0。
+    """
+    try:
+        from app.app_paths import get_data_root
+        root = get_data_root()
+    except Exception:
+        root = ROOT_DIR
+    try:
+        from backend.db.config import use_mysql
+        from backend.db.week_aggregates import sync_mapping
+        if not use_mysql():
+            return 0
+        from backend.db.connection import get_connection
+        conn = get_connection()
+    except Exception as e:
+        print(f"  ⚠️ 题材/画风映射入库失败（{e}），周汇总仍按旧映射")
+        return 0
+    if not conn:
+        return 0
+    try:
+        n = sync_mapping(conn, root)
+    except Exception as e:
+        print(f"  ⚠️ 按新映射重算周汇总失败: {e}")
+        return 0
+    finally:
+        conn.close()
+    if n:
+        print(f"  📝 题材/画风映射已更新，重算周汇总 {n} 行")
+    return n
+
+
 def run_phase1(week_tag: str, year: int, write_normalized: bool = True) -> bool:
     """第一步：制作数据监测表 + 获得目标产品表。"""
+    ensure_week_restored(year, week_tag)
     ensure_raw_csv_for_step1(year, week_tag)
     if write_normalized:
         return run_step(1, week_tag, year) and run_step(2, week_tag, year)
@@ -661,20 +826,22 @@ def classify_single_product_to_target(year: int, week_tag: str, unified_id: str)
     """
     try:
         import pandas as pd
+        from pipeline.steps.intermediate_io import current_monitor_frame, frame_path, read_frame, write_frame
     except ImportError:
         print("  ⚠️ 单产品归类需要 pandas，跳过")
         return True
     uid = (unified_id or "").strip()
     if not uid:
         return True
-    # 总表：优先 output 数据监测表，否则 pivot_table
+    # 总表：优先 monitor_table 中间表（即数据监测表的数据，过期时跳过），其次 output 数据监测表，否则 pivot_table
+    week_dir = ROOT_DIR / "intermediate" / str(year) / week_tag
     out_file = ROOT_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx"
-    pivot_file = ROOT_DIR / "intermediate" / str(year) / week_tag / "pivot_table.xlsx"
     df_master = None
-    for path in (out_file, pivot_file):
-        if path.exists():
+    monitor = current_monitor_frame(week_dir, out_file)
+    for path in ([monitor] if monitor is not None else []) + [out_file, week_dir / "pivot_table.xlsx"]:
+        if frame_path(path) is not None:
             try:
-                df_master = pd.read_excel(path)
+                df_master = read_frame(path)
                 break
             except Exception as e:
                 print(f"  ⚠️ 读取总表失败 {path.name}: {e}")
@@ -719,9 +886,9 @@ def classify_single_product_to_target(year: int, week_tag: str, unified_id: str)
         "上周周流水": row.get("上周周流水") if row is not None else "",
         "周流水变动": row.get("周流水变动") if row is not None else "",
     }
-    if target_path.exists():
+    if frame_path(target_path) is not None:
         try:
-            existing = pd.read_excel(target_path)
+            existing = read_frame(target_path)
             col_uid_ex = "Unified ID" if "Unified ID" in existing.columns else "产品归属"
             existing_uids = set(_normalize_uid_for_match(v) for v in existing[col_uid_ex].tolist())
             if _normalize_uid_for_match(uid) in existing_uids:
@@ -730,7 +897,7 @@ def classify_single_product_to_target(year: int, week_tag: str, unified_id: str)
             cols = list(existing.columns)
             new_df = pd.DataFrame([{c: new_row.get(c, "") for c in cols}])
             combined = pd.concat([existing, new_df], ignore_index=True)
-            combined.to_excel(target_path, index=False)
+            write_frame(combined, target_path, xlsx=True)
             print(f"  已按总表上线时间将单产品归入 {filename} 并追加")
         except Exception as e:
             print(f"  ⚠️ 追加单产品到 {filename} 失败: {e}")
@@ -739,7 +906,7 @@ def classify_single_product_to_target(year: int, week_tag: str, unified_id: str)
         try:
             cols = [c for c in base_cols if c in new_row]
             df_out = pd.DataFrame([{c: new_row.get(c, "") for c in cols}])
-            df_out.to_excel(target_path, index=False)
+            write_frame(df_out, target_path, xlsx=True)
             print(f"  已新建 {filename} 并写入单产品（按总表归类）")
         except Exception as e:
             print(f"  ⚠️ 新建 {filename} 写入单产品失败: {e}")
@@ -758,6 +925,7 @@ def run_phase2(
     unified_id: Optional[str] = None,
 ) -> bool:
     """第二步：根据目标产品表调 API。用户已选是否请求地区数据、创意数据、处理数量及策略/非策略目标、新/老产品。unified_id 非空时仅拉取该单产品。"""
+    ensure_week_restored(year, week_tag)
     if not fetch_country and not fetch_creatives:
         print("  第二步未选择任何 API 请求，跳过")
         return True
@@ -808,14 +976,10 @@ def run_pipeline(
     print("=" * 60)
 
     if run_phase1_flag:
-        print("\n🔹 第一步: 制作数据监测表 + 获得目标产品表")
-        if not run_phase1(week_tag, year):
-            print("\n❌ 第一步终止")
-            return False
-        # 第一步结束后自动更新网页
-        print("\n🔹 前端数据更新（第一步完成后自动）")
-        if not run_phase3(week_tag, year):
-            print("\n❌ 前端更新终止")
+        # 第一步与前端更新同图执行：前端任务在各自输入就绪后即开始，不必等整个第一步结束
+        print("\n🔹 第一步: 制作数据监测表 + 获得目标产品表（完成的产出随即更新前端）")
+        if not run_week(week_tag, year):
+            print("\n❌ 第一步 / 前端更新终止")
             return False
     if run_phase2_flag:
         # 第二步前：目标产品超过 100 个时二次确认
@@ -8,23 +8,28 @@
 2. target 表里「Unified ID」列是完整的 24 位 ID 字符串（若被 Excel 存成数字会变成科学计数法，无法匹配 JSON 文件名，获量会为 0）。
 
 输入：
-- target/{年}/{周}/strategy_target/target_strategy_old.xlsx、target_strategy_new.xlsx
+- target/{年}/{周}/strategy_target/target_strategy_old、target_strategy_new（.parquet / .xlsx 取较新者）
 - request/country_data/json/{app_id}.json（或 xlsx）
 - mapping/市场T度.csv
+- 启用数据库（USE_MYSQL=1 或 DB_BACKEND=sqlite）时改从 country_facts 表按 T 度 GROUP BY，缺数据的 app 自动从 JSON 补入
 输出：
 - final_join/{年}/{周}/target_strategy_old_with_ads_all.xlsx、target_strategy_new_with_ads_all.xlsx
 - frontend/data/{年}/{周}/product_strategy_old.json、product_strategy_new.json（自动调用 convert_final_join_to_json，供产品维度页使用）
 """
 import argparse
 import csv
+import importlib.util
 import json
-import subprocess
-import runpy
 import sys
 from pathlib import Path
 
 import pandas as pd
 
+try:
+    from pipeline.steps.intermediate_io import frame_path, read_frame
+except ImportError:  # 直接运行本脚本时
+    from intermediate_io import frame_path, read_frame
+
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 TARGET_BASE = BASE_DIR / "target"
 # 地区数据优先从 countiesdata（仿照 advertisements）读取，再回退到 request/country_data
@@ -134,6 +139,51 @@ def build_tier_df(app_ids: list, country_to_tier: dict, year: int = None, week_t
     return pd.DataFrame(rows)
 
 
+def _tier_df_from_db(app_ids: list, country_to_tier: dict, year: int, week_tag: str, product_type: str):
+    """
+    启用数据库时的 T 度汇总：country_facts 按 T 度 GROUP BY（地区数据拉取时已写入）；
+    该周库中缺数据的 app（旧周或拉取时未启用数据库）先从地区 JSON 补入一次。
+    返回 (tier_df, 有地区数据的 app 数)；未启用数据库或失败返回 None，调用方退回逐个读 JSON。
+    """
+    try:
+        from backend.db import country_facts as cf
+        from backend.db.config import use_mysql
+        from backend.db.connection import get_connection
+    except ImportError:
+        return None
+    if not use_mysql():
+        return None
+    conn = get_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cf.sync_country_tiers(cur, country_to_tier)
+            have = cf.apps_with_facts(cur, year, week_tag, product_type, app_ids)
+            missing = {}
+            for app_id in app_ids:
+                if app_id in have:
+                    continue
+                facts = cf.country_rows(load_country_data_for_app(app_id, year=year, week_tag=week_tag, product_type=product_type))
+                if facts:
+                    missing[app_id] = facts
+            if missing:
+                cf.store_app_facts(cur, year, week_tag, product_type, missing)
+                print(f"  country_facts 补入 {len(missing)} 个 app 的地区数据")
+            aggs = cf.tier_aggregates(cur, year, week_tag, product_type, app_ids)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"  ⚠️ country_facts 汇总失败，改为逐个读取地区 JSON: {e}")
+        return None
+    finally:
+        conn.close()
+    empty = {c: 0 for c in INSTALL_COLS + REVENUE_COLS}
+    rows = [dict(aggs.get(app_id) or empty, app_id=app_id) for app_id in app_ids]
+    df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["app_id"] + INSTALL_COLS + REVENUE_COLS)
+    return df, len(aggs)
+
+
 def _normalize_app_id(val):
     """Excel 可能把 Unified ID 存成数字/科学计数法，转为字符串；24 位 hex 原样保留。"""
     if pd.isna(val):
@@ -180,14 +230,20 @@ def run(year: int, week_tag: str) -> bool:
         ("new", "target_strategy_new.xlsx", "strategy_new"),
     ]:
         target_path = target_dir / filename
-        if not target_path.exists():
+        src = frame_path(target_path)
+        if src is None:
             print(f"  跳过（不存在）: {target_path}")
             continue
-        # 先读表头，确定 Unified ID 列名，再整表读取时将该列强制为字符串（避免 Excel 科学计数法）
-        head_df = pd.read_excel(target_path, nrows=0)
-        col_uid = _find_uid_column(head_df)
-        converters = {col_uid: str} if col_uid else None
-        target_df = pd.read_excel(target_path, converters=converters)
+        if src.suffix == ".parquet":
+            # Parquet 保留列类型，Unified ID 本就是字符串
+            target_df = read_frame(target_path)
+            col_uid = _find_uid_column(target_df)
+        else:
+            # 先读表头，确定 Unified ID 列名，再整表读取时将该列强制为字符串（避免 Excel 科学计数法）
+            head_df = pd.read_excel(src, nrows=0)
+            col_uid = _find_uid_column(head_df)
+            converters = {col_uid: str} if col_uid else None
+            target_df = pd.read_excel(src, converters=converters)
         col_product = "产品归属"
         if col_uid and col_uid in target_df.columns:
             target_df[col_uid] = target_df[col_uid].apply(_normalize_app_id)
@@ -204,8 +260,14 @@ def run(year: int, week_tag: str) -> bool:
         sci_ids = [aid for aid in app_ids if "e+" in (aid or "").lower() or "e-" in (aid or "").lower()]
         if sci_ids:
             print(f"  ⚠️ {filename}: 部分 Unified ID 为科学计数法（共 {len(sci_ids)} 个），无法匹配 country_data，这些行 4 市场获量为 0；建议在 target 表中将该列设为「文本」")
-        # 检查是否有 country_data 可读（便于排查全 0）；优先 countiesdata/{年}/{周}/strategy_old|strategy_new、countiesdata/all、request/country_data
-        n_with_data = sum(1 for aid in app_ids if load_country_data_for_app(aid, year=year, week_tag=week_tag, product_type=product_type))
+        # 启用数据库时 T 度汇总走 country_facts（SQL GROUP BY），否则逐个读地区 JSON 汇总
+        from_db = _tier_df_from_db(app_ids, country_to_tier, year, week_tag, product_type)
+        if from_db is not None:
+            tier_df, n_with_data = from_db
+        else:
+            # 检查是否有 country_data 可读（便于排查全 0）；优先 countiesdata/{年}/{周}/strategy_old|strategy_new、countiesdata/all、request/country_data
+            n_with_data = sum(1 for aid in app_ids if load_country_data_for_app(aid, year=year, week_tag=week_tag, product_type=product_type))
+            tier_df = build_tier_df(app_ids, country_to_tier, year=year, week_tag=week_tag, product_type=product_type)
         if n_with_data == 0:
             sample_dirs = [COUNTIESDATA_BASE / str(year) / week_tag / product_type / "json", LEGACY_COUNTRY_JSON]
             existing = []
@@ -221,7 +283,6 @@ def run(year: int, week_tag: str) -> bool:
             print(f"     建议: 对该周先执行步骤 3（拉取地区数据，仅写 json），再执行步骤 5（前端更新 + MySQL 同步）")
         else:
             print(f"  {filename}: 已匹配 {n_with_data}/{len(app_ids)} 个 app 的地区数据 → 写入四个市场获量")
-        tier_df = build_tier_df(app_ids, country_to_tier, year=year, week_tag=week_tag, product_type=product_type)
         join_key = col_uid if col_uid in target_df.columns else col_product
         if col_uid in target_df.columns:
             target_df[join_key] = target_df[col_uid].apply(_normalize_app_id)
@@ -242,25 +303,16 @@ def run(year: int, week_tag: str) -> bool:
         out_path = final_dir / out_name
         merged.to_excel(out_path, index=False)
         print(f"  已写 final_join: {out_path}")
-    # 同步生成前端用 JSON（产品维度页读 data/{年}/{周}/product_strategy_*.json）
+    # 同步生成前端用 JSON（产品维度页读 data/{年}/{周}/product_strategy_*.json）：直接调用转换脚本的 run，不另起解释器
     convert_script = BASE_DIR / "frontend" / "convert_final_join_to_json.py"
     if convert_script.exists():
         try:
-            if hasattr(sys, "_MEIPASS"):
-                old_argv = sys.argv[:]
-                try:
-                    sys.argv = [str(convert_script), "--year", str(year), "--week", week_tag]
-                    runpy.run_path(str(convert_script), run_name="__main__")
-                finally:
-                    sys.argv = old_argv
-            else:
-                subprocess.run(
-                    [sys.executable, str(convert_script), "--year", str(year), "--week", week_tag],
-                    check=True,
-                    cwd=str(BASE_DIR),
-                )
-        except subprocess.CalledProcessError as e:
-            print(f"  ⚠️ 生成前端 JSON 失败（退出码 {e.returncode}），产品维度页可能仍为旧数据")
+            spec = importlib.util.spec_from_file_location("convert_final_join_to_json", convert_script)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            mod.run(year, week_tag)
+        except Exception as e:
+            print(f"  ⚠️ 生成前端 JSON 失败（{e}），产品维度页可能仍为旧数据")
     else:
         print(f"  ⚠️ 未找到 {convert_script}，跳过生成前端 JSON")
     return True
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+前端大盘表格数据 {周}_formatted.json（headers / rows / styles）的生成。
+- step5 算出监测表与规则掩码后直接调用 write_formatted_json 写出，不经过 xlsx；
+  只部署网页端时可关闭数据监测表 xlsx（PIPELINE_REPORT_XLSX=0），前端数据不受影响；
+- frontend/convert_excel_with_format.py 复用 formatted_from_frame（由 monitor_table + monitor_marks 重建），
+  旧周没有中间表时仍读回 xlsx 样式；
+- formatted_is_current 判断现有 JSON 是否已不旧于其来源（掩码 / 监测表 / 规则文件），前端更新据此跳过重复转换。
+"""
+import json
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+TARGET_ROW_BG = "#FFF2CC"  # 标黄行黄底（由规则决定）
+SUMMARY_ROW_BG = "#D9E1F2"  # 汇总行浅蓝
+HEADER_BG = "#4F81BD"  # 表头深蓝
+STRIKE_FONT = "#FF0000"  # 划删除线的产品名
+UP_FONT = "#FF0000"  # 周变动上升
+DOWN_FONT = "#00B050"  # 周变动下降
+
+
+def frontend_data_dir() -> Path:
+    """与前端脚本一致：{数据根}/frontend/data。"""
+    try:
+        from app.app_paths import get_data_root
+        return get_data_root() / "frontend" / "data"
+    except Exception:
+        return BASE_DIR / "frontend" / "data"
+
+
+def formatted_json_path(year, week_tag: str) -> Path:
+    return frontend_data_dir() / str(year) / f"{week_tag}_formatted.json"
+
+
+def _cell_text(v) -> str:
+    """
+    与「DataFrame 写入 xlsx 再由 openpyxl 读回后 str()」一致：空值 / 无穷为空串；
+    数字按 openpyxl 写入格式 %.16g 取 16 位有效数字，读回时无小数点与指数的为整数（1000.0 → "1000"）。
+    """
+    if v is None or v is pd.NA or v is pd.NaT:
+        return ""
+    if hasattr(v, "item") and not isinstance(v, (str, bytes)):
+        # numpy 标量
+        v = v.item()
+    if isinstance(v, bool):
+        return str(v)
+    if isinstance(v, (int, float)):
+        if v != v or v in (float("inf"), float("-inf")):
+            return ""
+        text = "%.16g" % v
+        return str(float(text)) if ("." in text or "e" in text) else str(int(text))
+    return str(v)
+
+
+def _cell_style(font_color=None, bg_color=None):
+    style = {}
+    if font_color:
+        style["font_color"] = font_color
+    if bg_color:
+        style["bg_color"] = bg_color
+    return style or None
+
+
+def formatted_from_frame(df: pd.DataFrame, strike, yellow) -> dict:
+    """
+    由监测表数据与规则掩码（strike / yellow，与 df 行对齐）直接生成 formatted.json 内容，着色与数据监测表一致：
+    表头深蓝加粗；公司汇总行浅蓝；标黄行黄底；划删除线的产品名红字；周变动列下降绿字、其余红字。
+    """
+    headers = [str(c) for c in df.columns]
+    idx = {h: i for i, h in enumerate(headers)}
+    col_company = idx.get("公司归属", -1)
+    col_product = idx.get("产品归属", -1)
+    arrow_cols = [idx[h] for h in ("周安装变动", "周流水变动") if h in idx]
+    rows = [[_cell_text(v) for v in row] for row in df.itertuples(index=False, name=None)]
+    styles = [[{"bg_color": HEADER_BG, "bold": True} for _ in headers]]
+    for i, row in enumerate(rows):
+        if col_company >= 0 and row[col_company].strip().endswith("汇总"):
+            bg = SUMMARY_ROW_BG
+        elif yellow[i]:
+            bg = TARGET_ROW_BG
+        else:
+            bg = None
+        fonts = {}
+        if col_product >= 0 and strike[i] and bg != SUMMARY_ROW_BG:
+            fonts[col_product] = STRIKE_FONT
+        for c in arrow_cols:
+            text = row[c].strip()
+            if text:
+                fonts[c] = DOWN_FONT if text.startswith("-") else UP_FONT
+        styles.append([_cell_style(fonts.get(c), bg) for c in range(len(headers))])
+    return {"headers": headers, "rows": rows, "styles": styles}
+
+
+def save_formatted(data: dict, json_file: Path) -> Path:
+    json_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return json_file
+
+
+def write_formatted_json(df: pd.DataFrame, strike, yellow, year, week_tag: str) -> Path:
+    """step5 直接写出 {周}_formatted.json，返回文件路径。"""
+    return save_formatted(formatted_from_frame(df, strike, yellow), formatted_json_path(year, week_tag))
+
+
+def _sources(year, week_tag: str) -> list:
+    """formatted.json 的来源文件：规则掩码中间表、数据监测表 xlsx、监测规则文件（存在者）。"""
+    try:
+        from pipeline.steps.intermediate_io import frame_path
+    except ImportError:  # 直接运行步骤脚本时
+        from intermediate_io import frame_path
+    week_dir = BASE_DIR / "intermediate" / str(year) / week_tag
+    out = [
+        frame_path(week_dir / "monitor_marks.xlsx"),
+        BASE_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx",
+    ]
+    try:
+        from app.app_paths import get_data_root
+        out.append(get_data_root() / "config" / "monitor_rules.json")
+    except Exception:
+        pass
+    return [p for p in out if p is not None and p.is_file()]
+
+
+def formatted_is_current(year, week_tag: str) -> bool:
+    """formatted.json 已存在且不旧于各来源文件（如本轮 step5 刚写出）时返回 True。"""
+    json_file = formatted_json_path(year, week_tag)
+    try:
+        mtime = json_file.stat().st_mtime_ns
+    except OSError:
+        return False
+    return all(p.stat().st_mtime_ns <= mtime for p in _sources(year, week_tag))
@@ -17,6 +17,13 @@ from pathlib import Path
 
 import pandas as pd
 
+try:
+    from pipeline.steps.intermediate_io import current_monitor_frame, frame_path, read_frame, write_frame
+    from pipeline.steps.mapping_cache import read_mapping_table
+except ImportError:  # 直接运行本脚本时
+    from intermediate_io import current_monitor_frame, frame_path, read_frame, write_frame
+    from mapping_cache import read_mapping_table
+
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MAPPING_DIR = BASE_DIR / "mapping"
 
@@ -77,7 +84,7 @@ def get_strategy_product_set():
     path = MAPPING_DIR / "产品归属.xlsx"
     if not path.exists():
         raise FileNotFoundError(f"未找到: {path}")
-    df = pd.read_excel(path)
+    df = read_mapping_table(path)
     # step2 使用 B 列(1) 与 E 列(4)，E 列为产品归属
     if df.shape[1] >= 5:
         col = df.iloc[:, 4]
@@ -87,14 +94,26 @@ def get_strategy_product_set():
 
 
 def load_monitor_table(week_tag: str, year: int):
-    """加载数据监测表：优先 output/{年}/{周}_SLG数据监测表.xlsx，否则 intermediate/{年}/{周}/pivot_table.xlsx 并计算周安装变动。"""
+    """
+    加载数据监测表：优先 step5 同时写出的中间表 intermediate/{年}/{周}/monitor_table（与监测表同数据，免解析带格式的 xlsx），
+    其次 output/{年}/{周}_SLG数据监测表.xlsx，否则 intermediate/{年}/{周}/pivot_table 并计算周安装变动。
+    前两者比后面的来源旧时（如手工改过监测表、或重跑了第四步而未重跑 step5）视为过期，依次退到后一个来源。
+    """
+    week_dir = BASE_DIR / "intermediate" / str(year) / week_tag
     out_file = BASE_DIR / "output" / str(year) / f"{week_tag}_SLG数据监测表.xlsx"
-    if out_file.exists():
+    monitor = current_monitor_frame(week_dir, out_file)
+    if monitor is not None:
+        # 未写数据监测表 xlsx（PIPELINE_REPORT_XLSX=0）时同样可用
+        return read_frame(monitor)
+    pivot_file = week_dir / "pivot_table.xlsx"
+    pivot = frame_path(pivot_file)
+    pivot_mtime = pivot.stat().st_mtime if pivot is not None else 0
+    out_mtime = out_file.stat().st_mtime if out_file.exists() else 0
+    if out_file.exists() and out_mtime >= pivot_mtime:
         return pd.read_excel(out_file)
-    pivot_file = BASE_DIR / "intermediate" / str(year) / week_tag / "pivot_table.xlsx"
-    if not pivot_file.exists():
+    if pivot is None:
         raise FileNotFoundError(f"未找到数据监测表或 pivot: {out_file} 或 {pivot_file}")
-    df = pd.read_excel(pivot_file)
+    df = read_frame(pivot_file)
     if "周安装变动" not in df.columns and "当周周安装" in df.columns and "上周周安装" in df.columns:
         denom = df["上周周安装"].replace(0, pd.NA)
         pct = (df["当周周安装"] - df["上周周安装"]) / denom
@@ -147,16 +166,23 @@ def run_generate_target(week_tag: str, year: int, old_new_cutoff: str = OLD_NEW_
     (out_dir / "strategy_target").mkdir(parents=True, exist_ok=True)
     (out_dir / "non_strategy_target").mkdir(parents=True, exist_ok=True)
 
-    strategy_old.to_excel(out_dir / "strategy_target" / "target_strategy_old.xlsx", index=False)
-    strategy_new.to_excel(out_dir / "strategy_target" / "target_strategy_new.xlsx", index=False)
-    non_old.to_excel(out_dir / "non_strategy_target" / "target_non_strategy_old.xlsx", index=False)
-    non_new.to_excel(out_dir / "non_strategy_target" / "target_non_strategy_new.xlsx", index=False)
+    # target 表供人工查看仍写 xlsx，同时写 Parquet 供 build_final_join / 拉取 API 时快速读取
+    write_frame(strategy_old, out_dir / "strategy_target" / "target_strategy_old.xlsx", xlsx=True)
+    write_frame(strategy_new, out_dir / "strategy_target" / "target_strategy_new.xlsx", xlsx=True)
+    write_frame(non_old, out_dir / "non_strategy_target" / "target_non_strategy_old.xlsx", xlsx=True)
+    write_frame(non_new, out_dir / "non_strategy_target" / "target_non_strategy_new.xlsx", xlsx=True)
 
     print(f"  策略目标 old: {len(strategy_old)} 行, new: {len(strategy_new)} 行")
     print(f"  非策略目标 old: {len(non_old)} 行, new: {len(non_new)} 行")
     print(f"  输出: {out_dir}")
 
 
+def run(year: int, week_tag: str) -> bool:
+    """供流水线直接调用（常驻进程池）。"""
+    run_generate_target(week_tag, year)
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(description="功能一·获得目标产品，写入 target/{年}/{周}/")
     parser.add_argument("--week", required=True, help="周标签，如 1201-1207 或 0119-0125")
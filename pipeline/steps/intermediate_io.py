@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+流水线中间产物读写：步骤之间交接的大表（merged_deduplicated / mapped_total / metrics_total / pivot_table / monitor_table）
+改存 Parquet，列类型随文件保存，读写比 xlsx（openpyxl 写 + read_excel 解析）快一个数量级以上；
+只有给人看的数据监测表 output/{年}/{周}_SLG数据监测表.xlsx 与 target 表仍写 xlsx。
+- 调用方仍按原 xlsx 路径传入（如 intermediate/{年}/{周}/mapped_total.xlsx），实际读写同目录同名 .parquet；
+- 未安装 pyarrow / fastparquet 时回退为原来的 xlsx；PIPELINE_XLSX_INTERMEDIATES=1 时额外导出 xlsx 便于人工排查；
+- 读取时取 .parquet 与 .xlsx 中较新的一个：旧周只有 xlsx、维护页上传 metrics_total.xlsx 覆盖后都能读到最新内容。
+"""
+import os
+from pathlib import Path
+
+import pandas as pd
+
+# 额外导出 xlsx（排查中间结果时打开看）
+XLSX_INTERMEDIATES = os.environ.get("PIPELINE_XLSX_INTERMEDIATES", "").strip().lower() in ("1", "true", "yes")
+
+_ENGINE = []
+
+
+def parquet_engine():
+    """可用的 Parquet 引擎名（pyarrow 优先），都未安装时返回 None。"""
+    if not _ENGINE:
+        engine = None
+        for name in ("pyarrow", "fastparquet"):
+            try:
+                __import__(name)
+                engine = name
+                break
+            except ImportError:
+                continue
+        _ENGINE.append(engine)
+    return _ENGINE[0]
+
+
+def parquet_path(path) -> Path:
+    return Path(path).with_suffix(".parquet")
+
+
+def remove_frame(path) -> None:
+    """删除中间表的 .parquet / .xlsx（本次不落盘的表，避免其它读取方读到上一轮的旧文件）。"""
+    for p in (parquet_path(path), Path(path).with_suffix(".xlsx")):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def frame_path(path):
+    """path 为 xlsx 路径：返回 .parquet 与 .xlsx 中存在且较新的一个；都不存在时返回 None。"""
+    # 同一 mtime 时 Parquet 优先
+    paths = [parquet_path(path)] if parquet_engine() else []
+    paths.append(Path(path).with_suffix(".xlsx"))
+    candidates = [p for p in paths if p.is_file() and p.stat().st_size > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: p.stat().st_mtime)
+
+
+def has_frame(path) -> bool:
+    return frame_path(path) is not None
+
+
+def current_monitor_frame(week_dir, report_file, name: str = "monitor_table"):
+    """
+    step5 写出的 {name}.parquet（monitor_table / monitor_marks）不旧于数据监测表 xlsx 与 pivot_table 时返回其路径；
+    不存在、只有 xlsx，或监测表 / pivot 之后又被改写（手工编辑、重跑第四步未重跑 step5）时返回 None，调用方改读后面的来源。
+    """
+    week_dir = Path(week_dir)
+    src = frame_path(week_dir / (name + ".xlsx"))
+    if src is None or src.suffix != ".parquet":
+        return None
+    newest = 0
+    for other in (Path(report_file), frame_path(week_dir / "pivot_table.xlsx")):
+        if other is not None and other.is_file():
+            newest = max(newest, other.stat().st_mtime)
+    return src if src.stat().st_mtime >= newest else None
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    object 列混有数字与字符串（映射表合并、追加空行后常见）时 Parquet 无法定型：
+    数字夹杂空串的列把空串视为空值转成数值列，其余混合列的非空值统一转为字符串。
+    """
+    fixed = None
+    for col in df.columns:
+        s = df[col]
+        if s.dtype != object:
+            continue
+        values = s.dropna().tolist()
+        if len({type(v) for v in values}) <= 1:
+            continue
+        if fixed is None:
+            fixed = df.copy()
+        if all(isinstance(v, (int, float)) or v == "" for v in values):
+            # mask 而非 replace("", None)：pandas<1.4 中后者按 method="pad" 用上一行的值填充空串
+            fixed[col] = pd.to_numeric(s.mask(s == ""))
+        else:
+            fixed[col] = s.map(lambda v: v if v is None or (isinstance(v, float) and v != v) else str(v))
+    if fixed is not None:
+        return fixed
+    return df
+
+
+def write_frame(df: pd.DataFrame, path, xlsx: bool = False, cache_only: bool = False) -> Path:
+    """
+    写中间表：有 Parquet 引擎时写 .parquet（先写临时文件再替换），xlsx=True 或 PIPELINE_XLSX_INTERMEDIATES=1 时同时写 .xlsx；
+    无引擎时只写 .xlsx。cache_only=True 表示该表只是加速用的副本（如 monitor_table），无引擎时直接跳过。
+    返回主文件路径（未写时为 None）。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    engine = parquet_engine()
+    out = None
+    if engine:
+        pq = parquet_path(path)
+        tmp = pq.with_name(pq.name + ".tmp")
+        df = _arrow_safe(df)
+        df.to_parquet(tmp, index=False, engine=engine)
+        os.replace(tmp, pq)
+        out = pq
+    elif cache_only:
+        return None
+    if not engine or xlsx or XLSX_INTERMEDIATES:
+        xlsx_path = path.with_suffix(".xlsx")
+        df.to_excel(xlsx_path, index=False)
+        if out is not None:
+            # xlsx 晚写完，mtime 更新：让读取方仍以 Parquet 为准
+            os.utime(out)
+        out = out or xlsx_path
+    return out
+
+
+def read_frame(path, converters: dict = None) -> pd.DataFrame:
+    """
+    读中间表（取 .parquet / .xlsx 中较新的一个）。converters 仅对 xlsx 生效（如 Unified ID 强制按文本读），
+    Parquet 已保存列类型无需转换。都不存在时抛 FileNotFoundError。
+    """
+    src = frame_path(path)
+    if src is None:
+        raise FileNotFoundError(f"未找到中间表: {Path(path).with_suffix('')}.parquet / .xlsx")
+    if src.suffix == ".parquet":
+        return pd.read_parquet(src, engine=parquet_engine())
+    return pd.read_excel(src, converters=converters)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+映射表（mapping/产品归属.xlsx、公司归属.xlsx、流水系数.xlsx 及维护页底表）读取缓存，流水线各步、前端转换脚本与
+维护接口共用，不再各自 read_excel 同一张表。
+- 进程内按 (路径, 大小, mtime) 缓存解析结果，表被改写（维护页编辑、上传合并）后下次读取自动重新解析；
+- 磁盘缓存 {数据根}/cache/mapping/：解析结果 + 记录（大小、mtime、内容 sha256、pandas 版本）。大小与 mtime 未变时
+  直接读缓存；mtime 变了但内容摘要相同（复制、原样另存）同样复用。进程池 worker、服务端与命令行共享同一份缓存；
+- 缓存为逐格带类型的 JSON（不用 pickle：缓存目录共享，被写入的 pickle 在读取时可执行任意代码）；映射表的列常混有
+  数字与文本，转 Parquet 需统一类型，会改变 step2 合并出的值，故逐格保留原类型。写缓存前先解码比对，
+  有无法原样还原的值（少见类型）时不写缓存，每次直接解析 xlsx；
+- theme_style_maps 为题材 / 画风查表字典（Unified ID / 产品名 → 题材、画风），与原表同 key 缓存；
+  产品归属 → 公司归属不设查表：step2 按发行商关联公司归属表，generate_target 只用产品归属集合，没有调用方；
+- MAPPING_CACHE=0 关闭磁盘缓存（进程内缓存仍生效）；缓存损坏或不可写时退回直接解析 xlsx。
+"""
+import datetime
+import hashlib
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+DISK_CACHE = os.environ.get("MAPPING_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+_LOCK = threading.Lock()
+# 路径 → (大小, mtime, DataFrame, {查表名: 结果})
+_MEMORY = {}
+
+
+def cache_dir() -> Path:
+    try:
+        from app.app_paths import get_data_root
+        return get_data_root() / "cache" / "mapping"
+    except Exception:
+        return Path(__file__).resolve().parent.parent.parent / "cache" / "mapping"
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _enc(v):
+    """单元格 → JSON 值；非 JSON 原生类型带标记，遇到无法原样保存的类型抛 TypeError。"""
+    if v is None or isinstance(v, (bool, str)):
+        return v
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        if isinstance(v, float) and not math.isfinite(v):
+            return {"$f": repr(v)}
+        return v
+    if hasattr(v, "item") and not isinstance(v, (pd.Timestamp, datetime.date)):
+        # numpy 标量
+        return _enc(v.item())
+    if v is pd.NaT:
+        return {"$nat": 1}
+    if isinstance(v, pd.Timestamp):
+        return {"$ts": v.isoformat()}
+    if isinstance(v, datetime.datetime):
+        return {"$dt": v.isoformat()}
+    if isinstance(v, datetime.date):
+        return {"$d": v.isoformat()}
+    if isinstance(v, datetime.time):
+        return {"$t": v.isoformat()}
+    raise TypeError(type(v).__name__)
+
+
+def _dec(v):
+    if not isinstance(v, dict):
+        return v
+    if "$f" in v:
+        return float(v["$f"])
+    if "$nat" in v:
+        return pd.NaT
+    if "$ts" in v:
+        return pd.Timestamp(v["$ts"])
+    if "$dt" in v:
+        return datetime.datetime.fromisoformat(v["$dt"])
+    if "$d" in v:
+        return datetime.date.fromisoformat(v["$d"])
+    return datetime.time.fromisoformat(v["$t"])
+
+
+def _encode_frame(df: pd.DataFrame) -> dict:
+    return {
+        "columns": [_enc(c) for c in df.columns],
+        "dtypes": [str(t) for t in df.dtypes],
+        "data": [[_enc(v) for v in df.iloc[:, i].tolist()] for i in range(df.shape[1])],
+    }
+
+
+def _decode_frame(obj: dict) -> pd.DataFrame:
+    cols = {}
+    for i, (dtype, values) in enumerate(zip(obj["dtypes"], obj["data"])):
+        cols[i] = pd.Series([_dec(v) for v in values], dtype=dtype)
+    df = pd.DataFrame(cols) if cols else pd.DataFrame()
+    df.columns = [_dec(c) for c in obj["columns"]]
+    return df
+
+
+def _same_frame(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """列名、dtype、逐格值与类型均一致（NaN 与 NaN 视为相同）。"""
+    if list(a.columns) != list(b.columns) or list(a.dtypes) != list(b.dtypes) or a.shape != b.shape:
+        return False
+    for i in range(a.shape[1]):
+        for x, y in zip(a.iloc[:, i].tolist(), b.iloc[:, i].tolist()):
+            if type(x) is not type(y):
+                return False
+            if x != y and not (x != x and y != y):
+                return False
+    return True
+
+
+def _disk_read(path: Path, st) -> pd.DataFrame:
+    """按记录取磁盘缓存；记录不符（内容已变、pandas 版本不同）或读失败时解析 xlsx 并重写缓存。"""
+    base = cache_dir() / hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:16]
+    meta_file = base.with_suffix(".json")
+    data_file = base.with_suffix(".data.json")
+    try:
+        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+    except Exception:
+        meta = {}
+    digest = None
+    if meta.get("pandas") == pd.__version__ and data_file.is_file():
+        same_stat = meta.get("size") == st.st_size and meta.get("mtime_ns") == st.st_mtime_ns
+        if not same_stat:
+            digest = _sha256_file(path)
+        if same_stat or digest == meta.get("sha256"):
+            try:
+                df = _decode_frame(json.loads(data_file.read_text(encoding="utf-8")))
+            except Exception:
+                df = None
+            if df is not None:
+                if not same_stat:
+                    # 内容未变，只刷新记录中的 mtime，下次无需再算摘要
+                    meta.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                    _write_meta(meta_file, meta)
+                return df
+    df = pd.read_excel(path)
+    try:
+        encoded = _encode_frame(df)
+        if not _same_frame(df, _decode_frame(json.loads(json.dumps(encoded)))):
+            return df
+    except (TypeError, ValueError):
+        return df
+    try:
+        base.parent.mkdir(parents=True, exist_ok=True)
+        tmp = data_file.with_name(data_file.name + ".tmp")
+        tmp.write_text(json.dumps(encoded, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, data_file)
+        _write_meta(meta_file, {
+            "path": str(path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest or _sha256_file(path),
+            "pandas": pd.__version__,
+        })
+    except OSError:
+        pass
+    return df
+
+
+def _write_meta(meta_file: Path, meta: dict) -> None:
+    try:
+        tmp = meta_file.with_name(meta_file.name + ".tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, meta_file)
+    except OSError:
+        pass
+
+
+def _entry(path) -> tuple:
+    path = Path(path)
+    st = path.stat()
+    with _LOCK:
+        entry = _MEMORY.get(str(path))
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry
+    df = _disk_read(path, st) if DISK_CACHE else pd.read_excel(path)
+    entry = (st.st_size, st.st_mtime_ns, df, {})
+    with _LOCK:
+        _MEMORY[str(path)] = entry
+    return entry
+
+
+def read_mapping_table(path) -> pd.DataFrame:
+    """读映射表 xlsx（第一个 sheet），返回副本，调用方可随意修改。文件不存在时抛 FileNotFoundError。"""
+    return _entry(path)[2].copy()
+
+
+def _lookup(path, name: str, build):
+    """与原表同 key 缓存的派生结果；调用方不得修改返回值。"""
+    entry = _entry(path)
+    derived = entry[3]
+    if name not in derived:
+        derived[name] = build(entry[2])
+    return derived[name]
+
+
+def _cell_str(v) -> str:
+    """题材 / 画风 JSON 沿用的取值方式：空值（NaN）按 "nan" 输出，0 等假值为空串，与已生成的 JSON 保持一致。"""
+    if v is None:
+        return ""
+    if hasattr(v, "strip"):
+        return str(v).strip()
+    return str(v).strip() if v else ""
+
+
+def _find_col(df: pd.DataFrame, names):
+    """按 names 的优先顺序找列（列名去首尾空格比较，同名取第一列）。"""
+    cols = {}
+    for c in df.columns:
+        if c is not None:
+            cols.setdefault(str(c).strip(), c)
+    for name in names:
+        if name in cols:
+            return cols[name]
+    return None
+
+
+def _last_col(df: pd.DataFrame, names):
+    """列名属于 names 的最后一列。"""
+    found = None
+    for c in df.columns:
+        if c is not None and str(c).strip() in names:
+            found = c
+    return found
+
+
+def theme_style_maps(path) -> tuple:
+    """
+    产品归属表的题材 / 画风：返回 (byUnifiedId, byProductName)，值为 {"题材", "画风"}；表为空或不足两列时返回 None。
+    key 列优先 Unified ID，否则 Unified Name，都没有时取 B 列（与 step2 一致）；后出现的行覆盖先出现的。
+    """
+    def build(df):
+        if df.empty or len(df.columns) < 2:
+            return None
+        by_unified_id = {}
+        by_product_name = {}
+        key_col = _find_col(df, ("Unified ID", "Unified Name", "Unified id", "unified id"))
+        if key_col is None:
+            key_col = df.columns[1]
+        theme_col = _last_col(df, ("题材", "题材标签"))
+        style_col = _last_col(df, ("画风", "画风标签"))
+        product_col = _last_col(df, ("产品归属",))
+        n = len(df)
+        keys = df[key_col].tolist()
+        themes = df[theme_col].tolist() if theme_col is not None else [""] * n
+        styles = df[style_col].tolist() if style_col is not None else [""] * n
+        products = df[product_col].tolist() if product_col is not None else [""] * n
+        for key, theme, style, product in zip(keys, themes, styles, products):
+            key = _cell_str(key)
+            if not key:
+                continue
+            entry = {"题材": _cell_str(theme), "画风": _cell_str(style)}
+            by_unified_id[key] = entry
+            product = _cell_str(product)
+            if product:
+                by_product_name[product] = entry
+        return by_unified_id, by_product_name
+    return _lookup(path, "theme_style", build)
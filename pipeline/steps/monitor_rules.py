@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+数据监测表规则（删除 / 划删除线 / 标黄）：读取、规范化，以及编译为整列布尔掩码。
+- 规则存于 {数据根}/config/monitor_rules.json（维护页编辑），缺失时用默认规则；
+- compile_rules 把规范化后的规则编译一次，masks 对整张表按列比较得到 delete / strike / yellow 三个掩码，
+  语义与逐行的 rule_match 一致（条件缺失、运算符非法、阈值为空的规则不命中；同一列表内按 join 从左到右合并）；
+- step5 生成数据监测表与前端 formatted.json 用的是同一组掩码（随 monitor_marks 中间表保存），不再读回单元格样式。
+"""
+import json
+import operator
+
+import numpy as np
+import pandas as pd
+
+# 规则可引用的指标（周变动为百分数数值，如 20 表示 20%）
+METRICS = ("当周周安装", "上周周安装", "当周周流水", "上周周流水", "周安装变动", "周流水变动")
+RULE_KINDS = ("delete", "strike", "yellow")
+_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "=": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def default_monitor_rules() -> dict:
+    return {
+        "version": 1,
+        "delete_rules": [
+            {
+                "conditions": [
+                    {"metric": "当周周安装", "op": "<", "value": 400},
+                    {"metric": "上周周安装", "op": "<", "value": 400},
+                    {"metric": "当周周流水", "op": "<", "value": 20000},
+                    {"metric": "上周周流水", "op": "<", "value": 20000},
+                ]
+            }
+        ],
+        "strike_rules": [
+            {
+                "conditions": [
+                    {"metric": "当周周安装", "op": "<", "value": 400},
+                    {"metric": "上周周安装", "op": "<", "value": 400},
+                    {"metric": "当周周流水", "op": ">=", "value": 20000},
+                ]
+            },
+            {
+                "conditions": [
+                    {"metric": "当周周安装", "op": "<", "value": 400},
+                    {"metric": "上周周安装", "op": "<", "value": 400},
+                    {"metric": "上周周流水", "op": ">=", "value": 20000},
+                ]
+            },
+        ],
+        "yellow_rules": [
+            {
+                "conditions": [
+                    {"metric": "周安装变动", "op": ">=", "value": 20},
+                    {"metric": "当周周安装", "op": ">", "value": 1000},
+                ]
+            }
+        ],
+        "product_rules": {
+            "delete": [],
+            "strike": [],
+            "yellow": [],
+        },
+    }
+
+
+def load_monitor_rules() -> dict:
+    try:
+        from app.app_paths import get_data_root
+        path = get_data_root() / "config" / "monitor_rules.json"
+        if path.is_file():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                return data
+    except Exception:
+        pass
+    return default_monitor_rules()
+
+
+def normalize_rules(rules: dict) -> dict:
+    base = default_monitor_rules()
+    if not isinstance(rules, dict):
+        return base
+    out = {**base, **rules}
+    for key in ("delete_rules", "strike_rules", "yellow_rules"):
+        if not isinstance(out.get(key), list):
+            out[key] = []
+        for idx, rule in enumerate(out[key]):
+            if not isinstance(rule, dict):
+                continue
+            if idx > 0 and rule.get("join") not in ("and", "or"):
+                rule["join"] = "or"
+    pr = out.get("product_rules") if isinstance(out.get("product_rules"), dict) else {}
+    out["product_rules"] = {
+        "delete": pr.get("delete") if isinstance(pr.get("delete"), list) else [],
+        "strike": pr.get("strike") if isinstance(pr.get("strike"), list) else [],
+        "yellow": pr.get("yellow") if isinstance(pr.get("yellow"), list) else [],
+    }
+    return out
+
+
+def norm_str(val) -> str:
+    return str(val).strip().lower() if val is not None else ""
+
+
+def eval_condition(val, op, target) -> bool:
+    try:
+        v = float(val)
+        t = float(target)
+    except Exception:
+        return False
+    fn = _OPS.get(op)
+    return bool(fn(v, t)) if fn else False
+
+
+def rule_match(rule: dict, metrics: dict) -> bool:
+    """逐行判定单条规则（metrics 为指标名 → 值）；整列判定见 compile_rules。"""
+    conds = rule.get("conditions") if isinstance(rule, dict) else None
+    if not conds or not isinstance(conds, list):
+        return False
+    any_cond = False
+    for cond in conds:
+        if not isinstance(cond, dict):
+            return False
+        metric = cond.get("metric")
+        op = cond.get("op")
+        target = cond.get("value")
+        if metric not in metrics:
+            return False
+        if op not in _OPS:
+            return False
+        if target is None or target == "":
+            return False
+        any_cond = True
+        if not eval_condition(metrics.get(metric), op, target):
+            return False
+    return any_cond
+
+
+def combine_rule_list(rule_list: list, metrics: dict) -> bool:
+    if not rule_list:
+        return False
+    result = rule_match(rule_list[0], metrics)
+    for rule in rule_list[1:]:
+        join = str((rule or {}).get("join") or "or").strip().lower()
+        match = rule_match(rule, metrics)
+        if join == "and":
+            result = result and match
+        else:
+            result = result or match
+    return result
+
+
+def build_product_rule_sets(product_rules: dict) -> dict:
+    def _collect(key, by_value):
+        out = set()
+        for item in product_rules.get(key, []):
+            if not isinstance(item, dict):
+                continue
+            if item.get("by") != by_value:
+                continue
+            val = item.get("value")
+            if val is None:
+                continue
+            v = norm_str(val)
+            if v:
+                out.add(v)
+        return out
+
+    sets = {}
+    for kind in RULE_KINDS:
+        sets[f"{kind}_name"] = _collect(kind, "product_name")
+        sets[f"{kind}_id"] = _collect(kind, "unified_id")
+    return sets
+
+
+def _compile_rule(rule):
+    """单条规则 → [(指标, 比较函数, 阈值), ...]；与 rule_match 一致，任何条件不合法时整条规则不命中，返回 None。"""
+    conds = rule.get("conditions") if isinstance(rule, dict) else None
+    if not conds or not isinstance(conds, list):
+        return None
+    out = []
+    for cond in conds:
+        if not isinstance(cond, dict):
+            return None
+        metric, op, target = cond.get("metric"), cond.get("op"), cond.get("value")
+        if metric not in METRICS or op not in _OPS or target is None or target == "":
+            return None
+        try:
+            target = float(target)
+        except Exception:
+            return None
+        out.append((metric, _OPS[op], target))
+    return out
+
+
+def _as_float(s: pd.Series):
+    """整列转 float：返回 (数值, 是否可转换)。与 float(val) 一致：NaN 可转换（参与比较），None / 非数字字符串不可转换。"""
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_extension_array_dtype(s.dtype):
+        return s.to_numpy(dtype=float), np.ones(len(s), dtype=bool)
+    vals = np.full(len(s), np.nan)
+    valid = np.zeros(len(s), dtype=bool)
+    for i, v in enumerate(s.tolist()):
+        try:
+            vals[i] = float(v)
+            valid[i] = True
+        except Exception:
+            pass
+    return vals, valid
+
+
+def _truthy_in(s: pd.Series, values: set) -> np.ndarray:
+    """与 `if val and norm_str(val) in values` 一致（NaN 为真值，按 "nan" 比较）。"""
+    if not values:
+        return np.zeros(len(s), dtype=bool)
+    return np.fromiter((bool(v) and norm_str(v) in values for v in s.tolist()), dtype=bool, count=len(s))
+
+
+class CompiledRules:
+    """编译后的监测规则：masks(df, metrics) 返回 {"delete" / "strike" / "yellow": 布尔数组}。"""
+
+    def __init__(self, rules: dict):
+        rules = normalize_rules(rules)
+        self.product_sets = build_product_rule_sets(rules.get("product_rules", {}))
+        self.rule_lists = {}
+        for kind in RULE_KINDS:
+            compiled = []
+            for idx, rule in enumerate(rules.get(f"{kind}_rules", [])):
+                join = str(rule.get("join") or "or").strip().lower() if isinstance(rule, dict) else "or"
+                compiled.append(("or" if idx == 0 else join, _compile_rule(rule)))
+            self.rule_lists[kind] = compiled
+
+    def masks(self, df: pd.DataFrame, metrics: dict) -> dict:
+        """
+        df 需含 公司归属 / 产品归属 / Unified ID（缺列时按空值处理），metrics 为指标名 → 与 df 对齐的 Series。
+        公司汇总行（公司归属以「汇总」结尾）不命中任何规则。
+        """
+        n = len(df)
+        empty = pd.Series([None] * n, index=df.index, dtype=object)
+        company = df["公司归属"] if "公司归属" in df.columns else empty
+        product = df["产品归属"] if "产品归属" in df.columns else empty
+        uid = df["Unified ID"] if "Unified ID" in df.columns else empty
+        is_summary = np.fromiter((isinstance(v, str) and v.endswith("汇总") for v in company.tolist()), dtype=bool, count=n)
+        columns = {}
+        for name in METRICS:
+            s = metrics.get(name)
+            columns[name] = _as_float(s) if s is not None else None
+
+        def _rule_mask(conds):
+            mask = np.ones(n, dtype=bool)
+            for metric, fn, target in conds:
+                col = columns.get(metric)
+                if col is None:
+                    return np.zeros(n, dtype=bool)
+                vals, valid = col
+                with np.errstate(invalid="ignore"):
+                    mask &= valid & fn(vals, target)
+            return mask
+
+        out = {}
+        for kind in RULE_KINDS:
+            hit = np.zeros(n, dtype=bool)
+            for i, (join, conds) in enumerate(self.rule_lists[kind]):
+                match = _rule_mask(conds) if conds else np.zeros(n, dtype=bool)
+                if i == 0:
+                    hit = match
+                elif join == "and":
+                    hit = hit & match
+                else:
+                    hit = hit | match
+            hit = hit | _truthy_in(product, self.product_sets[f"{kind}_name"]) | _truthy_in(uid, self.product_sets[f"{kind}_id"])
+            out[kind] = hit & ~is_summary
+        return out
+
+
+def compile_rules(rules: dict = None) -> CompiledRules:
+    """rules 为 None 时读取当前规则文件。"""
+    return CompiledRules(load_monitor_rules() if rules is None else rules)
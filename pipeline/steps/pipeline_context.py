@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+第一步（step1→step5_5）在同一进程内执行时的内存交接上下文。
+- 上一步产出的 DataFrame 直接交给下一步，不再「写盘 → 下一步重新解析」；映射表经 mapping_cache 按路径 + mtime 缓存（跨进程共享磁盘缓存），未改动时不重复解析；
+- 只在检查点落盘：PIPELINE_CHECKPOINTS=all（默认，全部中间表照常写 Parquet，单步重跑不受影响）/ none /
+  逗号分隔的表名（merged_deduplicated, mapped_total, metrics_total, pivot_table, monitor_table, monitor_marks）；
+  metrics_total 供产品总表 JSON 与「按规则重建」使用，monitor_table / pivot_table 供 generate_target 使用，
+  monitor_table + monitor_marks 供 formatted.json 使用，精简时建议保留。不落盘的表同时删除上一轮留在磁盘上的旧文件，
+  convert_metrics_to_json、generate_target、「按规则重建」等盘上读取方不会读到与本轮不一致的数据（按缺表处理）；
+- step5 单遍写出监测表（箭头颜色已设置），同一流程中 step5_5 直接跳过；
+- 各 step 的 ctx 参数默认 None：单独运行 / 从服务端重跑某一步时仍按原路径读写磁盘。
+"""
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from pipeline.steps.intermediate_io import read_frame, remove_frame, write_frame
+    from pipeline.steps.mapping_cache import read_mapping_table
+except ImportError:  # 直接运行步骤脚本时
+    from intermediate_io import read_frame, remove_frame, write_frame
+    from mapping_cache import read_mapping_table
+
+FRAME_NAMES = ("merged_deduplicated", "mapped_total", "metrics_total", "pivot_table", "monitor_table", "monitor_marks")
+
+
+def _parse_checkpoints(value: str) -> set:
+    s = (value or "all").strip().lower()
+    if s in ("", "all"):
+        return set(FRAME_NAMES)
+    if s == "none":
+        return set()
+    return {x.strip() for x in s.split(",") if x.strip()}
+
+
+class PipelineContext:
+    """一次第一步执行的内存状态：frames（表名 → DataFrame）、mappings（映射表缓存）。"""
+
+    def __init__(self, week_tag: str, year: int, checkpoints=None, mappings: dict = None):
+        self.week_tag = week_tag
+        self.year = year
+        if checkpoints is None:
+            checkpoints = os.environ.get("PIPELINE_CHECKPOINTS", "all")
+        self.checkpoints = _parse_checkpoints(checkpoints) if isinstance(checkpoints, str) else set(checkpoints)
+        self.frames = {}
+        # 可由调用方传入共享 dict（映射表本身已由 mapping_cache 跨上下文缓存）
+        self.mappings = mappings if mappings is not None else {}
+
+    def get(self, name: str, path) -> pd.DataFrame:
+        """取上一步交接的表；本次未产出（如从中间某步开始）时从磁盘读取。交接后归调用方所有，不再复制。"""
+        df = self.frames.pop(name, None)
+        if df is not None:
+            return df
+        return read_frame(path)
+
+    def put(self, name: str, df: pd.DataFrame, path, **kwargs):
+        """交接给下一步；该表是检查点时同时落盘，否则删除盘上的旧文件。返回写出的文件路径（未落盘时为 None）。"""
+        self.frames[name] = df
+        if name in self.checkpoints:
+            return write_frame(df, path, **kwargs)
+        remove_frame(path)
+        return None
+
+    def mapping(self, path) -> pd.DataFrame:
+        """读映射表 xlsx，按 (路径, mtime) 缓存；返回副本，调用方可随意修改。"""
+        path = Path(path)
+        key = (str(path), path.stat().st_mtime_ns)
+        df = self.mappings.get(key)
+        if df is None:
+            df = read_mapping_table(path)
+            self.mappings[key] = df
+        return df.copy()
+
+
+def load_frame(ctx, name: str, path) -> pd.DataFrame:
+    """各 step 读入口：有上下文时优先取内存交接，否则读磁盘。"""
+    if ctx is not None:
+        return ctx.get(name, path)
+    return read_frame(path)
+
+
+def save_frame(ctx, name: str, df: pd.DataFrame, path, **kwargs):
+    """各 step 写入口：有上下文时交接并按检查点落盘，否则直接写盘。返回写出的文件路径（未落盘时为 None）。"""
+    if ctx is not None:
+        return ctx.put(name, df, path, **kwargs)
+    return write_frame(df, path, **kwargs)
+
+
+def read_mapping(ctx, path) -> pd.DataFrame:
+    if ctx is not None:
+        return ctx.mapping(path)
+    return read_mapping_table(path)
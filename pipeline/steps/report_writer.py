@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+数据监测表（{周}_SLG数据监测表.xlsx）单遍写出：先按 删除线 / 标黄 掩码与箭头方向算好每个单元格的格式，
+再逐行流式写入，不再「to_excel → openpyxl 逐格设样式 → step5_5 重新加载改箭头颜色 → 再保存」。
+- 优先用 xlsxwriter 的 constant_memory 模式（每行写完即落盘，内存与行数无关），格式对象按组合缓存；
+- 未安装 xlsxwriter 时回退 openpyxl 只写模式（write_only，同样逐行写出），样式一致；
+- 样式与原 step5 + step5_5 的结果一致：表头深蓝白字、公司汇总行浅蓝、标黄行浅黄、删除线产品红字划线、
+  周变动箭头上升红 / 下降绿（含汇总行）、安装 / 流水千分位与美元格式（汇总行除外）、全表居中与细边框。
+"""
+import datetime
+import math
+
+import numpy as np
+import pandas as pd
+
+HEADER_BG = "4F81BD"
+HEADER_FONT = "FFFFFF"
+SUMMARY_BG = "D9E1F2"
+YELLOW_BG = "FFF2CC"
+STRIKE_FONT = "FF0000"
+UP_FONT = "FF0000"
+DOWN_FONT = "00B050"
+BORDER_COLOR = "000000"
+
+INSTALL_COLS = ("当周周安装", "上周周安装")
+REVENUE_COLS = ("当周周流水", "上周周流水")
+ARROW_COLS = ("周安装变动", "周流水变动")
+INSTALL_FORMAT = "#,##0"
+REVENUE_FORMAT = '"$"#,##0.00'
+# 与 pandas.to_excel 默认一致
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+DATE_FORMAT = "YYYY-MM-DD"
+
+PRODUCT_WIDTH = 38   # 产品列 ≈10cm
+COLUMN_WIDTH = 18    # ≈5cm
+WIDTH_COLUMNS = 10   # 设置列宽的列数（A–J）
+
+
+def _cell_value(v):
+    """与 pandas.to_excel 一致的取值：缺失值写空单元格，inf 写字符串，numpy 标量转 Python 类型。"""
+    if v is None or v is pd.NaT:
+        return None
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float):
+        if math.isnan(v):
+            return None
+        if math.isinf(v):
+            return "inf" if v > 0 else "-inf"
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v
+
+
+def _arrow_font(v):
+    if isinstance(v, str) and v.strip() != "":
+        return DOWN_FONT if v.strip().startswith("-") else UP_FONT
+    return None
+
+
+def _row_styles(df: pd.DataFrame, strike_flags, yellow_flags):
+    """逐行生成 (取值列表, 每格样式键列表)；样式键为 (填充色, 字体色, 是否删除线, 数字格式)。"""
+    cols = list(df.columns)
+    pos = {name: i for i, name in enumerate(cols)}
+    col_company = pos.get("公司归属")
+    col_product = pos.get("产品归属")
+    num_formats = {}
+    for name in INSTALL_COLS:
+        if name in pos:
+            num_formats[pos[name]] = INSTALL_FORMAT
+    for name in REVENUE_COLS:
+        if name in pos:
+            num_formats[pos[name]] = REVENUE_FORMAT
+    arrow_cols = [pos[name] for name in ARROW_COLS if name in pos]
+    strike_flags = np.asarray(strike_flags, dtype=bool)
+    yellow_flags = np.asarray(yellow_flags, dtype=bool)
+
+    for idx, row in enumerate(df.itertuples(index=False, name=None)):
+        values = [_cell_value(v) for v in row]
+        company = values[col_company] if col_company is not None else None
+        summary = isinstance(company, str) and company.endswith("汇总")
+        if summary:
+            fill = SUMMARY_BG
+        else:
+            fill = YELLOW_BG if yellow_flags[idx] else None
+        styles = []
+        for c, v in enumerate(values):
+            fmt = None
+            if isinstance(v, datetime.datetime):
+                fmt = DATETIME_FORMAT
+            elif isinstance(v, datetime.date):
+                fmt = DATE_FORMAT
+            if not summary and c in num_formats:
+                fmt = num_formats[c]
+            styles.append([fill, None, False, fmt])
+        if not summary and col_product is not None and strike_flags[idx]:
+            styles[col_product][1] = STRIKE_FONT
+            styles[col_product][2] = True
+        # 箭头颜色：汇总行同样着色（原 step5_5 对全表重新染色）
+        for c in arrow_cols:
+            color = _arrow_font(values[c])
+            if color:
+                styles[c][1] = color
+        yield values, [tuple(s) for s in styles]
+
+
+def _column_widths(ncols: int):
+    return [(c, PRODUCT_WIDTH if c == 1 else COLUMN_WIDTH) for c in range(min(ncols, WIDTH_COLUMNS))]
+
+
+def _write_xlsxwriter(xlsxwriter, df, strike_flags, yellow_flags, path) -> None:
+    wb = xlsxwriter.Workbook(str(path), {"constant_memory": True, "strings_to_numbers": False,
+                                          "strings_to_formulas": False, "strings_to_urls": False})
+    ws = wb.add_worksheet("Sheet1")
+    base = {"border": 1, "border_color": "#" + BORDER_COLOR, "align": "center", "valign": "vcenter"}
+    formats = {}
+
+    def _format(key):
+        fmt = formats.get(key)
+        if fmt is None:
+            fill, font, strike, num_format = key
+            props = dict(base)
+            if fill:
+                props.update(pattern=1, bg_color="#" + fill)
+            if font:
+                props["font_color"] = "#" + font
+            if strike:
+                props["font_strikeout"] = True
+            if num_format:
+                props["num_format"] = num_format
+            fmt = formats[key] = wb.add_format(props)
+        return fmt
+
+    for c, width in _column_widths(len(df.columns)):
+        ws.set_column(c, c, width)
+    header = wb.add_format(dict(base, bold=True, font_color="#" + HEADER_FONT, pattern=1, bg_color="#" + HEADER_BG))
+    for c, name in enumerate(df.columns):
+        ws.write_string(0, c, str(name), header)
+
+    for r, (values, styles) in enumerate(_row_styles(df, strike_flags, yellow_flags), start=1):
+        for c, (v, key) in enumerate(zip(values, styles)):
+            fmt = _format(key)
+            if v is None or v == "":
+                ws.write_blank(r, c, None, fmt)
+            elif isinstance(v, bool):
+                ws.write_boolean(r, c, v, fmt)
+            elif isinstance(v, (int, float)):
+                ws.write_number(r, c, v, fmt)
+            elif isinstance(v, (datetime.datetime, datetime.date)):
+                ws.write_datetime(r, c, v, fmt)
+            else:
+                ws.write_string(r, c, str(v), fmt)
+    wb.close()
+
+
+def _write_openpyxl(df, strike_flags, yellow_flags, path) -> None:
+    from copy import copy
+
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    thin = Side(border_style="thin", color=BORDER_COLOR)
+    border = Border(top=thin, left=thin, right=thin, bottom=thin)
+    center = Alignment(horizontal="center", vertical="center")
+    cached = {}
+
+    def _cell(v, key):
+        cell = WriteOnlyCell(ws, value=v)
+        style = cached.get(key)
+        if style is None:
+            fill, font, strike, num_format = key
+            cell.border = border
+            cell.alignment = center
+            if fill:
+                cell.fill = PatternFill("solid", fgColor=fill)
+            if font:
+                cell.font = Font(color=font, strike=strike or None)
+            if num_format:
+                cell.number_format = num_format
+            # 同一组合的样式索引只算一次，其余单元格直接复用（逐项赋值需反复查重样式表，较慢）
+            style = cached[key] = copy(cell._style)
+        else:
+            cell._style = copy(style)
+        return cell
+
+    for c, width in _column_widths(len(df.columns)):
+        ws.column_dimensions[get_column_letter(c + 1)].width = width
+    header_fill = PatternFill("solid", fgColor=HEADER_BG)
+    header_font = Font(color=HEADER_FONT, bold=True)
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.border = border
+        cell.alignment = center
+        header.append(cell)
+    ws.append(header)
+
+    for values, styles in _row_styles(df, strike_flags, yellow_flags):
+        ws.append([_cell(v, key) for v, key in zip(values, styles)])
+    wb.save(path)
+
+
+def write_report(df: pd.DataFrame, strike_flags, yellow_flags, path) -> str:
+    """
+    单遍写出带格式的数据监测表。strike_flags / yellow_flags 为与 df 行对齐的布尔掩码（step5 的 monitor_marks）。
+    返回实际使用的写出方式（xlsxwriter / openpyxl）。
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+    if xlsxwriter is not None:
+        _write_xlsxwriter(xlsxwriter, df, strike_flags, yellow_flags, path)
+        return "xlsxwriter"
+    _write_openpyxl(df, strike_flags, yellow_flags, path)
+    return "openpyxl"
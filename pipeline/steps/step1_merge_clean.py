@@ -1,11 +1,56 @@
+import os
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import argparse
 
+try:
+    from pipeline.steps.pipeline_context import save_frame
+except ImportError:  # 直接运行本脚本时
+    from pipeline_context import save_frame
+
 # =================================================
 # Sensor Tower CSV 读取函数
 # =================================================
+# 固定按文本读取的列：ID / 名称类即使全为数字也不能推断成数值（否则大整数 ID 会丢精度、变科学计数法）
+TEXT_COLUMNS = ("Unified ID", "Unified Name", "Unified Publisher Name", "Earliest Release Date")
+
+# 与 pandas read_csv 默认一致的空值写法，保证两条读取路径结果相同
+_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+# 并行读取的线程数（STEP1_READ_WORKERS，默认 CPU 核数）
+READ_WORKERS = int(os.environ.get("STEP1_READ_WORKERS", "0") or 0) or (os.cpu_count() or 4)
+
+
+def _read_csv_arrow(path: Path) -> pd.DataFrame:
+    """pyarrow 多线程解析：UTF-16 整体转码为 UTF-8 后交给 Arrow CSV 读取器，不做日期推断（与 pandas 一致，保留原文本）。"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    data = path.read_bytes().decode("utf-16").encode("utf-8")
+    header = data[: data.find(b"\n")].decode("utf-8").rstrip("\r").split("\t")
+    table = pacsv.read_csv(
+        pa.BufferReader(data),
+        parse_options=pacsv.ParseOptions(delimiter="\t"),
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: pa.string() for c in TEXT_COLUMNS if c in header},
+            null_values=_NA_VALUES,
+            strings_can_be_null=True,
+            timestamp_parsers=[],
+        ),
+    )
+    return table.to_pandas()
+
+
 def read_sensor_tower_csv(path: Path) -> pd.DataFrame:
+    try:
+        return _read_csv_arrow(path)
+    except Exception:
+        # 未安装 pyarrow 或文件格式不规整：回退 pandas
+        pass
+    dtype = {c: str for c in TEXT_COLUMNS}
     try:
         return pd.read_csv(
             path,
@@ -13,6 +58,7 @@ def read_sensor_tower_csv(path: Path) -> pd.DataFrame:
             sep="\t",
             engine="c",
             low_memory=False,
+            dtype=dtype,
         )
     except Exception:
         return pd.read_csv(
@@ -20,12 +66,75 @@ def read_sensor_tower_csv(path: Path) -> pd.DataFrame:
             encoding="utf-16",
             sep="\t",
             engine="python",
+            dtype=dtype,
         )
 
+
+def read_sensor_tower_csvs(paths: list, normalized_dir: Path = None, workers: int = None) -> list:
+    """
+    并行读取多个导出文件，按 paths 顺序返回 DataFrame 列表。
+    normalized_dir 非空时每个文件解析完即提交写 UTF-8 标准化 CSV，与其余文件的解析重叠进行，全部完成后才返回。
+    """
+    workers = max(1, min(len(paths), workers or READ_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        read_futs = [ex.submit(read_sensor_tower_csv, f) for f in paths]
+        write_futs = []
+        dfs = []
+        for f, fut in zip(paths, read_futs):
+            df = fut.result()
+            print(f"读取: {f.name}（{len(df)} 行）")
+            if normalized_dir is not None:
+                out_path = normalized_dir / f.name
+                write_futs.append((out_path, ex.submit(df.to_csv, out_path, index=False, encoding="utf-8-sig")))
+            dfs.append(df)
+        for out_path, fut in write_futs:
+            fut.result()
+            print(f"  ✅ 输出: normalized/{out_path.name}")
+    return dfs
+
+
+def raw_dir(week_tag: str, year: int) -> Path:
+    """原始 CSV 所在目录：{year}_raw_csv/{week_tag}，不存在时回退数据根目录 raw_csv/{year}/{week_tag}。"""
+    base_dir = Path(__file__).resolve().parent.parent.parent
+    path = base_dir / f"{year}_raw_csv" / week_tag
+    if not path.exists():
+        try:
+            from app.app_paths import get_data_root
+            alt_dir = get_data_root() / "raw_csv" / str(year) / week_tag
+            if alt_dir.exists():
+                path = alt_dir
+        except Exception:
+            pass
+    return path
+
+
+# 步骤记忆化声明（见 step_memo）：输入为本周原始 CSV，产出 merged_deduplicated
+MEMO_OUTPUTS = ("merged_deduplicated",)
+
+
+def memo_inputs(week_tag: str, year: int) -> dict:
+    return {"files": sorted(raw_dir(week_tag, year).glob(f"{week_tag}-*.csv"))}
+
+
+def normalized_is_current(week_tag: str, year: int) -> bool:
+    """normalized 目录下每个原始 CSV 都有不旧于它的标准化文件时返回 True（需要 normalized 时 step1 可照常复用）。"""
+    src_dir = raw_dir(week_tag, year)
+    csv_files = sorted(src_dir.glob(f"{week_tag}-*.csv"))
+    if not csv_files:
+        return False
+    for f in csv_files:
+        out = src_dir / "normalized" / f.name
+        try:
+            if out.stat().st_mtime_ns < f.stat().st_mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
 # =================================================
 # STEP1 主流程
 # =================================================
-def run_step1(week_tag: str, year: int = None, write_normalized: bool = True):
+def run_step1(week_tag: str, year: int = None, write_normalized: bool = True, ctx=None):
 
     # === 项目根目录 SLG Monitor ===
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -62,17 +171,7 @@ def run_step1(week_tag: str, year: int = None, write_normalized: bool = True):
         print(f"🔍 自动检测到年份: {year}")
 
     # === 原始 CSV 所在目录 {year}_raw_csv/0105-0111 ===
-    RAW_DIR = BASE_DIR / f"{year}_raw_csv" / week_tag
-
-    if not RAW_DIR.exists():
-        try:
-            from app.app_paths import get_data_root
-            data_root = get_data_root()
-            alt_dir = data_root / "raw_csv" / str(year) / week_tag
-            if alt_dir.exists():
-                RAW_DIR = alt_dir
-        except Exception:
-            pass
+    RAW_DIR = raw_dir(week_tag, year)
 
     if not RAW_DIR.exists():
         raise ValueError(f"❌ 未找到目录: {RAW_DIR}")
@@ -103,17 +202,8 @@ def run_step1(week_tag: str, year: int = None, write_normalized: bool = True):
     # =================================================
     # 2. 标准化 CSV (utf-16/tab → utf-8)
     # =================================================
-    df_list = []
-
-    print("\n🔹 Step 1.1: 读取 CSV 并合并")
-    for f in csv_files:
-        print(f"读取: {f.name}")
-        df = read_sensor_tower_csv(f)
-        if write_normalized:
-            out_path = NORMALIZED_DIR / f.name
-            df.to_csv(out_path, index=False, encoding="utf-8-sig")
-            print(f"  ✅ 输出: normalized/{out_path.name}")
-        df_list.append(df)
+    print("\n🔹 Step 1.1: 读取 CSV 并合并（并行）")
+    df_list = read_sensor_tower_csvs(csv_files, NORMALIZED_DIR if write_normalized else None)
 
     merged_df = pd.concat(df_list, ignore_index=True)
 
@@ -191,14 +281,14 @@ def run_step1(week_tag: str, year: int = None, write_normalized: bool = True):
     print(f"   StepB 删除行数:   {before - after}")
 
     # =================================================
-    # 7. 输出最终 XLSX
+    # 7. 输出中间表（Parquet，无引擎时为 xlsx；有上下文时交接给 STEP2，按检查点落盘）
     # =================================================
-    df_final.to_excel(FINAL_OUTPUT_PATH, index=False)
+    written = save_frame(ctx, "merged_deduplicated", df_final, FINAL_OUTPUT_PATH)
 
     print("\n==============================")
     print("✅ STEP 1 全流程完成")
     print(f"   最终剩余行数: {len(df_final)}")
-    print(f"   输出文件: {FINAL_OUTPUT_PATH}")
+    print(f"   输出文件: {written or '未落盘（内存交接给 STEP2）'}")
     print("==============================\n")
 
 
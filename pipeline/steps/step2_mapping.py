@@ -1,8 +1,46 @@
-import pandas as pd
 from pathlib import Path
 import argparse
 
-def run_step2(week_tag: str = None, year: int = None):
+try:
+    from pipeline.steps.intermediate_io import has_frame
+    from pipeline.steps.pipeline_context import load_frame, read_mapping, save_frame
+except ImportError:  # 直接运行本脚本时
+    from intermediate_io import has_frame
+    from pipeline_context import load_frame, read_mapping, save_frame
+
+# STEP2 使用的三张映射表
+MAPPING_FILES = ("产品归属.xlsx", "公司归属.xlsx", "流水系数.xlsx")
+
+
+def mapping_paths() -> dict:
+    """三张映射表的实际路径 {文件名: Path}：优先 AppData（数据根目录）/mapping，回退到项目根目录 mapping。"""
+    try:
+        from app.app_paths import get_data_root
+        data_root = get_data_root()
+    except Exception:
+        data_root = None
+
+    mapping_root = data_root / "mapping" if data_root else None
+    fallback_mapping_root = Path(__file__).resolve().parent.parent.parent / "mapping"
+
+    out = {}
+    for filename in MAPPING_FILES:
+        if mapping_root and (mapping_root / filename).is_file():
+            out[filename] = mapping_root / filename
+        else:
+            out[filename] = fallback_mapping_root / filename
+    return out
+
+
+# 步骤记忆化声明（见 step_memo）：输入为三张映射表，产出 mapped_total
+MEMO_OUTPUTS = ("mapped_total",)
+
+
+def memo_inputs(week_tag: str, year: int) -> dict:
+    return {"files": list(mapping_paths().values())}
+
+
+def run_step2(week_tag: str = None, year: int = None, ctx=None):
 
     BASE_DIR = Path(__file__).resolve().parent.parent.parent   # 项目根目录
     
@@ -14,8 +52,7 @@ def run_step2(week_tag: str = None, year: int = None):
         intermediate_dir = BASE_DIR / "intermediate"
         if week_tag and not year:
             # 只有week_tag，查找匹配的文件
-            pattern = f"*/{week_tag}/merged_deduplicated.xlsx"
-            files = list(intermediate_dir.glob(pattern))
+            files = [d / "merged_deduplicated.xlsx" for d in intermediate_dir.glob(f"*/{week_tag}") if has_frame(d / "merged_deduplicated.xlsx")]
             if files:
                 INPUT_FILE = sorted(files)[-1]  # 取最新的
             else:
@@ -32,30 +69,17 @@ def run_step2(week_tag: str = None, year: int = None):
         OUTPUT_FILE = BASE_DIR / "intermediate" / "mapped_total.xlsx"
 
     # === 读取 STEP1 总表 ===
-    df = pd.read_excel(INPUT_FILE)
+    df = load_frame(ctx, "merged_deduplicated", INPUT_FILE)
 
     # === 将 "Earliest Release Date" 重命名为 "第三方记录最早上线时间"（如果存在）===
     if "Earliest Release Date" in df.columns and "第三方记录最早上线时间" not in df.columns:
         df = df.rename(columns={"Earliest Release Date": "第三方记录最早上线时间"})
 
     # === 读取映射表（优先 AppData，回退到项目根目录） ===
-    try:
-        from app.app_paths import get_data_root
-        data_root = get_data_root()
-    except Exception:
-        data_root = None
-
-    mapping_root = data_root / "mapping" if data_root else None
-    fallback_mapping_root = BASE_DIR / "mapping"
-
-    def _pick_mapping_path(filename: str) -> Path:
-        if mapping_root and (mapping_root / filename).is_file():
-            return mapping_root / filename
-        return fallback_mapping_root / filename
-
-    prod_map_raw = pd.read_excel(_pick_mapping_path("产品归属.xlsx"))
-    comp_map = pd.read_excel(_pick_mapping_path("公司归属.xlsx"))
-    coef_map = pd.read_excel(_pick_mapping_path("流水系数.xlsx"))
+    paths = mapping_paths()
+    prod_map_raw = read_mapping(ctx, paths["产品归属.xlsx"])
+    comp_map = read_mapping(ctx, paths["公司归属.xlsx"])
+    coef_map = read_mapping(ctx, paths["流水系数.xlsx"])
 
     # ---------------------------------------------------
     # 1. 产品归属（按列名取「产品名」与「产品归属」，避免列顺序变化导致匹配错）
@@ -127,10 +151,10 @@ def run_step2(week_tag: str = None, year: int = None):
     df = df.merge(coef_map, on="Unified Name", how="left")
 
     # === 输出 ===
-    df.to_excel(OUTPUT_FILE, index=False)
+    written = save_frame(ctx, "mapped_total", df, OUTPUT_FILE)
 
     print("\n✅ STEP2 完成")
-    print(f"输出文件: {OUTPUT_FILE}\n")
+    print(f"输出文件: {written or '未落盘（内存交接给 STEP3）'}\n")
 
 
 # 允许单独运行测试
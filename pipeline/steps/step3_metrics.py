@@ -1,7 +1,16 @@
-import pandas as pd
 from pathlib import Path
 
-def run_step3(week_tag: str = None, year: int = None):
+try:
+    from pipeline.steps.intermediate_io import has_frame
+    from pipeline.steps.pipeline_context import load_frame, save_frame
+except ImportError:  # 直接运行本脚本时
+    from intermediate_io import has_frame
+    from pipeline_context import load_frame, save_frame
+
+# 步骤记忆化声明（见 step_memo）：除上一步产出外无其它输入
+MEMO_OUTPUTS = ("metrics_total",)
+
+def run_step3(week_tag: str = None, year: int = None, ctx=None):
 
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -13,8 +22,7 @@ def run_step3(week_tag: str = None, year: int = None):
         intermediate_dir = BASE_DIR / "intermediate"
         if week_tag and not year:
             # 只有week_tag，查找匹配的文件
-            pattern = f"*/{week_tag}/mapped_total.xlsx"
-            files = list(intermediate_dir.glob(pattern))
+            files = [d / "mapped_total.xlsx" for d in intermediate_dir.glob(f"*/{week_tag}") if has_frame(d / "mapped_total.xlsx")]
             if files:
                 INPUT_FILE = sorted(files)[-1]  # 取最新的
             else:
@@ -31,7 +39,7 @@ def run_step3(week_tag: str = None, year: int = None):
         OUTPUT_FILE = BASE_DIR / "intermediate" / "metrics_total.xlsx"
 
     # === 读取 STEP2 表 ===
-    df = pd.read_excel(INPUT_FILE)
+    df = load_frame(ctx, "mapped_total", INPUT_FILE)
 
     # === 必要列名 ===
     downloads_abs = "Downloads (Absolute)"
@@ -58,10 +66,10 @@ def run_step3(week_tag: str = None, year: int = None):
     df["上周周流水"] = (df[revenue_abs] - df[revenue_pop]) / df[coef_col]
 
     # === 输出 ===
-    df.to_excel(OUTPUT_FILE, index=False)
+    written = save_frame(ctx, "metrics_total", df, OUTPUT_FILE)
 
     print("\n✅ STEP3 完成")
-    print(f"输出文件: {OUTPUT_FILE}\n")
+    print(f"输出文件: {written or '未落盘（内存交接给 STEP4）'}\n")
 
 
 # 允许单独运行测试
@@ -1,7 +1,17 @@
 import pandas as pd
 from pathlib import Path
 
-def run_step4(week_tag: str = None, year: int = None):
+try:
+    from pipeline.steps.intermediate_io import has_frame
+    from pipeline.steps.pipeline_context import load_frame, save_frame
+except ImportError:  # 直接运行本脚本时
+    from intermediate_io import has_frame
+    from pipeline_context import load_frame, save_frame
+
+# 步骤记忆化声明（见 step_memo）：除上一步产出外无其它输入
+MEMO_OUTPUTS = ("pivot_table",)
+
+def run_step4(week_tag: str = None, year: int = None, ctx=None):
 
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -13,8 +23,7 @@ def run_step4(week_tag: str = None, year: int = None):
         intermediate_dir = BASE_DIR / "intermediate"
         if week_tag and not year:
             # 只有week_tag，查找匹配的文件
-            pattern = f"*/{week_tag}/metrics_total.xlsx"
-            files = list(intermediate_dir.glob(pattern))
+            files = [d / "metrics_total.xlsx" for d in intermediate_dir.glob(f"*/{week_tag}") if has_frame(d / "metrics_total.xlsx")]
             if files:
                 INPUT_FILE = sorted(files)[-1]  # 取最新的
             else:
@@ -30,7 +39,7 @@ def run_step4(week_tag: str = None, year: int = None):
     else:
         OUTPUT_FILE = BASE_DIR / "intermediate" / "pivot_table.xlsx"
 
-    df = pd.read_excel(INPUT_FILE)
+    df = load_frame(ctx, "metrics_total", INPUT_FILE)
 
     # === 列名定义 ===
     col_company = "公司归属"
@@ -117,10 +126,10 @@ def run_step4(week_tag: str = None, year: int = None):
     final = final[out_cols + val_cols]
 
     # === 输出 ===
-    final.to_excel(OUTPUT_FILE, index=False)
+    written = save_frame(ctx, "pivot_table", final, OUTPUT_FILE)
 
     print("\n✅ STEP4 完成")
-    print(f"输出文件: {OUTPUT_FILE}\n")
+    print(f"输出文件: {written or '未落盘（内存交接给 STEP5）'}\n")
 
 
 # 允许单独运行
@@ -3,7 +3,10 @@ import argparse
 from openpyxl import load_workbook
 from openpyxl.styles import Font
 
-def run_step5_5(week_tag: str = None, year: int = None):
+# 步骤记忆化声明（见 step_memo）：不声明产出——step5 单遍写出时已设置箭头颜色，第一步流程中本步不再改写文件
+MEMO_OUTPUTS = ()
+
+def run_step5_5(week_tag: str = None, year: int = None, ctx=None):
 
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
     
@@ -22,6 +25,12 @@ def run_step5_5(week_tag: str = None, year: int = None):
         else:
             FILE_PATH = BASE_DIR / "output" / "SLG数据监测表.xlsx"
 
+    if ctx is not None:
+        # 同一流程中 step5 已用 report_writer 写好箭头颜色，无需重新加载、保存；
+        # 单独运行本脚本时仍按原方式对已有文件重新染色（兼容旧版生成的监测表）
+        print("\n🎯 STEP5.5 跳过：箭头颜色已在 STEP5 写出时设置")
+        return
+
     wb = load_workbook(FILE_PATH)
     ws = wb.active
 
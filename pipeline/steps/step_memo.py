@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+第一步（step1→step5_5）按输入指纹跳过未变化的步骤。
+- 每个步骤模块声明 MEMO_OUTPUTS（产出表名；"report" 为 output 下的数据监测表，名字带 ? 表示只校验存在）
+  与可选的 memo_inputs(week_tag, year) -> {"files": [...], "values": {...}}；
+- 指纹 = 上一步指纹 + 本步代码（步骤脚本与中间表读写模块的内容）+ pandas 版本 + 声明的输入文件内容摘要 + 配置值，
+  因此改监测规则只影响 step5 起的指纹，改映射表只影响 step2 起的指纹，上游步骤直接复用磁盘上的产出；
+- 只跳过链条开头连续未变化的步骤：一旦某步重跑，其后各步一律重跑（下游读的是刚写出的产出）；
+- 记录存于 intermediate/{年}/{周}/step_memo.json：指纹与产出文件的 (大小, mtime)。产出被删除、被覆盖（如维护页上传
+  metrics_total.xlsx）或本次未落盘（PIPELINE_CHECKPOINTS 未包含该表）时不会跳过；
+- 输入文件摘要按 (路径, 大小, mtime) 缓存在同一清单中，原始 CSV 未变化时不重复计算；
+- PIPELINE_MEMO=0 关闭。
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+try:
+    from pipeline.steps.intermediate_io import frame_path
+except ImportError:  # 直接运行步骤脚本时
+    from intermediate_io import frame_path
+
+MANIFEST = "step_memo.json"
+ENABLED = os.environ.get("PIPELINE_MEMO", "1").strip().lower() not in ("0", "false", "no")
+
+_STEPS_DIR = Path(__file__).resolve().parent
+# 所有步骤共用的读写模块：其代码变化也会改变各步产出
+_SHARED_CODE = ("intermediate_io.py", "pipeline_context.py", "monitor_rules.py", "report_writer.py", "formatted_json.py",
+                "mapping_cache.py")
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class StepMemo:
+    """某一周的步骤记忆：fingerprint 计算指纹，is_fresh 判断能否跳过，record 在步骤完成后登记产出。"""
+
+    def __init__(self, base_dir: Path, year: int, week_tag: str):
+        self.base_dir = Path(base_dir)
+        self.year = year
+        self.week_tag = week_tag
+        self.week_dir = self.base_dir / "intermediate" / str(year) / week_tag
+        self.path = self.week_dir / MANIFEST
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            self.data = {}
+        self.data.setdefault("steps", {})
+        self.data.setdefault("digests", {})
+
+    def _digest(self, path: Path) -> str:
+        """文件内容摘要，按 (大小, mtime) 缓存；文件不存在时返回 missing。"""
+        try:
+            st = path.stat()
+        except OSError:
+            return "missing"
+        key = str(path)
+        cached = self.data["digests"].get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = _sha256_file(path)
+        self.data["digests"][key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def fingerprint(self, step: str, parent: str, mod) -> str:
+        import pandas as pd
+        h = hashlib.sha256()
+        h.update(("%s\n%s\npandas=%s\n" % (parent, step, pd.__version__)).encode("utf-8"))
+        for code in [Path(mod.__file__)] + [_STEPS_DIR / name for name in _SHARED_CODE]:
+            h.update(("%s=%s\n" % (code.name, self._digest(code))).encode("utf-8"))
+        inputs = mod.memo_inputs(self.week_tag, self.year) if hasattr(mod, "memo_inputs") else {}
+        for f in inputs.get("files") or []:
+            f = Path(f)
+            h.update(("file:%s=%s\n" % (f.name, self._digest(f))).encode("utf-8"))
+        values = inputs.get("values")
+        if values:
+            h.update(json.dumps(values, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def _outputs(self, mod) -> list:
+        """[(路径或 None, 是否校验 mtime), ...]；中间表取 .parquet / .xlsx 中较新者。"""
+        out = []
+        for name in getattr(mod, "MEMO_OUTPUTS", ()):
+            exact = not name.endswith("?")
+            name = name.rstrip("?")
+            if name == "report":
+                path = self.base_dir / "output" / str(self.year) / f"{self.week_tag}_SLG数据监测表.xlsx"
+                out.append((path if path.is_file() else None, exact))
+            else:
+                out.append((frame_path(self.week_dir / f"{name}.xlsx"), exact))
+        return out
+
+    def is_fresh(self, step: str, fp: str, mod) -> bool:
+        entry = self.data["steps"].get(step)
+        if not entry or entry.get("fp") != fp or not getattr(mod, "MEMO_OUTPUTS", ()):
+            return False
+        recorded = entry.get("outputs") or {}
+        for path, exact in self._outputs(mod):
+            if path is None:
+                return False
+            if exact:
+                st = path.stat()
+                if recorded.get(str(path)) != [st.st_size, st.st_mtime_ns]:
+                    return False
+        return True
+
+    def record(self, step: str, fp: str, mod, since_ns: int) -> None:
+        """
+        步骤成功后登记：需校验 mtime 的产出必须是本次（since_ns 之后）写出的，否则说明本次未落盘，不登记该步。
+        清单立即写盘，中途失败时已完成的步骤下次仍可跳过。
+        """
+        outputs = {}
+        ok = True
+        for path, exact in self._outputs(mod):
+            if not exact:
+                continue
+            if path is None:
+                ok = False
+                break
+            st = path.stat()
+            # 留 1 秒余量：部分文件系统 mtime 精度较粗
+            if st.st_mtime_ns < since_ns - 1_000_000_000:
+                ok = False
+                break
+            outputs[str(path)] = [st.st_size, st.st_mtime_ns]
+        if ok:
+            self.data["steps"][step] = {"fp": fp, "outputs": outputs}
+        else:
+            self.data["steps"].pop(step, None)
+        self.save()
+
+    def save(self) -> None:
+        self.week_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
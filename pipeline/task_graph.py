@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+流水线任务依赖图：每个任务声明依赖（deps），调度器在线程池中执行所有依赖已完成的任务，
+整周耗时取决于关键路径而不是各步耗时之和。
+- 线程数默认 CPU 核数，PIPELINE_WORKERS 可覆盖；任务多为子进程脚本，线程只负责等待与调度；
+- when 在依赖完成后才求值（如「本轮 build_final_join 是否生成了 final_join 目录」），不满足时打印 skip_note 并视为完成；
+- 某任务失败时其下游全部跳过，互不依赖的任务照常执行完，最后整体返回 False；
+- 结束后输出关键路径报告：总耗时、各任务耗时合计、关键路径上的任务链；
+- CANCEL 为进程级取消标志（任务队列 worker 失去租约时置位）：置位后不再启动新任务，已在执行的任务结束后整体返回 False。
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+CANCEL = threading.Event()
+
+
+def default_workers() -> int:
+    raw = os.environ.get("PIPELINE_WORKERS", "").strip()
+    if raw.isdigit() and int(raw) > 0:
+        return int(raw)
+    return os.cpu_count() or 1
+
+
+class Task:
+    """依赖图中的一个任务：fn() 返回真值表示成功。"""
+
+    def __init__(self, name: str, fn, deps=(), when=None, skip_note: str = ""):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.when = when
+        self.skip_note = skip_note
+
+
+def _check(tasks: list) -> str:
+    """校验任务名唯一、依赖存在且无环；有问题时返回说明，否则返回空串。"""
+    names = [t.name for t in tasks]
+    if len(set(names)) != len(names):
+        return "任务名重复"
+    known = set(names)
+    for t in tasks:
+        missing = [d for d in t.deps if d not in known]
+        if missing:
+            return f"{t.name} 依赖未定义的任务: {', '.join(missing)}"
+    deps = {t.name: set(t.deps) for t in tasks}
+    done = set()
+    while len(done) < len(tasks):
+        ready = [n for n in names if n not in done and deps[n] <= done]
+        if not ready:
+            return "任务依赖存在环: " + ", ".join(n for n in names if n not in done)
+        done.update(ready)
+    return ""
+
+
+def _run_one(task: Task):
+    """执行单个任务，返回 (状态, 开始, 结束)；状态为 ok / skipped / failed。"""
+    start = time.perf_counter()
+    try:
+        if task.when is not None and not task.when():
+            if task.skip_note:
+                print(f"  ⏭ 跳过 {task.name}（{task.skip_note}）")
+            return "skipped", start, time.perf_counter()
+        ok = task.fn()
+    except Exception as e:
+        print(f"  ❌ {task.name} 异常: {e}")
+        ok = False
+    return ("ok" if ok else "failed"), start, time.perf_counter()
+
+
+def critical_path(tasks: list, timings: dict) -> list:
+    """从最晚结束的任务沿「最晚完成的依赖」回溯，得到决定总耗时的任务链。"""
+    by_name = {t.name: t for t in tasks}
+    finished = [n for n in timings if n in by_name]
+    if not finished:
+        return []
+    name = max(finished, key=lambda n: timings[n][1])
+    path = [name]
+    while True:
+        deps = [d for d in by_name[name].deps if d in timings]
+        if not deps:
+            break
+        name = max(deps, key=lambda d: timings[d][1])
+        path.append(name)
+    path.reverse()
+    return path
+
+
+def run_tasks(tasks: list, workers: int = None, report: dict = None) -> bool:
+    """
+    按依赖执行 tasks，全部成功（或按 when 跳过）返回 True。
+    report 传入 dict 时填入 status（任务名 → ok / skipped / failed / blocked / cancelled）、timings（任务名 → (开始, 结束) 秒）、
+    critical_path、elapsed。
+    """
+    problem = _check(tasks)
+    if problem:
+        print(f"  ❌ 任务图无效: {problem}")
+        return False
+    workers = max(1, workers or default_workers())
+    pending = {t.name: t for t in tasks}
+    status = {}
+    timings = {}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        running = {}
+        while pending or running:
+            if CANCEL.is_set() and pending:
+                for name in list(pending):
+                    status[name] = "cancelled"
+                    del pending[name]
+                print("  ⏹ 已取消，未开始的任务不再执行")
+            # 上游失败：下游直接标记 blocked
+            for name, t in list(pending.items()):
+                if any(status.get(d) in ("failed", "blocked") for d in t.deps):
+                    status[name] = "blocked"
+                    del pending[name]
+                    print(f"  ⏭ 跳过 {name}（上游任务失败）")
+            for name, t in list(pending.items()):
+                if all(status.get(d) in ("ok", "skipped") for d in t.deps):
+                    running[ex.submit(_run_one, t)] = name
+                    del pending[name]
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                state, start, end = fut.result()
+                status[name] = state
+                timings[name] = (start - t0, end - t0)
+                if state == "failed":
+                    print(f"  ❌ {name} 失败")
+    elapsed = time.perf_counter() - t0
+    path = critical_path(tasks, {n: v for n, v in timings.items() if status[n] != "skipped"})
+    _print_report(timings, path, elapsed, workers)
+    if report is not None:
+        report.update(status=status, timings=timings, critical_path=path, elapsed=elapsed)
+    return all(s in ("ok", "skipped") for s in status.values())
+
+
+def _print_report(timings: dict, path: list, elapsed: float, workers: int) -> None:
+    if not timings:
+        return
+    total = sum(end - start for start, end in timings.values())
+    print(f"  ⏱ 总耗时 {elapsed:.1f}s（各任务耗时合计 {total:.1f}s，{workers} 线程）")
+    if path:
+        chain = " → ".join(f"{n} {timings[n][1] - timings[n][0]:.1f}s" for n in path)
+        print(f"  ⏱ 关键路径: {chain}")
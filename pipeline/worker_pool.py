@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+前端转换脚本 / 拉数脚本 / 目标产品脚本的常驻进程池：脚本在预热好的 worker 进程中按模块调用，
+不再每次启动新解释器、重新导入 pandas / openpyxl（每次数百毫秒，批量重建多周时占大头）。
+- 各脚本提供可导入的入口：run(year, week_tag)（全局脚本为 run()），返回 False 表示失败；
+  拉数脚本提供 main(argv)，按命令行参数执行；
+- 进程数默认 CPU 核数（PIPELINE_WORKERS 可覆盖），用 spawn 启动，多线程的服务端中也安全；冻结版同样可用
+  （入口已调用 multiprocessing.freeze_support），不再退化为串行 runpy；
+- worker 按 (路径, mtime) 缓存已加载的脚本模块，脚本更新后下次调用自动重新加载；
+- 父进程 stdout 被重定向到日志文件（无控制台模式）时，worker 的输出写入同一文件；
+- PIPELINE_SUBPROCESS=1 时不用进程池，仍按原方式逐个启动子进程（便于对比或排查）。
+"""
+import importlib.util
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+ENABLED = os.environ.get("PIPELINE_SUBPROCESS", "").strip().lower() not in ("1", "true", "yes")
+# worker 启动时预先导入，首个任务即可直接执行
+PRELOAD = ("pandas", "openpyxl")
+
+_POOL = None
+_LOCK = threading.Lock()
+_MODULES = {}
+
+
+def _init_worker(root: str, log_path: str = None) -> None:
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    if log_path:
+        try:
+            log_file = open(log_path, "a", encoding="utf-8", buffering=1)
+            sys.stdout = log_file
+            sys.stderr = log_file
+        except OSError:
+            pass
+    else:
+        # 与子进程 PYTHONUNBUFFERED=1 一致：日志逐行可见
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.reconfigure(line_buffering=True)
+            except Exception:
+                pass
+    for name in PRELOAD:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def _load(path: str):
+    """按文件路径加载脚本模块，(路径, mtime) 未变时复用。"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _MODULES.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    p = Path(path)
+    spec = importlib.util.spec_from_file_location(f"_pool_{p.parent.name}_{p.stem}", p)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    _MODULES[path] = (mtime, mod)
+    return mod
+
+
+def _call(path: str, func: str, args: tuple):
+    """worker 内执行：返回 True / False；脚本没有该入口时返回 None（调用方改用子进程）。"""
+    try:
+        fn = getattr(_load(path), func, None)
+        if fn is None:
+            return None
+        try:
+            result = fn(*args)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 0
+            if code not in (0, None):
+                print(f"  ❌ {Path(path).name} 执行失败，退出码: {code}")
+            return code in (0, None)
+        return result is not False
+    except Exception as exc:
+        print(f"  ❌ {Path(path).name} 执行失败: {exc}")
+        return False
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _log_path():
+    """父进程 stdout 已重定向到普通文件时返回其路径。"""
+    name = getattr(sys.stdout, "name", None)
+    if isinstance(name, str) and not name.startswith("<") and os.path.isfile(name):
+        return name
+    return None
+
+
+def get_pool():
+    global _POOL
+    with _LOCK:
+        if _POOL is None:
+            import multiprocessing
+            from pipeline.task_graph import default_workers
+            _POOL = ProcessPoolExecutor(
+                max_workers=default_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(str(ROOT_DIR), _log_path()),
+            )
+        return _POOL
+
+
+def shutdown() -> None:
+    global _POOL
+    with _LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def call_script(script: Path, func: str = "run", args: tuple = ()):
+    """
+    在进程池中执行脚本的 func(*args)，阻塞到完成。返回 True / False；
+    进程池未启用、无法启动或脚本没有该入口时返回 None，由调用方回退为子进程执行。
+    """
+    global _POOL
+    if not ENABLED:
+        return None
+    sys.stdout.flush()
+    try:
+        fut = get_pool().submit(_call, str(script), func, tuple(args))
+    except Exception as exc:
+        print(f"  ⚠️ 进程池不可用（{exc}），改用子进程")
+        return None
+    try:
+        return fut.result()
+    except BrokenProcessPool:
+        # worker 异常退出（如内存不足被杀）：丢弃进程池，下次调用重建
+        with _LOCK:
+            _POOL = None
+        print(f"  ❌ {script.name} 执行失败：worker 进程异常退出")
+        return False
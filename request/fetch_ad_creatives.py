@@ -384,7 +384,8 @@ def parse_app_list(app_ids=None, app_ids_file=None, app_list_file=None):
     return out
 
 
-def main():
+def main(argv=None):
+    """argv 为 None 时读命令行；流水线在常驻进程池中调用时直接传参数列表。"""
     parser = argparse.ArgumentParser(
         description="拉取广告创意数据，写入 advertisements/{年}/{周}/ 或 request/ad_creatives/"
     )
@@ -409,7 +410,7 @@ def main():
     parser.add_argument("--xlsx", action="store_true", help="同时写入 xlsx（默认仅写 json，供 MySQL 同步）")
     parser.add_argument("--strict", action="store_true", help="任一请求失败即退出，默认跳过失败继续")
     parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"并发请求数，默认 {DEFAULT_CONCURRENCY}；设为 1 则串行")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     app_list = parse_app_list(
         app_ids=args.app_ids,
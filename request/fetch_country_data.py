@@ -194,8 +194,9 @@ def _fetch_one(
     xlsx_dir,
     save_xlsx_too,
     debug,
+    sink=None,
 ):
-    """单个 app 拉取并落盘，供线程池调用。返回 (app_id, None) 成功，(app_id, exception) 失败。"""
+    """单个 app 拉取并落盘，供线程池调用。返回 (app_id, None) 成功，(app_id, exception) 失败。sink 非空时另存一份返回数据（写入 country_facts 用）。"""
     app_id = app_id.strip()
     if not app_id:
         return (app_id, None)
@@ -217,6 +218,8 @@ def _fetch_one(
         if isinstance(data, dict) and "data" in data:
             data = data["data"]
         save_json(app_id, data, json_dir=json_dir)
+        if sink is not None:
+            sink[app_id] = data
         if save_xlsx_too:
             save_xlsx(app_id, data, xlsx_dir=xlsx_dir)
         return (app_id, None)
@@ -251,6 +254,8 @@ def run(
         json_dir = BASE_DIR / "countiesdata" / str(year) / week_tag / product_type / "json"
         xlsx_dir = BASE_DIR / "countiesdata" / str(year) / week_tag / product_type / "xlsx"
         print(f"  写入: countiesdata/{year}/{week_tag}/{product_type}/json" + (" 与 xlsx" if save_xlsx_too else ""))
+    # 指定年/周时把拉到的数据同时写入 country_facts（启用数据库时），下游 T 度汇总直接走 SQL
+    sink = {} if (year is not None and week_tag and product_type) else None
     token = load_token()
     workers = int(concurrency) if concurrency is not None else DEFAULT_CONCURRENCY
     workers = max(1, min(workers, 20))
@@ -263,7 +268,7 @@ def run(
             _, exc = _fetch_one(
                 app_id, token, start_date, end_date, os_platform,
                 date_granularity, countries, data_model,
-                json_dir, xlsx_dir, save_xlsx_too, debug,
+                json_dir, xlsx_dir, save_xlsx_too, debug, sink,
             )
             if exc is None:
                 ok += 1
@@ -283,7 +288,7 @@ def run(
                     _fetch_one,
                     app_id, token, start_date, end_date, os_platform,
                     date_granularity, countries, data_model,
-                    json_dir, xlsx_dir, save_xlsx_too, debug,
+                    json_dir, xlsx_dir, save_xlsx_too, debug, sink,
                 ): app_id
                 for app_id in app_ids
             }
@@ -301,9 +306,23 @@ def run(
         if fail > MAX_SKIP_LOGS:
             print(f"  ... 其余 {fail - MAX_SKIP_LOGS} 个已跳过")
         print(f"  地区数据：成功 {ok}，跳过 {fail}")
+    if sink:
+        _store_country_facts(year, week_tag, product_type, sink)
 
 
-def main():
+def _store_country_facts(year, week_tag, product_type, sink):
+    """写入国家维度事实表；未启用数据库或 backend 不可用时静默跳过（JSON 已落盘）。"""
+    try:
+        from backend.db.country_facts import country_rows, store_fetched
+    except ImportError:
+        return
+    n = store_fetched(year, week_tag, product_type, {app_id: country_rows(data) for app_id, data in sink.items()}, BASE_DIR)
+    if n >= 0:
+        print(f"  已写入 country_facts：{len(sink)} 个 app，{n} 行")
+
+
+def main(argv=None):
+    """argv 为 None 时读命令行；流水线在常驻进程池中调用时直接传参数列表。"""
     parser = argparse.ArgumentParser(
         description="拉取下载/收入估算（API: GET /v1/{os}/sales_report_estimates）"
     )
@@ -322,7 +341,7 @@ def main():
     parser.add_argument("--product_type", choices=["strategy_old", "strategy_new"], help="与 --year、--week 一起时写入 countiesdata/{年}/{周}/strategy_old 或 strategy_new")
     parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"并发请求数，默认 {DEFAULT_CONCURRENCY}；设为 1 则串行")
     parser.add_argument("--test", action="store_true", help="测试模式：只请求第一个 app_id，打印详细调试信息")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     app_ids = []
     if args.app_ids:
@@ -84,13 +84,20 @@ def _parse_multipart_form_data(body: bytes, content_type: str):
     return fields, files_list
 
 
-def _excel_to_headers_rows(path: Path) -> tuple:
-    """读取 Excel 第一 sheet，返回 (headers: list, rows: list of list)。文件不存在或读失败返回 ([], [])。"""
+def _excel_to_headers_rows(path: Path, cache: bool = False) -> tuple:
+    """
+    读取 Excel 第一 sheet，返回 (headers: list, rows: list of list)。文件不存在或读失败返回 ([], [])。
+    cache=True 用于 mapping / labels 底表：经 mapping_cache 读取，表未改动时不重复解析。
+    """
     if not path or not path.is_file():
         return [], []
     try:
         import pandas as pd
-        df = pd.read_excel(path)
+        if cache:
+            from pipeline.steps.mapping_cache import read_mapping_table
+            df = read_mapping_table(path)
+        else:
+            df = pd.read_excel(path)
     except Exception:
         return [], []
     if df.empty:
@@ -110,6 +117,113 @@ def _excel_to_headers_rows(path: Path) -> tuple:
     return headers, rows
 
 
+def _schedule_basetable_export(names) -> None:
+    """
+    行级编辑 / 追加提交后调用：库中数据为准，请求内只留「待写回」标记，BASETABLE_EXPORT_DELAY_S 秒后合并写回一次 xlsx
+    （流水线与文件模式读的是 xlsx；流水线、整表同步读 xlsx 之前也会先写回，见 sync_maintenance.flush_dirty_basetables）。
+    """
+    try:
+        from backend.db.sync_maintenance import mark_basetables_dirty
+        mark_basetables_dirty(names, DATA_ROOT)
+    except ImportError:
+        return
+    with _BASETABLE_EXPORT_LOCK:
+        _BASETABLE_EXPORT_PENDING.update(names)
+        if _BASETABLE_EXPORT_TIMER[0] is None:
+            timer = threading.Timer(BASETABLE_EXPORT_DELAY_S, _flush_basetable_export)
+            timer.daemon = True
+            _BASETABLE_EXPORT_TIMER[0] = timer
+            timer.start()
+
+
+def _flush_basetable_export() -> None:
+    """写回所有待写回的底表；产品归属表变化时重新生成题材/画风 JSON。"""
+    with _BASETABLE_EXPORT_LOCK:
+        names = set(_BASETABLE_EXPORT_PENDING)
+        _BASETABLE_EXPORT_PENDING.clear()
+        _BASETABLE_EXPORT_TIMER[0] = None
+    try:
+        from backend.db.connection import get_connection
+        from backend.db.sync_maintenance import dirty_basetables, flush_dirty_basetables
+    except ImportError:
+        return
+    conn = get_connection()
+    if not conn:
+        logging.warning("底表写回 xlsx 失败：数据库连接失败")
+        return
+    try:
+        with BASETABLE_FILE_LOCK:
+            flush_dirty_basetables(conn, DATA_ROOT)
+    finally:
+        conn.close()
+    left = dirty_basetables(DATA_ROOT)
+    if left:
+        logging.warning("底表写回 xlsx 失败: %s", ", ".join(left))
+    # 标记也可能已被流水线写回，按本进程记下的表名重建 JSON
+    if "product_mapping" in names:
+        _refresh_theme_style_mapping()
+
+
+def _refresh_theme_style_mapping() -> None:
+    """
+    产品归属表变化后调用：重新生成题材/画风 JSON；启用数据库时再在后台写入映射表并按新映射重算各周汇总
+    （题材 / 画风合计依赖映射，见 week_aggregates.sync_mapping），完成后清掉按周取数缓存。
+    """
+    try:
+        from pipeline.run_full_pipeline import run_frontend_script
+        run_frontend_script("convert_product_mapping_to_json.py")
+        from backend.db import api_data
+        api_data.invalidate_product_theme_style_mapping()
+    except Exception:
+        pass
+    try:
+        from backend.db.config import use_mysql
+    except ImportError:
+        return
+    if use_mysql():
+        threading.Thread(target=_sync_mapping_aggregates, daemon=True).start()
+
+
+def _sync_mapping_aggregates() -> None:
+    from backend.db import api_data
+    from backend.db.connection import get_connection
+    from backend.db.week_aggregates import sync_mapping
+    # 多次更新排队串行重算，避免并发重写同一批周
+    with _MAPPING_SYNC_LOCK:
+        conn = get_connection()
+        if not conn:
+            logging.warning("按新映射重算周汇总失败：数据库连接失败")
+            return
+        try:
+            n = sync_mapping(conn, DATA_ROOT)
+        except Exception as e:
+            logging.warning("按新映射重算周汇总失败: %s", e)
+            return
+        finally:
+            conn.close()
+    if n:
+        api_data.invalidate_product_theme_style_mapping()
+        api_data.invalidate_week_data()
+
+
+def _flush_basetables_now() -> None:
+    """上传替换 / 合并底表前调用（持 BASETABLE_FILE_LOCK）：先把待写回的行级编辑写进 xlsx，再在其基础上合并或替换。"""
+    try:
+        from backend.db.config import use_mysql
+        from backend.db.connection import get_connection
+        from backend.db.sync_maintenance import dirty_basetables, flush_dirty_basetables
+    except ImportError:
+        return
+    if not use_mysql() or not dirty_basetables(DATA_ROOT):
+        return
+    conn = get_connection()
+    if conn:
+        try:
+            flush_dirty_basetables(conn, DATA_ROOT)
+        finally:
+            conn.close()
+
+
 def _normalize_headers(headers: list) -> list:
     out = []
     for h in headers or []:
@@ -304,6 +418,73 @@ def _run_phase1_batch(root_dir: Path, write_normalized: bool = False) -> None:
     _phase1_batch_update(running=False, current="", finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
 
 
+def _ensure_week_live(year, week_tag) -> None:
+    """已归档的旧周在首次访问时恢复（见 backend/db/week_archive.py），恢复后清掉取数缓存。"""
+    if not str(year or "").isdigit() or not week_tag:
+        return
+    try:
+        from backend.db import week_archive
+        if week_archive.ensure_week(DATA_ROOT, int(year), week_tag):
+            from backend.db import api_data
+            api_data.invalidate_week_data()
+    except Exception:
+        pass
+
+
+def _static_week(parts):
+    """静态路径 {year}/{week}_formatted.json 或 {year}/{week}/... 对应的 (年, 周)；不是按周的文件返回 None。"""
+    if len(parts) < 2 or not (parts[0].isdigit() and len(parts[0]) == 4):
+        return None
+    if len(parts) == 2:
+        name = parts[1]
+        return (parts[0], name[: -len("_formatted.json")]) if name.endswith("_formatted.json") else None
+    return parts[0], parts[1]
+
+
+def _enqueue_pipeline_jobs(specs: list, batch: str = None):
+    """
+    启用任务队列（PIPELINE_JOB_QUEUE=1 且启用数据库）时把 [(kind, year, week_tag, params), ...] 入队，由独立 worker
+    （python -m pipeline.job_worker）执行，返回任务 id 列表；未启用或入队失败返回 None，调用方仍在本进程内同步执行。
+    """
+    try:
+        from backend.db import job_queue
+        from backend.db.connection import get_connection
+    except ImportError:
+        return None
+    if not job_queue.queue_enabled():
+        return None
+    conn = get_connection()
+    if not conn:
+        return None
+    try:
+        return [job_queue.enqueue(conn, kind, year, week_tag, params, batch=batch) for kind, year, week_tag, params in specs]
+    except Exception as exc:
+        logging.warning("enqueue pipeline jobs failed: %s", exc)
+        return None
+    finally:
+        conn.close()
+
+
+def _estimate_api_calls(fetch_country: bool, year: int, week_tag: str, target: str, product_type: str, limit, unified_id) -> int:
+    """2.1 / 2.2 步消耗的 ST API 调用次数（计入 api_usage）：地区数据每产品 1 次，创意数据每产品 4 次。"""
+    from pipeline.run_full_pipeline import get_app_ids_from_strategy_file, get_target_products_with_limit
+    if fetch_country:
+        if unified_id:
+            return 1
+        if target != "strategy":
+            return 0
+        n = 0
+        if product_type in ("old", "both"):
+            n += len(get_app_ids_from_strategy_file(year, week_tag, "target_strategy_old.xlsx", limit=limit))
+        if product_type in ("new", "both"):
+            n += len(get_app_ids_from_strategy_file(year, week_tag, "target_strategy_new.xlsx", limit=limit))
+        return n
+    if unified_id:
+        return 4
+    _, app_list = get_target_products_with_limit(year, week_tag, limit, target_source=target, product_type=product_type)
+    return len(app_list) * 4
+
+
 def _setup_file_logging(log_path: Path) -> None:
     """Write server logs to a file when running in no-console mode."""
     try:
@@ -347,6 +528,17 @@ BASETABLE_SOURCES = {
     "gameplay_label": LABELS_DIR / "玩法标签表.xlsx",
     "art_style_label": LABELS_DIR / "画风标签表.xlsx",
 }
+# 底表 xlsx 的写入互斥：上传替换（写文件 + 整表同步入库）与行级编辑后的写回依次执行，不会互相覆盖
+BASETABLE_FILE_LOCK = threading.Lock()
+# 行级编辑后延迟合并写回 xlsx 的等待秒数（见 _schedule_basetable_export）
+try:
+    BASETABLE_EXPORT_DELAY_S = max(0.0, float(os.environ.get("BASETABLE_EXPORT_DELAY_S", "10")))
+except ValueError:
+    BASETABLE_EXPORT_DELAY_S = 10.0
+_BASETABLE_EXPORT_LOCK = threading.Lock()
+_MAPPING_SYNC_LOCK = threading.Lock()
+_BASETABLE_EXPORT_PENDING = set()
+_BASETABLE_EXPORT_TIMER = [None]
 THEME_STYLE_MAPPING_PATH = FRONTEND_DATA_DIR / "product_theme_style_mapping.json"
 INDEX_HTML_PATH = FRONTEND_DIR / "index.html"
 MONITOR_RULES_PATH = DATA_ROOT / "config" / "monitor_rules.json"
@@ -385,6 +577,26 @@ def _phase1_batch_update(**kwargs) -> None:
             PHASE1_BATCH_STATE[k] = v
 
 
+def _phase1_batch_queue_snapshot():
+    """任务队列模式下的批量进度（来自 pipeline_jobs，服务重启不丢失）；未启用队列或无批次返回 None。"""
+    try:
+        from backend.db import job_queue
+        from backend.db.connection import get_connection
+    except ImportError:
+        return None
+    if not job_queue.queue_enabled():
+        return None
+    conn = get_connection()
+    if not conn:
+        return None
+    try:
+        return job_queue.batch_status(conn)
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
 def _load_auth_users():
     """加载 deploy/auth_users.json，格式：{"users": [{"username", "salt", "hash", "role?", "status?"}]}。"""
     if not AUTH_USERS_PATH.is_file():
@@ -550,10 +762,17 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             return str((root.joinpath(*parts)).resolve())
 
         if raw_path.startswith("/frontend/data/"):
+            # 已归档的旧周：前端直接取 {周}_formatted.json、{周}/product_strategy_*.json 时同样先恢复
+            week = _static_week(path_parts[2:])
+            if week:
+                _ensure_week_live(*week)
             return _from_root(DATA_ROOT / "frontend" / "data", path_parts[2:])
         if raw_path.startswith("/output/"):
             return _from_root(DATA_ROOT / "output", path_parts[1:])
         if raw_path.startswith("/advertisements/"):
+            week = _static_week(path_parts[1:])
+            if week:
+                _ensure_week_live(*week)
             return _from_root(DATA_ROOT / "advertisements", path_parts[1:])
         if raw_path.startswith("/request/"):
             return _from_root(DATA_ROOT / "request", path_parts[1:])
@@ -917,7 +1136,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps({"error": "missing or invalid name"}, ensure_ascii=False).encode("utf-8"))
             return True
         path = BASETABLE_SOURCES[name]
-        headers, rows = _excel_to_headers_rows(path)
+        headers, rows = _excel_to_headers_rows(path, cache=True)
         self.send_response(200)
         self.send_header("Content-Type", "application/json; charset=utf-8")
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -932,6 +1151,9 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             return False
         if not self._require_super_admin():
             return True
+        qs = urllib.parse.parse_qs((self.path or "").split("?", 1)[1] if "?" in (self.path or "") else "")
+        if (qs.get("engine") or [""])[0].strip().lower() == "duckdb":
+            return self._handle_analytics_tables(raw)
         use_db = False
         conn = None
         try:
@@ -996,8 +1218,114 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(json.dumps({"ok": False, "message": "Not Found"}, ensure_ascii=False).encode("utf-8"))
         return True
 
+    def _handle_analytics_tables(self, raw):
+        """GET /api/advanced_query/tables|table/<name>?engine=duckdb：列式分析引擎（按周 Parquet）的表列表 / 结构与样例行，不需要 MySQL。"""
+        try:
+            from backend.db import analytics
+        except ImportError:
+            analytics = None
+        if analytics is None or not analytics.enabled():
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(json.dumps({"ok": False, "message": "列式分析引擎未启用（需 ANALYTICS_ENGINE=duckdb 并安装 duckdb）"}, ensure_ascii=False).encode("utf-8"))
+            return True
+        if raw == "/api/advanced_query/tables":
+            status, out = 200, {"tables": analytics.get_tables(), "engine": "duckdb"}
+        elif raw.startswith("/api/advanced_query/table/"):
+            info = analytics.get_table_info(raw[len("/api/advanced_query/table/"):].strip())
+            status, out = (200, info) if info is not None else (404, {"ok": False, "message": "表不存在或尚未导出"})
+        else:
+            status, out = 404, {"ok": False, "message": "Not Found"}
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(json.dumps(out, ensure_ascii=False).encode("utf-8"))
+        return True
+
+    def _run_analytics_query(self, sql, data):
+        """engine=duckdb：在按周 Parquet 上执行 SELECT（向量化执行，行数上限 limit，默认 10000），结果结构同 MySQL 的 json 输出。"""
+        try:
+            from backend.db import analytics
+        except ImportError:
+            analytics = None
+        if analytics is None:
+            out = {"error": "列式分析引擎不可用"}
+        else:
+            try:
+                limit = int(data.get("limit") or analytics.MAX_SELECT_ROWS)
+            except (TypeError, ValueError):
+                limit = analytics.MAX_SELECT_ROWS
+            try:
+                out = analytics.run_select(sql, max_rows=limit)
+            except analytics.QueryRejected as e:
+                out = {"error": str(e)}
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        if "error" in out:
+            body = {"ok": False, "message": out["error"]}
+        else:
+            body = {"ok": True, "headers": out["headers"], "rows": out["rows"], "truncated": out["truncated"],
+                    "rowCount": len(out["rows"]), "stats": out["stats"]}
+        self.wfile.write(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        return True
+
+    def _stream_advanced_query(self, conn, aq, sql, data):
+        """
+        SELECT 走服务端游标流式输出（见 advanced_query.stream_select），边取边写，不在内存中缓存整个结果集。
+        执行受 advanced_query.guarded_query 约束（EXPLAIN 代价预检、并发名额、MAX_EXECUTION_TIME），统计信息写在结果末尾 stats。
+        Body 可选：format=json|ndjson|csv，limit（json 默认 MAX_SELECT_ROWS，ndjson/csv 默认不限），key + after（keyset 翻页）。
+        """
+        fmt = str(data.get("format") or "json").strip().lower()
+        default_limit = aq.MAX_SELECT_ROWS if fmt == "json" else 0
+        try:
+            limit = int(data.get("limit") if data.get("limit") is not None else default_limit)
+        except (TypeError, ValueError):
+            limit = default_limit
+        started = []
+
+        def write(chunk):
+            if not started:
+                started.append(True)
+                self.send_response(200)
+                if fmt == "csv":
+                    self.send_header("Content-Type", "text/csv; charset=utf-8")
+                    self.send_header("Content-Disposition", "attachment; filename=advanced_query_result.csv")
+                elif fmt == "ndjson":
+                    self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+                else:
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+            self.wfile.write(chunk)
+
+        try:
+            with aq.guarded_query(conn, sql) as stats:
+                out = aq.stream_select(
+                    conn, sql, write, fmt=fmt, limit=limit,
+                    key=data.get("key") or "", after=data.get("after") or "",
+                    on_finish=lambda consumed: aq.finish_stats(conn, stats, consumed),
+                )
+        except aq.QueryRejected as e:
+            out = {"error": str(e)}
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中途断开：结果未读完，guarded_query 已直接关闭连接，服务端游标随之释放
+            return True
+        if "error" in out and not started:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(json.dumps({"ok": False, "message": out["error"]}, ensure_ascii=False).encode("utf-8"))
+        return True
+
     def _handle_advanced_query_execute(self):
-        """POST /api/advanced_query/execute：Body JSON { "sql": "..." }，执行 SQL 并返回结果或影响行数。仅超级管理员；需 MySQL。"""
+        """POST /api/advanced_query/execute：Body JSON { "sql": "..." }，执行 SQL 并返回结果或影响行数。仅超级管理员；需 MySQL。
+        Body 带 engine=duckdb 时改在列式分析引擎（按周 Parquet）上执行只读查询，见 backend/db/analytics.py。"""
         if not self._require_super_admin():
             return True
         length = int(self.headers.get("Content-Length", 0) or 0)
@@ -1026,6 +1354,8 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"ok": False, "message": "SQL 不能为空"}, ensure_ascii=False).encode("utf-8"))
             return True
+        if str(data.get("engine") or "").strip().lower() == "duckdb":
+            return self._run_analytics_query(sql, data)
         conn = None
         try:
             from backend.db.config import use_mysql
@@ -1046,6 +1376,8 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({"ok": False, "message": "数据库连接失败"}, ensure_ascii=False).encode("utf-8"))
                 return True
+            if aq.is_select(sql):
+                return self._stream_advanced_query(conn, aq, sql, data)
             out = aq.execute_sql(conn, sql)
         except Exception as e:
             self.send_response(500)
@@ -1139,6 +1471,9 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         except ImportError:
             pass
 
+        # 按周取数前确认该周未被归档；已归档时先解包恢复（一次 stat，未归档时几乎无开销）
+        _ensure_week_live((params.get("year") or [""])[0].strip(), (params.get("week") or [""])[0].strip())
+
         def send_json(obj):
             self.send_response(200)
             self.send_header("Content-Type", "application/json; charset=utf-8")
@@ -1156,6 +1491,9 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                     pass
             return None
 
+        if raw == "/api/data/cache_stats":
+            # 取数缓存命中率（进程内 L1 + 多实例共享 L2），各实例分别统计；文件模式不经缓存
+            return send_json(api_data.cache_stats() if use_db else {})
         if raw == "/api/data/weeks_index":
             out = api_data.get_weeks_index() if use_db else read_json_path(WEEKS_INDEX_PATH)
             if out is not None:
@@ -1216,6 +1554,49 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 if out is not None:
                     return send_json(out)
             return send_json({})
+        if raw == "/api/data/product_history":
+            unified_id = (params.get("unified_id") or [""])[0].strip()
+            if not unified_id:
+                self.send_response(400)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "unified_id required"}, ensure_ascii=False).encode("utf-8"))
+                return True
+            try:
+                limit = int((params.get("weeks") or [52])[0])
+            except (TypeError, ValueError):
+                limit = 52
+            limit = max(1, min(limit, 520))
+            if use_db:
+                out = api_data.get_product_history(unified_id, limit=limit)
+            else:
+                # 单机文件模式：无 product_history 表，按周读取 JSON 抽取（较慢，仅兜底）
+                from backend.db.product_history import history_from_files
+                out = history_from_files(FRONTEND_DATA_DIR, read_json_path(WEEKS_INDEX_PATH) or {}, unified_id, limit)
+            if out is not None:
+                return send_json(out)
+            return send_json({"unifiedId": unified_id, "weeks": []})
+        if raw == "/api/data/country_breakdown":
+            unified_id = (params.get("unified_id") or [""])[0].strip()
+            year = (params.get("year") or [""])[0].strip()
+            week = (params.get("week") or [""])[0].strip()
+            if not unified_id or not year.isdigit() or not week:
+                self.send_response(400)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "unified_id, year and week required"}, ensure_ascii=False).encode("utf-8"))
+                return True
+            if use_db:
+                out = api_data.get_country_breakdown(unified_id, year, week)
+            else:
+                # 单机文件模式：直接读该 app 当周的地区 JSON
+                from backend.db.country_facts import breakdown_from_files, load_tier_mapping
+                out = breakdown_from_files(DATA_ROOT, unified_id, int(year), week, load_tier_mapping(MAPPING_DIR / "市场T度.csv"))
+            if out is not None:
+                return send_json(out)
+            return send_json({"unifiedId": unified_id, "year": int(year), "week": week, "countries": [], "tiers": {}})
         if raw == "/api/data/company_detail_panels":
             year = (params.get("year") or [""])[0].strip()
             week = (params.get("week") or [""])[0].strip()
@@ -1237,6 +1618,34 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "no data for this company in this week"}, ensure_ascii=False).encode("utf-8"))
             return True
+        if raw.startswith("/api/data/aggregates/"):
+            # 按周物化汇总：company（公司累计安装/流水与排名）、theme（题材/画风合计）、top_products、rule_hits
+            from backend.db.week_aggregates import KINDS as AGGREGATE_KINDS, aggregates_from_files
+            kind = raw[len("/api/data/aggregates/"):]
+            year = (params.get("year") or [""])[0].strip()
+            week = (params.get("week") or [""])[0].strip()
+            if kind not in AGGREGATE_KINDS or not year.isdigit() or not week:
+                self.send_response(400)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "kind (%s), year and week required" % "|".join(AGGREGATE_KINDS)}, ensure_ascii=False).encode("utf-8"))
+                return True
+            if use_db:
+                out = api_data.get_week_aggregate(year, week, kind)
+            else:
+                # 单机文件模式：无 week_aggregates 表，读该周 JSON 现场计算（较慢，仅兜底）
+                out = aggregates_from_files(FRONTEND_DATA_DIR, year, week, read_json_path(THEME_STYLE_MAPPING_PATH)).get(kind)
+            if out is None:
+                out = {}
+            try:
+                limit = int((params.get("limit") or [0])[0])
+            except (TypeError, ValueError):
+                limit = 0
+            if limit > 0:
+                # 看板只要前 N 名时按 limit 截断列表
+                out = {k: v[:limit] if isinstance(v, list) else v for k, v in out.items()}
+            return send_json({"year": int(year), "week": week, "kind": kind, "data": out})
         if raw == "/api/data/creative_products":
             year = (params.get("year") or [""])[0].strip()
             week = (params.get("week") or [""])[0].strip()
@@ -1388,7 +1797,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             if name in BASETABLE_SOURCES:
                 out = api_data.get_basetable(name) if use_db else None
                 if not use_db:
-                    headers, rows = _excel_to_headers_rows(BASETABLE_SOURCES[name])
+                    headers, rows = _excel_to_headers_rows(BASETABLE_SOURCES[name], cache=True)
                     out = {"headers": headers, "rows": rows} if (headers or rows) else None
                 if out is not None:
                     return send_json(out)
@@ -1898,6 +2307,8 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             return
         if self._handle_maintenance_phase1_batch_status():
             return
+        if self._handle_jobs():
+            return
         if self._handle_video_proxy():
             return
         if self._handle_maintenance_download():
@@ -1946,7 +2357,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         """CORS 预检：允许对 maintenance、auth 接口的 POST，避免浏览器报 Method Not Allowed。"""
         path = (self.path or "").split("?")[0].rstrip("/")
-        if path in ("/api/maintenance/phase1", "/api/maintenance/phase1_table_only", "/api/maintenance/phase1_batch_start", "/api/maintenance/refresh_weeks_index", "/api/maintenance/rebuild_monitor_table", "/api/maintenance/phase2_1", "/api/maintenance/phase2_2", "/api/maintenance/mapping_update", "/api/maintenance/newproducts_update", "/api/maintenance/add_to_product_mapping", "/api/auth/login", "/api/auth/logout", "/api/auth/register", "/api/auth/approve", "/api/auth/promote", "/api/auth/delete", "/api/monitor_rules", "/api/advanced_query/execute", "/api/api_management"):
+        if path in ("/api/maintenance/phase1", "/api/maintenance/phase1_table_only", "/api/maintenance/phase1_batch_start", "/api/maintenance/refresh_weeks_index", "/api/maintenance/rebuild_monitor_table", "/api/maintenance/phase2_1", "/api/maintenance/phase2_2", "/api/maintenance/mapping_update", "/api/maintenance/newproducts_update", "/api/maintenance/add_to_product_mapping", "/api/auth/login", "/api/auth/logout", "/api/auth/register", "/api/auth/approve", "/api/auth/promote", "/api/auth/delete", "/api/monitor_rules", "/api/advanced_query/execute", "/api/api_management", "/api/basetable/row", "/api/jobs/enqueue"):
             self.send_response(200)
             self.send_header("Access-Control-Allow-Origin", "*")
             self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
@@ -2020,6 +2431,9 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                     "message": "上传文件数不足 13 个，当前仅 %d 个，无法处理。请补全后重试。" % saved
                 }, ensure_ascii=False).encode("utf-8"))
                 return True
+            queued = _enqueue_pipeline_jobs([("phase1", year, week_val, {})])
+            if queued is not None:
+                return self._reply_queued(queued, "CSV 已保存，第一步已加入任务队列，由 worker 执行后自动更新前端并同步数据库。")
             from pipeline.run_full_pipeline import ensure_raw_csv_for_step1, run_phase1, run_phase3
             ensure_raw_csv_for_step1(year, week_val)
             if not run_phase1(week_val, year):
@@ -2062,7 +2476,12 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                     pass
             # 第一步完成后显式将 metrics_total 转为 JSON，供数据底表「产品总表」展示
             metrics_xlsx = DATA_ROOT / "intermediate" / str(year) / week_val / "metrics_total.xlsx"
-            if metrics_xlsx.is_file():
+            try:
+                from pipeline.steps.intermediate_io import has_frame
+                has_metrics = has_frame(metrics_xlsx)
+            except ImportError:
+                has_metrics = metrics_xlsx.is_file()
+            if has_metrics:
                 try:
                     from pipeline.run_full_pipeline import run_frontend_script
                     run_frontend_script("convert_metrics_to_json.py", year=year, week_tag=week_val)
@@ -2276,6 +2695,15 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, "root_dir not found")
                 return True
             write_normalized = bool(data.get("write_normalized", False))
+            # 任务队列模式：每周一个第一步任务，由 worker 执行，进度落库（批次号区分各次批量）
+            batch = "phase1-" + time.strftime("%Y%m%d%H%M%S")
+            specs = [
+                ("phase1", year, week_tag, {"source_dir": str(week_dir), "source_root": str(root_dir), "write_normalized": write_normalized})
+                for year, week_tag, week_dir in _scan_phase1_batch_root(root_dir)
+            ]
+            queued = _enqueue_pipeline_jobs(specs, batch=batch) if specs else None
+            if queued is not None:
+                return self._reply_queued(queued, "已将 %d 个周的第一步加入任务队列（批次 %s）" % (len(queued), batch), batch=batch)
             snapshot = _phase1_batch_snapshot()
             if snapshot.get("running"):
                 self.send_response(200)
@@ -2317,7 +2745,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         if raw != "/api/maintenance/phase1_batch_status":
             return False
         try:
-            snapshot = _phase1_batch_snapshot()
+            snapshot = _phase1_batch_queue_snapshot() or _phase1_batch_snapshot()
             self.send_response(200)
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.send_header("Access-Control-Allow-Origin", "*")
@@ -2339,6 +2767,109 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 pass
             return True
 
+    def _reply_queued(self, job_ids: list, message: str, **extra):
+        """维护接口在任务队列模式下的统一返回：{ok, queued: true, jobIds, message}，前端可用 GET /api/jobs 查看进度。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        out = {"ok": True, "queued": True, "jobIds": job_ids, "message": message}
+        out.update(extra)
+        self.wfile.write(json.dumps(out, ensure_ascii=False).encode("utf-8"))
+        return True
+
+    def _handle_jobs(self):
+        """GET /api/jobs?status=&batch=&limit=：最近的流水线任务；GET /api/jobs/<id>：单个任务。仅超级管理员。"""
+        raw = (self.path or "").split("?")[0].rstrip("/")
+        if raw != "/api/jobs" and not raw.startswith("/api/jobs/"):
+            return False
+        if not self._require_super_admin():
+            return True
+
+        def reply(code, obj):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+            return True
+
+        try:
+            from backend.db import job_queue
+            from backend.db.connection import get_connection
+        except ImportError:
+            return reply(503, {"ok": False, "message": "任务队列需启用数据库"})
+        conn = get_connection()
+        if not conn:
+            return reply(503, {"ok": False, "message": "数据库连接失败"})
+        try:
+            if raw.startswith("/api/jobs/"):
+                job_id = raw[len("/api/jobs/"):]
+                job = job_queue.get_job(conn, int(job_id)) if job_id.isdigit() else None
+                if not job:
+                    return reply(404, {"ok": False, "message": "任务不存在"})
+                return reply(200, {"ok": True, "job": job})
+            qs = urllib.parse.parse_qs((self.path or "").split("?", 1)[-1] if "?" in self.path else "")
+            status = (qs.get("status") or [""])[0].strip() or None
+            batch = (qs.get("batch") or [""])[0].strip() or None
+            limit = (qs.get("limit") or ["50"])[0].strip()
+            jobs = job_queue.list_jobs(conn, status=status, batch=batch, limit=int(limit) if limit.isdigit() else 50)
+            return reply(200, {"ok": True, "enabled": job_queue.queue_enabled(), "jobs": jobs})
+        except Exception as e:
+            self.log_message("jobs error: %s", e)
+            return reply(500, {"ok": False, "message": str(e)})
+        finally:
+            conn.close()
+
+    def _handle_jobs_enqueue(self):
+        """POST /api/jobs/enqueue：Body JSON { kind, year?, week_tag?, params? }，直接入队一个流水线任务（不要求开启 PIPELINE_JOB_QUEUE）。仅超级管理员。"""
+        if not self._require_super_admin():
+            return True
+
+        def reply(code, obj):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+            return True
+
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        if length <= 0 or length > 1024 * 1024:
+            return reply(400, {"ok": False, "message": "请求体为空或过大"})
+        try:
+            data = json.loads(self.rfile.read(length).decode("utf-8"))
+        except Exception:
+            return reply(400, {"ok": False, "message": "请求体须为 JSON"})
+        kind = str(data.get("kind") or "").strip()
+        year_val = str(data.get("year") or "").strip()
+        week_val = str(data.get("week_tag") or "").strip()
+        params = data.get("params") if isinstance(data.get("params"), dict) else {}
+        try:
+            from backend.db import job_queue
+            from backend.db.config import use_mysql
+            from backend.db.connection import get_connection
+        except ImportError:
+            return reply(503, {"ok": False, "message": "任务队列需启用数据库"})
+        if kind not in job_queue.KINDS:
+            return reply(400, {"ok": False, "message": "kind 须为 " + " / ".join(job_queue.KINDS)})
+        if kind != "mapping_update":
+            if not year_val.isdigit() or len(year_val) != 4 or not re.match(r"^\d{4}-\d{4}$", week_val):
+                return reply(400, {"ok": False, "message": "year 须为 4 位数字，week_tag 形如 0119-0125"})
+        if not use_mysql():
+            return reply(503, {"ok": False, "message": "任务队列需启用数据库"})
+        conn = get_connection()
+        if not conn:
+            return reply(503, {"ok": False, "message": "数据库连接失败"})
+        try:
+            job_id = job_queue.enqueue(conn, kind, int(year_val or 0), week_val, params)
+            return reply(200, {"ok": True, "jobId": job_id})
+        except Exception as e:
+            self.log_message("jobs/enqueue error: %s", e)
+            return reply(500, {"ok": False, "message": str(e)})
+        finally:
+            conn.close()
+
     def _handle_monitor_rules_post(self):
         """POST /api/monitor_rules：保存数据监测表规则。Body JSON: { rules }。"""
         path = (self.path or "").split("?")[0].rstrip("/")
@@ -2404,26 +2935,33 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 weeks = _list_weeks_from_index()
             if not weeks:
                 weeks = [(int(year_val), week_val)]
+            queued = _enqueue_pipeline_jobs([("rebuild_monitor_table", y, w, {}) for y, w in weeks])
+            if queued is not None:
+                return self._reply_queued(queued, "已将 %d 个周的重建加入任务队列。" % len(queued))
 
             sys.path.insert(0, str(RESOURCE_ROOT))
             from pipeline.run_full_pipeline import run_frontend_script
             from pipeline.steps.step4_pivot import run_step4
             from pipeline.steps.step5_final_report import run_step5
             from pipeline.steps.step5_5_fix_arrow_color import run_step5_5
+            from pipeline.steps.intermediate_io import has_frame
+            from pipeline.steps.pipeline_context import PipelineContext
 
             rebuilt = []
             skipped = []
             failed = []
             for y, w in weeks:
                 metrics_path = BASE_DIR / "intermediate" / str(y) / w / "metrics_total.xlsx"
-                if not metrics_path.is_file():
+                if not has_frame(metrics_path):
                     skipped.append(f"{y}-{w}")
                     continue
+                # step4→step5_5 内存交接
+                ctx = PipelineContext(w, y)
                 try:
-                    run_step4(w, y)
-                    run_step5(w, y)
-                    run_step5_5(w, y)
-                    run_frontend_script("convert_excel_with_format.py", year=y, week_tag=w)
+                    run_step4(w, y, ctx=ctx)
+                    run_step5(w, y, ctx=ctx)
+                    run_step5_5(w, y, ctx=ctx)
+                    # formatted.json 已由 step5 直接写出
                     rebuilt.append(f"{y}-{w}")
                 except Exception as e:
                     failed.append(f"{y}-{w}: {e}")
@@ -2492,7 +3030,15 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 limit = limit_raw
             year = int(year_val)
             unified_id = (data.get("unified_id") or "").strip() or None
-            from pipeline.run_full_pipeline import run_phase2, run_phase3, classify_single_product_to_target, get_app_ids_from_strategy_file
+            job_params = {"target": target, "product_type": product_type, "limit": limit, "unified_id": unified_id or ""}
+            queued = _enqueue_pipeline_jobs([("phase2_1", year, week_val, job_params)])
+            if queued is not None:
+                # 队列模式：API 用量在入队时按目标产品数计入
+                api_calls = _estimate_api_calls(True, year, week_val, target, product_type, limit, unified_id)
+                if api_calls > 0:
+                    _increment_api_usage(api_calls)
+                return self._reply_queued(queued, "2.1 步已加入任务队列，由 worker 拉取地区数据后自动更新前端并同步数据库。")
+            from pipeline.run_full_pipeline import run_phase2, run_phase3, classify_single_product_to_target
             if not run_phase2(
                 week_val, year,
                 fetch_country=True,
@@ -2517,16 +3063,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({"ok": False, "message": "前端更新执行失败"}, ensure_ascii=False).encode("utf-8"))
                 return True
-            api_calls = 0
-            if unified_id:
-                api_calls = 1
-            elif target != "strategy":
-                api_calls = 0
-            else:
-                if product_type in ("old", "both"):
-                    api_calls += len(get_app_ids_from_strategy_file(year, week_val, "target_strategy_old.xlsx", limit=limit))
-                if product_type in ("new", "both"):
-                    api_calls += len(get_app_ids_from_strategy_file(year, week_val, "target_strategy_new.xlsx", limit=limit))
+            api_calls = _estimate_api_calls(True, year, week_val, target, product_type, limit, unified_id)
             if api_calls > 0:
                 _increment_api_usage(api_calls)
             synced_mysql = False
@@ -2610,7 +3147,14 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 limit = limit_raw
             year = int(year_val)
             unified_id = (data.get("unified_id") or "").strip() or None
-            from pipeline.run_full_pipeline import run_phase2, run_phase3, classify_single_product_to_target, get_target_products_with_limit
+            job_params = {"target": target, "product_type": product_type, "limit": limit, "unified_id": unified_id or ""}
+            queued = _enqueue_pipeline_jobs([("phase2_2", year, week_val, job_params)])
+            if queued is not None:
+                api_calls = _estimate_api_calls(False, year, week_val, target, product_type, limit, unified_id)
+                if api_calls > 0:
+                    _increment_api_usage(api_calls)
+                return self._reply_queued(queued, "2.2 步已加入任务队列，由 worker 拉取创意数据后自动更新前端并同步数据库。")
+            from pipeline.run_full_pipeline import run_phase2, run_phase3, classify_single_product_to_target
             if not run_phase2(
                 week_val, year,
                 fetch_country=False,
@@ -2635,12 +3179,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({"ok": False, "message": "前端更新执行失败"}, ensure_ascii=False).encode("utf-8"))
                 return True
-            api_calls = 0
-            if unified_id:
-                api_calls = 4
-            else:
-                _, app_list = get_target_products_with_limit(year, week_val, limit, target_source=target, product_type=product_type)
-                api_calls = len(app_list) * 4
+            api_calls = _estimate_api_calls(False, year, week_val, target, product_type, limit, unified_id)
             if api_calls > 0:
                 _increment_api_usage(api_calls)
             synced_mysql = False
@@ -2725,28 +3264,26 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 import sys
                 sys.path.insert(0, str(RESOURCE_ROOT))
                 from scripts.update_mapping_from_upload import run as run_mapping_update
-                ok, msg = run_mapping_update(Path(tmp_path))
-                if ok:
-                    try:
-                        from pipeline.run_full_pipeline import run_frontend_script
-                        run_frontend_script("convert_product_mapping_to_json.py")
-                    except Exception:
-                        pass
-                    try:
-                        from backend.db.config import use_mysql
-                        from backend.db.connection import get_connection
-                        from backend.db.sync_maintenance import sync_basetable_from_files
-                    except ImportError:
-                        pass
-                    else:
-                        if use_mysql():
-                            conn = get_connection()
-                            if conn:
-                                try:
-                                    if sync_basetable_from_files(conn, DATA_ROOT):
-                                        msg = msg + " 已同步到 MySQL。"
-                                finally:
-                                    conn.close()
+                with BASETABLE_FILE_LOCK:
+                    _flush_basetables_now()
+                    ok, msg = run_mapping_update(Path(tmp_path))
+                    if ok:
+                        _refresh_theme_style_mapping()
+                        try:
+                            from backend.db.config import use_mysql
+                            from backend.db.connection import get_connection
+                            from backend.db.sync_maintenance import sync_basetable_from_files
+                        except ImportError:
+                            pass
+                        else:
+                            if use_mysql():
+                                conn = get_connection()
+                                if conn:
+                                    try:
+                                        if sync_basetable_from_files(conn, DATA_ROOT):
+                                            msg = msg + " 已同步到 MySQL。"
+                                    finally:
+                                        conn.close()
             finally:
                 try:
                     os.unlink(tmp_path)
@@ -2858,6 +3395,65 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 pass
             return True
 
+    def _handle_basetable_row(self):
+        """
+        POST /api/basetable/row：数据底表单行增 / 改 / 删（行级存储，见 backend/db/basetable_rows.py）。仅超级管理员；需数据库模式。
+        Body JSON { name, action: insert|update|delete, key, row: [...] 或 {列名: 值}, version }；
+        update/delete 须带 GET /api/basetable 返回的 keys / versions 中对应的 key 与 version，版本不符返回 409 与当前版本。
+        """
+        if not self._require_super_admin():
+            return True
+
+        def reply(code, obj):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+            return True
+
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        if length <= 0 or length > 1024 * 1024:
+            return reply(400, {"ok": False, "message": "请求体为空或过大"})
+        try:
+            data = json.loads(self.rfile.read(length).decode("utf-8"))
+        except Exception:
+            return reply(400, {"ok": False, "message": "请求体须为 JSON"})
+        name = str(data.get("name") or "").strip()
+        action = str(data.get("action") or "").strip()
+        key = str(data.get("key") or "").strip()
+        if name not in BASETABLE_SOURCES:
+            return reply(400, {"ok": False, "message": "missing or invalid name"})
+        if action not in ("insert", "update", "delete"):
+            return reply(400, {"ok": False, "message": "action 须为 insert / update / delete"})
+        if action != "insert" and (not key or data.get("version") is None):
+            return reply(400, {"ok": False, "message": "update / delete 须提供 key 与 version"})
+        try:
+            from backend.db.config import use_mysql
+            from backend.db.connection import get_connection
+            from backend.db import api_data, basetable_rows
+        except ImportError:
+            return reply(503, {"ok": False, "message": "单行编辑需启用数据库"})
+        if not use_mysql():
+            return reply(503, {"ok": False, "message": "单行编辑需启用数据库"})
+        conn = get_connection()
+        if not conn:
+            return reply(503, {"ok": False, "message": "数据库连接失败"})
+        try:
+            if action == "insert":
+                out = basetable_rows.insert_row(conn, name, data.get("row"))
+            elif action == "update":
+                out = basetable_rows.update_row(conn, name, key, data.get("row"), data.get("version"))
+            else:
+                out = basetable_rows.delete_row(conn, name, key, data.get("version"))
+        finally:
+            conn.close()
+        if out.get("ok"):
+            _schedule_basetable_export([name])
+            api_data.invalidate_basetable(name)
+            return reply(200, out)
+        return reply(409 if out.get("conflict") else 200, out)
+
     def _handle_basetable_upload(self):
         """POST /api/basetable/upload：上传并替换数据底表（xlsx），列名需与原表一致。"""
         try:
@@ -3029,28 +3625,26 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                         self.end_headers()
                         self.wfile.write(json.dumps({"ok": False, "message": "列名不一致，无法更新"}, ensure_ascii=False).encode("utf-8"))
                         return True
-                target_path.parent.mkdir(parents=True, exist_ok=True)
-                target_path.write_bytes(content)
-                if name == "product_mapping":
+                with BASETABLE_FILE_LOCK:
+                    _flush_basetables_now()
+                    target_path.parent.mkdir(parents=True, exist_ok=True)
+                    target_path.write_bytes(content)
+                    if name == "product_mapping":
+                        _refresh_theme_style_mapping()
                     try:
-                        from pipeline.run_full_pipeline import run_frontend_script
-                        run_frontend_script("convert_product_mapping_to_json.py")
-                    except Exception:
+                        from backend.db.config import use_mysql
+                        from backend.db.connection import get_connection
+                        from backend.db.sync_maintenance import sync_basetable_from_files
+                    except ImportError:
                         pass
-                try:
-                    from backend.db.config import use_mysql
-                    from backend.db.connection import get_connection
-                    from backend.db.sync_maintenance import sync_basetable_from_files
-                except ImportError:
-                    pass
-                else:
-                    if use_mysql():
-                        conn = get_connection()
-                        if conn:
-                            try:
-                                sync_basetable_from_files(conn, DATA_ROOT)
-                            finally:
-                                conn.close()
+                    else:
+                        if use_mysql():
+                            conn = get_connection()
+                            if conn:
+                                try:
+                                    sync_basetable_from_files(conn, DATA_ROOT)
+                                finally:
+                                    conn.close()
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json; charset=utf-8")
                 self.send_header("Access-Control-Allow-Origin", "*")
@@ -3146,6 +3740,8 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                 if conn:
                     try:
                         added = append_product_mapping_rows(conn, normalized)
+                        if added > 0:
+                            _schedule_basetable_export(["product_mapping", "company_mapping"])
                     finally:
                         conn.close()
                         self.send_response(200)
@@ -3158,6 +3754,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                             self.wfile.write(json.dumps({"ok": True, "message": "所选产品均已在产品归属表中，无新增", "added": 0}, ensure_ascii=False).encode("utf-8"))
                         return True
             import pandas as pd
+            from pipeline.steps.mapping_cache import read_mapping_table
             PROD_XLSX = MAPPING_DIR / "产品归属.xlsx"
             COMP_XLSX = MAPPING_DIR / "公司归属.xlsx"
             df_new = pd.DataFrame(normalized, columns=OUT_COLS)
@@ -3165,7 +3762,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             df_old = pd.DataFrame()
             if PROD_XLSX.exists():
                 try:
-                    df_old = pd.read_excel(PROD_XLSX)
+                    df_old = read_mapping_table(PROD_XLSX)
                     if not df_old.empty and "产品归属" in df_old.columns:
                         existing_belong = set(df_old["产品归属"].astype(str).str.strip().replace("nan", "").dropna().unique())
                     elif not df_old.empty and df_old.shape[1] >= 5:
@@ -3194,7 +3791,7 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             df_merged.to_excel(PROD_XLSX, index=False)
             if not df_new.empty and COMP_XLSX.exists():
                 try:
-                    df_comp = pd.read_excel(COMP_XLSX)
+                    df_comp = read_mapping_table(COMP_XLSX)
                     comp_pairs = df_new[["发行商", "公司归属"]].drop_duplicates()
                     comp_pairs = comp_pairs[comp_pairs["发行商"].notna() & (comp_pairs["发行商"].astype(str).str.strip() != "")]
                     if not comp_pairs.empty and not df_comp.empty and df_comp.shape[1] >= 2:
@@ -3206,12 +3803,8 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
                         comp_pairs.to_excel(COMP_XLSX, index=False)
                 except Exception:
                     pass
-            try:
-                sys.path.insert(0, str(RESOURCE_ROOT))
-                from pipeline.run_full_pipeline import run_frontend_script
-                run_frontend_script("convert_product_mapping_to_json.py")
-            except Exception:
-                pass
+            sys.path.insert(0, str(RESOURCE_ROOT))
+            _refresh_theme_style_mapping()
             self.send_response(200)
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.send_header("Access-Control-Allow-Origin", "*")
@@ -3291,9 +3884,15 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         if path == "/api/basetable/upload":
             if self._handle_basetable_upload():
                 return
+        if path == "/api/basetable/row":
+            if self._handle_basetable_row():
+                return
         if path == "/api/advanced_query/execute":
             if self._handle_advanced_query_execute():
                 return
+        if path == "/api/jobs/enqueue":
+            if self._handle_jobs_enqueue():
+                return
         if READ_ONLY_SERVER:
             self.send_error(405, "Method Not Allowed (read-only server)")
             self.log_message("BLOCKED POST %s", self.path)
@@ -3412,6 +4011,15 @@ def run_server(
 
     if on_ready:
         on_ready(used_port)
+    # 上次退出前未写回的行级编辑
+    try:
+        from backend.db.config import use_mysql
+        from backend.db.sync_maintenance import dirty_basetables
+        left = dirty_basetables(DATA_ROOT) if use_mysql() else []
+        if left:
+            _schedule_basetable_export(left)
+    except ImportError:
+        pass
 
     try:
         with httpd:
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""pytest 公共配置：仓库根目录加入 sys.path，测试按 pipeline.steps.* / backend.db.* 导入（与流水线一致）。"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
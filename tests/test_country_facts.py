@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""country_facts：SQL 按 T 度汇总与 build_final_join.aggregate_by_tier 逐条取整的结果一致，且按 product_type 区分。"""
+import random
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from backend.db import country_facts as cf
+from backend.db.sqlite_backend import connect
+from pipeline.steps.build_final_join import aggregate_by_tier
+
+TIERS = {"US": "欧美T1", "JP": "亚洲T1", "BR": "T2", "DE": "欧美T1", "XX": "其它"}
+WEEK = "0105-0111"
+
+
+def _raw(rng, n):
+    return [
+        {
+            "country": rng.choice(["US", "jp", " BR", "DE", "XX", "ZZ", None, "nan"]),
+            "unified_units": rng.choice([rng.random() * 50, rng.randint(0, 9), None, "12"]),
+            "unified_revenue": rng.random() * 99,
+        }
+        for _ in range(n)
+    ]
+
+
+def _baseline(raw):
+    # load_country_data_for_app 只规范化有国家代码的记录，缺失的保持 None（汇总时归 T3）
+    rows = [dict(r, country=str(r["country"]).strip().upper() if r["country"] is not None else None) for r in raw]
+    return aggregate_by_tier(rows, TIERS)
+
+
+@pytest.fixture
+def cur(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    with conn.cursor() as c:
+        cf.sync_country_tiers(c, TIERS)
+        yield c
+    conn.close()
+
+
+def test_tier_aggregates_match_row_by_row_truncation(cur):
+    rng = random.Random(7)
+    raw = {f"app{i}": _raw(rng, 150) for i in range(6)}
+    cf.store_app_facts(cur, 2026, WEEK, "strategy_old", {a: cf.country_rows(r) for a, r in raw.items()})
+    got = cf.tier_aggregates(cur, 2026, WEEK, "strategy_old", list(raw))
+    for app_id, r in raw.items():
+        assert got[app_id] == _baseline(r)
+
+
+def test_product_types_are_kept_apart(cur):
+    cf.store_app_facts(cur, 2026, WEEK, "strategy_old", {"a": {"US": (10, 1)}})
+    cf.store_app_facts(cur, 2026, WEEK, "strategy_new", {"a": {"JP": (3, 2)}})
+    old = cf.tier_aggregates(cur, 2026, WEEK, "strategy_old", ["a"])["a"]
+    new = cf.tier_aggregates(cur, 2026, WEEK, "strategy_new", ["a"])["a"]
+    assert (old["欧美T1_安装"], old["亚洲T1_安装"]) == (10, 0)
+    assert (new["欧美T1_安装"], new["亚洲T1_安装"]) == (0, 3)
+    assert cf.apps_with_facts(cur, 2026, WEEK, "strategy_new", ["a", "b"]) == {"a"}
+    # 重拉覆盖只影响同一类型
+    cf.store_app_facts(cur, 2026, WEEK, "strategy_old", {"a": {"BR": (1, 1)}})
+    assert cf.tier_aggregates(cur, 2026, WEEK, "strategy_new", ["a"])["a"] == new
+
+
+def test_breakdown_lists_countries_and_counts_unknown_in_t3(cur):
+    cf.store_app_facts(cur, 2026, WEEK, "strategy_old", {"a": cf.country_rows([
+        {"country": "US", "unified_units": 5.9, "unified_revenue": 1},
+        {"country": None, "unified_units": 2, "unified_revenue": 3},
+    ])})
+    out = cf.country_breakdown(cur, "a", 2026, WEEK)
+    assert [c["country"] for c in out["countries"]] == ["US"]
+    assert out["countries"][0]["downloads"] == 5
+    assert out["tiers"]["T3"] == {"downloads": 2, "revenue": 3}
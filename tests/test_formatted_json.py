@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""formatted_from_frame 的单元格文本与「写 xlsx 再由 openpyxl 读回 str()」（原 convert_excel_with_format 路径）一致。"""
+import pytest
+
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+openpyxl = pytest.importorskip("openpyxl")
+
+from pipeline.steps.formatted_json import (
+    DOWN_FONT,
+    STRIKE_FONT,
+    SUMMARY_ROW_BG,
+    TARGET_ROW_BG,
+    UP_FONT,
+    formatted_from_frame,
+)
+
+
+def _openpyxl_texts(df, path):
+    df.to_excel(path, index=False, engine="openpyxl")
+    ws = openpyxl.load_workbook(path).active
+    return [[str(c.value) if c.value is not None else "" for c in row] for row in ws.iter_rows(min_row=2)]
+
+
+def test_cell_text_matches_openpyxl(tmp_path):
+    values = [1000.0, 0.1 + 0.2, 1e20, 1.5e-7, 12345678901234567, np.nan, None, "", "x", 3, 2.5, -0.0,
+              123456789.123456789, np.int64(7), np.float64(0.25)]
+    df = pd.DataFrame({"v": values}, dtype=object)
+    df["f"] = pd.Series([float(i) / 3 for i in range(len(values))])
+    df["i"] = pd.Series(range(len(values)), dtype="int64")
+    n = len(df)
+    got = formatted_from_frame(df, [False] * n, [False] * n)["rows"]
+    assert got == _openpyxl_texts(df, tmp_path / "t.xlsx")
+
+
+def test_styles_follow_masks():
+    df = pd.DataFrame({
+        "公司归属": ["A公司", "A公司汇总", "B"],
+        "产品归属": ["甲", "乙", "丙"],
+        "周安装变动": ["12.00%▲", "", "-3.00%▼"],
+    })
+    out = formatted_from_frame(df, strike=[True, True, False], yellow=[False, True, True])
+    header, row0, row1, row2 = out["styles"]
+    assert all(s["bold"] for s in header)
+    # 划删除线：产品名红字；周变动上升红字
+    assert row0[1] == {"font_color": STRIKE_FONT}
+    assert row0[2] == {"font_color": UP_FONT}
+    # 汇总行浅蓝，优先于标黄，且不标红产品名
+    assert row1[1] == {"bg_color": SUMMARY_ROW_BG}
+    # 标黄行黄底；周变动下降绿字
+    assert row2[0] == {"bg_color": TARGET_ROW_BG}
+    assert row2[2] == {"font_color": DOWN_FONT, "bg_color": TARGET_ROW_BG}
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""中间表 Parquet 写入前的类型整理（_arrow_safe）与读写往返。"""
+import pytest
+
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+
+from pipeline.steps.intermediate_io import _arrow_safe, parquet_engine, read_frame, remove_frame, write_frame
+
+
+def test_numbers_with_blank_strings_become_numeric_without_padding():
+    df = pd.DataFrame({"n": pd.Series([1, "", 2.5, "", None], dtype=object)})
+    out = _arrow_safe(df)
+    assert pd.api.types.is_numeric_dtype(out["n"])
+    # 空串为空值，不被上一行的值填充
+    assert out["n"].tolist()[0] == 1 and out["n"].tolist()[2] == 2.5
+    assert out["n"].isna().tolist() == [False, True, False, True, True]
+    # 不改动原表
+    assert df["n"].tolist()[1] == ""
+
+
+def test_mixed_columns_become_strings_keeping_nulls():
+    df = pd.DataFrame({"m": pd.Series(["a", 1, 2.5, None, float("nan")], dtype=object)})
+    out = _arrow_safe(df)["m"]
+    assert out.tolist()[:3] == ["a", "1", "2.5"]
+    assert out.isna().tolist() == [False, False, False, True, True]
+
+
+def test_uniform_frame_is_returned_as_is():
+    df = pd.DataFrame({"s": ["a", "b", None], "i": [1, 2, 3]})
+    assert _arrow_safe(df) is df
+
+
+def test_write_read_round_trip(tmp_path):
+    if not parquet_engine():
+        pytest.skip("未安装 Parquet 引擎")
+    df = pd.DataFrame({
+        "Unified ID": ["5f0a", "000123", None],
+        "mixed": pd.Series(["x", 3, None], dtype=object),
+        "num": pd.Series([1, "", 3], dtype=object),
+    })
+    path = tmp_path / "t.xlsx"
+    assert write_frame(df, path).suffix == ".parquet"
+    back = read_frame(path)
+    assert back["Unified ID"].tolist()[:2] == ["5f0a", "000123"]
+    assert back["mixed"].tolist()[:2] == ["x", "3"]
+    assert back["mixed"].isna().tolist() == [False, False, True]
+    assert back["num"].isna().tolist() == [False, True, False]
+    remove_frame(path)
+    with pytest.raises(FileNotFoundError):
+        read_frame(path)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""CompiledRules.masks（整列比较）与原 step5 逐行 iterrows 判定逐行一致。"""
+import random
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+
+from pipeline.steps.monitor_rules import (
+    METRICS,
+    build_product_rule_sets,
+    combine_rule_list,
+    compile_rules,
+    default_monitor_rules,
+    norm_str,
+    normalize_rules,
+)
+
+
+def _reference_masks(df, metrics, rules):
+    """原 step5 的逐行实现：每行取六个指标组成 dict，按规则列表从左到右合并，公司汇总行不命中。"""
+    rules = normalize_rules(rules)
+    sets = build_product_rule_sets(rules.get("product_rules", {}))
+
+    def product_hit(kind, product_name, unified_id):
+        if product_name and norm_str(product_name) in sets[f"{kind}_name"]:
+            return True
+        if unified_id and norm_str(unified_id) in sets[f"{kind}_id"]:
+            return True
+        return False
+
+    work = df.copy()
+    for name in METRICS:
+        work["_m_" + name] = metrics[name]
+    out = {kind: [] for kind in ("delete", "strike", "yellow")}
+    for _, row in work.iterrows():
+        company = row.get("公司归属")
+        is_summary = isinstance(company, str) and company.endswith("汇总")
+        row_metrics = {name: row.get("_m_" + name) for name in METRICS}
+        for kind in out:
+            hit = False
+            if not is_summary:
+                hit = product_hit(kind, row.get("产品归属"), row.get("Unified ID")) or combine_rule_list(
+                    rules.get(f"{kind}_rules", []), row_metrics
+                )
+            out[kind].append(bool(hit))
+    return {kind: np.array(v, dtype=bool) for kind, v in out.items()}
+
+
+def _random_value(rng):
+    return rng.choice([
+        rng.randint(0, 3000),
+        rng.uniform(0, 50000),
+        float("nan"),
+        None,
+        "",
+        "abc",
+        "1200",
+        400,
+        20000,
+        rng.uniform(-100, 200),
+    ])
+
+
+def _random_frame(rng, n):
+    companies = ["A公司", "B公司", "A公司汇总", None, "C"]
+    products = ["甲", "乙", "丙", None, "", float("nan")]
+    uids = ["u1", "U2", "u3", None, ""]
+    df = pd.DataFrame({
+        "公司归属": [rng.choice(companies) for _ in range(n)],
+        "产品归属": [rng.choice(products) for _ in range(n)],
+        "Unified ID": [rng.choice(uids) for _ in range(n)],
+    })
+    metrics = {}
+    for name in METRICS:
+        if rng.random() < 0.5:
+            # 纯数值列（含 NaN），走向量化快路径
+            metrics[name] = pd.Series([rng.choice([rng.randint(0, 3000), rng.uniform(0, 50000), float("nan"), 400.0])
+                                       for _ in range(n)], index=df.index, dtype=float)
+        else:
+            metrics[name] = pd.Series([_random_value(rng) for _ in range(n)], index=df.index, dtype=object)
+    return df, metrics
+
+
+def _random_condition(rng):
+    return {
+        "metric": rng.choice(list(METRICS) + ["不存在的指标"]),
+        "op": rng.choice([">", ">=", "<", "<=", "=", "!=", "~"]),
+        "value": rng.choice([400, 20000, 1000, 20, 0, "400", "", None, "x", 1500.5]),
+    }
+
+
+def _random_rules(rng):
+    rules = {}
+    for kind in ("delete", "strike", "yellow"):
+        lst = []
+        for idx in range(rng.randint(0, 3)):
+            rule = {"conditions": [_random_condition(rng) for _ in range(rng.randint(0, 3))]}
+            if idx > 0:
+                rule["join"] = rng.choice(["and", "or", "AND", None])
+            lst.append(rule)
+        rules[f"{kind}_rules"] = lst
+    rules["product_rules"] = {
+        kind: [
+            {"by": rng.choice(["product_name", "unified_id"]), "value": rng.choice(["甲", " 乙 ", "u1", "U2", "nan", None])}
+            for _ in range(rng.randint(0, 2))
+        ]
+        for kind in ("delete", "strike", "yellow")
+    }
+    return rules
+
+
+def _assert_same(df, metrics, rules):
+    got = compile_rules(rules).masks(df, metrics)
+    want = _reference_masks(df, metrics, rules)
+    for kind in want:
+        np.testing.assert_array_equal(got[kind], want[kind], err_msg=kind)
+
+
+def test_default_rules_match_row_by_row():
+    rng = random.Random(0)
+    df, metrics = _random_frame(rng, 300)
+    _assert_same(df, metrics, default_monitor_rules())
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_rules_match_row_by_row(seed):
+    rng = random.Random(seed)
+    df, metrics = _random_frame(rng, 60)
+    _assert_same(df, metrics, _random_rules(rng))
+
+
+def test_summary_rows_never_hit():
+    df = pd.DataFrame({"公司归属": ["A公司汇总", "A公司"], "产品归属": ["甲", "甲"], "Unified ID": ["u1", "u1"]})
+    metrics = {name: pd.Series([0.0, 0.0]) for name in METRICS}
+    rules = {"product_rules": {"delete": [{"by": "product_name", "value": "甲"}], "strike": [], "yellow": []}}
+    masks = compile_rules(rules).masks(df, metrics)
+    assert masks["delete"].tolist() == [False, True]
+
+
+def test_missing_columns_count_as_empty():
+    df = pd.DataFrame({"x": [1, 2]})
+    metrics = {name: pd.Series([100.0, 5000.0]) for name in METRICS}
+    rules = {
+        "delete_rules": [],
+        "strike_rules": [],
+        "yellow_rules": [{"conditions": [{"metric": "当周周安装", "op": ">", "value": 1000}]}],
+    }
+    masks = compile_rules(rules).masks(df, metrics)
+    assert masks["yellow"].tolist() == [False, True]
+    assert not masks["delete"].any()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""payload 压缩编码：各编码往返、无标记 JSON 兼容、zstd 缺失时回退，以及旧库无 payload_blob 列时的读取回退。"""
+import json
+import sqlite3
+
+import pytest
+
+from backend.db import payload_codec
+from backend.db.payload_codec import decode, encode, fetch_payloads, get_codec
+
+PAYLOAD = {"headers": ["产品", "安装"], "rows": [["甲", 1], ["乙", None]], "note": "x" * 500}
+TEXT = json.dumps(PAYLOAD, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("codec", ["json", "zlib", "zstd"])
+def test_round_trip(codec):
+    blob = encode(TEXT, codec)
+    assert blob.startswith(b"SLGP")
+    assert decode(blob) == PAYLOAD
+    if codec != "json":
+        assert len(blob) < len(TEXT.encode("utf-8"))
+
+
+def test_unmarked_blob_is_plain_json():
+    assert decode(TEXT.encode("utf-8")) == PAYLOAD
+    assert decode(bytearray(TEXT.encode("utf-8"))) == PAYLOAD
+
+
+def test_zstd_falls_back_to_zlib_without_zstandard(monkeypatch):
+    monkeypatch.setattr(payload_codec, "zstandard", None)
+    monkeypatch.setenv("MYSQL_PAYLOAD_CODEC", "zstd")
+    assert get_codec() == "zlib"
+    blob = encode(TEXT, "zstd")
+    assert blob[4] == 1
+    assert decode(blob) == PAYLOAD
+
+
+@pytest.mark.parametrize("value, expected", [("", "json"), ("none", "json"), ("ZLIB", "zlib"), ("bogus", "json")])
+def test_get_codec(monkeypatch, value, expected):
+    monkeypatch.setenv("MYSQL_PAYLOAD_CODEC", value)
+    assert get_codec() == expected
+
+
+@pytest.fixture
+def fresh_support(monkeypatch):
+    monkeypatch.setattr(payload_codec, "_BLOB_SUPPORT", {})
+
+
+def test_fetch_prefers_payload_then_blob(fresh_support):
+    conn = sqlite3.connect(":memory:")
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE formatted_data (year INTEGER, week_tag TEXT, payload TEXT, payload_blob BLOB)")
+    cur.execute("INSERT INTO formatted_data VALUES (2026, 'a', ?, ?)", (TEXT, encode('{"stale": 1}', "zlib")))
+    cur.execute("INSERT INTO formatted_data VALUES (2026, 'b', NULL, ?)", (encode(TEXT, "zlib"),))
+    cur.execute("INSERT INTO formatted_data VALUES (2026, 'c', NULL, NULL)")
+    rows = fetch_payloads(cur, "formatted_data", "year = ? ORDER BY week_tag", (2026,), extra=("week_tag",))
+    assert rows == [("a", PAYLOAD), ("b", PAYLOAD)]
+    assert payload_codec._BLOB_SUPPORT["formatted_data"] is True
+
+
+def test_fetch_falls_back_when_blob_column_missing(fresh_support):
+    conn = sqlite3.connect(":memory:")
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE metrics_total (year INTEGER, week_tag TEXT, payload TEXT)")
+    cur.execute("INSERT INTO metrics_total VALUES (2026, 'a', ?)", (TEXT,))
+    assert fetch_payloads(cur, "metrics_total", "year = ?", (2026,)) == [(PAYLOAD,)]
+    assert payload_codec._BLOB_SUPPORT["metrics_total"] is False
+
+
+def test_fetch_does_not_fall_back_on_other_errors(fresh_support):
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(sqlite3.OperationalError):
+        fetch_payloads(conn.cursor(), "formatted_data", "year = ?", (2026,))
+    assert "formatted_data" not in payload_codec._BLOB_SUPPORT
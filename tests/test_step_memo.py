@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""步骤记忆化：指纹随输入 / 配置变化，产出未被改动时才判定可跳过。"""
+import os
+import time
+import types
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from pipeline.steps.step_memo import StepMemo
+
+YEAR, WEEK = 2026, "0105-0111"
+
+
+@pytest.fixture
+def step(tmp_path):
+    """一个假步骤模块：读 rules.json，产出 intermediate 下的 out 表。"""
+    code = tmp_path / "fake_step.py"
+    code.write_text("# step\n", encoding="utf-8")
+    rules = tmp_path / "rules.json"
+    rules.write_text("{}", encoding="utf-8")
+    mod = types.SimpleNamespace(
+        __file__=str(code),
+        MEMO_OUTPUTS=("out",),
+        memo_inputs=lambda week_tag, year: {"files": [rules], "values": {"flag": mod.flag}},
+        flag=1,
+    )
+    return mod, rules
+
+
+def _write_output(base, text="data"):
+    out = base / "intermediate" / str(YEAR) / WEEK / "out.xlsx"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(text, encoding="utf-8")
+    return out
+
+
+def test_fingerprint_tracks_parent_inputs_and_values(tmp_path, step):
+    mod, rules = step
+    memo = StepMemo(tmp_path, YEAR, WEEK)
+    fp = memo.fingerprint("s", "parent", mod)
+    assert memo.fingerprint("s", "parent", mod) == fp
+    assert memo.fingerprint("s", "other", mod) != fp
+    mod.flag = 2
+    assert memo.fingerprint("s", "parent", mod) != fp
+    mod.flag = 1
+    rules.write_text('{"changed": true}', encoding="utf-8")
+    assert memo.fingerprint("s", "parent", mod) != fp
+
+
+def test_fresh_only_while_outputs_untouched(tmp_path, step):
+    mod, _ = step
+    memo = StepMemo(tmp_path, YEAR, WEEK)
+    fp = memo.fingerprint("s", "", mod)
+    assert not memo.is_fresh("s", fp, mod)
+    since = time.time_ns()
+    out = _write_output(tmp_path)
+    memo.record("s", fp, mod, since)
+    # 清单已落盘，新实例同样可跳过
+    reloaded = StepMemo(tmp_path, YEAR, WEEK)
+    assert reloaded.is_fresh("s", fp, mod)
+    assert not reloaded.is_fresh("s", "other", mod)
+    out.write_text("overwritten by upload", encoding="utf-8")
+    assert not reloaded.is_fresh("s", fp, mod)
+    out.unlink()
+    assert not reloaded.is_fresh("s", fp, mod)
+
+
+def test_record_skips_outputs_not_written_this_run(tmp_path, step):
+    mod, _ = step
+    out = _write_output(tmp_path)
+    old = time.time() - 3600
+    os.utime(out, (old, old))
+    memo = StepMemo(tmp_path, YEAR, WEEK)
+    fp = memo.fingerprint("s", "", mod)
+    memo.record("s", fp, mod, time.time_ns())
+    assert not memo.is_fresh("s", fp, mod)
+    assert "s" not in StepMemo(tmp_path, YEAR, WEEK).data["steps"]
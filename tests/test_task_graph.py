@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""任务依赖图：上游失败时下游 blocked，取消后未开始的任务 cancelled，when 不满足时 skipped。"""
+import pytest
+
+from pipeline.task_graph import CANCEL, Task, critical_path, run_tasks
+
+
+@pytest.fixture(autouse=True)
+def _reset_cancel():
+    CANCEL.clear()
+    yield
+    CANCEL.clear()
+
+
+def test_all_ok_and_skipped():
+    ran = []
+    tasks = [
+        Task("a", lambda: ran.append("a") or True),
+        Task("b", lambda: ran.append("b") or True, deps=("a",), when=lambda: False),
+        Task("c", lambda: ran.append("c") or True, deps=("b",)),
+    ]
+    report = {}
+    assert run_tasks(tasks, workers=2, report=report)
+    assert report["status"] == {"a": "ok", "b": "skipped", "c": "ok"}
+    assert ran == ["a", "c"]
+
+
+def test_failure_blocks_downstream_only():
+    tasks = [
+        Task("a", lambda: False),
+        Task("b", lambda: True, deps=("a",)),
+        Task("c", lambda: True, deps=("b",)),
+        Task("d", lambda: True),
+    ]
+    report = {}
+    assert not run_tasks(tasks, workers=2, report=report)
+    assert report["status"] == {"a": "failed", "b": "blocked", "c": "blocked", "d": "ok"}
+
+
+def test_exception_counts_as_failure():
+    def boom():
+        raise RuntimeError("x")
+
+    report = {}
+    assert not run_tasks([Task("a", boom), Task("b", lambda: True, deps=("a",))], workers=1, report=report)
+    assert report["status"] == {"a": "failed", "b": "blocked"}
+
+
+def test_cancel_stops_pending_tasks():
+    def cancel():
+        CANCEL.set()
+        return True
+
+    report = {}
+    tasks = [Task("a", cancel), Task("b", lambda: True, deps=("a",)), Task("c", lambda: True, deps=("b",))]
+    assert not run_tasks(tasks, workers=1, report=report)
+    assert report["status"] == {"a": "ok", "b": "cancelled", "c": "cancelled"}
+
+
+def test_invalid_graph_is_rejected():
+    assert not run_tasks([Task("a", lambda: True, deps=("b",)), Task("b", lambda: True, deps=("a",))])
+    assert not run_tasks([Task("a", lambda: True), Task("a", lambda: True)])
+    assert not run_tasks([Task("a", lambda: True, deps=("missing",))])
+
+
+def test_critical_path_follows_latest_dependency():
+    tasks = [Task("a", None), Task("b", None), Task("c", None, deps=("a", "b"))]
+    timings = {"a": (0.0, 1.0), "b": (0.0, 3.0), "c": (3.0, 4.0)}
+    assert critical_path(tasks, timings) == ["b", "c"]